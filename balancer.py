@@ -1,5 +1,6 @@
-import logging
+from functools import partial
 from pathlib import Path
+from typing import Optional, Type
 
 import typer
 
@@ -9,11 +10,36 @@ from balancer.conf.banner import BANNER
 from balancer.conf.constants import (
     BALANCER_DEFAULT_LISTENER_PORT,
     BALANCER_DEFAULT_MAX_CONNECTIONS,
+    BALANCER_DEFAULT_PROCESSES,
 )
 from balancer.conf.settings import Settings
+from balancer.core.async_balancer import AsyncBalancer
 from balancer.core.balancer import Balancer
-from balancer.core.enums import BalancerAlgorithmEnum
-from balancer.core.logger import logger
+from balancer.core.common.admission import AdmissionQueue
+from balancer.core.common.backpressure import BufferPolicy, MemoryBudget
+from balancer.core.common.handoff import ListenSocketHandoff
+from balancer.core.common.health import HealthChecker
+from balancer.core.common.http import HttpPolicy
+from balancer.core.common.metrics import Metrics, MetricsServer
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.pool import ConnectionPools
+from balancer.core.common.ratelimit import RateLimiter
+from balancer.core.common.reload import SettingsReloader
+from balancer.core.common.resolver import TargetResolver
+from balancer.core.common.retry import FailoverPolicy, RetryBudget
+from balancer.core.common.timeouts import TimeoutPolicy
+from balancer.core.common.tls import TlsPolicy
+from balancer.core.common.udp import UdpPolicy
+from balancer.core.enums import (
+    BalancerAlgorithmEnum,
+    BalancerEngineEnum,
+    BalancerLoggingModeEnum,
+    BalancerProtocolEnum,
+    BalancerRelayModeEnum,
+)
+from balancer.core.logger import logger, setup_logging
+from balancer.core.supervisor import BalancerSupervisor
+from balancer.core.udp_balancer import UdpBalancer
 from balancer.utils import create_targets, get_pretty_dict_properties
 
 app = typer.Typer()
@@ -27,6 +53,14 @@ def run(
     ),
     port: int = typer.Option(BALANCER_DEFAULT_LISTENER_PORT),
     max_connections: int = typer.Option(BALANCER_DEFAULT_MAX_CONNECTIONS),
+    engine: Optional[str] = typer.Option(
+        None,
+        help=f"Engine that relays connections, overrides 'balancer.engine' setting. Able to: {', '.join(BalancerEngineEnum.values())}",
+    ),
+    processes: int = typer.Option(
+        BALANCER_DEFAULT_PROCESSES,
+        help="Amount of pre-forked balancer processes that accept connections on the same port",
+    ),
 ):
     logs_dir = Path(logs)
     if not logs_dir.exists():
@@ -35,42 +69,258 @@ def run(
     if not logs_dir.is_dir():
         raise ValueError(f"Provided path '{logs}' for logs location is not directory")
 
-    logger_debug_file_handler = logging.FileHandler(
-        logs_dir.joinpath(f"{balancer_name}.debug.log")
+    path_to_config = Path(config)
+    settings = Settings(path_to=path_to_config)
+    setup_logging(
+        logs_dir,
+        name=balancer_name,
+        level=settings.balancer.logging.level,
+        mode=BalancerLoggingModeEnum(settings.balancer.logging.mode),
+        flush_interval=settings.balancer.logging.flush_interval,
+        access_log=settings.balancer.logging.access_log,
+        access_sample_rate=settings.balancer.logging.access_sample_rate,
     )
-    logger_debug_file_handler.setLevel(logging.DEBUG)
-    logger_debug_file_handler.setFormatter(logger.handlers[0].formatter)
+    logger.info(f"Start {balancer_name} v.{balancer_version}" + BANNER)
+    logger.info(
+        f"With using configuration: {get_pretty_dict_properties(settings.balancer)}"
+    )
+
+    # Host names are resolved once before balancers are forked, so connections don't wait for the resolver
+    resolver = TargetResolver(
+        ttl=settings.balancer.dns.ttl, expand=settings.balancer.dns.expand
+    )
+    targets = resolver.expand_targets(create_targets(settings.balancer.targets))
+    resolver.resolve(targets)
+    protocol = BalancerProtocolEnum(settings.balancer.protocol)
+    http = None
+    if protocol is BalancerProtocolEnum.HTTP:
+        http = HttpPolicy(
+            idle_timeout=settings.balancer.http.idle_timeout,
+            max_head_size=settings.balancer.http.max_head_size,
+        )
+
+    udp = None
+    if protocol is BalancerProtocolEnum.UDP:
+        # Built before balancers are forked, so the counters of the flows are shared by all of them
+        udp = UdpPolicy(
+            idle_timeout=settings.balancer.udp.idle_timeout,
+            max_flows=settings.balancer.udp.max_flows,
+            source_addresses=settings.balancer.udp.source_addresses,
+        )
+
+    tls = None
+    if settings.balancer.tls.cert_file and udp is not None:
+        logger.warning(f"TLS isn't terminated for protocol '{protocol.value}'")
+    elif settings.balancer.tls.cert_file:
+        # Built before balancers are forked, so the keys of session tickets are shared by all of them
+        tls = TlsPolicy(
+            cert_file=settings.balancer.tls.cert_file,
+            key_file=settings.balancer.tls.key_file,
+            ciphers=settings.balancer.tls.ciphers,
+            alpn=settings.balancer.tls.alpn,
+            session_tickets=settings.balancer.tls.session_tickets,
+            handshake_timeout=settings.balancer.tls.handshake_timeout,
+        )
 
-    logger_info_file_handler = logging.FileHandler(
-        logs_dir.joinpath(f"{balancer_name}.info.log")
+    connection_pools = None
+    # Keep-alive connections to the targets are pooled in the HTTP mode, even if they're not pre-connected
+    # Datagrams have no connections to pool
+    if udp is None and (settings.balancer.pool.min_idle > 0 or http is not None):
+        connection_pools = ConnectionPools(
+            min_idle=settings.balancer.pool.min_idle,
+            max_idle=settings.balancer.pool.max_idle,
+            max_age=settings.balancer.pool.max_age,
+        )
+
+    health_checker = None
+    if settings.balancer.health_check.enabled is True:
+        health_checker = HealthChecker(
+            interval=settings.balancer.health_check.interval,
+            timeout=settings.balancer.health_check.timeout,
+            rise=settings.balancer.health_check.rise,
+            fall=settings.balancer.health_check.fall,
+            send=settings.balancer.health_check.send.encode(),
+            expect=settings.balancer.health_check.expect.encode(),
+        )
+        if udp is not None:
+            logger.warning(
+                "Health checks probe the targets over TCP, so UDP targets are healthy only if they accept "
+                "TCP connections on the same port"
+            )
+
+    # Built before balancers are forked, so the retry budget is shared by all of them
+    failover = FailoverPolicy(
+        connect_timeout=settings.balancer.failover.connect_timeout,
+        max_attempts=settings.balancer.failover.max_attempts,
+        budget=RetryBudget(
+            percent=settings.balancer.failover.retry_budget,
+            min_retries=settings.balancer.failover.min_retries,
+        ),
     )
-    logger_info_file_handler.setLevel(logging.INFO)
-    logger_info_file_handler.setFormatter(logger.handlers[0].formatter)
 
-    logger_err_file_handler = logging.FileHandler(
-        logs_dir.joinpath(f"{balancer_name}.err.log")
+    timeouts = TimeoutPolicy(
+        idle_read=settings.balancer.timeouts.idle_read,
+        idle_write=settings.balancer.timeouts.idle_write,
+        session=settings.balancer.timeouts.session,
+        keepalive_idle=settings.balancer.timeouts.keepalive_idle,
+        keepalive_interval=settings.balancer.timeouts.keepalive_interval,
+        keepalive_count=settings.balancer.timeouts.keepalive_count,
     )
-    logger_err_file_handler.setLevel(logging.ERROR)
-    logger_err_file_handler.setFormatter(logger.handlers[0].formatter)
 
-    logger.addHandler(logger_info_file_handler)
-    logger.addHandler(logger_debug_file_handler)
-    logger.addHandler(logger_err_file_handler)
+    # Built before balancers are forked, so the memory budget is shared by all of them
+    buffers = BufferPolicy(
+        upstream_size=settings.balancer.buffers.upstream.high,
+        downstream_size=settings.balancer.buffers.downstream.high,
+        upstream_low_watermark=settings.balancer.buffers.upstream.low,
+        downstream_low_watermark=settings.balancer.buffers.downstream.low,
+        budget=(
+            MemoryBudget(settings.balancer.buffers.memory_budget)
+            if settings.balancer.buffers.memory_budget > 0
+            else None
+        ),
+    )
 
-    path_to_config = Path(config)
-    settings = Settings(path_to=path_to_config)
-    logger.info(f"Start {balancer_name} v.{balancer_version}" + BANNER)
-    logger.info(
-        f"With using configuration: {get_pretty_dict_properties(settings.balancer)}"
+    # Built before balancers are forked, so the queue size limits waiting clients of all of them
+    admission = AdmissionQueue(
+        size=settings.balancer.admission.queue_size,
+        timeout=settings.balancer.admission.queue_timeout,
     )
 
-    targets = create_targets(settings.balancer.targets)
+    rate_limiter = None
+    rate_limit = settings.balancer.rate_limit
+    if rate_limit.client_rate > 0 or rate_limit.total_rate > 0:
+        # Built before balancers are forked, so the buckets are shared by all of them
+        rate_limiter = RateLimiter(
+            client_rate=rate_limit.client_rate,
+            client_burst=rate_limit.client_burst,
+            total_rate=rate_limit.total_rate,
+            total_burst=rate_limit.total_burst,
+            table_size=rate_limit.table_size,
+        )
+
+    metrics = None
+    metrics_server = None
+    if settings.balancer.metrics.enabled is True:
+        metrics = Metrics(targets)
+        metrics_server = MetricsServer(
+            metrics,
+            host=settings.balancer.metrics.host,
+            port=settings.balancer.metrics.port,
+            admission=admission,
+            rate_limiter=rate_limiter,
+            tls=tls,
+            udp=udp,
+        )
+
+    outliers = None
+    outlier_detection = settings.balancer.outlier_detection
+    if outlier_detection.enabled is True:
+        # Failures and ejections are kept in the target counters, so they're shared by all the balancers
+        outliers = OutlierDetector(
+            consecutive_failures=outlier_detection.consecutive_failures,
+            short_session=outlier_detection.short_session,
+            base_ejection_time=outlier_detection.base_ejection_time,
+            max_ejection_time=outlier_detection.max_ejection_time,
+            max_ejection_percent=outlier_detection.max_ejection_percent,
+            slow_start=outlier_detection.slow_start,
+            metrics=metrics,
+        )
 
     algorithm = BalancerAlgorithmEnum(settings.balancer.balance_algorithm)
-    balancer = Balancer(
-        targets=targets, port=port, algorithm=algorithm, max_connections=max_connections
+    engine_type = BalancerEngineEnum(engine or settings.balancer.engine)
+    if http is not None and engine_type is not BalancerEngineEnum.ASYNCIO:
+        logger.warning(
+            f"Protocol '{protocol.value}' is served by the '{BalancerEngineEnum.ASYNCIO.value}' engine only, "
+            f"it's used instead of '{engine_type.value}'"
+        )
+        engine_type = BalancerEngineEnum.ASYNCIO
+    # Each connection of the process engine is handshaken by a process of its own, so it has an empty cache
+    sessions_cached = tls is not None and tls.session_tickets is False
+    if sessions_cached and engine_type is BalancerEngineEnum.PROCESS:
+        logger.warning(
+            f"Sessions kept in the server-side cache are not resumed by the '{engine_type.value}' engine, "
+            "session tickets resume them"
+        )
+    balancer_class: Type[Balancer] = (
+        AsyncBalancer if engine_type is BalancerEngineEnum.ASYNCIO else Balancer
     )
-    balancer.run()
+    if udp is not None:
+        # Flows are served by callbacks of a single event loop, whatever the engine is
+        balancer_class = UdpBalancer
+    balancer_factory = partial(
+        balancer_class,
+        targets=targets,
+        port=port,
+        algorithm=algorithm,
+        max_connections=max_connections,
+        relay_mode=BalancerRelayModeEnum(settings.balancer.relay_mode),
+        connection_pools=connection_pools,
+        failover=failover,
+        metrics=metrics,
+        buffers=buffers,
+        admission=admission,
+        rate_limiter=rate_limiter,
+        http=http,
+        tls=tls,
+        udp=udp,
+        outliers=outliers,
+        timeouts=timeouts,
+        resolver=resolver,
+        drain_timeout=settings.balancer.reload.drain_timeout,
+    )
+    # Targets and the algorithm are reloaded on SIGHUP, by the supervisor if there is one
+    reloader = SettingsReloader(
+        path_to=path_to_config,
+        watch_interval=settings.balancer.reload.watch_interval,
+        resolver=resolver,
+    )
+    reloader.watch()
+    # Targets are reloaded once addresses of an expanded host name change
+    resolver.watch()
+
+    handoff = None
+    listen_socket = None
+    if settings.balancer.upgrade.socket_path:
+        # The listening socket is taken over from the running balancer, if there is one, and it's handed over
+        # to the next one, so it's never closed during upgrades and queued connections are not lost
+        handoff = ListenSocketHandoff(
+            path=settings.balancer.upgrade.socket_path,
+            timeout=settings.balancer.upgrade.handoff_timeout,
+        )
+        listen_socket = handoff.receive(port, balancer_class.socket_type)
+        if listen_socket is None:
+            listen_socket = balancer_factory().bind()
+    if processes > 1:
+        supervisor = BalancerSupervisor(
+            factory=balancer_factory,
+            processes=processes,
+            health_checker=health_checker,
+            metrics_server=metrics_server,
+            metrics=metrics,
+            reloader=reloader,
+            listen_socket=listen_socket,
+            drain_timeout=settings.balancer.reload.drain_timeout,
+            resolver=resolver,
+        )
+        runner = supervisor.run
+    else:
+        balancer = balancer_factory(
+            health_checker=health_checker,
+            metrics_server=metrics_server,
+            reloader=reloader,
+            listen_socket=listen_socket,
+        )
+        runner = balancer.run
+    if handoff is None:
+        runner()
+        return
+    # The running balancer drains once this one is about to accept, queued connections wait for it meanwhile
+    handoff.complete()
+    handoff.serve(listen_socket)  # type: ignore
+    try:
+        runner()
+    finally:
+        handoff.stop()
 
 
 if __name__ == "__main__":
@@ -1,9 +1,146 @@
 # Defaults
-BALANCER_DEFAULT_BUFFER_SIZE = 8192
+BALANCER_DEFAULT_BUFFER_SIZE = 65536  # Matches the default pipe capacity on Linux
+# Bytes a full relay buffer drains to before its source is read again
+BALANCER_DEFAULT_BUFFER_LOW_WATERMARK = 32768
 BALANCER_DEFAULT_LISTENER_HOST = "0.0.0.0"
 BALANCER_DEFAULT_LISTENER_PORT = 3333
 
 BALANCER_DEFAULT_MAX_CONNECTIONS = 21
 BALANCER_DEFAULT_CLEANUP_WAITING = 2  # seconds
 BALANCER_DEFAULT_BIND_RETRY_WAITING = 5  # seconds
-BALANCE_DEFAULT_GRACEFUL_SHUTDOWN_TIME = 5  # seconds
+# Turns in a precomputed weighted round-robin period
+BALANCER_DEFAULT_SCHEDULE_MAX_SIZE = 65536
+# Consistent hash ring points per unit of a target weight
+BALANCER_DEFAULT_KETAMA_POINTS = 160
+# Prime, should be much bigger than the total weight of the targets
+BALANCER_DEFAULT_MAGLEV_TABLE_SIZE = 65537
+BALANCER_DEFAULT_EWMA_DECAY = 10  # seconds
+# Latency assumed for targets without observations
+BALANCER_DEFAULT_EWMA_INITIAL_LATENCY = 0.01  # seconds
+# Latency observed when connection to a target fails
+BALANCER_DEFAULT_EWMA_FAILURE_PENALTY = 5  # seconds
+
+BALANCER_DEFAULT_PROCESSES = 1
+BALANCER_DEFAULT_RESTART_WAITING = 1  # seconds
+
+BALANCER_DEFAULT_POOL_MIN_IDLE = 0  # Pooling is disabled
+BALANCER_DEFAULT_POOL_MAX_IDLE = 8
+BALANCER_DEFAULT_POOL_MAX_AGE = 30  # seconds
+BALANCER_DEFAULT_POOL_FILL_INTERVAL = 1  # seconds
+BALANCER_DEFAULT_POOL_CONNECT_TIMEOUT = 2  # seconds
+
+BALANCER_DEFAULT_HEALTH_INTERVAL = 2  # seconds
+BALANCER_DEFAULT_HEALTH_TIMEOUT = 1  # seconds
+BALANCER_DEFAULT_HEALTH_RISE = 2  # Passed probes in a row to mark a target healthy
+BALANCER_DEFAULT_HEALTH_FALL = 3  # Failed probes in a row to mark a target unhealthy
+
+BALANCER_DEFAULT_CONNECT_TIMEOUT = 1  # seconds
+# Targets a connection is tried on, including the first one
+BALANCER_DEFAULT_MAX_ATTEMPTS = 3
+# Percent of recent requests that are able to be retried
+BALANCER_DEFAULT_RETRY_BUDGET = 20
+BALANCER_DEFAULT_RETRY_BUDGET_MIN_RETRIES = 3  # Retries per second allowed anyway
+BALANCER_DEFAULT_RETRY_BUDGET_WINDOW = 10  # seconds
+
+BALANCER_DEFAULT_METRICS_HOST = "127.0.0.1"
+BALANCER_DEFAULT_METRICS_PORT = 9333
+BALANCER_DEFAULT_METRICS_SHARDS = 16  # Parts of the metrics memory with their own locks
+# Upper bounds of the histograms buckets, seconds
+BALANCER_DEFAULT_METRICS_CONNECT_BUCKETS = (0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1, 5)
+BALANCER_DEFAULT_METRICS_SESSION_BUCKETS = (0.01, 0.1, 1, 10, 60, 300, 3600)
+# Targets that are able to be added by reloads in addition to the initial ones, the metrics memory is reserved for them
+BALANCER_DEFAULT_METRICS_SPARE_SLOTS = 16
+# Seconds between checks of the settings file for changes, 0 means it's reloaded on SIGHUP only
+BALANCER_DEFAULT_RELOAD_WATCH_INTERVAL = 0
+# Seconds a draining balancer waits for relays in progress to complete, before they're terminated
+BALANCER_DEFAULT_DRAIN_TIMEOUT = 60
+# Seconds log lines are collected for before they're written at once, in the queue logging mode
+BALANCER_DEFAULT_LOG_FLUSH_INTERVAL = 0.2
+# Bytes of log lines the pipe to the writer holds, in the queue logging mode (Linux only)
+BALANCER_DEFAULT_LOG_PIPE_SIZE = 1 << 20
+# Bytes of a log line at most, in the queue logging mode. Longer lines are cut, so a frame is told from garbage by its length
+BALANCER_DEFAULT_LOG_MAX_LINE_SIZE = 1 << 22
+# Clients that are able to wait for a saturated target, in all the balancer processes together
+BALANCER_DEFAULT_ADMISSION_QUEUE_SIZE = 64
+# Seconds a client waits for a saturated target before it's rejected
+BALANCER_DEFAULT_ADMISSION_QUEUE_TIMEOUT = 5
+# Seconds between checks of the saturated targets for room, while there are waiting clients
+BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL = 0.005
+# Upper bounds of the admission wait histogram buckets, seconds
+BALANCER_DEFAULT_ADMISSION_WAIT_BUCKETS = (0.01, 0.05, 0.1, 0.5, 1, 5)
+# Connections a client is able to open at once, when its connection rate is limited
+BALANCER_DEFAULT_RATE_LIMIT_CLIENT_BURST = 20
+# Connections all the clients are able to open at once, when the total connection rate is limited
+BALANCER_DEFAULT_RATE_LIMIT_TOTAL_BURST = 200
+# Clients whose buckets are kept at once, the least recently seen ones are evicted beyond that
+BALANCER_DEFAULT_RATE_LIMIT_TABLE_SIZE = 4096
+# Slots of the buckets table an address is able to take, the least recently used one of them is evicted
+BALANCER_DEFAULT_RATE_LIMIT_WAYS = 8
+# Locks of the buckets table, each one guards a part of it
+BALANCER_DEFAULT_RATE_LIMIT_LOCKS = 16
+# Seconds a keep-alive client connection is able to stay idle between requests, in the HTTP mode
+BALANCER_DEFAULT_HTTP_IDLE_TIMEOUT = 30
+# Bytes the head of an HTTP message (start line and headers) is able to take
+BALANCER_DEFAULT_HTTP_MAX_HEAD_SIZE = 65536
+# Bytes a chunk size line or a trailer line of a chunked HTTP body is able to take
+BALANCER_DEFAULT_HTTP_MAX_LINE_SIZE = 4096
+# Seconds a TLS handshake with a client is able to take
+BALANCER_DEFAULT_TLS_HANDSHAKE_TIMEOUT = 5
+# Bytes of TLS records received from a client at once
+BALANCER_DEFAULT_TLS_READ_SIZE = 65536
+# Plain bytes encrypted into TLS records at once, they're reported as sent once all the records are sent
+BALANCER_DEFAULT_TLS_WRITE_SIZE = 65536
+# Seconds a UDP flow is kept without datagrams in either direction
+BALANCER_DEFAULT_UDP_IDLE_TIMEOUT = 30
+# UDP flows a balancer process keeps at once, the least recently active ones are evicted beyond that
+BALANCER_DEFAULT_UDP_MAX_FLOWS = 65536
+# Datagrams received from a socket at once, before the event loop serves other sockets
+BALANCER_DEFAULT_UDP_BATCH_SIZE = 64
+# Bytes the largest UDP datagram takes
+BALANCER_DEFAULT_UDP_DATAGRAM_SIZE = 65535
+# Bytes of the kernel buffers of the UDP listening socket, so bursts of datagrams are not dropped
+BALANCER_DEFAULT_UDP_SOCKET_BUFFER = 4 * 1024 * 1024
+# Seconds between checks of the UDP flows for idleness, at most
+BALANCER_DEFAULT_UDP_SWEEP_INTERVAL = 1
+# Descriptors kept for the listening socket, logs and metrics, besides the sockets of UDP flows
+BALANCER_DEFAULT_UDP_RESERVED_DESCRIPTORS = 256
+# Failures in a row (failed connects, resets, sessions the target closed right away) that eject a target
+BALANCER_DEFAULT_OUTLIER_CONSECUTIVE_FAILURES = 5
+# Seconds a session the target closed without a byte of response is taken as a failure within
+BALANCER_DEFAULT_OUTLIER_SHORT_SESSION = 1
+# Seconds of the first ejection of a target, each ejection in a row doubles it
+BALANCER_DEFAULT_OUTLIER_BASE_EJECTION_TIME = 30
+# Seconds an ejection takes at most. A target back for longer than that starts its ejections over
+BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_TIME = 300
+# Percent of the targets that are able to be ejected at once, one target is ejectable anyway
+BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_PERCENT = 50
+# Seconds a target returned from ejection takes to get its full share of new connections
+BALANCER_DEFAULT_OUTLIER_SLOW_START = 30
+# Share of new connections a target gets right after it's returned from ejection
+BALANCER_DEFAULT_OUTLIER_SLOW_START_MIN_SHARE = 0.1
+# Seconds the first retry of binding the listening socket waits, each next retry waits twice as long
+BALANCER_DEFAULT_BIND_RETRY_MIN_WAITING = 0.1
+# Seconds a balancer started for an upgrade and the running one wait for each other during the handoff
+BALANCER_DEFAULT_HANDOFF_TIMEOUT = 10
+# Seconds between attempts to bind the metrics port, while it's taken (e.g. by the balancer being upgraded)
+BALANCER_DEFAULT_METRICS_BIND_RETRY_WAITING = 0.5
+# Seconds a relay waits for data from either side before it's closed, 0 disables the timeout
+BALANCER_DEFAULT_IDLE_READ_TIMEOUT = 600
+# Seconds relayed data waits for its side to take it before the relay is closed, 0 disables the timeout
+BALANCER_DEFAULT_IDLE_WRITE_TIMEOUT = 60
+# Seconds a relayed session lasts at most, 0 means it's unlimited
+BALANCER_DEFAULT_SESSION_TIMEOUT = 0
+# Seconds a connection is idle before TCP keepalive probes are sent, 0 disables keepalive
+BALANCER_DEFAULT_KEEPALIVE_IDLE = 60
+# Seconds between TCP keepalive probes
+BALANCER_DEFAULT_KEEPALIVE_INTERVAL = 10
+# Unanswered TCP keepalive probes that drop the connection
+BALANCER_DEFAULT_KEEPALIVE_COUNT = 6
+# Seconds a tick of the timer wheel takes, timers fire within a tick after they're due
+BALANCER_DEFAULT_TIMER_RESOLUTION = 0.1
+# Slots of each level of the timer wheel, each level spans the whole previous one by a slot
+BALANCER_DEFAULT_TIMER_SLOTS = 64
+# Levels of the timer wheel, timers due beyond the span of all of them wait in the last slot of the top one
+BALANCER_DEFAULT_TIMER_LEVELS = 4
+# Seconds resolved addresses of the targets are kept before their host names are resolved again, 0 disables it
+BALANCER_DEFAULT_DNS_TTL = 30
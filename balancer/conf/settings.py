@@ -2,7 +2,57 @@ from pathlib import Path
 
 from dynaconf import Dynaconf, Validator  # type: ignore
 
-from balancer.core.enums import BalancerAlgorithmEnum
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_ADMISSION_QUEUE_SIZE,
+    BALANCER_DEFAULT_ADMISSION_QUEUE_TIMEOUT,
+    BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+    BALANCER_DEFAULT_BUFFER_SIZE,
+    BALANCER_DEFAULT_CONNECT_TIMEOUT,
+    BALANCER_DEFAULT_DNS_TTL,
+    BALANCER_DEFAULT_DRAIN_TIMEOUT,
+    BALANCER_DEFAULT_HANDOFF_TIMEOUT,
+    BALANCER_DEFAULT_HEALTH_FALL,
+    BALANCER_DEFAULT_HEALTH_INTERVAL,
+    BALANCER_DEFAULT_HEALTH_RISE,
+    BALANCER_DEFAULT_HEALTH_TIMEOUT,
+    BALANCER_DEFAULT_HTTP_IDLE_TIMEOUT,
+    BALANCER_DEFAULT_HTTP_MAX_HEAD_SIZE,
+    BALANCER_DEFAULT_IDLE_READ_TIMEOUT,
+    BALANCER_DEFAULT_IDLE_WRITE_TIMEOUT,
+    BALANCER_DEFAULT_KEEPALIVE_COUNT,
+    BALANCER_DEFAULT_KEEPALIVE_IDLE,
+    BALANCER_DEFAULT_KEEPALIVE_INTERVAL,
+    BALANCER_DEFAULT_LOG_FLUSH_INTERVAL,
+    BALANCER_DEFAULT_MAX_ATTEMPTS,
+    BALANCER_DEFAULT_METRICS_HOST,
+    BALANCER_DEFAULT_METRICS_PORT,
+    BALANCER_DEFAULT_OUTLIER_BASE_EJECTION_TIME,
+    BALANCER_DEFAULT_OUTLIER_CONSECUTIVE_FAILURES,
+    BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_PERCENT,
+    BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_TIME,
+    BALANCER_DEFAULT_OUTLIER_SHORT_SESSION,
+    BALANCER_DEFAULT_OUTLIER_SLOW_START,
+    BALANCER_DEFAULT_POOL_MAX_AGE,
+    BALANCER_DEFAULT_POOL_MAX_IDLE,
+    BALANCER_DEFAULT_POOL_MIN_IDLE,
+    BALANCER_DEFAULT_RATE_LIMIT_CLIENT_BURST,
+    BALANCER_DEFAULT_RATE_LIMIT_TABLE_SIZE,
+    BALANCER_DEFAULT_RATE_LIMIT_TOTAL_BURST,
+    BALANCER_DEFAULT_RELOAD_WATCH_INTERVAL,
+    BALANCER_DEFAULT_RETRY_BUDGET,
+    BALANCER_DEFAULT_RETRY_BUDGET_MIN_RETRIES,
+    BALANCER_DEFAULT_SESSION_TIMEOUT,
+    BALANCER_DEFAULT_TLS_HANDSHAKE_TIMEOUT,
+    BALANCER_DEFAULT_UDP_IDLE_TIMEOUT,
+    BALANCER_DEFAULT_UDP_MAX_FLOWS,
+)
+from balancer.core.enums import (
+    BalancerAlgorithmEnum,
+    BalancerEngineEnum,
+    BalancerLoggingModeEnum,
+    BalancerProtocolEnum,
+    BalancerRelayModeEnum,
+)
 
 
 class Settings:
@@ -22,6 +72,318 @@ class Settings:
             default=BalancerAlgorithmEnum.ROUND_ROBIN.value,
         ),
         Validator("balancer.targets", must_exist=True),
+        Validator(
+            "balancer.engine",
+            condition=BalancerEngineEnum.is_valid_engine,
+            default=BalancerEngineEnum.PROCESS.value,
+        ),
+        Validator(
+            "balancer.relay_mode",
+            condition=BalancerRelayModeEnum.is_valid_relay_mode,
+            default=BalancerRelayModeEnum.AUTO.value,
+        ),
+        Validator(
+            "balancer.protocol",
+            condition=BalancerProtocolEnum.is_valid_protocol,
+            default=BalancerProtocolEnum.TCP.value,
+        ),
+        Validator(
+            "balancer.http.idle_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_HTTP_IDLE_TIMEOUT,
+        ),
+        Validator(
+            "balancer.http.max_head_size",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_HTTP_MAX_HEAD_SIZE,
+        ),
+        Validator(
+            "balancer.udp.idle_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_UDP_IDLE_TIMEOUT,
+        ),
+        Validator(
+            "balancer.udp.max_flows",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_UDP_MAX_FLOWS,
+        ),
+        Validator("balancer.udp.source_addresses", is_type_of=list, default=[]),
+        Validator(
+            "balancer.tls.cert_file",
+            "balancer.tls.key_file",
+            "balancer.tls.ciphers",
+            is_type_of=str,
+            default="",
+        ),
+        Validator("balancer.tls.alpn", is_type_of=list, default=[]),
+        Validator("balancer.tls.session_tickets", is_type_of=bool, default=True),
+        Validator(
+            "balancer.tls.handshake_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_TLS_HANDSHAKE_TIMEOUT,
+        ),
+        Validator(
+            "balancer.pool.min_idle",
+            is_type_of=int,
+            gte=0,
+            default=BALANCER_DEFAULT_POOL_MIN_IDLE,
+        ),
+        Validator(
+            "balancer.pool.max_idle",
+            is_type_of=int,
+            gte=0,
+            default=BALANCER_DEFAULT_POOL_MAX_IDLE,
+        ),
+        Validator(
+            "balancer.pool.max_age",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_POOL_MAX_AGE,
+        ),
+        Validator("balancer.health_check.enabled", is_type_of=bool, default=False),
+        Validator(
+            "balancer.health_check.interval",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_HEALTH_INTERVAL,
+        ),
+        Validator(
+            "balancer.health_check.timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_HEALTH_TIMEOUT,
+        ),
+        Validator(
+            "balancer.health_check.rise",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_HEALTH_RISE,
+        ),
+        Validator(
+            "balancer.health_check.fall",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_HEALTH_FALL,
+        ),
+        Validator("balancer.health_check.send", is_type_of=str, default=""),
+        Validator("balancer.health_check.expect", is_type_of=str, default=""),
+        Validator("balancer.outlier_detection.enabled", is_type_of=bool, default=False),
+        Validator(
+            "balancer.outlier_detection.consecutive_failures",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_OUTLIER_CONSECUTIVE_FAILURES,
+        ),
+        Validator(
+            "balancer.outlier_detection.short_session",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_OUTLIER_SHORT_SESSION,
+        ),
+        Validator(
+            "balancer.outlier_detection.base_ejection_time",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_OUTLIER_BASE_EJECTION_TIME,
+        ),
+        Validator(
+            "balancer.outlier_detection.max_ejection_time",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_TIME,
+        ),
+        Validator(
+            "balancer.outlier_detection.max_ejection_percent",
+            is_type_of=(int, float),
+            gte=0,
+            lte=100,
+            default=BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_PERCENT,
+        ),
+        Validator(
+            "balancer.outlier_detection.slow_start",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_OUTLIER_SLOW_START,
+        ),
+        Validator(
+            "balancer.failover.connect_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_CONNECT_TIMEOUT,
+        ),
+        Validator(
+            "balancer.failover.max_attempts",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_MAX_ATTEMPTS,
+        ),
+        Validator(
+            "balancer.failover.retry_budget",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_RETRY_BUDGET,
+        ),
+        Validator(
+            "balancer.failover.min_retries",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_RETRY_BUDGET_MIN_RETRIES,
+        ),
+        Validator(
+            "balancer.dns.ttl",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_DNS_TTL,
+        ),
+        Validator("balancer.dns.expand", is_type_of=bool, default=False),
+        Validator(
+            "balancer.timeouts.idle_read",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_IDLE_READ_TIMEOUT,
+        ),
+        Validator(
+            "balancer.timeouts.idle_write",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_IDLE_WRITE_TIMEOUT,
+        ),
+        Validator(
+            "balancer.timeouts.session",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_SESSION_TIMEOUT,
+        ),
+        Validator(
+            "balancer.timeouts.keepalive_idle",
+            is_type_of=int,
+            gte=0,
+            default=BALANCER_DEFAULT_KEEPALIVE_IDLE,
+        ),
+        Validator(
+            "balancer.timeouts.keepalive_interval",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_KEEPALIVE_INTERVAL,
+        ),
+        Validator(
+            "balancer.timeouts.keepalive_count",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_KEEPALIVE_COUNT,
+        ),
+        Validator(
+            "balancer.admission.queue_size",
+            is_type_of=int,
+            gte=0,
+            default=BALANCER_DEFAULT_ADMISSION_QUEUE_SIZE,
+        ),
+        Validator(
+            "balancer.admission.queue_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_ADMISSION_QUEUE_TIMEOUT,
+        ),
+        Validator(
+            "balancer.rate_limit.client_rate",
+            "balancer.rate_limit.total_rate",
+            is_type_of=(int, float),
+            gte=0,
+            default=0,
+        ),
+        Validator(
+            "balancer.rate_limit.client_burst",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_RATE_LIMIT_CLIENT_BURST,
+        ),
+        Validator(
+            "balancer.rate_limit.total_burst",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_RATE_LIMIT_TOTAL_BURST,
+        ),
+        Validator(
+            "balancer.rate_limit.table_size",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_RATE_LIMIT_TABLE_SIZE,
+        ),
+        Validator("balancer.metrics.enabled", is_type_of=bool, default=False),
+        Validator(
+            "balancer.metrics.host",
+            is_type_of=str,
+            default=BALANCER_DEFAULT_METRICS_HOST,
+        ),
+        Validator(
+            "balancer.metrics.port",
+            is_type_of=int,
+            gt=0,
+            default=BALANCER_DEFAULT_METRICS_PORT,
+        ),
+        Validator(
+            "balancer.reload.watch_interval",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_RELOAD_WATCH_INTERVAL,
+        ),
+        Validator(
+            "balancer.reload.drain_timeout",
+            is_type_of=(int, float),
+            gte=0,
+            default=BALANCER_DEFAULT_DRAIN_TIMEOUT,
+        ),
+        Validator("balancer.upgrade.socket_path", is_type_of=str, default=""),
+        Validator(
+            "balancer.upgrade.handoff_timeout",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_HANDOFF_TIMEOUT,
+        ),
+        Validator(
+            "balancer.buffers.upstream.high",
+            "balancer.buffers.downstream.high",
+            is_type_of=int,
+            gte=1,
+            default=BALANCER_DEFAULT_BUFFER_SIZE,
+        ),
+        Validator(
+            "balancer.buffers.upstream.low",
+            "balancer.buffers.downstream.low",
+            is_type_of=int,
+            gte=0,
+            default=BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+        ),
+        Validator("balancer.buffers.memory_budget", is_type_of=int, gte=0, default=0),
+        Validator(
+            "balancer.logging.level",
+            is_in=["DEBUG", "INFO", "WARNING", "ERROR", "CRITICAL"],
+            default="DEBUG",
+        ),
+        Validator(
+            "balancer.logging.mode",
+            condition=BalancerLoggingModeEnum.is_valid_logging_mode,
+            default=BalancerLoggingModeEnum.SYNC.value,
+        ),
+        Validator(
+            "balancer.logging.flush_interval",
+            is_type_of=(int, float),
+            gt=0,
+            default=BALANCER_DEFAULT_LOG_FLUSH_INTERVAL,
+        ),
+        Validator("balancer.logging.access_log", is_type_of=bool, default=False),
+        Validator(
+            "balancer.logging.access_sample_rate",
+            is_type_of=(int, float),
+            gte=0,
+            lte=1,
+            default=1,
+        ),
     ]
 
     def __init__(self, path_to: Path) -> None:
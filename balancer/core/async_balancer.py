@@ -0,0 +1,234 @@
+import asyncio
+import signal
+import socket
+import sys
+from typing import Dict, Optional, Union
+
+from balancer.conf.constants import BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL
+from balancer.core.balancer import Balancer
+from balancer.core.common.async_worker import AsyncWorker
+from balancer.core.common.http_worker import HttpWorker
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.target import Target
+from balancer.core.common.timeouts import TimerWheel
+from balancer.core.enums import BalancerRelayModeEnum
+from balancer.core.logger import logger
+from balancer.utils import close_with_reset
+
+
+class AsyncBalancer(Balancer):
+    """
+    Class that listens connections on a local port and balances a loading between provided targets.
+    Unlike the :class:`Balancer` it doesn't spawn a process per connection: the accept loop and
+    all client-target relays run as coroutines on a single asyncio event loop.
+    """
+
+    def __init__(self, *args, **kwargs) -> None:
+        super(AsyncBalancer, self).__init__(*args, **kwargs)
+        if self.relay_mode is BalancerRelayModeEnum.SPLICE:
+            logger.warning(
+                f"Relay mode '{self.relay_mode.value}' isn't supported by the asyncio engine, "
+                f"'{BalancerRelayModeEnum.BUFFER.value}' is used"
+            )
+        # Relays currently processing a job
+        self.processing_tasks: Dict[asyncio.Task, Union[AsyncWorker, HttpWorker]] = {}
+        self.accept_task: Optional[asyncio.Task] = None
+        # Admits clients waiting for saturated targets, it runs while there are any
+        self.admission_task: Optional[asyncio.Task] = None
+        self.draining: bool = False  # Relays are given time to complete on stop
+        # Timeouts of all the relays are checked on the wheel of the event loop, it's created once the loop runs
+        self.timers: Optional[TimerWheel] = None
+
+    def close_workers(self, *args):
+        """
+        It stops accepting new connections. Remaining relays are terminated by the event loop right after that
+        """
+        self.keep_going = False
+        self.resolver and self.resolver.stop()
+        self.connection_pools and self.connection_pools.stop()
+        self.health_checker and self.health_checker.stop()
+        self.metrics_server and self.metrics_server.stop()
+        if self.accept_task is not None:
+            self.accept_task.cancel()
+
+    def drain_workers(self, *args):
+        """
+        It stops accepting new connections. Remaining relays are given the drain timeout to complete,
+        then they're terminated
+        """
+        logger.info(
+            f"Balancer '{self}' is draining, relays are given {self.drain_timeout}s to complete"
+        )
+        self.draining = True
+        self.close_workers()
+        for (task, worker) in list(self.processing_tasks.items()):
+            # Keep-alive connections are closed once their requests in progress are served
+            if isinstance(worker, HttpWorker) and worker.close_when_idle():
+                task.cancel()
+
+    async def accept_connections(self, listen_socket: socket.socket):
+        """
+        It accepts incoming connections and starts a relay coroutine for each of them
+        """
+        loop = asyncio.get_running_loop()
+        while self.keep_going is True:
+            try:
+                (client_socket, client_host) = await loop.sock_accept(listen_socket)
+            except asyncio.CancelledError:
+                raise
+            except Exception:
+                logger.exception(f"Failed bind to {self.host}:{self.port}")
+                if self.keep_going is True:
+                    # Exception did not come from termination process, so keep rollin'
+                    await asyncio.sleep(3)
+                    continue
+                raise  # Termination DID come from termination process, so abort.
+
+            self.handle_client(client_socket, client_host)
+
+    def handle_client(self, client_socket, client_host):
+        """
+        It gives the accepted connection to a target and starts a coroutine that relays it.
+        If all the targets are saturated, the connection waits in the admission queue or it's rejected.
+        Connections over the rate limit are rejected before anything else
+        """
+        if self.rate_limiter is not None and not self.rate_limiter.allow(client_host):
+            close_with_reset(client_socket)
+            return
+        client_socket.setblocking(False)
+        if self.http is not None:
+            self.start_http_worker(client_socket, client_host)
+            return
+        target = self._next_target(client_host[0])
+        if target is None:
+            if self.admission.enqueue(client_socket, client_host) is False:
+                return
+            if self.admission_task is None or self.admission_task.done():
+                self.admission_task = asyncio.get_running_loop().create_task(
+                    self.admit_waiting()
+                )
+            return
+        self.start_worker(target, client_socket, client_host)
+
+    async def admit_waiting(self):
+        """
+        It admits the clients waiting for saturated targets once the targets have room for them. Room is made by
+        relays of any balancer, so the targets are checked each poll interval while there are waiting clients
+        """
+        while not self.admission.is_empty:
+            await asyncio.sleep(BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL)
+            self.admission.dispatch(self._next_target, self.start_worker)
+
+    def start_worker(self, target: Target, client_socket, client_host) -> None:
+        """It starts a coroutine that relays the connection to the target, the connection is counted on it already"""
+        if self.metrics is not None:
+            self.metrics.add(target, Metrics.ACCEPTED)
+        new_worker = AsyncWorker(
+            target,
+            client_socket,
+            client_host,
+            self.buffer_size,
+            self._pooled_socket(target),
+            self.targets,
+            self.failover,
+            self.metrics,
+            self.buffers,
+            self.tls,
+            self.outliers,
+            self.timeouts,
+            self.timers,
+        )
+        task = asyncio.get_running_loop().create_task(new_worker.run())
+        self.processing_tasks[task] = new_worker
+        task.add_done_callback(self.processing_tasks.pop)
+
+    def start_http_worker(self, client_socket, client_host) -> None:
+        """It starts a coroutine that serves requests of the connection, a target is chosen for each request"""
+        new_worker = HttpWorker(
+            client_socket,
+            client_host,
+            lambda: self.targets,
+            self.http,
+            self.connection_pools,
+            self.failover,
+            self.metrics,
+            self.buffers,
+            self.tls,
+            self.outliers,
+            self.timeouts,
+        )
+        task = asyncio.get_running_loop().create_task(new_worker.run())
+        self.processing_tasks[task] = new_worker
+        task.add_done_callback(self.processing_tasks.pop)
+
+    async def serve(self, listen_socket: socket.socket):
+        """
+        It runs the accept loop until termination and then terminates all the relays
+        """
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self.close_workers)
+        loop.add_signal_handler(signal.SIGQUIT, self.drain_workers)
+        if self.reloader is not None:
+            loop.add_signal_handler(signal.SIGHUP, self.reload_targets)
+        else:
+            # Balancers run by a supervisor are reloaded by replacing them
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        listen_socket.setblocking(False)
+        self.timers = TimerWheel(loop=loop)
+
+        self.accept_task = loop.create_task(self.accept_connections(listen_socket))
+        try:
+            await self.accept_task
+        except asyncio.CancelledError:
+            pass
+        except Exception as exc:
+            logger.critical(
+                f"Got unexpected behaviour. Start shutting down workers on: {self.host}:{self.port}"
+            )
+            logger.exception(exc)
+
+        self.keep_going = False
+        if self.draining is True:
+            self.accept_backlog()
+        self.close_listen_socket()
+
+        if self.draining is True:
+            deadline = loop.time() + self.drain_timeout
+            # Waiting clients are admitted meanwhile, their relays are waited for as well
+            while self.processing_tasks or not self.admission.is_empty:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                waited = list(self.processing_tasks)
+                if self.admission_task is not None and not self.admission_task.done():
+                    waited.append(self.admission_task)
+                if not waited:
+                    break
+                await asyncio.wait(
+                    waited, timeout=timeout, return_when=asyncio.FIRST_COMPLETED
+                )
+        self.admission.clear()
+        if self.admission_task is not None:
+            self.admission_task.cancel()
+        tasks = list(self.processing_tasks)
+        for task in tasks:
+            task.cancel()
+        if tasks:
+            await asyncio.wait(tasks, timeout=0.2)
+        if self.timers is not None:
+            self.timers.close()
+
+    def run(self):
+        """
+        It creates a socket, binds it to the host and port, and then serves incoming connections on the event loop.
+        Each connection is relayed by its own coroutine, so there is no process or thread per connection
+        :return: NoReturn
+        """
+        listen_socket = self.bind()
+        self.resolver and self.resolver.start(self.targets)
+        self.connection_pools and self.connection_pools.start(self.targets)
+        self.health_checker and self.health_checker.start(self.targets)
+        self.metrics_server and self.metrics_server.start(self.targets, self.port)
+        asyncio.run(self.serve(listen_socket))
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.exit(0)
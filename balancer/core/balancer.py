@@ -1,25 +1,45 @@
 import multiprocessing
 import os
+import select
+import selectors
 import signal
 import socket
 import sys
 import threading
 import time
-from typing import List
+from typing import Dict, List, Optional, Tuple
 
 from balancer.conf.constants import (
+    BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL,
+    BALANCER_DEFAULT_BIND_RETRY_MIN_WAITING,
     BALANCER_DEFAULT_BIND_RETRY_WAITING,
     BALANCER_DEFAULT_BUFFER_SIZE,
     BALANCER_DEFAULT_CLEANUP_WAITING,
+    BALANCER_DEFAULT_DRAIN_TIMEOUT,
     BALANCER_DEFAULT_LISTENER_HOST,
     BALANCER_DEFAULT_LISTENER_PORT,
     BALANCER_DEFAULT_MAX_CONNECTIONS,
 )
+from balancer.core.common.admission import AdmissionQueue
 from balancer.core.common.algorithms import BalanceAlgorithmFactory
+from balancer.core.common.backpressure import BufferPolicy
+from balancer.core.common.health import HealthChecker
+from balancer.core.common.http import HttpPolicy
+from balancer.core.common.metrics import Metrics, MetricsServer
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.pool import ConnectionPools
+from balancer.core.common.ratelimit import RateLimiter
+from balancer.core.common.reload import SettingsReloader
+from balancer.core.common.resolver import TargetResolver
+from balancer.core.common.retry import FailoverPolicy
 from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.common.timeouts import TimeoutPolicy
+from balancer.core.common.tls import TlsPolicy
+from balancer.core.common.udp import UdpPolicy
 from balancer.core.common.worker import Worker
-from balancer.core.enums import BalancerAlgorithmEnum
-from balancer.core.logger import logger
+from balancer.core.enums import BalancerAlgorithmEnum, BalancerRelayModeEnum
+from balancer.core.logger import handlers_locked, logger
+from balancer.utils import close_with_reset
 
 
 class Balancer(multiprocessing.Process):
@@ -28,6 +48,8 @@ class Balancer(multiprocessing.Process):
     It's aims to balance a loading between provided targets.
     """
 
+    socket_type: int = socket.SOCK_STREAM  # Type of the listening socket
+
     def __init__(
         self,
         targets: List[Target],
@@ -35,6 +57,25 @@ class Balancer(multiprocessing.Process):
         buffer_size: int = BALANCER_DEFAULT_BUFFER_SIZE,
         max_connections: int = BALANCER_DEFAULT_MAX_CONNECTIONS,
         algorithm: BalancerAlgorithmEnum = BalancerAlgorithmEnum.ROUND_ROBIN,
+        relay_mode: BalancerRelayModeEnum = BalancerRelayModeEnum.AUTO,
+        connection_pools: Optional[ConnectionPools] = None,
+        health_checker: Optional[HealthChecker] = None,
+        failover: Optional[FailoverPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        metrics_server: Optional[MetricsServer] = None,
+        reuse_port: bool = False,
+        listen_socket: Optional[socket.socket] = None,
+        reloader: Optional[SettingsReloader] = None,
+        drain_timeout: float = BALANCER_DEFAULT_DRAIN_TIMEOUT,
+        buffers: Optional[BufferPolicy] = None,
+        admission: Optional[AdmissionQueue] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        http: Optional[HttpPolicy] = None,
+        tls: Optional[TlsPolicy] = None,
+        udp: Optional[UdpPolicy] = None,
+        outliers: Optional[OutlierDetector] = None,
+        timeouts: Optional[TimeoutPolicy] = None,
+        resolver: Optional[TargetResolver] = None,
     ) -> None:
 
         # multiprocessing.Process.__init__(self)
@@ -51,15 +92,73 @@ class Balancer(multiprocessing.Process):
         self.targets = TargetAlgorithmizedList()
         self.targets.attach_algorithm(BalanceAlgorithmFactory.build(self.algorithm))
         self.buffer_size = buffer_size
+        # Sizes and watermarks of the relay buffers, and the memory budget shared by all the balancers
+        self.buffers = buffers or BufferPolicy(buffer_size, buffer_size)
+        self.relay_mode = relay_mode
+        # Pre-connected sockets to targets, if enabled
+        self.connection_pools = connection_pools
+        # Probes the targets, if enabled and not run by a supervisor
+        self.health_checker = health_checker
+        # Retries connections on other targets, its budget should be shared by all the balancers
+        self.failover = failover or FailoverPolicy()
+        # Counters shared by all the balancers and the server of them, if enabled and not run by a supervisor
+        self.metrics = metrics
+        self.metrics_server = metrics_server
         self.max_connections = max_connections
+        self.reuse_port = reuse_port  # Allows several balancers to bind the same port
+        # Reloads the targets on SIGHUP, if the balancer isn't run by a supervisor
+        self.reloader = reloader
+        self.drain_timeout = drain_timeout
+        # Clients waiting for saturated targets, its depth should be shared by all the balancers
+        self.admission = admission or AdmissionQueue()
+        # Limits rate of new connections, if enabled. Its buckets should be shared by all the balancers
+        self.rate_limiter = rate_limiter
+        # Requests are balanced one by one in the HTTP/1.1 mode, if it's given. It's served by the asyncio engine only
+        self.http = http
+        # TLS is terminated on client connections, if it's given. Its context should be shared by all the balancers
+        self.tls = tls
+        if tls is not None and relay_mode is not BalancerRelayModeEnum.BUFFER:
+            if relay_mode is BalancerRelayModeEnum.SPLICE:
+                logger.warning(
+                    f"Relay mode '{relay_mode.value}' isn't able to relay TLS connections, "
+                    f"'{BalancerRelayModeEnum.BUFFER.value}' is used"
+                )
+            # Decrypted data exists in the user-space only
+            self.relay_mode = BalancerRelayModeEnum.BUFFER
+        # Datagrams are balanced by flows in the UDP mode, if it's given. It's served by the UDP balancer only
+        self.udp = udp
+        # Ejects targets whose connections keep failing, if enabled. Its state is kept in the target counters
+        self.outliers = outliers
+        # Idle and session timeouts of the relays, and keepalive of their sockets
+        self.timeouts = timeouts or TimeoutPolicy()
+        # Resolves host names of the targets again each TTL, if enabled. Each balancer process runs its own
+        self.resolver = resolver
 
         for target in targets:
             self.targets.append(target)
             logger.info(f"Add target: {target} for load distribution")
-
-        self.processing_workers: List[Worker] = []  # Workers currently processing a job
-        self.listen_socket: socket.socket = None  # type: ignore        # Socket for incoming connections
+        # Counters are bound before balancer processes are forked, so they're shared by all of them
+        self.targets.bind_counters()
+
+        # Workers currently processing a job by their sentinels
+        self.processing_workers: Dict[int, Worker] = {}
+        # Notifies the cleanup thread when a worker sentinel becomes ready, created in the balancer process
+        self.workers_selector: selectors.BaseSelector = None  # type: ignore
+        self.cleanup_wakeup: Tuple[int, int] = (
+            -1,
+            -1,
+        )  # Pipe that interrupts the cleanup thread waiting
+        self.listen_socket: socket.socket = listen_socket  # type: ignore  # Socket for incoming connections
+        # Inherited socket is shared with other processes, so it mustn't be shut down by this one
+        self.inherited_listen_socket: bool = listen_socket is not None
         self.cleanup_thread: threading.Thread = None  # type: ignore    # Cleans up completed workers
+        # Admits clients waiting for saturated targets
+        self.admission_thread: threading.Thread = None  # type: ignore
+        # Set by the cleanup thread when a worker is removed
+        self.workers_completed = threading.Event()
+        # Starting a process reaps completed ones by the way, so it mustn't take the exit status of a worker
+        # being joined by the cleanup thread, the worker would be left as if it's still running then
+        self.reaping_lock = threading.Lock()
         self.keep_going: bool = (
             True  # Turns to False when the application is set to terminate
         )
@@ -68,48 +167,174 @@ class Balancer(multiprocessing.Process):
 
     def cleanup(self):
         """
-        It waits for a certain amount of time, then checks if any of the workers are done. If they are, it removes them from
-        the list of workers
+        It waits for sentinels of the workers to become ready, i.e. for the workers to complete, and removes completed
+        workers. Waiting is done by the selector, so the thread doesn't take CPU while workers run, and each completed
+        worker is removed in O(1)
         """
-        logger.info(f"Cleaning up will start in {BALANCER_DEFAULT_CLEANUP_WAITING}s...")
-        time.sleep(BALANCER_DEFAULT_CLEANUP_WAITING)  # Wait for things to kick off
+        (wakeup_read, _) = self.cleanup_wakeup
+        self.workers_selector.register(wakeup_read, selectors.EVENT_READ)
         while self.keep_going is True:
-            processing_workers_copy = self.processing_workers[:]
-            for worker in processing_workers_copy:
-                if worker.is_alive() is False:  # Worker is done
-                    self.processing_workers.remove(worker)
-                    logger.info(f"Worker '{worker}' is successfully cleaned up")
+            # Timeout is to catch up registrations on platforms where the selector doesn't see them while waiting
+            for (key, _) in self.workers_selector.select(
+                BALANCER_DEFAULT_CLEANUP_WAITING
+            ):
+                if key.fd == wakeup_read:
+                    continue
+                self.workers_selector.unregister(key.fd)
+                worker = self.processing_workers.pop(key.fd, None)
+                if worker is None:
+                    continue
+                with self.reaping_lock:
+                    worker.join()
+                    worker.close()  # Releases the sentinel, so it isn't piled up by thousands of connections
+                self.workers_completed.set()
+                logger.info("Worker '%s' is successfully cleaned up", worker)
+
+    def track_worker(self, worker: Worker) -> None:
+        """
+        It starts the worker and registers it, so it's cleaned up once completed.
+        Workers are started by the accept loop and the admission thread, so it's done under the lock
+        """
+        with self.reaping_lock:
+            with handlers_locked():
+                worker.start()
+            self.processing_workers[worker.sentinel] = worker
+            self.workers_selector.register(worker.sentinel, selectors.EVENT_READ)
 
-    def close_workers(self):
+    def admit_waiting(self):
         """
-        It closes the listening socket, then it tries to terminate all the workers, and if they don't terminate, it kills
-        them
+        It admits the clients waiting for saturated targets once the targets have room for them. Room is made by
+        workers of any balancer, so the targets are checked each poll interval while there are waiting clients
+        """
+        while self.keep_going is True:
+            if not self.admission.has_waiting.wait(BALANCER_DEFAULT_CLEANUP_WAITING):
+                continue
+            self.admission.dispatch(self._next_target, self.start_worker)
+            time.sleep(BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL)
+
+    def reload_targets(self, *args):
+        """
+        It reads the targets and the algorithm from the settings again and swaps them in.
+        If the settings are invalid, the running ones are kept
         """
-        self.keep_going = False
         try:
-            self.listen_socket.shutdown(socket.SHUT_RDWR)
+            (targets, algorithm) = self.reloader.load()  # type: ignore
         except Exception as exc:
-            logger.exception(exc)
+            logger.error(f"Reload failed, the running targets are kept: {exc!r}")
+            return
+        self.swap_targets(targets, algorithm)
+
+    def swap_targets(self, targets: List[Target], algorithm: BalancerAlgorithmEnum):
+        """
+        It swaps in the new targets and algorithm with a single assignment, so accepting doesn't need locking.
+        Relays in progress keep the list they were given, so connections to removed targets are not broken
+        """
+        reloaded = self.targets.reloaded(
+            targets, BalanceAlgorithmFactory.build(algorithm)
+        )
+        # Components are given the targets before the swap, so a target is never given without them
+        if self.metrics is not None:
+            self.metrics.register(reloaded)
+        if self.resolver is not None:
+            self.resolver.update_targets(reloaded)
+        if self.connection_pools is not None:
+            self.connection_pools.update_targets(reloaded)
+        if self.health_checker is not None:
+            self.health_checker.update_targets(reloaded)
+        if self.metrics_server is not None:
+            self.metrics_server.update_targets(reloaded)
+        self.targets = reloaded
+        self.algorithm = algorithm
+        logger.info(f"Targets are reloaded: {self}")
+
+    def drain_workers(self, *args):
+        """
+        It stops accepting connections and waits for the workers to complete, so relays in progress are not broken
+        (e.g. when the balancer is replaced by one with reloaded targets). Workers remaining after the drain timeout
+        are terminated
+        """
+        logger.info(
+            f"Balancer '{self}' is draining, workers are given {self.drain_timeout}s to complete"
+        )
+        self.accept_backlog()
+        self.close_listen_socket()
+        deadline = time.monotonic() + self.drain_timeout
+        while time.monotonic() < deadline:
+            if not self.processing_workers and self.admission.is_empty:
+                break
+            timeout = deadline - time.monotonic()
+            if not self.admission.is_empty:
+                # Waiting clients are admitted or rejected meanwhile, not only on completion of a worker
+                timeout = min(timeout, BALANCER_DEFAULT_ADMISSION_POLL_INTERVAL)
+            self.workers_completed.wait(timeout)
+            self.workers_completed.clear()
+        self.close_workers()
+
+    def accept_backlog(self):
+        """
+        It handles connections that are already queued on the listening socket, so they're not reset on close.
+        A socket shared with another balancer keeps being filled, so it takes as many as the queue holds at most
+        """
+        self.listen_socket.setblocking(False)
+        for _ in range(self.max_connections):
+            try:
+                (client_socket, client_host) = self.listen_socket.accept()
+            except OSError:
+                break  # Queue is empty
+            client_socket.setblocking(True)
+            self.handle_client(client_socket, client_host)
+
+    def close_listen_socket(self):
+        """It stops listening, if it's not stopped yet"""
+        if self.listen_socket is None or self.listen_socket.fileno() < 0:
+            return
+        # Datagram sockets are not connected, so there is nothing to shut down
+        connected = self.socket_type == socket.SOCK_STREAM
+        if self.inherited_listen_socket is False and connected:
+            try:
+                self.listen_socket.shutdown(socket.SHUT_RDWR)
+            except Exception as exc:
+                logger.exception(exc)
         try:
             self.listen_socket.close()
         except Exception as exc:
             logger.exception(exc)
 
+    def close_workers(self, *args):
+        """
+        It closes the listening socket, then it tries to terminate all the workers, and if they don't terminate, it kills
+        them
+        """
+        self.keep_going = False
+        self.resolver and self.resolver.stop()
+        self.connection_pools and self.connection_pools.stop()
+        self.health_checker and self.health_checker.stop()
+        self.metrics_server and self.metrics_server.stop()
+        if self.cleanup_wakeup[1] >= 0:
+            os.write(self.cleanup_wakeup[1], b"\0")
+        self.close_listen_socket()
+        # Remaining workers are handled here from now on, so the cleanup thread doesn't close them meanwhile
+        self.cleanup_thread and self.cleanup_thread.join(3)
+        self.admission.has_waiting.set()  # Wakes the admission thread up to stop
+        self.admission_thread and self.admission_thread.join(3)
+        self.admission.clear()
+
         if not self.processing_workers:
-            self.cleanup_thread and self.cleanup_thread.join(3)
             signal.signal(signal.SIGTERM, signal.SIG_DFL)
             sys.exit(0)
 
-        for worker in self.processing_workers:
+        processing_workers = list(self.processing_workers.values())
+        for worker in processing_workers:
+            if worker.exitcode is not None:
+                continue  # Already completed, but not cleaned up yet
             try:
                 worker.terminate()
-                os.kill(worker.pid, signal.SIGTERM)  # type: ignore
                 logger.warning(f"Worker '{worker}' is terminated")
             except Exception as exc:
                 logger.exception(exc)
 
         remaining_workers = []
-        for worker in self.processing_workers:
+        for worker in processing_workers:
             worker.join(0.03)
             if worker.is_alive() is True:  # Worker still in execution
                 remaining_workers.append(worker)
@@ -119,52 +344,44 @@ class Balancer(multiprocessing.Process):
             for worker in remaining_workers:
                 worker.join(0.2)
 
-        self.cleanup_thread and self.cleanup_thread.join(2)
         signal.signal(signal.SIGTERM, signal.SIG_DFL)
         sys.exit(0)
 
-    def retry_failed_workers(self):
+    def bind(self) -> socket.socket:
         """
-        retry_failed_workers -
-            This method loops over current running workers and scans them for a multiprocess shared field called "failure_connection".
-            If this is set to 1, then we failed to connect to the backend worker.
-            If that happens, it goes pick a different target and use worker to handle it.
+        It creates a listening socket and binds it to the host and port. Binding is retried until it succeeds.
+        If the balancer was given an already listening socket (e.g. inherited from a supervisor), it's used as is
+        :return: The socket that listens for incoming connections
         """
+        if self.listen_socket is not None:
+            return self.listen_socket
 
-        not_failed = 0  # We use this to differ between long waits in between successful periods and short waits when there is a failing host in the mix.
-        while self.keep_going is True:
-            processing_workers_copy = self.processing_workers[:]
-            for worker in processing_workers_copy:
-                if worker.failure_connection.value == 1:
-                    target = self.__next_target()
-                    while target.host == worker.host and target.port == target.port:
-                        # Make sure the newly selected target is not the one we are changing
-                        target = self.__next_target()
-
-                    logger.info(
-                        f"Retry client '{worker.client_host}' request from "
-                        f"worker {worker.host}:{worker.port} to "
-                        f"another worker: {target.host}:{target.port}"
-                    )
-
-                    next_worker = Worker(
-                        target.host,
-                        target.port,
-                        worker.client_socket,
-                        worker.client_host,
-                        self.buffer_size,
-                    )
-                    next_worker.start()
-                    self.processing_workers.append(next_worker)
-                    worker.failure_connection.value = 0  # Reset
-
-            not_failed += 1
-            if not_failed > 1000000:  # Make sure we don't overrun
-                not_failed = 6
-            if not_failed > 5:
-                time.sleep(2)
-            else:
-                time.sleep(0.05)
+        waiting = BALANCER_DEFAULT_BIND_RETRY_MIN_WAITING
+        while True:
+            try:
+                listen_socket = socket.socket(socket.AF_INET, self.socket_type)
+                try:
+                    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                    if self.reuse_port is True:
+                        listen_socket.setsockopt(
+                            socket.SOL_SOCKET, socket.SO_REUSEPORT, 1
+                        )
+                except Exception as exc:
+                    logger.exception(exc)
+                listen_socket.bind((self.host, self.port))
+                self.listen_socket = listen_socket
+                break
+            except Exception:
+                # Port is released soon, if it's held by a balancer being replaced, so the first retries are quick
+                logger.exception(
+                    f"Failed to bind to {self.host}:{self.port}. Retrying in {waiting:g} seconds ..."
+                )
+                time.sleep(waiting)
+                waiting = min(waiting * 2, BALANCER_DEFAULT_BIND_RETRY_WAITING)
+
+        if self.socket_type == socket.SOCK_STREAM:
+            listen_socket.listen(self.max_connections)
+        return listen_socket
 
     def run(self):
         """
@@ -183,31 +400,26 @@ class Balancer(multiprocessing.Process):
         :return: NoReturn
         """
         signal.signal(signal.SIGTERM, self.close_workers)
-        while True:
-            try:
-                listen_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-                try:
-                    listen_socket.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
-                except Exception as exc:
-                    logger.exception(exc)
-                listen_socket.bind((self.host, self.port))
-                self.listen_socket = listen_socket
-                break
-            except Exception:
-                logger.exception(
-                    f"Failed to bind to {self.host}:{self.port}. Retrying in {BALANCER_DEFAULT_BIND_RETRY_WAITING} seconds ..."
-                )
-                time.sleep(BALANCER_DEFAULT_BIND_RETRY_WAITING)
-
-        listen_socket.listen(self.max_connections)
+        signal.signal(signal.SIGQUIT, self.drain_workers)
+        # Balancers run by a supervisor are reloaded by replacing them
+        signal.signal(
+            signal.SIGHUP, self.reload_targets if self.reloader else signal.SIG_IGN
+        )
+        listen_socket = self.bind()
+        self.resolver and self.resolver.start(self.targets)
+        self.connection_pools and self.connection_pools.start(self.targets)
+        self.health_checker and self.health_checker.start(self.targets)
+        self.metrics_server and self.metrics_server.start(self.targets, self.port)
 
         # Create thread that will cleanup completed tasks
+        self.workers_selector = selectors.DefaultSelector()
+        self.cleanup_wakeup = os.pipe()
         self.cleanup_thread = cleanup_thread = threading.Thread(target=self.cleanup)
         cleanup_thread.start()
-
-        # Create thread that will retry failed tasks
-        retry_thread = threading.Thread(target=self.retry_failed_workers)
-        retry_thread.start()
+        self.admission_thread = threading.Thread(
+            target=self.admit_waiting, name="admission", daemon=True
+        )
+        self.admission_thread.start()
 
         try:
             while self.keep_going is True:
@@ -215,6 +427,11 @@ class Balancer(multiprocessing.Process):
                     break
                 try:
                     (client_socket, client_host) = listen_socket.accept()
+                except BlockingIOError:
+                    # Socket shared with another balancer is made non-blocking by it (e.g. by the asyncio engine),
+                    # so the connection is waited for and the one that's ready first is accepted
+                    select.select([listen_socket], [], [])
+                    continue
                 except Exception:
                     logger.exception(f"Failed bind to {self.host}:{self.port}")
                     if self.keep_going is True:
@@ -223,16 +440,7 @@ class Balancer(multiprocessing.Process):
                         continue
                     raise  # Termination DID come from termination process, so abort.
 
-                target = self.__next_target()
-                new_worker = Worker(
-                    target.host,
-                    target.port,
-                    client_socket,
-                    client_host,
-                    self.buffer_size,
-                )
-                self.processing_workers.append(new_worker)
-                new_worker.start()
+                self.handle_client(client_socket, client_host)
 
         except Exception as exc:
             logger.critical(
@@ -244,12 +452,63 @@ class Balancer(multiprocessing.Process):
 
         self.close_workers()
 
-    def __next_target(self) -> Target:
+    def handle_client(self, client_socket, client_host):
+        """
+        It gives the accepted connection to a target and starts a worker that relays it.
+        If all the targets are saturated, the connection waits in the admission queue or it's rejected.
+        Connections over the rate limit are rejected before anything else
+        """
+        if self.rate_limiter is not None and not self.rate_limiter.allow(client_host):
+            close_with_reset(client_socket)
+            return
+        target = self._next_target(client_host[0])
+        if target is None:
+            self.admission.enqueue(client_socket, client_host)
+            return
+        self.start_worker(target, client_socket, client_host)
+
+    def start_worker(self, target: Target, client_socket, client_host) -> None:
+        """It starts a worker that relays the connection to the target, the connection is counted on it already"""
+        if self.metrics is not None:
+            self.metrics.add(target, Metrics.ACCEPTED)
+        pooled_socket = self._pooled_socket(target)
+        new_worker = Worker(
+            target,
+            client_socket,
+            client_host,
+            self.buffer_size,
+            self.relay_mode,
+            pooled_socket,
+            self.targets,
+            self.failover,
+            self.metrics,
+            self.buffers,
+            self.tls,
+            self.outliers,
+            self.timeouts,
+        )
+        self.track_worker(new_worker)
+        # Sockets are owned by the worker process from now on
+        client_socket.close()
+        if pooled_socket is not None:
+            pooled_socket.close()
+
+    def _next_target(self, key: Optional[str] = None) -> Optional[Target]:
+        """
+        > This function returns the next target in the list of targets, counting the connection on it
+        :param key: Request key (client address) for algorithms with client affinity
+        :return: The next target in the list or None if all the targets are saturated.
+        """
+        return self.targets.acquire_next(key)
+
+    def _pooled_socket(self, target: Target) -> Optional[socket.socket]:
         """
-        > This function returns the next target in the list of targets
-        :return: The next target in the list.
+        It takes a socket pre-connected to the target
+        :return: Connected socket or None if pooling is disabled or there are no idle sockets
         """
-        return self.targets.get_next()
+        if self.connection_pools is None:
+            return None
+        return self.connection_pools.acquire(target)
 
     def __str__(self):
         return f"<{__class__.__name__} host={self.host} port={self.port} algorithm={self.algorithm.name} targets_amount={len(self.targets)}>"
@@ -0,0 +1,183 @@
+import multiprocessing
+import socket
+import threading
+import time
+from bisect import bisect_left
+from collections import deque
+from typing import Any, Callable, Deque, List, NamedTuple, Optional, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_ADMISSION_QUEUE_SIZE,
+    BALANCER_DEFAULT_ADMISSION_QUEUE_TIMEOUT,
+    BALANCER_DEFAULT_ADMISSION_WAIT_BUCKETS,
+)
+from balancer.core.common.target import Target
+from balancer.core.logger import logger
+from balancer.utils import close_with_reset
+
+
+class WaitingClient(NamedTuple):
+    """Client connection waiting in the admission queue"""
+
+    client_socket: socket.socket
+    client_host: Any
+    enqueued_at: float
+
+
+class AdmissionQueue:
+    """
+    Bounded queue of client connections that came when all the eligible targets were saturated. Waiting clients
+    are admitted in the order they came, as soon as a target has room for them. Clients that came when the queue
+    was full, or waited longer than the timeout, are rejected at once with a reset instead of hanging until
+    the client gives up. Depth of the queue and the counters of waits are kept in shared memory created before
+    balancer processes are forked, so the queue size limits the waiting clients of all of them,
+    while each process keeps its own clients
+    """
+
+    # Fields of the shared state
+    DEPTH = 0  # Clients waiting in all the processes
+    REJECTED = 1  # Clients rejected as the queue was full
+    TIMED_OUT = 2  # Clients rejected as they waited longer than the timeout
+    WAIT_SUM = 3  # Seconds the admitted clients waited in total
+    WAIT_BUCKETS = 4  # Admitted clients by the wait time buckets, the last one is +Inf
+
+    def __init__(
+        self,
+        size: int = BALANCER_DEFAULT_ADMISSION_QUEUE_SIZE,
+        timeout: float = BALANCER_DEFAULT_ADMISSION_QUEUE_TIMEOUT,
+        wait_buckets: Tuple[float, ...] = BALANCER_DEFAULT_ADMISSION_WAIT_BUCKETS,
+    ) -> None:
+        """
+        :param size: Clients that are able to wait, 0 means clients are rejected once the targets are saturated
+        :param timeout: Seconds a client is able to wait
+        :param wait_buckets: Upper bounds of the wait time histogram buckets, seconds
+        """
+        if size < 0:
+            raise ValueError(f"Argument 'size' should be non-negative, got: {size}")
+        if timeout <= 0:
+            raise ValueError(f"Argument 'timeout' should be positive, got: {timeout}")
+
+        self.size = size
+        self.timeout = timeout
+        self.wait_buckets = wait_buckets
+        # Doubles hold integers exactly up to 2**53, that's enough for counters
+        self.__state = multiprocessing.RawArray(
+            "d", self.WAIT_BUCKETS + len(wait_buckets) + 1
+        )
+        self.__lock = multiprocessing.Lock()
+        self.__waiting: Deque[WaitingClient] = deque()  # Clients of this process
+        # Clients are admitted by a thread of their own in the process engine
+        self.__waiting_lock = threading.Lock()
+        # Set while there are clients waiting in this process
+        self.has_waiting = threading.Event()
+
+    @property
+    def depth(self) -> int:
+        return int(self.__state[self.DEPTH])
+
+    @property
+    def is_empty(self) -> bool:
+        """Checks if there are no clients waiting in this process"""
+        return not self.__waiting
+
+    def read(self) -> List[float]:
+        """It returns the shared state, positions are the fields of it"""
+        with self.__lock:
+            return list(self.__state)
+
+    def enqueue(self, client_socket: socket.socket, client_host: Any) -> bool:
+        """
+        It puts the client into the queue, or rejects it if the queue is full
+        :return: Whether the client is waiting
+        """
+        with self.__lock:
+            full = self.__state[self.DEPTH] >= self.size
+            if full:
+                self.__state[self.REJECTED] += 1
+            else:
+                self.__state[self.DEPTH] += 1
+        if full:
+            logger.info(
+                "All the targets are saturated and the admission queue is full, client '%s' is rejected",
+                client_host,
+            )
+            self.reject(client_socket)
+            return False
+
+        with self.__waiting_lock:
+            self.__waiting.append(
+                WaitingClient(client_socket, client_host, time.monotonic())
+            )
+            self.has_waiting.set()
+        logger.info(
+            "All the targets are saturated, client '%s' waits for admission",
+            client_host,
+        )
+        return True
+
+    def dispatch(
+        self,
+        acquire: Callable[[str], Optional[Target]],
+        admit: Callable[[Target, socket.socket, Any], None],
+    ) -> None:
+        """
+        It admits the waiting clients in order while the targets have room for them, and rejects the ones
+        that waited longer than the timeout
+        :param acquire: It takes a target with room for the client by the client address, counting the connection on it
+        :param admit: It starts relaying the client connection to the target
+        """
+        while True:
+            now = time.monotonic()
+            target = None
+            with self.__waiting_lock:
+                if not self.__waiting:
+                    self.has_waiting.clear()
+                    return
+                client = self.__waiting[0]
+                waited = now - client.enqueued_at
+                if waited < self.timeout:
+                    target = acquire(client.client_host[0])
+                    if target is None:
+                        return  # Targets are still saturated
+                self.__waiting.popleft()
+
+            with self.__lock:
+                self.__state[self.DEPTH] -= 1
+                if target is None:
+                    self.__state[self.TIMED_OUT] += 1
+                else:
+                    bucket = bisect_left(self.wait_buckets, waited)
+                    self.__state[self.WAIT_BUCKETS + bucket] += 1
+                    self.__state[self.WAIT_SUM] += waited
+            if target is None:
+                logger.info(
+                    "Client '%s' waited for admission for %.3fs, it's rejected",
+                    client.client_host,
+                    waited,
+                )
+                self.reject(client.client_socket)
+                continue
+            logger.info(
+                "Client '%s' is admitted after waiting for %.3fs",
+                client.client_host,
+                waited,
+            )
+            admit(target, client.client_socket, client.client_host)
+
+    def clear(self) -> None:
+        """It rejects all the clients waiting in this process, e.g. on termination"""
+        with self.__waiting_lock:
+            waiting = list(self.__waiting)
+            self.__waiting.clear()
+            self.has_waiting.clear()
+        if not waiting:
+            return
+        with self.__lock:
+            self.__state[self.DEPTH] -= len(waiting)
+            self.__state[self.REJECTED] += len(waiting)
+        for client in waiting:
+            self.reject(client.client_socket)
+
+    def reject(self, client_socket: socket.socket) -> None:
+        """It closes the client connection with a reset, so the client fails fast and is able to try elsewhere"""
+        close_with_reset(client_socket)
@@ -1,42 +1,304 @@
+import hashlib
 import random
+import struct
 
 # from balancer.core.enums import BalancerAlgorithmEnum
 from abc import ABCMeta, abstractmethod
-from itertools import cycle
-from typing import Any, List
+from bisect import bisect
+from functools import reduce
+from math import gcd
+from typing import Any, List, Optional, Tuple
 
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_KETAMA_POINTS,
+    BALANCER_DEFAULT_MAGLEV_TABLE_SIZE,
+    BALANCER_DEFAULT_SCHEDULE_MAX_SIZE,
+)
 from balancer.core.exceptions import WrongBalanceAlgorithmError
 
 
 class AbstractBalanceAlgorithm(metaclass=ABCMeta):
+    weighted: bool = False  # Whether the algorithm takes weights of items into account
+
     @abstractmethod
     def set_sequence(self, seq: List[Any]) -> None:
         """Items sequence setter"""
         raise NotImplementedError("Method should be overridden")
 
     @abstractmethod
-    def get_next_item(self) -> Any:
+    def get_next_item(self, key: Optional[str] = None) -> Any:
         """Implement this method with algorithm that should
-        return sequence item by described rules"""
+        return sequence item by described rules. Key of the request (e.g. client address)
+        is given to the algorithms that map requests to items by it"""
         raise NotImplementedError("Method should be overridden")
 
+    def inherit(self, previous: "AbstractBalanceAlgorithm") -> None:
+        """
+        It's called once the algorithm replaces the previous one over a reloaded sequence.
+        Override it to take over the state the previous algorithm has for the items that are not changed
+        """
+
 
 class RandomBalanceAlgorithm(AbstractBalanceAlgorithm):
     def set_sequence(self, seq: List[Any]) -> None:
         self.sequence = seq
 
     # A method that returns a random item from the sequence.
-    def get_next_item(self) -> Any:
+    def get_next_item(self, key: Optional[str] = None) -> Any:
         return random.choice(self.sequence)
 
 
 class RoundRobinBalanceAlgorithm(AbstractBalanceAlgorithm):
     def set_sequence(self, seq: List[Any]) -> None:
         self.sequence = seq
-        self.iter = cycle(self.sequence)
+        self.position = 0  # Index of the item to be given next
+
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        if self.position >= len(self.sequence):
+            self.position = 0
+        item = self.sequence[self.position]
+        self.position += 1
+        return item
+
+    def inherit(self, previous: AbstractBalanceAlgorithm) -> None:
+        """It goes on with the item the previous algorithm was going to give, if the item is still there"""
+        if not isinstance(previous, RoundRobinBalanceAlgorithm):
+            return
+        if not previous.sequence:
+            return
+        upcoming = previous.sequence[previous.position % len(previous.sequence)]
+        for index, item in enumerate(self.sequence):
+            if item.name == upcoming.name:
+                self.position = index
+                return
+        self.position = previous.position
+
+
+class AbstractPrecomputedBalanceAlgorithm(AbstractBalanceAlgorithm):
+    """
+    Base of algorithms that precompute a lookup structure over the sequence, so an item is given cheaply.
+    The structure is rebuilt lazily, only when the sequence is changed
+    """
+
+    # Attributes computed by the build, they're taken over on a reload that doesn't change the items
+    built_attributes: Tuple[str, ...] = ()
+
+    def set_sequence(self, seq: List[Any]) -> None:
+        self.sequence = seq
+        # Sequence length and version the lookup structure is built for
+        self.built_for: Tuple[int, int] = (-1, -1)
+
+    def ensure_built(self) -> None:
+        """It rebuilds the lookup structure if the sequence is changed since the last build"""
+        state = (len(self.sequence), getattr(self.sequence, "version", 0))
+        if self.built_for != state:
+            self.build()
+            self.built_for = state
+
+    def inherit(self, previous: AbstractBalanceAlgorithm) -> None:
+        """
+        It takes over the lookup structure of the previous algorithm of the same kind, if the items it's built for
+        have the same names and weights. Otherwise the structure is built right away, so the first request after
+        the reload doesn't wait for it
+        """
+        if isinstance(previous, type(self)) and self.__is_built_alike(previous):
+            for name in self.built_attributes:
+                setattr(self, name, getattr(previous, name))
+            self.built_for = (len(self.sequence), getattr(self.sequence, "version", 0))
+            return
+        self.ensure_built()
+
+    def __is_built_alike(self, previous: "AbstractPrecomputedBalanceAlgorithm") -> bool:
+        """Checks if the previous algorithm has the lookup structure built for the same items"""
+        previous_state = (
+            len(previous.sequence),
+            getattr(previous.sequence, "version", 0),
+        )
+        if previous.built_for != previous_state:
+            return False  # Not built yet or built for an outdated sequence
+        return self.layout(previous.sequence) == self.layout(self.sequence)
+
+    @staticmethod
+    def layout(seq: List[Any]) -> List[Tuple[str, int]]:
+        """It returns what the lookup structure depends on: names and weights of the items in order"""
+        return [(item.name, item.weight) for item in seq]
+
+    @abstractmethod
+    def build(self) -> None:
+        """Implement this method with computing of the lookup structure over the sequence"""
+        raise NotImplementedError("Method should be overridden")
+
+
+class SmoothWeightedRoundRobinBalanceAlgorithm(AbstractPrecomputedBalanceAlgorithm):
+    """
+    Gives items in turn proportionally to their weights, interleaving them smoothly (like nginx does)
+    instead of giving the same item several times in a row. The whole period of turns is precomputed,
+    so an item is given in O(1)
+    """
+
+    weighted = True
+    built_attributes = ("schedule", "position")
+
+    def build(self) -> None:
+        """It computes one period of smooth weighted turns"""
+        weights = [item.weight for item in self.sequence]
+        divisor = reduce(gcd, weights, 0) or 1
+        weights = [weight // divisor for weight in weights]
+        total = sum(weights)
+        if total > BALANCER_DEFAULT_SCHEDULE_MAX_SIZE:
+            # Weights are too big to keep the whole period, so they're scaled down with minor precision loss
+            weights = [
+                max(1, weight * BALANCER_DEFAULT_SCHEDULE_MAX_SIZE // total)
+                for weight in weights
+            ]
+            total = sum(weights)
+
+        current = [0] * len(weights)
+        schedule = []
+        for _ in range(total):
+            for i, weight in enumerate(weights):
+                current[i] += weight
+            chosen = max(range(len(current)), key=current.__getitem__)
+            current[chosen] -= total
+            schedule.append(chosen)
+
+        self.schedule: List[int] = schedule  # Period of item indexes
+        self.position = 0
+
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        self.ensure_built()
+        item = self.sequence[self.schedule[self.position]]
+        self.position = (self.position + 1) % len(self.schedule)
+        return item
+
+
+def hash_key(key: str) -> int:
+    """It returns a hash of the key that is stable across processes and restarts (unlike the builtin ``hash``)"""
+    return int.from_bytes(hashlib.md5(key.encode()).digest()[:8], "little")
+
+
+class ConsistentHashBalanceAlgorithm(AbstractPrecomputedBalanceAlgorithm):
+    """
+    Gives the same item for the same key using a ketama hash ring: every item is placed on the ring
+    at a number of points proportional to its weight, and a key is given the item of the first point
+    that follows the key hash. Adding or removing an item remaps only the keys of its ring arcs.
+    Items are placed by their names, so the mapping survives reordering of the sequence.
+    Lookup is a binary search over the ring, O(log n). Requests without a key are given a random item
+    """
+
+    weighted = True
+    built_attributes = ("ring_hashes", "ring_items")
+
+    def build(self) -> None:
+        """It places the items on the ring"""
+        points: List[Tuple[int, int]] = []
+        for index, item in enumerate(self.sequence):
+            for replica in range(BALANCER_DEFAULT_KETAMA_POINTS * item.weight // 4):
+                digest = hashlib.md5(f"{item.name}-{replica}".encode()).digest()
+                # Each digest gives 4 points like the original ketama does
+                for point in struct.unpack("<4I", digest):
+                    points.append((point, index))
+        points.sort()
+        self.ring_hashes: List[int] = [point for (point, _) in points]
+        self.ring_items: List[int] = [index for (_, index) in points]
+
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        if key is None:
+            return random.choice(self.sequence)
+        self.ensure_built()
+        position = bisect(self.ring_hashes, hash_key(key) & 0xFFFFFFFF)
+        return self.sequence[self.ring_items[position % len(self.ring_items)]]
+
+
+class MaglevBalanceAlgorithm(AbstractPrecomputedBalanceAlgorithm):
+    """
+    Gives the same item for the same key using a Maglev lookup table: items fill the table slots
+    taking turns (proportionally to their weights), each one by its own permutation of the slots.
+    This gives an even spread of keys and minimal remapping when the sequence is changed.
+    Lookup is a single table access, O(1). Requests without a key are given a random item
+    """
+
+    weighted = True
+    built_attributes = ("table",)
+
+    def build(self) -> None:
+        """It populates the lookup table"""
+        size = BALANCER_DEFAULT_MAGLEV_TABLE_SIZE
+        table = [-1] * size
+        if not self.sequence:
+            self.table: List[int] = table
+            return
+
+        offsets, skips, nexts = [], [], []
+        for item in self.sequence:
+            offsets.append(hash_key(f"{item.name}-offset") % size)
+            skips.append(hash_key(f"{item.name}-skip") % (size - 1) + 1)
+            nexts.append(0)
+
+        filled = 0
+        while True:
+            for index, item in enumerate(self.sequence):
+                for _ in range(item.weight):
+                    # Next preferred slot of the item that is still free
+                    slot = (offsets[index] + nexts[index] * skips[index]) % size
+                    while table[slot] >= 0:
+                        nexts[index] += 1
+                        slot = (offsets[index] + nexts[index] * skips[index]) % size
+                    table[slot] = index
+                    nexts[index] += 1
+                    filled += 1
+                    if filled == size:
+                        self.table = table
+                        return
+
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        if key is None:
+            return random.choice(self.sequence)
+        self.ensure_built()
+        return self.sequence[self.table[hash_key(key) % len(self.table)]]
+
+
+class LeastConnectionsBalanceAlgorithm(AbstractBalanceAlgorithm):
+    """
+    Gives the item with the least amount of active connections. Items sequence should provide shared
+    connections counters (see :class:`balancer.core.common.counters.ConnectionCounters`)
+    """
+
+    def set_sequence(self, seq: List[Any]) -> None:
+        self.sequence = seq
+
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        return self.sequence[self.sequence.counters.least_loaded()]  # type: ignore
+
+
+class WeightedLeastConnectionsBalanceAlgorithm(LeastConnectionsBalanceAlgorithm):
+    """Gives the item with the least ratio of active connections amount to the item weight"""
+
+    weighted = True
+
+
+class PeakEwmaBalanceAlgorithm(AbstractBalanceAlgorithm):
+    """
+    Power of two choices: samples two random items and gives the one with the lower load score,
+    i.e. peak-EWMA latency multiplied by amount of in-flight connections. Items sequence should provide shared
+    connections counters (see :class:`balancer.core.common.counters.ConnectionCounters`)
+    """
+
+    def set_sequence(self, seq: List[Any]) -> None:
+        self.sequence = seq
 
-    def get_next_item(self) -> Any:
-        return next(self.iter)
+    def get_next_item(self, key: Optional[str] = None) -> Any:
+        size = len(self.sequence)
+        if size < 2:
+            return self.sequence[0]
+        counters = self.sequence.counters  # type: ignore
+        first = random.randrange(size)
+        second = random.randrange(size - 1)
+        if second >= first:
+            second += 1  # Two distinct items
+        if counters.load_score(second) < counters.load_score(first):
+            return self.sequence[second]
+        return self.sequence[first]
 
 
 #
@@ -47,7 +309,7 @@ class BalanceAlgorithmFactory:
     def build(algorithm_type) -> AbstractBalanceAlgorithm:
         """
         "If the algorithm type is random, return a random balance algorithm, if it's round robin, return a round robin
-        balance algorithm, otherwise raise an error."
+        balance algorithm, and so on for the rest of the algorithm types, otherwise raise an error."
 
         :param algorithm_type: The type of algorithm to build
         """
@@ -57,6 +319,18 @@ class BalanceAlgorithmFactory:
                     return RandomBalanceAlgorithm()
                 case algorithm_type.ROUND_ROBIN:
                     return RoundRobinBalanceAlgorithm()
+                case algorithm_type.WEIGHTED_ROUND_ROBIN:
+                    return SmoothWeightedRoundRobinBalanceAlgorithm()
+                case algorithm_type.CONSISTENT_HASH:
+                    return ConsistentHashBalanceAlgorithm()
+                case algorithm_type.MAGLEV:
+                    return MaglevBalanceAlgorithm()
+                case algorithm_type.PEAK_EWMA:
+                    return PeakEwmaBalanceAlgorithm()
+                case algorithm_type.LEAST_CONNECTIONS:
+                    return LeastConnectionsBalanceAlgorithm()
+                case algorithm_type.WEIGHTED_LEAST_CONNECTIONS:
+                    return WeightedLeastConnectionsBalanceAlgorithm()
         except AttributeError:
             raise WrongBalanceAlgorithmError(
                 f"Provided algorithm '{algorithm_type}' is invalid"
@@ -0,0 +1,405 @@
+import asyncio
+import socket
+import time
+from typing import List, Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_BUFFER_SIZE,
+    BALANCER_DEFAULT_EWMA_FAILURE_PENALTY,
+)
+from balancer.core.common.backpressure import BufferPolicy
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.retry import FailoverPolicy
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.common.timeouts import TimeoutPolicy, Timer, TimerWheel
+from balancer.core.common.tls import TlsPolicy
+from balancer.core.enums import BalancerRelayModeEnum
+from balancer.core.logger import log_access, logger
+
+
+class AsyncWorker:
+    """
+    A coroutine counterpart of the :class:`balancer.core.common.worker.Worker`.
+    It handles the worker-side of processing a request on the running event loop
+    instead of a dedicated process
+    """
+
+    def __init__(
+        self,
+        target: Target,
+        client_socket: socket.socket,
+        client_host: str,
+        buffer_size: int = BALANCER_DEFAULT_BUFFER_SIZE,
+        worker_socket: Optional[socket.socket] = None,
+        targets: Optional[TargetAlgorithmizedList] = None,
+        failover: Optional[FailoverPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        buffers: Optional[BufferPolicy] = None,
+        tls: Optional[TlsPolicy] = None,
+        outliers: Optional[OutlierDetector] = None,
+        timeouts: Optional[TimeoutPolicy] = None,
+        timers: Optional[TimerWheel] = None,
+    ) -> None:
+        self.client_socket: socket.socket = client_socket
+        self.client_host = client_host
+
+        self.target = target
+        self.host = target.host
+        self.port = target.port
+        # Whether the connection is given back to the target counters
+        self.target_released: bool = False
+
+        self.worker_socket: socket.socket = worker_socket  # type: ignore  # Pooled socket, if any
+        # Sizes of the buffers in each direction, low watermarks don't matter as a chunk is sent entirely
+        self.buffers = buffers or BufferPolicy(buffer_size, buffer_size)
+        # Targets to retry the connection on, if connection to the target fails
+        self.targets = targets
+        self.failover = failover or FailoverPolicy()
+        self.metrics = metrics
+        # TLS is terminated on the client connection, if it's given
+        self.tls = tls
+        # Time the relay is started at, until the session is counted by the metrics
+        self.connected_at: Optional[float] = None
+        # Bytes relayed from the client to the target and back
+        self.relayed = [0, 0]
+        # Time the first request data was sent at, until the first response data is received
+        self.request_sent_at: Optional[float] = None
+        self.response_received = False
+        # Ejects the target if its connections keep failing, if enabled
+        self.outliers = outliers
+        # Whether the target closed the connection first, none while neither side closed it
+        self.closed_by_target: Optional[bool] = None
+        self.reset_by_target: bool = (
+            False  # Whether the connection to the target was reset
+        )
+        # Idle and session timeouts of the relay, and keepalive of its sockets
+        self.timeouts = timeouts or TimeoutPolicy()
+        # Wheel of the event loop the timeouts are checked on, if the timeouts are enabled
+        self.timers = timers
+        self.timer: Optional[Timer] = None
+        # Times of the relay activity the timeouts are checked against
+        self.received_at: float = 0
+        # Time data of each direction started waiting for its side to take it, none while nothing waits
+        self.sending_since: List[Optional[float]] = [None, None]
+        # Resolved with the reason once the relay expires
+        self.expired: Optional[asyncio.Future] = None
+        self.timed_out: bool = False  # Whether the relay is closed by a timeout
+
+    def switch_target(self, target: Target) -> None:
+        """It makes the worker to process the connection on another target"""
+        self.target = target
+        self.host = target.host
+        self.port = target.port
+        self.target_released = False
+
+    def record_session(self) -> None:
+        """It counts the relayed session by the metrics and the access log. It's safe to be called several times"""
+        if self.connected_at is None:
+            return
+        duration = time.monotonic() - self.connected_at
+        self.connected_at = None
+        if self.metrics is not None:
+            self.metrics.observe_session(self.target, duration, *self.relayed)
+        if self.outliers is not None:
+            self.outliers.record_session(
+                self.target,
+                duration,
+                self.relayed[1],
+                self.closed_by_target is True,
+                self.reset_by_target,
+            )
+        log_access(
+            self.client_host,
+            self.target.name,
+            self.host,
+            self.port,
+            "timeout" if self.timed_out else "ok",
+            duration,
+            *self.relayed,
+        )
+
+    def release_target(self):
+        """
+        It gives the connection back to the target active connections counters. It's safe to be called several times
+        """
+        if self.target_released is False:
+            self.target_released = True
+            self.target.decrement_connections()
+
+    def close_connections(self):
+        """
+        It closes the client and worker sockets
+        """
+        self.record_session()
+        self.release_target()
+        logger.info(
+            "Closing connections from '%s' to '%s:%d' ...",
+            self.client_host,
+            self.host,
+            self.port,
+        )
+        for sock in (self.worker_socket, self.client_socket):
+            try:
+                sock.shutdown(socket.SHUT_RDWR)
+            except OSError:
+                pass  # Peer is already gone, nothing to shut down
+            except Exception as exc:
+                logger.exception(exc)
+            try:
+                sock.close()
+            except Exception as exc:
+                logger.exception(exc)
+        logger.info("Connections closed successfully")
+
+    async def connect(self) -> bool:
+        """
+        It connects to the target. If connection fails, the connection is retried right away on the next target
+        chosen by the failover policy, until it succeeds or the policy gives up
+        :return: Whether the worker is connected
+        """
+        self.failover.budget.record_request()
+        if self.worker_socket is not None:
+            self.worker_socket.setblocking(False)
+            logger.info("Connected to %s:%d (pooled connection)", self.host, self.port)
+            return True
+
+        loop = asyncio.get_running_loop()
+        tried = []
+        while True:
+            tried.append(self.target)
+            worker_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            worker_socket.setblocking(False)
+            connect_started_at = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    loop.sock_connect(worker_socket, (self.target.address, self.port)),
+                    self.failover.connect_timeout,
+                )
+                connect_time = time.monotonic() - connect_started_at
+                self.target.observe_latency(connect_time)
+                self.metrics and self.metrics.observe(
+                    self.target, self.metrics.connect_histogram, connect_time
+                )
+                self.worker_socket = worker_socket
+                self.timeouts.keep_alive(worker_socket)
+                logger.info("Connected to %s:%d", self.host, self.port)
+                return True
+            except (OSError, asyncio.TimeoutError) as exc:
+                logger.error(
+                    "Couldn't connect to the worker %s:%d: %r",
+                    self.host,
+                    self.port,
+                    exc,
+                )
+                worker_socket.close()
+                self.target.observe_latency(BALANCER_DEFAULT_EWMA_FAILURE_PENALTY)
+                self.metrics and self.metrics.add(self.target, Metrics.FAILED)
+                self.outliers and self.outliers.record_failure(
+                    self.target, f"connection failed: {exc!r}"
+                )
+                self.release_target()
+            except asyncio.CancelledError:
+                worker_socket.close()
+                self.release_target()
+                raise
+
+            target = None
+            if self.targets is not None:
+                target = self.failover.next_target(self.targets, tried)
+            if target is None:
+                logger.error(
+                    "No one target is able to process client '%s' request",
+                    self.client_host,
+                )
+                log_access(
+                    self.client_host, self.target.name, self.host, self.port, "failed"
+                )
+                return False
+            logger.info(
+                "Retry client '%s' request from worker %s:%d to another worker: %s:%d",
+                self.client_host,
+                self.host,
+                self.port,
+                target.host,
+                target.port,
+            )
+            self.metrics and self.metrics.add(target, Metrics.RETRIES)
+            self.switch_target(target)
+
+    async def accept_tls(self) -> bool:
+        """
+        It completes the TLS handshake with the client before the target is connected, so failing clients
+        don't take target connections. If it fails, the connection is given back to the target
+        :return: Whether the client connection relays plain data from now on
+        """
+        try:
+            tls_socket = await self.tls.accept_async(  # type: ignore
+                self.client_socket, self.client_host
+            )
+        except asyncio.CancelledError:
+            self.release_target()
+            if self.worker_socket is not None:
+                self.worker_socket.close()
+            raise
+        if tls_socket is None:
+            self.release_target()
+            if self.worker_socket is not None:
+                self.worker_socket.close()  # Pooled socket isn't needed anymore
+            return False
+        self.client_socket = tls_socket  # type: ignore
+        return True
+
+    async def run(self):
+        """
+        It connects to the worker and then reads data from the client socket and sends it to the worker socket,
+        and vice versa, until one of the sides closes the connection.
+        If no one target is able to be connected, the client socket is closed.
+        Timeouts are checked by a single timer of the connection on the shared wheel
+        """
+        loop = asyncio.get_running_loop()
+        self.timeouts.keep_alive(self.client_socket)
+        if self.tls is not None and await self.accept_tls() is False:
+            return
+        if await self.connect() is False:
+            self.client_socket.close()
+            return
+
+        logger.info(
+            "Relay '%s' to %s:%d through '%s' path",
+            self.client_host,
+            self.host,
+            self.port,
+            BalancerRelayModeEnum.BUFFER.value,
+        )
+        self.connected_at = self.received_at = time.monotonic()
+        waiting = []
+        if self.timers is not None and self.timeouts.enabled:
+            self.expired = loop.create_future()
+            waiting.append(self.expired)
+            self.check_timeouts()
+        relays = [
+            loop.create_task(
+                self.__relay(
+                    self.client_socket, self.worker_socket, BufferPolicy.UPSTREAM
+                )
+            ),
+            loop.create_task(
+                self.__relay(
+                    self.worker_socket, self.client_socket, BufferPolicy.DOWNSTREAM
+                )
+            ),
+        ]
+        try:
+            await asyncio.wait([*relays, *waiting], return_when=asyncio.FIRST_COMPLETED)
+            for relay in relays:
+                if relay.done() and relay.exception() is not None:
+                    raise relay.exception()  # type: ignore
+            if self.expired is not None and self.expired.done():
+                self.timed_out = True
+                logger.info(
+                    "Connection of '%s' to %s:%d is closed as %s",
+                    self.client_host,
+                    self.host,
+                    self.port,
+                    self.expired.result(),
+                )
+        except asyncio.CancelledError:
+            logger.warning("Worker '%s' is terminated", self)
+            raise
+        except ConnectionError as exc:
+            logger.info(
+                "Connection of '%s' to %s:%d is broken by the %s: %r",
+                self.client_host,
+                self.host,
+                self.port,
+                "target" if self.reset_by_target else "client",
+                exc,
+            )
+        except Exception as exc:
+            logger.critical(
+                "Got unexpected behaviour on: %s:%d. Closing connections and shutting down.",
+                self.host,
+                self.port,
+            )
+            logger.exception(exc)
+        finally:
+            self.timer and self.timer.cancel()
+            for relay in relays:
+                relay.cancel()
+            self.close_connections()
+
+    def check_timeouts(self) -> None:
+        """
+        It resolves the expiry of the relay if one of its timeouts is over, otherwise the timer is set again
+        for the rest of the nearest timeout
+        """
+        now = time.monotonic()
+        sending_since = min(
+            (since for since in self.sending_since if since is not None), default=None
+        )
+        reason = self.timeouts.expired(
+            now, self.connected_at, self.received_at, sending_since  # type: ignore
+        )
+        if reason is not None:
+            self.timer = None
+            if not self.expired.done():  # type: ignore
+                self.expired.set_result(reason)  # type: ignore
+            return
+        deadline = self.timeouts.deadline(
+            self.connected_at, self.received_at, sending_since  # type: ignore
+        )
+        # Only the write timeout may be enabled, while nothing waits to be sent
+        delay = self.timeouts.idle_write if deadline is None else deadline - now
+        self.timer = self.timers.schedule(delay, self.check_timeouts)  # type: ignore
+
+    async def __relay(
+        self, source: socket.socket, destination: socket.socket, direction: int
+    ):
+        """
+        It moves data from the source socket to the destination socket until the source is exhausted.
+        A chunk is received only when the previous one is sent, and it's cut to the fair share of the memory budget
+        while the budget is used up.
+        Time to the first byte of the response is observed as the target latency
+        :param direction: Direction of the relay, it's the position of the relayed bytes counter as well
+        """
+        loop = asyncio.get_running_loop()
+        budget = self.buffers.budget
+        # Preallocated, so relaying doesn't allocate per chunk
+        view = memoryview(bytearray(self.buffers.sizes[direction]))
+        while True:
+            chunk = view
+            if budget is not None and budget.is_used_up:
+                chunk = view[: budget.fair_share]
+            try:
+                received = await loop.sock_recv_into(source, chunk)
+            except ConnectionError:
+                self.reset_by_target = source is self.worker_socket
+                raise
+            if not received:
+                if self.closed_by_target is None:
+                    self.closed_by_target = source is self.worker_socket
+                break
+            self.received_at = time.monotonic()
+            if self.response_received is False:
+                if source is self.client_socket:
+                    if self.request_sent_at is None:
+                        self.request_sent_at = time.monotonic()
+                elif self.request_sent_at is not None:
+                    self.response_received = True
+                    self.target.observe_latency(time.monotonic() - self.request_sent_at)
+            self.buffers.account(0, received)
+            self.sending_since[direction] = time.monotonic()
+            try:
+                await loop.sock_sendall(destination, view[:received])
+            except ConnectionError:
+                self.reset_by_target = destination is self.worker_socket
+                raise
+            finally:
+                # The chunk is either delivered or dropped with the connection
+                self.buffers.account(received, -received)
+                self.sending_since[direction] = None
+            self.relayed[direction] += received
+
+    def __str__(self):
+        return f"<{__class__.__name__} on={self.host}:{self.port}, from={f'%s:%d' % self.client_host}>"
@@ -0,0 +1,128 @@
+import multiprocessing
+from typing import Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+    BALANCER_DEFAULT_BUFFER_SIZE,
+)
+from balancer.core.common.relay import AbstractRelayBuffer, build_relay_buffer
+from balancer.core.enums import BalancerRelayModeEnum
+
+
+class MemoryBudget:
+    """
+    Limits bytes held by relay buffers of all the connections, i.e. received from one side and not yet sent
+    to another. When the budget is used up, buffers holding more than their fair share of it (the largest ones)
+    stop receiving until the total gets under the limit, while the smaller ones keep going, so a few slow
+    consumers don't stall everyone. Relays of the asyncio mode hold a single chunk at a time, so they aren't
+    paused: their chunks are cut to the fair share instead. Counters are kept in shared memory created before
+    balancer processes are forked, so the budget is common for all of them. It's a soft limit: buffers under
+    their share are able to overrun it by a chunk each
+    """
+
+    # Fields of the shared state
+    __USED = 0  # Bytes held by all the buffers
+    __HOLDERS = 1  # Buffers holding any bytes
+
+    def __init__(self, limit: int) -> None:
+        """
+        :param limit: Bytes all the buffers are able to hold together
+        """
+        if limit < 1:
+            raise ValueError(f"Argument 'limit' should be positive, got: {limit}")
+
+        self.limit = limit
+        self.__state = multiprocessing.RawArray("q", 2)
+        self.__lock = multiprocessing.Lock()
+
+    @property
+    def used(self) -> int:
+        return self.__state[self.__USED]
+
+    @property
+    def is_used_up(self) -> bool:
+        return self.__state[self.__USED] >= self.limit
+
+    @property
+    def fair_share(self) -> int:
+        """Bytes each of the buffers holding any is able to hold within the limit, one at least"""
+        return max(self.limit // max(self.__state[self.__HOLDERS], 1), 1)
+
+    def account(self, size: int, delta: int) -> None:
+        """
+        It must be called when a buffer receives or sends data
+        :param size: Bytes the buffer held before
+        :param delta: Bytes the buffer received, or sent if it's negative
+        """
+        if delta == 0:
+            return
+        with self.__lock:
+            self.__state[self.__USED] += delta
+            if size == 0:
+                self.__state[self.__HOLDERS] += 1
+            elif size + delta == 0:
+                self.__state[self.__HOLDERS] -= 1
+
+    def is_exceeded_by(self, size: int) -> bool:
+        """
+        Checks if a buffer holding the amount of bytes should stop receiving. It's read without locking,
+        a stale value only moves the moment the buffer is paused or resumed
+        """
+        if not self.is_used_up:
+            return False
+        return size * max(self.__state[self.__HOLDERS], 1) >= self.limit
+
+
+class BufferPolicy:
+    """
+    Sizes and watermarks of relay buffers in each direction, and the memory budget common for all the connections
+    """
+
+    UPSTREAM = 0  # From the client to the target
+    DOWNSTREAM = 1  # From the target to the client
+
+    def __init__(
+        self,
+        upstream_size: int = BALANCER_DEFAULT_BUFFER_SIZE,
+        downstream_size: int = BALANCER_DEFAULT_BUFFER_SIZE,
+        upstream_low_watermark: int = BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+        downstream_low_watermark: int = BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+        budget: Optional[MemoryBudget] = None,
+    ) -> None:
+        """
+        :param upstream_size: Bytes the buffer from the client to the target holds, that is its high watermark
+        :param downstream_size: Bytes the buffer from the target to the client holds, that is its high watermark
+        :param upstream_low_watermark: Bytes the full upstream buffer drains to before the client is read again
+        :param downstream_low_watermark: Bytes the full downstream buffer drains to before the target is read again
+        :param budget: Memory budget of all the connections, it's shared by all the balancers using the policy
+        """
+        if upstream_size < 1 or downstream_size < 1:
+            raise ValueError(
+                f"Buffer sizes should be positive, got: upstream={upstream_size}, downstream={downstream_size}"
+            )
+        if upstream_low_watermark < 0 or downstream_low_watermark < 0:
+            raise ValueError(
+                f"Low watermarks should be non-negative, got: upstream={upstream_low_watermark}, "
+                f"downstream={downstream_low_watermark}"
+            )
+
+        self.sizes = (upstream_size, downstream_size)
+        self.low_watermarks = (upstream_low_watermark, downstream_low_watermark)
+        self.budget = budget
+
+    def build(self, mode: BalancerRelayModeEnum, direction: int) -> AbstractRelayBuffer:
+        """It builds a buffer of the direction for the relay path that matches the mode"""
+        return build_relay_buffer(
+            mode, self.sizes[direction], self.low_watermarks[direction]
+        )
+
+    def may_receive(self, buffer: AbstractRelayBuffer) -> bool:
+        """Checks if the source of the buffer is able to be read: neither the buffer nor the budget is exceeded"""
+        if buffer.is_paused:
+            return False
+        return self.budget is None or not self.budget.is_exceeded_by(buffer.size)
+
+    def account(self, size: int, delta: int) -> None:
+        """It must be called when a buffer receives or sends data, see :meth:`MemoryBudget.account`"""
+        if self.budget is not None:
+            self.budget.account(size, delta)
@@ -0,0 +1,289 @@
+import math
+import multiprocessing
+import time
+from typing import List
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_EWMA_DECAY,
+    BALANCER_DEFAULT_EWMA_INITIAL_LATENCY,
+    BALANCER_DEFAULT_OUTLIER_SLOW_START_MIN_SHARE,
+)
+
+
+class ConnectionCounters:
+    """
+    Active connections counters of a set of targets. Counters are kept in shared memory created before
+    balancer processes are forked, so every relay (thread, process or coroutine) is able to change them atomically.
+    Counters are indexed by a min-tree over the connections-to-weight ratios: the least loaded target
+    is found in O(1) and a counter is changed in O(log n). Equally loaded targets are ordered by the amount of
+    connections they were given in total, so they take turns instead of the first one taking everything.
+    Targets marked as unhealthy or ejected as outliers are given only if all the targets are unhealthy or ejected.
+
+    Besides, latencies of the targets are kept there as peak-EWMA: a latency peak is taken at once,
+    while lower observations lower the estimate smoothly. Latencies are updated without locking,
+    a lost update of a concurrent observation is cheaper than the lock is. So are failures in a row,
+    while ejections of outliers, that are rare, are done under the lock
+    """
+
+    def __init__(self, weights: List[int]) -> None:
+        self.size = len(weights)
+        self.weights = list(weights)
+        self.__capacity = (
+            1 << max(self.size - 1, 0).bit_length()
+        )  # Leaves amount of the tree
+        self.__counts = multiprocessing.RawArray("q", self.size)  # Active connections
+        self.__totals = multiprocessing.RawArray("q", self.size)  # Given connections
+        # Each node holds index of the least loaded target in the subtree, -1 means no target
+        self.__tree = multiprocessing.RawArray("i", 2 * self.__capacity)
+        self.__lock = multiprocessing.Lock()
+        self.__healthy = multiprocessing.RawArray("b", [1] * self.size)
+        self.__latencies = multiprocessing.RawArray("d", self.size)  # seconds
+        # Monotonic time of the last latency observation, 0 means no observations yet
+        self.__observed_at = multiprocessing.RawArray("d", self.size)
+        self.__failures = multiprocessing.RawArray("i", self.size)  # Failures in a row
+        # Ejections in a row, each one doubles the ejection time
+        self.__ejections = multiprocessing.RawArray("i", self.size)
+        # Monotonic time the ejection ends at, 0 means the target isn't ejected
+        self.__ejected_until = multiprocessing.RawArray("d", self.size)
+        # Monotonic time the last ejection ended at and the slow start after it ends at
+        self.__returned_at = multiprocessing.RawArray("d", self.size)
+        self.__ramped_at = multiprocessing.RawArray("d", self.size)
+        # Monotonic time the earliest ejection ends at, so selection checks ejections by a single comparison
+        self.__release_at = multiprocessing.RawArray("d", [math.inf])
+        # Incremented on each change of the available targets, so selection notices it by a single comparison
+        self.__availability = multiprocessing.RawArray("q", 1)
+
+        for leaf in range(self.__capacity):
+            self.__tree[self.__capacity + leaf] = leaf if leaf < self.size else -1
+        for node in range(self.__capacity - 1, 0, -1):
+            self.__tree[node] = self.__lighter(
+                self.__tree[2 * node], self.__tree[2 * node + 1]
+            )
+
+    def __lighter(self, first: int, second: int) -> int:
+        """It compares loads of two targets (without division, weights are positive) and returns the lighter one"""
+        if first < 0 or second < 0:
+            return max(first, second)
+        first_available = self.is_available(first)
+        if first_available != self.is_available(second):
+            # Unhealthy or ejected targets are given only if there are no available ones
+            return first if first_available else second
+        first_load = self.__counts[first] * self.weights[second]
+        second_load = self.__counts[second] * self.weights[first]
+        if first_load == second_load:
+            first_load = self.__totals[first] * self.weights[second]
+            second_load = self.__totals[second] * self.weights[first]
+        return first if first_load <= second_load else second
+
+    def __restore(self, index: int) -> None:
+        """It restores the tree on the path from the target by index to the root"""
+        node = (self.__capacity + index) // 2
+        while node > 0:
+            self.__tree[node] = self.__lighter(
+                self.__tree[2 * node], self.__tree[2 * node + 1]
+            )
+            node //= 2
+
+    def add(self, index: int, delta: int) -> None:
+        """It changes the counter of the target by index and restores the tree on the path to the root"""
+        with self.__lock:
+            self.__counts[index] += delta
+            if delta > 0:
+                self.__totals[index] += delta
+            self.__restore(index)
+
+    def try_add(self, index: int, limit: int) -> bool:
+        """
+        It increments the counter of the target by index, unless the target already has as many connections as
+        the limit. Checking and incrementing are done at once, so concurrent relays don't overrun the limit
+        :param limit: Connections limit of the target, 0 means no limit
+        :return: Whether the counter is incremented
+        """
+        with self.__lock:
+            if limit > 0 and self.__counts[index] >= limit:
+                return False
+            self.__counts[index] += 1
+            self.__totals[index] += 1
+            self.__restore(index)
+        return True
+
+    def is_healthy(self, index: int) -> bool:
+        """Checks if the target by index is marked as healthy"""
+        return self.__healthy[index] == 1
+
+    def is_available(self, index: int) -> bool:
+        """Checks if the target by index is healthy and not ejected"""
+        return self.__healthy[index] == 1 and self.__ejected_until[index] == 0
+
+    def set_healthy(self, index: int, healthy: bool) -> None:
+        """It marks the target by index as healthy or not"""
+        with self.__lock:
+            if self.__healthy[index] != (1 if healthy else 0):
+                self.__availability[0] += 1
+            self.__healthy[index] = 1 if healthy else 0
+            self.__restore(index)
+
+    @property
+    def availability_version(self) -> int:
+        """Number of changes of the available targets, i.e. of their health and ejections"""
+        return self.__availability[0]
+
+    def inherit(
+        self, index: int, previous: "ConnectionCounters", previous_index: int
+    ) -> None:
+        """
+        It takes over health, latency and ejection of the target by index from the counters it was counted by before
+        a reload. Active connections are not taken over: relays in progress release them in the previous counters
+        """
+        with self.__lock:
+            self.__healthy[index] = previous.__healthy[previous_index]
+            self.__latencies[index] = previous.__latencies[previous_index]
+            self.__observed_at[index] = previous.__observed_at[previous_index]
+            self.__failures[index] = previous.__failures[previous_index]
+            self.__ejections[index] = previous.__ejections[previous_index]
+            self.__ejected_until[index] = previous.__ejected_until[previous_index]
+            self.__returned_at[index] = previous.__returned_at[previous_index]
+            self.__ramped_at[index] = previous.__ramped_at[previous_index]
+            if self.__ejected_until[index] > 0:
+                self.__release_at[0] = min(
+                    self.__release_at[0], self.__ejected_until[index]
+                )
+            self.__availability[0] += 1
+            self.__restore(index)
+
+    def count(self, index: int) -> int:
+        """It returns amount of active connections of the target by index"""
+        return self.__counts[index]
+
+    def least_loaded(self) -> int:
+        """It returns index of the target with the least connections-to-weight ratio"""
+        return self.__tree[1]
+
+    def observe_latency(self, index: int, latency: float) -> None:
+        """It updates the latency estimate of the target by index with the observed latency (in seconds)"""
+        now = time.monotonic()
+        estimate = self.__latencies[index]
+        observed_at = self.__observed_at[index]
+        if observed_at == 0 or latency > estimate:
+            estimate = latency
+        else:
+            # The longer there were no observations, the less the old estimate weighs
+            weight = math.exp((observed_at - now) / BALANCER_DEFAULT_EWMA_DECAY)
+            estimate = estimate * weight + latency * (1 - weight)
+        self.__latencies[index] = estimate
+        self.__observed_at[index] = now
+
+    def load_score(self, index: int) -> float:
+        """
+        It returns the latency estimate of the target by index multiplied by amount of its connections
+        (including the one going to be given). The estimate decays while there are no observations,
+        so the target that was slow once gets requests again to be measured
+        """
+        observed_at = self.__observed_at[index]
+        if observed_at == 0:
+            latency = BALANCER_DEFAULT_EWMA_INITIAL_LATENCY
+        else:
+            decay = math.exp(
+                (observed_at - time.monotonic()) / BALANCER_DEFAULT_EWMA_DECAY
+            )
+            latency = self.__latencies[index] * decay
+        return latency * (self.__counts[index] + 1)
+
+    def record_failure(self, index: int) -> int:
+        """
+        It counts a failure of the target by index in a row, without locking
+        :return: Failures of the target in a row
+        """
+        failures = self.__failures[index] + 1
+        self.__failures[index] = failures
+        return failures
+
+    def record_success(self, index: int) -> None:
+        """It breaks the row of failures of the target by index, without locking"""
+        if self.__failures[index] != 0:
+            self.__failures[index] = 0
+
+    def is_ejected(self, index: int) -> bool:
+        return self.__ejected_until[index] != 0
+
+    def eject(
+        self,
+        index: int,
+        base_time: float,
+        max_time: float,
+        max_ejected: int,
+        slow_start: float,
+    ) -> float:
+        """
+        It ejects the target by index, unless it's ejected already or as many targets as allowed are ejected.
+        Each ejection in a row doubles the time, a target back for longer than the longest time starts over
+        :param base_time: Seconds of the first ejection
+        :param max_time: Seconds an ejection takes at most
+        :param max_ejected: Targets that are able to be ejected at once
+        :param slow_start: Seconds the target takes to get its full share of connections once it's back
+        :return: Seconds the target is ejected for, 0 if it isn't ejected
+        """
+        now = time.monotonic()
+        with self.__lock:
+            self.__failures[index] = 0  # Next ejection takes a new row of failures
+            if self.__ejected_until[index] != 0:
+                return 0
+            ejected = sum(1 for until in self.__ejected_until if until != 0)
+            if ejected >= max_ejected:
+                return 0
+            returned_at = self.__returned_at[index]
+            if returned_at == 0 or now - returned_at > max_time:
+                self.__ejections[index] = 0
+            self.__ejections[index] += 1
+            duration = min(base_time * 2 ** (self.__ejections[index] - 1), max_time)
+            until = now + duration
+            self.__ejected_until[index] = until
+            self.__returned_at[index] = until
+            self.__ramped_at[index] = until + slow_start
+            self.__release_at[0] = min(self.__release_at[0], until)
+            self.__availability[0] += 1
+            self.__restore(index)
+        return duration
+
+    def release_ejected(self) -> List[int]:
+        """
+        It returns the targets whose ejection is over to the balancing. It's cheap while no ejection is over,
+        so it's able to be called on each selection
+        :return: Indexes of the returned targets
+        """
+        now = time.monotonic()
+        if self.__release_at[0] > now:
+            return []
+        released = []
+        with self.__lock:
+            release_at = math.inf
+            for index in range(self.size):
+                until = self.__ejected_until[index]
+                if until == 0:
+                    continue
+                if until <= now:
+                    self.__ejected_until[index] = 0
+                    self.__availability[0] += 1
+                    self.__restore(index)
+                    released.append(index)
+                else:
+                    release_at = min(release_at, until)
+            self.__release_at[0] = release_at
+        return released
+
+    def slow_start_share(self, index: int) -> float:
+        """
+        It returns the share of new connections the target by index gets. It grows linearly from the minimal
+        share to the full one while the slow start after an ejection lasts
+        """
+        ramped_at = self.__ramped_at[index]
+        if ramped_at == 0:
+            return 1.0
+        now = time.monotonic()
+        if now >= ramped_at:
+            return 1.0
+        returned_at = self.__returned_at[index]
+        if now <= returned_at:
+            return BALANCER_DEFAULT_OUTLIER_SLOW_START_MIN_SHARE  # It's still ejected
+        share = (now - returned_at) / (ramped_at - returned_at)
+        return max(share, BALANCER_DEFAULT_OUTLIER_SLOW_START_MIN_SHARE)
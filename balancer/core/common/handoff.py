@@ -0,0 +1,181 @@
+import os
+import signal
+import socket
+import threading
+from typing import Optional
+
+from balancer.conf.constants import BALANCER_DEFAULT_HANDOFF_TIMEOUT
+from balancer.core.logger import logger
+
+# Message a balancer started for an upgrade sends once it's about to accept connections
+READY = b"ready"
+
+
+class ListenSocketHandoff:
+    """
+    Class that hands the listening socket of a running balancer over to a balancer started for an upgrade
+    (e.g. of a new version), so connections are not refused meanwhile. The running balancer serves a Unix socket
+    at the path, a new one connects to it at startup and takes the listening socket by SCM_RIGHTS. Both of them
+    accept from the same socket, until the new one reports it's ready: the running one stops accepting then and
+    drains its relays, as it does on SIGQUIT. Connections queued on the socket are accepted by the new one,
+    so none of them is lost. If the new one fails before it's ready, the running one keeps serving
+    """
+
+    def __init__(self, path: str, timeout: float = BALANCER_DEFAULT_HANDOFF_TIMEOUT):
+        """
+        :param path: Path to the Unix socket the listening socket is handed over through
+        :param timeout: Seconds the balancers wait for each other during the handoff
+        """
+        if not path:
+            raise ValueError("Argument 'path' shouldn't be empty")
+        if timeout <= 0:
+            raise ValueError(f"Argument 'timeout' should be positive, got: {timeout}")
+
+        self.path = path
+        self.timeout = timeout
+        self.keep_going: bool = False
+        # Connection to the running balancer, from taking the listening socket until reporting readiness
+        self.__connection: Optional[socket.socket] = None
+        self.__server: Optional[socket.socket] = None
+        # Inode of the served Unix socket, to tell whether the path still leads to it
+        self.__server_inode: int = 0
+        # Set if the running balancer listens on another port or protocol, so its path isn't taken away from it
+        self.__foreign: bool = False
+        self.__serve_thread: threading.Thread = None  # type: ignore
+
+    def receive(self, port: int, socket_type: int) -> Optional[socket.socket]:
+        """
+        It takes the listening socket over from the running balancer, if there is one
+        :param port: Port the socket should listen on
+        :param socket_type: Type the socket should be of, i.e. the same protocol is balanced
+        :return: The listening socket or None if there is no running balancer or its socket doesn't fit
+        """
+        connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        connection.settimeout(self.timeout)
+        try:
+            connection.connect(self.path)
+            (_, fds, _, _) = socket.recv_fds(connection, len(READY), 1)
+        except OSError as exc:
+            connection.close()
+            logger.info(
+                f"No running balancer hands over the listening socket at '{self.path}': {exc!r}"
+            )
+            return None
+        if not fds:
+            connection.close()
+            logger.warning(f"Running balancer at '{self.path}' handed over no socket")
+            return None
+
+        listen_socket = socket.socket(fileno=fds[0])
+        listen_port = listen_socket.getsockname()[1]
+        if listen_socket.type != socket_type or listen_port != port:
+            # Closing the connection tells the running balancer to keep serving
+            logger.warning(
+                f"Socket handed over at '{self.path}' doesn't fit: it listens on port {listen_port} "
+                f"with type {listen_socket.type!r}, expected port {port} with type {socket_type!r}"
+            )
+            listen_socket.close()
+            connection.close()
+            self.__foreign = True
+            return None
+        self.__connection = connection
+        logger.info(
+            f"Listening socket on port {listen_port} is taken over from the running balancer"
+        )
+        return listen_socket
+
+    def complete(self) -> None:
+        """
+        It reports the running balancer that this one is about to accept connections, so it drains.
+        It does nothing if the listening socket wasn't taken over
+        """
+        connection = self.__connection
+        if connection is None:
+            return
+        self.__connection = None
+        try:
+            connection.sendall(READY)
+        except OSError as exc:
+            logger.warning(f"Running balancer isn't told to drain: {exc!r}")
+        finally:
+            connection.close()
+
+    def serve(self, listen_socket: socket.socket) -> None:
+        """
+        It starts the thread that hands the listening socket over to balancers started for an upgrade. The Unix socket
+        is bound at a temporary path and renamed to the path, so the previous balancer's one is replaced atomically.
+        It does nothing if the path is served by a balancer of another port or protocol
+        """
+        if self.__foreign is True:
+            logger.warning(
+                f"Upgrades are not served, '{self.path}' is served by a balancer of another port or protocol"
+            )
+            return
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        temporary_path = f"{self.path}.{os.getpid()}"
+        try:
+            if os.path.exists(temporary_path):
+                os.unlink(temporary_path)
+            server.bind(temporary_path)
+            server.listen(1)
+            os.rename(temporary_path, self.path)
+        except OSError as exc:
+            server.close()
+            logger.error(f"Upgrades are not served at '{self.path}': {exc!r}")
+            return
+        self.__server = server
+        self.__server_inode = os.stat(self.path).st_ino
+        self.keep_going = True
+        self.__serve_thread = threading.Thread(
+            target=self.keep_serving,
+            args=(server, listen_socket, os.getpid()),
+            name="handoff",
+            daemon=True,
+        )
+        self.__serve_thread.start()
+        logger.info(f"Upgrades are served at '{self.path}'")
+
+    def keep_serving(
+        self, server: socket.socket, listen_socket: socket.socket, pid: int
+    ) -> None:
+        """
+        It hands the listening socket over to each balancer that connects, until one of them reports it's ready.
+        Then it sends SIGQUIT to the current process, so it stops accepting and drains
+        """
+        while self.keep_going is True:
+            try:
+                (connection, _) = server.accept()
+            except OSError:
+                break  # Server is closed
+            with connection:
+                connection.settimeout(self.timeout)
+                try:
+                    socket.send_fds(connection, [READY], [listen_socket.fileno()])
+                    ready = connection.recv(len(READY))
+                except OSError as exc:
+                    logger.warning(f"Upgrade failed, serving goes on: {exc!r}")
+                    continue
+            if ready != READY:
+                logger.warning(
+                    "Upgraded balancer exited before it was ready, serving goes on"
+                )
+                continue
+            logger.info("Upgraded balancer is ready, this one is draining")
+            # The path leads to the Unix socket of the upgraded balancer already, so it isn't removed
+            self.keep_going = False
+            server.close()
+            os.kill(pid, signal.SIGQUIT)
+            return
+
+    def stop(self) -> None:
+        """It stops serving upgrades, the Unix socket is removed unless it was replaced by another balancer's one"""
+        self.keep_going = False
+        if self.__server is None:
+            return
+        try:
+            if os.stat(self.path).st_ino == self.__server_inode:
+                os.unlink(self.path)
+        except OSError:
+            pass  # Removed already
+        self.__server.close()
+        self.__server = None
@@ -0,0 +1,138 @@
+import asyncio
+import threading
+import time
+from typing import Dict, Iterable, List
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_HEALTH_FALL,
+    BALANCER_DEFAULT_HEALTH_INTERVAL,
+    BALANCER_DEFAULT_HEALTH_RISE,
+    BALANCER_DEFAULT_HEALTH_TIMEOUT,
+)
+from balancer.core.common.target import Target
+from balancer.core.logger import logger
+
+
+class HealthChecker:
+    """
+    Class that probes the targets in a background thread and marks them as healthy or not.
+    A probe connects to the target and, if the ``send`` data is set, sends it and expects the response to start
+    with the ``expect`` data. A target is marked as unhealthy after ``fall`` failed probes in a row
+    and healthy again after ``rise`` succeeded ones. All the targets are probed concurrently on an event loop,
+    so a slow target doesn't delay probes of others. Health flags are kept in the shared target counters,
+    so the checker is enough to be run in one process
+    """
+
+    def __init__(
+        self,
+        interval: float = BALANCER_DEFAULT_HEALTH_INTERVAL,
+        timeout: float = BALANCER_DEFAULT_HEALTH_TIMEOUT,
+        rise: int = BALANCER_DEFAULT_HEALTH_RISE,
+        fall: int = BALANCER_DEFAULT_HEALTH_FALL,
+        send: bytes = b"",
+        expect: bytes = b"",
+    ) -> None:
+        if rise < 1 or fall < 1:
+            raise ValueError(
+                f"Health check thresholds should be positive, got: rise={rise}, fall={fall}"
+            )
+
+        self.interval = interval
+        self.timeout = timeout
+        self.rise = rise
+        self.fall = fall
+        self.send = send
+        self.expect = expect
+        self.targets: List[Target] = []
+        # Amount of probes in a row that disagree with the current state of the target
+        self.streaks: Dict[Target, int] = {}
+        self.keep_going: bool = False
+        self.__check_thread: threading.Thread = None  # type: ignore
+
+    def start(self, targets: Iterable[Target]) -> None:
+        """It starts the thread that probes the targets"""
+        self.targets = list(targets)
+        self.streaks = {target: 0 for target in self.targets}
+        self.keep_going = True
+        self.__check_thread = threading.Thread(
+            target=asyncio.run, args=(self.keep_checking(),), daemon=True
+        )
+        self.__check_thread.start()
+        logger.info(
+            f"Health checks are started: interval={self.interval}s timeout={self.timeout}s "
+            f"rise={self.rise} fall={self.fall}"
+        )
+
+    async def keep_checking(self) -> None:
+        """It probes all the targets each interval"""
+        while self.keep_going is True:
+            started_at = time.monotonic()
+            targets = (
+                self.targets
+            )  # The targets are able to be swapped by a reload meanwhile
+            results = await asyncio.gather(*(self.probe(target) for target in targets))
+            for target, passed in zip(targets, results):
+                self.account(target, passed)
+            await asyncio.sleep(
+                max(0.0, self.interval - (time.monotonic() - started_at))
+            )
+
+    def update_targets(self, targets: Iterable[Target]) -> None:
+        """It makes the checker to probe the reloaded targets from the next round"""
+        targets = list(targets)
+        streaks = {target.key: streak for target, streak in self.streaks.items()}
+        self.streaks = {target: streaks.get(target.key, 0) for target in targets}
+        self.targets = targets
+
+    async def probe(self, target: Target) -> bool:
+        """
+        It checks the target once
+        :return: Whether the probe is passed
+        """
+        try:
+            return await asyncio.wait_for(self.__exchange(target), self.timeout)
+        except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError) as exc:
+            logger.debug("Health probe of the %s failed: %r", target, exc)
+            return False
+
+    async def __exchange(self, target: Target) -> bool:
+        """It connects to the target and talks to it, if it's set up to"""
+        (reader, writer) = await asyncio.open_connection(target.address, target.port)
+        try:
+            if self.send:
+                writer.write(self.send)
+                await writer.drain()
+            if self.expect:
+                response = await reader.readexactly(len(self.expect))
+                if response != self.expect:
+                    logger.debug(
+                        "Health probe of the %s got unexpected response: %r",
+                        target,
+                        response,
+                    )
+                    return False
+            return True
+        finally:
+            writer.close()
+
+    def account(self, target: Target, passed: bool) -> None:
+        """It counts the probe result and changes the target state once the threshold is reached"""
+        if passed is target.healthy:
+            self.streaks[target] = 0
+            return
+
+        self.streaks[target] = self.streaks.get(target, 0) + 1
+        if passed is True and self.streaks[target] >= self.rise:
+            self.streaks[target] = 0
+            target.set_healthy(True)
+            logger.info(f"Target {target} is healthy again")
+        elif passed is False and self.streaks[target] >= self.fall:
+            self.streaks[target] = 0
+            target.set_healthy(False)
+            logger.warning(
+                f"Target {target} is unhealthy, connections are not given to it"
+            )
+
+    def stop(self) -> None:
+        """It stops probing, the thread completes after the current round of probes"""
+        self.keep_going = False
@@ -0,0 +1,244 @@
+import re
+from typing import FrozenSet, List, Optional, Set, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_HTTP_IDLE_TIMEOUT,
+    BALANCER_DEFAULT_HTTP_MAX_HEAD_SIZE,
+    BALANCER_DEFAULT_HTTP_MAX_LINE_SIZE,
+)
+from balancer.core.exceptions import HttpProtocolError
+
+# Headers that describe a single connection, so they're not relayed to the other side
+HOP_BY_HOP_HEADERS: FrozenSet[bytes] = frozenset(
+    (b"connection", b"keep-alive", b"proxy-connection")
+)
+# Responses to these statuses have no body, whatever their headers say
+BODILESS_STATUSES: FrozenSet[int] = frozenset((204, 304))
+# Chunk size is hex digits only: signs, prefixes, underscores and whitespace are parsed differently by targets.
+# Sizes over 64 bits are not taken either
+CHUNK_SIZE = re.compile(rb"[0-9A-Fa-f]{1,16}")
+
+
+class HttpPolicy:
+    """
+    Rules of serving client connections in the HTTP/1.1 mode
+    """
+
+    def __init__(
+        self,
+        idle_timeout: float = BALANCER_DEFAULT_HTTP_IDLE_TIMEOUT,
+        max_head_size: int = BALANCER_DEFAULT_HTTP_MAX_HEAD_SIZE,
+    ) -> None:
+        """
+        :param idle_timeout: Seconds a keep-alive client connection is able to wait for its next request
+        :param max_head_size: Bytes the head of a request or a response is able to take
+        """
+        if idle_timeout <= 0:
+            raise ValueError(
+                f"Argument 'idle_timeout' should be positive, got: {idle_timeout}"
+            )
+        if max_head_size < 1:
+            raise ValueError(
+                f"Argument 'max_head_size' should be positive, got: {max_head_size}"
+            )
+
+        self.idle_timeout = idle_timeout
+        self.max_head_size = max_head_size
+
+
+class HttpHead:
+    """
+    Head of an HTTP/1.x message, parsed only as far as it's needed to find the end of the message and to relay it.
+    Header lines are kept as they are, so relaying doesn't rebuild them
+    """
+
+    __slots__ = (
+        "start_line",
+        "method",
+        "status",
+        "version",
+        "headers",
+        "connection",
+        "content_length",
+        "chunked",
+        "keep_alive",
+        "upgrade",
+    )
+
+    def __init__(self, data: bytes, is_request: bool) -> None:
+        """
+        :param data: Bytes of the head, up to and including the empty line
+        :param is_request: Whether it's a head of a request or of a response
+        :raises HttpProtocolError: If the head is malformed
+        """
+        lines = data.split(b"\r\n")
+        self.start_line = lines[0]
+        parts = self.start_line.split(b" ", 2)
+        self.method = b""
+        self.status = 0
+        if is_request:
+            if len(parts) != 3:
+                raise HttpProtocolError(f"Malformed request line: {self.start_line!r}")
+            (self.method, _, self.version) = parts
+        else:
+            if len(parts) < 2 or not parts[1].isdigit() or len(parts[1]) != 3:
+                raise HttpProtocolError(f"Malformed status line: {self.start_line!r}")
+            self.version = parts[0]
+            self.status = int(parts[1])
+        if self.version not in (b"HTTP/1.1", b"HTTP/1.0"):
+            raise HttpProtocolError(
+                f"Unsupported version: {self.version!r}", status=505
+            )
+
+        # Lowercase name and the line of each header
+        self.headers: List[Tuple[bytes, bytes]] = []
+        self.connection: Set[bytes] = set()  # Options of the Connection header
+        self.content_length: Optional[int] = None
+        self.chunked = False
+        transfer_encoding = False
+        for line in lines[1:]:
+            if not line:
+                continue  # The empty line that ends the head
+            (name, separator, value) = line.partition(b":")
+            # Whitespace between the name and the colon is a known way to smuggle requests
+            if not separator or not name or name != name.strip():
+                raise HttpProtocolError(f"Malformed header line: {line!r}")
+            name = name.lower()
+            value = value.strip()
+            if name == b"content-length":
+                if not value.isdigit():
+                    raise HttpProtocolError(f"Malformed Content-Length: {value!r}")
+                length = int(value)
+                if self.content_length is not None and self.content_length != length:
+                    raise HttpProtocolError("Conflicting Content-Length headers")
+                self.content_length = length
+            elif name == b"transfer-encoding":
+                transfer_encoding = True
+                self.chunked = value.rsplit(b",", 1)[-1].strip().lower() == b"chunked"
+            elif name == b"connection":
+                self.connection.update(
+                    option.strip().lower() for option in value.split(b",")
+                )
+            self.headers.append((name, line))
+
+        if self.version == b"HTTP/1.1":
+            self.keep_alive = b"close" not in self.connection
+        else:
+            self.keep_alive = b"keep-alive" in self.connection
+        self.upgrade = b"upgrade" in self.connection and any(
+            name == b"upgrade" for (name, _) in self.headers
+        )
+        if transfer_encoding:
+            if is_request and not self.chunked:
+                raise HttpProtocolError("Request body length is unknown")
+            if self.content_length is not None:
+                # Transfer-Encoding overrides Content-Length, but the connection isn't trusted anymore
+                self.content_length = None
+                self.keep_alive = False
+
+    @property
+    def has_body(self) -> bool:
+        """Checks if a request has a body. Responses are checked by :meth:`response_has_body`"""
+        return self.chunked or bool(self.content_length)
+
+    def response_has_body(self, request: "HttpHead") -> bool:
+        """Checks if the response to the request has a body"""
+        if request.method == b"HEAD" or self.status < 200:
+            return False
+        return self.status not in BODILESS_STATUSES
+
+    def rebuild(self, connection: Optional[bytes] = None) -> bytes:
+        """
+        It builds the head to be relayed: headers that describe the incoming connection are dropped
+        and the given Connection header is added
+        :param connection: Value of the Connection header for the outgoing connection, none if it's omitted
+        """
+        dropped = HOP_BY_HOP_HEADERS | self.connection
+        if connection == b"upgrade":
+            dropped = dropped - {b"upgrade"}
+        lines = [self.start_line]
+        lines.extend(line for (name, line) in self.headers if name not in dropped)
+        if connection is not None:
+            lines.append(b"Connection: " + connection)
+        lines.append(b"\r\n")
+        return b"\r\n".join(lines)
+
+
+class ChunkedBody:
+    """
+    Incremental parser of a chunked body. It finds where the body ends, so the body is relayed as it is
+    and the bytes that follow it (e.g. a pipelined request) are kept
+    """
+
+    SIZE = 0  # Chunk size line is expected
+    DATA = 1  # Chunk data is expected
+    DATA_END = 2  # Line break after the chunk data is expected
+    TRAILER = 3  # Trailer lines are expected, up to the empty one
+
+    def __init__(self) -> None:
+        self.state = self.SIZE
+        self.remaining = 0  # Bytes of the chunk data that are not parsed yet
+        self.done = False
+
+    def feed(self, data: bytearray) -> int:
+        """
+        It parses the data as far as it's able to
+        :return: Amount of the parsed bytes, the rest of the data should be fed again with the bytes that follow
+        :raises HttpProtocolError: If the body is malformed
+        """
+        position = 0
+        end = len(data)
+        while position < end and not self.done:
+            if self.state == self.DATA:
+                step = min(self.remaining, end - position)
+                position += step
+                self.skip(step)
+                continue
+            line_end = data.find(b"\r\n", position)
+            if line_end < 0:
+                if end - position > BALANCER_DEFAULT_HTTP_MAX_LINE_SIZE:
+                    raise HttpProtocolError("Chunked body line is too long")
+                break
+            line = data[position:line_end]
+            position = line_end + 2
+            if self.state == self.SIZE:
+                digits = line.split(b";", 1)[0]
+                if CHUNK_SIZE.fullmatch(digits) is None:
+                    raise HttpProtocolError(f"Malformed chunk size: {bytes(line)!r}")
+                size = int(digits, 16)
+                self.state = self.DATA if size > 0 else self.TRAILER
+                self.remaining = size
+            elif self.state == self.DATA_END:
+                if line:
+                    raise HttpProtocolError("Chunk data is longer than its size")
+                self.state = self.SIZE
+            elif not line:
+                self.done = True  # The empty line that ends the trailer
+        return position
+
+    def skip(self, size: int) -> None:
+        """It takes the amount of chunk data bytes as parsed, when they're relayed without being fed"""
+        self.remaining -= size
+        if self.remaining == 0:
+            self.state = self.DATA_END
+
+    @property
+    def expects_data(self) -> bool:
+        return self.state == self.DATA
+
+
+def error_response(status: int) -> bytes:
+    """It builds a response the balancer gives by itself, the connection is closed after it"""
+    reasons = {
+        400: b"Bad Request",
+        408: b"Request Timeout",
+        431: b"Request Header Fields Too Large",
+        502: b"Bad Gateway",
+        503: b"Service Unavailable",
+        504: b"Gateway Timeout",
+        505: b"HTTP Version Not Supported",
+    }
+    return b"HTTP/1.1 %d %s\r\nContent-Length: 0\r\nConnection: close\r\n\r\n" % (
+        status,
+        reasons.get(status, b"Error"),
+    )
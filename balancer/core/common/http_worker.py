@@ -0,0 +1,655 @@
+import asyncio
+import socket
+import time
+from typing import Any, Awaitable, Callable, List, Optional, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_BUFFER_SIZE,
+    BALANCER_DEFAULT_EWMA_FAILURE_PENALTY,
+)
+from balancer.core.common.backpressure import BufferPolicy
+from balancer.core.common.http import ChunkedBody, HttpHead, HttpPolicy, error_response
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.pool import ConnectionPools
+from balancer.core.common.retry import FailoverPolicy
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.common.timeouts import TimeoutPolicy
+from balancer.core.common.tls import TlsPolicy
+from balancer.core.exceptions import (
+    HttpClientError,
+    HttpProtocolError,
+    RelayTimeoutError,
+)
+from balancer.core.logger import log_access, logger
+
+
+class HttpWorker:
+    """
+    It serves a client connection in the HTTP/1.1 mode on the running event loop. Requests are parsed one by one
+    and each one is given to the target chosen for it, over a keep-alive connection to the target taken from
+    the pools, so a keep-alive client doesn't pin its requests to a single target and clients don't pay
+    a connection to a target per request. Pipelined requests are read ahead and served in order,
+    so responses are sent in the order of the requests. Upgraded connections (e.g. WebSocket)
+    are relayed as they are once the target agrees to upgrade
+    """
+
+    def __init__(
+        self,
+        client_socket: socket.socket,
+        client_host: str,
+        targets: Callable[[], TargetAlgorithmizedList],
+        policy: Optional[HttpPolicy] = None,
+        pools: Optional[ConnectionPools] = None,
+        failover: Optional[FailoverPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        buffers: Optional[BufferPolicy] = None,
+        tls: Optional[TlsPolicy] = None,
+        outliers: Optional[OutlierDetector] = None,
+        timeouts: Optional[TimeoutPolicy] = None,
+    ) -> None:
+        """
+        :param targets: It returns the current targets, so requests are given to the reloaded ones once they're swapped in
+        :param pools: Pools that keep idle keep-alive connections to the targets
+        :param timeouts: Keepalive of the client and target connections, and idle timeouts of the exchanges.
+            Idle connections between requests are timed out by the HTTP policy
+        """
+        self.client_socket: socket.socket = client_socket
+        self.client_host = client_host
+        self.targets = targets
+        self.policy = policy or HttpPolicy()
+        self.pools = pools
+        self.failover = failover or FailoverPolicy()
+        self.metrics = metrics
+        self.tls = tls  # TLS is terminated on the client connection, if it's given
+        self.outliers = (
+            outliers  # Ejects targets whose requests keep failing, if enabled
+        )
+        self.timeouts = timeouts or TimeoutPolicy()
+        buffers = buffers or BufferPolicy(
+            BALANCER_DEFAULT_BUFFER_SIZE, BALANCER_DEFAULT_BUFFER_SIZE
+        )
+        # Preallocated, so bodies are relayed without allocating per chunk
+        self.upstream_view = memoryview(bytearray(buffers.sizes[BufferPolicy.UPSTREAM]))
+        self.downstream_view = memoryview(
+            bytearray(buffers.sizes[BufferPolicy.DOWNSTREAM])
+        )
+        # Received bytes that are not relayed yet, e.g. pipelined requests
+        self.client_buffer = bytearray()
+        self.target_buffer = bytearray()
+        self.idle: bool = (
+            False  # Whether the client connection waits for the next request
+        )
+        self.keep_going: bool = (
+            True  # Turns to False when the connection should be closed once idle
+        )
+
+    def close_when_idle(self) -> bool:
+        """
+        It makes the worker to close the client connection once the current request is served
+        :return: Whether the connection is idle right now, so the worker is able to be cancelled at once
+        """
+        self.keep_going = False
+        return self.idle
+
+    async def run(self):
+        """It serves requests of the client until the client or the balancer closes the connection"""
+        self.timeouts.keep_alive(self.client_socket)
+        if self.tls is not None:
+            tls_socket = await self.tls.accept_async(
+                self.client_socket, self.client_host
+            )
+            if tls_socket is None:
+                return
+            self.client_socket = tls_socket  # type: ignore
+        try:
+            while self.keep_going is True:
+                self.idle = not self.client_buffer
+                try:
+                    request = await asyncio.wait_for(
+                        self.read_head(self.client_socket, self.client_buffer, True),
+                        self.policy.idle_timeout,
+                    )
+                except asyncio.TimeoutError:
+                    logger.debug("Client '%s' is idle for too long", self.client_host)
+                    break
+                self.idle = False
+                if request is None:
+                    break  # Client closed the connection between requests
+                if await self.serve(request) is False:
+                    break
+        except HttpProtocolError as exc:
+            logger.warning(
+                "Malformed request from client '%s': %s", self.client_host, exc
+            )
+            await self.respond_error(exc.status)
+        except asyncio.CancelledError:
+            raise
+        except OSError as exc:
+            logger.debug("Client '%s' connection failed: %r", self.client_host, exc)
+        except Exception as exc:
+            logger.critical(
+                "Got unexpected behaviour serving client '%s'. Closing connection.",
+                self.client_host,
+            )
+            logger.exception(exc)
+        finally:
+            self.close_socket(self.client_socket)
+            logger.debug("Client '%s' connection is closed", self.client_host)
+
+    async def read_head(
+        self, source: socket.socket, buffer: bytearray, is_request: bool
+    ) -> Optional[HttpHead]:
+        """
+        It reads the source until the buffer holds a whole message head, and takes the head out of the buffer
+        :return: Parsed head or None if the source is closed before a message is started
+        """
+        loop = asyncio.get_running_loop()
+        view = self.upstream_view if is_request else self.downstream_view
+        scanned = 0
+        while True:
+            if is_request and buffer[:2] == b"\r\n":
+                del buffer[:2]  # Empty lines before a request are ignored
+                continue
+            end = buffer.find(b"\r\n\r\n", scanned)
+            if end > self.policy.max_head_size or (
+                end < 0 and len(buffer) > self.policy.max_head_size
+            ):
+                raise HttpProtocolError("Message head is too large", status=431)
+            if end >= 0:
+                break
+            # The end of the head may be split between receives
+            scanned = max(len(buffer) - 3, 0)
+            received = await loop.sock_recv_into(source, view)
+            if not received:
+                if buffer:
+                    raise ConnectionError(
+                        "Connection is closed in the middle of a head"
+                    )
+                return None
+            buffer += view[:received]
+        end += 4
+        head = HttpHead(bytes(buffer[:end]), is_request)
+        del buffer[:end]
+        return head
+
+    async def serve(self, request: HttpHead) -> bool:
+        """
+        It relays the request to the target chosen for it and the response back to the client
+        :return: Whether the client connection is able to be kept for the next request
+        """
+        target = self.targets().acquire_next(self.client_host[0])
+        if target is None:
+            logger.info(
+                "All the targets are saturated, request of client '%s' is rejected",
+                self.client_host,
+            )
+            await self.respond_error(503)
+            return False
+        if self.metrics is not None:
+            self.metrics.add(target, Metrics.ACCEPTED)
+        started_at = time.monotonic()
+        self.failover.budget.record_request()
+        connected = await self.connect(target)
+        if connected is None:
+            await self.respond_error(502)
+            return False
+        (target, target_socket, reused) = connected
+
+        relayed = [0, 0]
+        reusable = False
+        try:
+            while True:
+                try:
+                    (reusable, keep_alive) = await self.exchange(
+                        request, target, target_socket, relayed
+                    )
+                    break
+                except OSError as exc:
+                    # A target that stalls isn't given the request once again
+                    stalled = isinstance(exc, RelayTimeoutError)
+                    if stalled or not reused or relayed[1] > 0 or request.has_body:
+                        raise
+                # The target closed the keep-alive connection meanwhile, the request is sent over a new one
+                logger.debug(
+                    "Keep-alive connection to %s is closed, reconnecting", target
+                )
+                self.close_socket(target_socket)
+                target_socket = await self.open_connection(target)
+                reused = False
+                relayed[:] = [0, 0]
+        except HttpClientError as exc:
+            logger.warning("Request of client '%s' failed: %s", self.client_host, exc)
+            if relayed[1] == 0:
+                await self.respond_error(exc.status)
+            return False
+        except HttpProtocolError as exc:
+            logger.error("Malformed response from %s: %s", target, exc)
+            if self.outliers is not None:
+                self.outliers.record_failure(target, f"malformed response: {exc}")
+            if relayed[1] == 0:
+                await self.respond_error(502)
+            return False
+        except OSError as exc:
+            # Failures of the client connection are raised as HttpClientError, so it's the target connection that failed
+            logger.error("Request to %s failed: %r", target, exc)
+            if self.outliers is not None:
+                self.outliers.record_failure(target, f"request failed: {exc!r}")
+            if relayed[1] == 0:
+                await self.respond_error(
+                    504 if isinstance(exc, RelayTimeoutError) else 502
+                )
+            return False
+        finally:
+            target.decrement_connections()
+            if reusable and self.pools is not None:
+                self.pools.release(target, target_socket)
+            else:
+                self.close_socket(target_socket)
+
+        duration = time.monotonic() - started_at
+        if self.metrics is not None:
+            self.metrics.observe_session(target, duration, *relayed)
+        if self.outliers is not None:
+            self.outliers.record_success(target)
+        log_access(
+            self.client_host,
+            target.name,
+            target.host,
+            target.port,
+            "ok",
+            duration,
+            *relayed,
+        )
+        return keep_alive
+
+    async def connect(
+        self, target: Target
+    ) -> Optional[Tuple[Target, socket.socket, bool]]:
+        """
+        It takes a keep-alive connection to the target from the pools or connects to the target. If connection fails,
+        the request is given to the next target chosen by the failover policy, until it succeeds or the policy gives up
+        :param target: Target the request is counted on
+        :return: Target the request is given to, the connection to it and whether the connection is reused,
+                 or None if no one target is able to be connected
+        """
+        if self.pools is not None:
+            pooled_socket = self.pools.acquire(target)
+            if pooled_socket is not None:
+                pooled_socket.setblocking(False)
+                return (target, pooled_socket, True)
+
+        tried: List[Target] = []
+        while True:
+            tried.append(target)
+            try:
+                return (target, await self.open_connection(target), False)
+            except (OSError, asyncio.TimeoutError) as exc:
+                logger.error("Couldn't connect to the %s: %r", target, exc)
+                target.observe_latency(BALANCER_DEFAULT_EWMA_FAILURE_PENALTY)
+                if self.metrics is not None:
+                    self.metrics.add(target, Metrics.FAILED)
+                if self.outliers is not None:
+                    self.outliers.record_failure(target, f"connection failed: {exc!r}")
+                target.decrement_connections()
+            except asyncio.CancelledError:
+                target.decrement_connections()
+                raise
+
+            retry_target = self.failover.next_target(self.targets(), tried)
+            if retry_target is None:
+                logger.error(
+                    "No one target is able to process client '%s' request",
+                    self.client_host,
+                )
+                log_access(
+                    self.client_host, target.name, target.host, target.port, "failed"
+                )
+                return None
+            if self.metrics is not None:
+                self.metrics.add(retry_target, Metrics.RETRIES)
+            target = retry_target
+
+    async def open_connection(self, target: Target) -> socket.socket:
+        """
+        It connects to the target, connect time is observed as the target latency
+        :raises OSError: If connection fails or times out
+        """
+        loop = asyncio.get_running_loop()
+        target_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        target_socket.setblocking(False)
+        connect_started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(
+                loop.sock_connect(target_socket, (target.address, target.port)),
+                self.failover.connect_timeout,
+            )
+        except BaseException:
+            target_socket.close()
+            raise
+        connect_time = time.monotonic() - connect_started_at
+        target.observe_latency(connect_time)
+        if self.metrics is not None:
+            self.metrics.observe(target, self.metrics.connect_histogram, connect_time)
+        self.timeouts.keep_alive(target_socket)
+        return target_socket
+
+    async def exchange(
+        self,
+        request: HttpHead,
+        target: Target,
+        target_socket: socket.socket,
+        relayed: List[int],
+    ) -> Tuple[bool, bool]:
+        """
+        It sends the request to the target and relays the response. The request body is relayed concurrently with
+        the response, so a target is able to answer before the body is sent (e.g. with 100 Continue)
+        :param relayed: Bytes relayed from the client to the target and back, they're counted there
+        :return: Whether the connection to the target is able to be reused and whether the client connection
+                 is able to be kept
+        """
+        loop = asyncio.get_running_loop()
+        head = request.rebuild(
+            b"upgrade"
+            if request.upgrade
+            else (None if request.version == b"HTTP/1.1" else b"keep-alive")
+        )
+        self.target_buffer.clear()
+        body: Optional[asyncio.Task] = None
+        response_head_read: Optional[asyncio.Task] = None
+        try:
+            await self.send(target_socket, head)
+            sent_at = time.monotonic()
+            relayed[0] += len(head)
+            if request.has_body:
+                body = loop.create_task(
+                    self.relay_body(
+                        self.client_socket,
+                        self.client_buffer,
+                        target_socket,
+                        self.upstream_view,
+                        request.content_length,
+                        request.chunked,
+                        relayed,
+                        0,
+                    )
+                )
+                response_head_read = loop.create_task(
+                    self.read_response_head(request, target_socket)
+                )
+                # The body may fail (e.g. the client is gone) while the target still waits for it
+                await asyncio.wait(
+                    (body, response_head_read), return_when=asyncio.FIRST_COMPLETED
+                )
+                if body.done() and body.exception() is not None:
+                    raise body.exception()  # type: ignore
+            # The target isn't timed out while it's waiting for the body, the body is timed out by itself
+            response = await self.within(
+                response_head_read or self.read_response_head(request, target_socket),
+                self.timeouts.idle_read,
+                f"target didn't respond for {self.timeouts.idle_read:g}s",
+            )
+            if response is None:
+                raise ConnectionError("Target closed the connection before responding")
+        except BaseException:
+            if body is not None:
+                body.cancel()
+            if response_head_read is not None:
+                response_head_read.cancel()
+            raise
+        target.observe_latency(time.monotonic() - sent_at)
+
+        if response.status == 101:
+            await self.tunnel(response, target_socket, relayed)
+            return (False, False)
+
+        has_body = response.response_has_body(request)
+        # A body of unknown length ends when the target closes the connection
+        delimited = (
+            not has_body or response.chunked or response.content_length is not None
+        )
+        keep_alive = request.keep_alive and delimited and self.keep_going is True
+        response_head = response.rebuild(
+            None
+            if keep_alive and request.version == b"HTTP/1.1"
+            else (b"keep-alive" if keep_alive else b"close")
+        )
+        await self.send(self.client_socket, response_head)
+        relayed[1] += len(response_head)
+        if has_body:
+            await self.relay_body(
+                target_socket,
+                self.target_buffer,
+                self.client_socket,
+                self.downstream_view,
+                response.content_length,
+                response.chunked,
+                relayed,
+                1,
+            )
+
+        if body is not None and not body.done():
+            # The target answered before the whole body is sent, the rest of it isn't able to be told apart
+            body.cancel()
+            return (False, False)
+        if body is not None and body.exception() is not None:
+            raise body.exception()  # type: ignore
+        reusable = response.keep_alive and delimited and not self.target_buffer
+        return (reusable, keep_alive)
+
+    async def read_response_head(
+        self, request: HttpHead, target_socket: socket.socket
+    ) -> Optional[HttpHead]:
+        """It reads the final response head, interim responses (e.g. 100 Continue) are relayed to the client"""
+        while True:
+            response = await self.read_head(target_socket, self.target_buffer, False)
+            if response is None or not 100 <= response.status < 200:
+                return response
+            if response.status == 101:
+                return response
+            if request.version == b"HTTP/1.1":
+                await self.send(self.client_socket, response.rebuild())
+
+    async def relay_body(
+        self,
+        source: socket.socket,
+        buffer: bytearray,
+        destination: socket.socket,
+        view: memoryview,
+        length: Optional[int],
+        chunked: bool,
+        relayed: List[int],
+        direction: int,
+        timed: bool = True,
+    ) -> None:
+        """
+        It relays a message body from the source, starting with the bytes already received into the buffer.
+        Bytes that follow the body are left in the buffer
+        :param length: Bytes of the body, if it isn't chunked. None means the body ends when the source is closed
+        :param direction: Position of the counter of the relayed bytes
+        :param timed: Whether the source is timed out once it's idle for longer than the idle read timeout
+        :raises HttpClientError: If the body is malformed or the connection fails on the client side
+        :raises RelayTimeoutError: If the target side is idle for longer than its timeouts allow
+        """
+        if chunked:
+            parser = ChunkedBody()
+            while True:
+                if buffer:
+                    try:
+                        parsed = parser.feed(buffer)
+                    except HttpProtocolError as exc:
+                        raise self.blame(source, exc)
+                    if parsed:
+                        await self.send(destination, bytes(buffer[:parsed]))
+                        del buffer[:parsed]
+                        relayed[direction] += parsed
+                    if parser.done:
+                        return
+                if parser.expects_data and not buffer:
+                    # Chunk data isn't buffered, it's relayed right away
+                    received = await self.receive(
+                        source, view[: min(parser.remaining, len(view))], timed
+                    )
+                    await self.send(destination, view[:received])
+                    parser.skip(received)
+                    relayed[direction] += received
+                    continue
+                received = await self.receive(source, view, timed)
+                buffer += view[:received]
+
+        remaining = -1 if length is None else length
+        if buffer:
+            part = len(buffer) if remaining < 0 else min(len(buffer), remaining)
+            await self.send(destination, bytes(buffer[:part]))
+            del buffer[:part]
+            relayed[direction] += part
+            remaining -= part if remaining >= 0 else 0
+        while remaining != 0:
+            size = len(view) if remaining < 0 else min(remaining, len(view))
+            received = await self.receive(source, view[:size], timed, remaining < 0)
+            if not received:
+                return  # The body is delimited by closing the connection
+            await self.send(destination, view[:received])
+            relayed[direction] += received
+            if remaining > 0:
+                remaining -= received
+
+    async def receive(
+        self,
+        source: socket.socket,
+        view: memoryview,
+        timed: bool = True,
+        closing_ends: bool = False,
+    ) -> int:
+        """
+        It receives a part of a message body from the source
+        :param timed: Whether the idle read timeout applies
+        :param closing_ends: Whether the body ends when the source is closed
+        :return: Amount of the received bytes, 0 only if closing ends the body
+        :raises HttpClientError: If the source is the client and its connection fails
+        """
+        try:
+            received = await self.within(
+                asyncio.get_running_loop().sock_recv_into(source, view),
+                self.timeouts.idle_read if timed else 0,
+                f"no data was received for {self.timeouts.idle_read:g}s",
+            )
+            if not received and not closing_ends:
+                raise ConnectionError("Connection is closed in the middle of a body")
+        except OSError as exc:
+            raise self.blame(source, exc)
+        return received
+
+    async def send(self, destination: socket.socket, data: bytes | memoryview) -> None:
+        """
+        It sends the data to the destination
+        :raises HttpClientError: If the destination is the client and its connection fails
+        """
+        try:
+            await self.within(
+                asyncio.get_running_loop().sock_sendall(destination, data),
+                self.timeouts.idle_write,
+                f"relayed data wasn't taken for {self.timeouts.idle_write:g}s",
+            )
+        except OSError as exc:
+            raise self.blame(destination, exc)
+
+    @staticmethod
+    async def within(awaitable: Awaitable, timeout: float, reason: str) -> Any:
+        """
+        It awaits the awaitable for the timeout at most, 0 means it isn't limited
+        :raises RelayTimeoutError: If the timeout expires, with the reason
+        """
+        if timeout == 0:
+            return await awaitable
+        try:
+            return await asyncio.wait_for(awaitable, timeout)
+        except asyncio.TimeoutError:
+            raise RelayTimeoutError(reason) from None
+
+    def blame(self, sock: socket.socket, exc: Exception) -> Exception:
+        """It turns the failure into :class:`HttpClientError` if it's the client connection that failed"""
+        if sock is not self.client_socket:
+            return exc
+        if isinstance(exc, HttpProtocolError):
+            return HttpClientError(str(exc), exc.status)
+        if isinstance(exc, RelayTimeoutError):
+            return HttpClientError(f"Client timed out: {exc}", 408)
+        return HttpClientError(f"Client connection failed: {exc!r}")
+
+    async def tunnel(
+        self, response: HttpHead, target_socket: socket.socket, relayed: List[int]
+    ) -> None:
+        """It relays the upgraded connection as it is, in both directions, until one of the sides closes it"""
+        loop = asyncio.get_running_loop()
+        response_head = response.rebuild(b"upgrade")
+        await self.send(self.client_socket, response_head)
+        relayed[1] += len(response_head)
+        pipes = [
+            loop.create_task(
+                self.relay_body(
+                    self.client_socket,
+                    self.client_buffer,
+                    target_socket,
+                    self.upstream_view,
+                    None,
+                    False,
+                    relayed,
+                    0,
+                    False,
+                )
+            ),
+            loop.create_task(
+                self.relay_body(
+                    target_socket,
+                    self.target_buffer,
+                    self.client_socket,
+                    self.downstream_view,
+                    None,
+                    False,
+                    relayed,
+                    1,
+                    False,
+                )
+            ),
+        ]
+        try:
+            # Either side is able to keep the tunnel going, so it's idle only while neither of them sends
+            idle_read = self.timeouts.idle_read or None
+            while True:
+                last = relayed[:]
+                (done, _) = await asyncio.wait(
+                    pipes, timeout=idle_read, return_when=asyncio.FIRST_COMPLETED
+                )
+                if done:
+                    break
+                if relayed == last:
+                    logger.info(
+                        "Upgraded connection of client '%s' is idle for %gs, closing it",
+                        self.client_host,
+                        idle_read,
+                    )
+                    break
+        finally:
+            for pipe in pipes:
+                pipe.cancel()
+
+    async def respond_error(self, status: int) -> None:
+        """It gives the client a response of the status, if the client is still there"""
+        try:
+            await asyncio.get_running_loop().sock_sendall(
+                self.client_socket, error_response(status)
+            )
+        except OSError:
+            pass  # Client is already gone
+
+    @staticmethod
+    def close_socket(sock: socket.socket) -> None:
+        try:
+            sock.shutdown(socket.SHUT_RDWR)
+        except OSError:
+            pass  # Peer is already gone, nothing to shut down
+        sock.close()
+
+    def __str__(self):
+        return f"<{__class__.__name__} from={f'%s:%d' % self.client_host}>"
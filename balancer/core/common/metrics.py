@@ -0,0 +1,505 @@
+import multiprocessing
+import os
+import threading
+from bisect import bisect_left
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_METRICS_BIND_RETRY_WAITING,
+    BALANCER_DEFAULT_METRICS_CONNECT_BUCKETS,
+    BALANCER_DEFAULT_METRICS_SESSION_BUCKETS,
+    BALANCER_DEFAULT_METRICS_SHARDS,
+    BALANCER_DEFAULT_METRICS_SPARE_SLOTS,
+)
+from balancer.core.common.admission import AdmissionQueue
+from balancer.core.common.ratelimit import RateLimiter
+from balancer.core.common.target import Target
+from balancer.core.common.tls import TlsPolicy
+from balancer.core.common.udp import UdpPolicy
+from balancer.core.logger import logger
+
+
+class Histogram:
+    """Layout of a histogram in the metrics memory: a counter per bucket (the last one is +Inf) and a sum"""
+
+    def __init__(self, offset: int, buckets: Tuple[float, ...]) -> None:
+        self.offset = offset
+        self.buckets = buckets
+        self.size = len(buckets) + 2  # Buckets, +Inf bucket and sum
+
+    def bucket_of(self, value: float) -> int:
+        """It returns position of the bucket that counts the value"""
+        return self.offset + bisect_left(self.buckets, value)
+
+    @property
+    def sum_position(self) -> int:
+        return self.offset + self.size - 1
+
+
+class Metrics:
+    """
+    Counters and histograms of the balancer, kept in shared memory created before balancer processes are forked,
+    so every relay (thread, process or coroutine) counts into them. Memory is split into shards, each one with its own
+    lock, and a process counts into the shard picked by its pid, so relays rarely wait for each other.
+    Reading sums the shards up, it's done on scrapes only.
+    Values are kept in a slot per target name, spare slots are reserved for targets added by reloads
+    """
+
+    # Counters of a target
+    ACCEPTED = 0  # Connections given to the target
+    FAILED = 1  # Connections to the target that failed
+    RETRIES = 2  # Connections given to the target as a retry
+    BYTES_IN = 3  # Bytes relayed from clients to the target
+    BYTES_OUT = 4  # Bytes relayed from the target to clients
+    EJECTIONS = 5  # Times the target was ejected as an outlier
+    COUNTERS = 6
+
+    def __init__(
+        self,
+        targets: Iterable[Target],
+        shards: int = BALANCER_DEFAULT_METRICS_SHARDS,
+        connect_buckets: Tuple[float, ...] = BALANCER_DEFAULT_METRICS_CONNECT_BUCKETS,
+        session_buckets: Tuple[float, ...] = BALANCER_DEFAULT_METRICS_SESSION_BUCKETS,
+        spare_slots: int = BALANCER_DEFAULT_METRICS_SPARE_SLOTS,
+    ) -> None:
+        self.names: List[str] = []
+        self.slots: Dict[str, int] = {}
+        targets = list(targets)
+        self.capacity = len(targets) + spare_slots
+        self.connect_histogram = Histogram(self.COUNTERS, connect_buckets)
+        self.session_histogram = Histogram(
+            self.connect_histogram.offset + self.connect_histogram.size,
+            session_buckets,
+        )
+        # Values of a target
+        self.stride = self.session_histogram.offset + self.session_histogram.size
+        self.shard_size = self.stride * self.capacity
+
+        self.shards = shards
+        # Doubles hold integers exactly up to 2**53, that's enough for counters
+        self.__values = multiprocessing.RawArray("d", self.shard_size * shards)
+        self.__locks = [multiprocessing.Lock() for _ in range(shards)]
+        self.register(targets)
+
+    def register(self, targets: Iterable[Target]) -> None:
+        """
+        It gives slots to the targets that are not counted yet. It must be called before the processes that count
+        into the metrics are forked, so they know the slots
+        """
+        for target in targets:
+            if target.name in self.slots:
+                continue
+            if len(self.names) >= self.capacity:
+                logger.warning(
+                    f"There is no spare metrics slot for the {target}, it isn't counted until restart"
+                )
+                continue
+            self.slots[target.name] = len(self.names)
+            self.names.append(target.name)
+
+    def __base(self, target: Target) -> int:
+        """It returns position of the target values in the shard, or -1 if the target isn't known"""
+        slot = self.slots.get(target.name, -1)
+        return -1 if slot < 0 else slot * self.stride
+
+    def add(self, target: Target, counter: int, value: float = 1) -> None:
+        """It adds the value to the counter of the target"""
+        base = self.__base(target)
+        if base < 0:
+            return
+        shard = os.getpid() % self.shards
+        position = shard * self.shard_size + base + counter
+        with self.__locks[shard]:
+            self.__values[position] += value
+
+    def observe(self, target: Target, histogram: Histogram, value: float) -> None:
+        """It counts the value in the histogram of the target"""
+        base = self.__base(target)
+        if base < 0:
+            return
+        shard = os.getpid() % self.shards
+        start = shard * self.shard_size + base
+        with self.__locks[shard]:
+            self.__values[start + histogram.bucket_of(value)] += 1
+            self.__values[start + histogram.sum_position] += value
+
+    def observe_session(
+        self, target: Target, duration: float, bytes_in: int, bytes_out: int
+    ) -> None:
+        """It counts a completed session with the target at once, so a relay takes the lock once"""
+        base = self.__base(target)
+        if base < 0:
+            return
+        shard = os.getpid() % self.shards
+        start = shard * self.shard_size + base
+        histogram = self.session_histogram
+        with self.__locks[shard]:
+            self.__values[start + self.BYTES_IN] += bytes_in
+            self.__values[start + self.BYTES_OUT] += bytes_out
+            self.__values[start + histogram.bucket_of(duration)] += 1
+            self.__values[start + histogram.sum_position] += duration
+
+    def read(self, name: str) -> List[float]:
+        """It returns values of the target by name summed up over the shards"""
+        base = self.slots[name] * self.stride
+        values = [0.0] * self.stride
+        for shard in range(self.shards):
+            start = shard * self.shard_size + base
+            for i in range(self.stride):
+                values[i] += self.__values[start + i]
+        return values
+
+
+def read_accept_queue_length(port: int) -> Optional[int]:
+    """
+    It returns amount of connections waiting to be accepted on the port, summed up over all the listening sockets
+    (e.g. of all the balancers sharing the port). For listening sockets the kernel reports the accept queue length
+    as the receive queue in ``/proc/net/tcp``, so it's Linux only
+    :return: The length or None if it's unknown on the platform
+    """
+    length = None
+    for path in ("/proc/net/tcp", "/proc/net/tcp6"):
+        try:
+            with open(path) as table:
+                next(table)  # Header
+                for line in table:
+                    fields = line.split()
+                    # Fields are: sl, local address, remote address, state, queues, ...
+                    (_, local_port) = fields[1].rsplit(":", 1)
+                    if fields[3] != "0A" or int(local_port, 16) != port:
+                        continue  # Not the listening socket of the port
+                    (_, receive_queue) = fields[4].split(":")
+                    length = (length or 0) + int(receive_queue, 16)
+        except OSError:
+            continue
+    return length
+
+
+class MetricsServer:
+    """
+    Class that serves the metrics in the Prometheus text format over HTTP in a background thread
+    """
+
+    def __init__(
+        self,
+        metrics: Metrics,
+        host: str,
+        port: int,
+        admission: Optional[AdmissionQueue] = None,
+        rate_limiter: Optional[RateLimiter] = None,
+        tls: Optional[TlsPolicy] = None,
+        udp: Optional[UdpPolicy] = None,
+    ) -> None:
+        self.metrics = metrics
+        self.admission = admission  # Its depth and waits are reported, if given
+        self.rate_limiter = rate_limiter  # Its rejections are reported, if given
+        self.tls = tls  # Its handshakes are reported, if given
+        self.udp = udp  # Its closed flows and dropped datagrams are reported, if given
+        self.host = host
+        self.port = port
+        self.targets: List[Target] = []
+        self.listen_port: int = 0  # Port of the balancers, to report its accept queue
+        self.__server: ThreadingHTTPServer = None  # type: ignore
+        self.__stopped = threading.Event()
+        # Serializes binding the port later with stopping
+        self.__lock = threading.Lock()
+
+    def start(self, targets: Iterable[Target], listen_port: int) -> None:
+        """It starts serving the metrics of the targets"""
+        self.targets = list(targets)
+        self.listen_port = listen_port
+        server = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = server.render().encode()
+                self.send_response(200)
+                self.send_header("Content-Type", "text/plain; version=0.0.4")
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass  # Scrapes are not worth logging
+
+        try:
+            self.serve(Handler)
+        except OSError as exc:
+            # E.g. the port is held by the balancer being upgraded until it drains
+            logger.warning(
+                f"Metrics port {self.port} isn't bound: {exc!r}. "
+                f"Retrying every {BALANCER_DEFAULT_METRICS_BIND_RETRY_WAITING}s ..."
+            )
+            threading.Thread(
+                target=self.serve_later, args=(Handler,), daemon=True
+            ).start()
+
+    def serve(self, handler: Callable[..., BaseHTTPRequestHandler]) -> None:
+        """
+        It binds the port and serves the metrics in a background thread
+        :raises OSError: If the port is unable to be bound
+        """
+        with self.__lock:
+            if self.__stopped.is_set():
+                return
+            self.__server = ThreadingHTTPServer((self.host, self.port), handler)
+            self.__server.daemon_threads = True
+            threading.Thread(target=self.__server.serve_forever, daemon=True).start()
+        logger.info(f"Metrics are served on http://{self.host}:{self.port}/metrics")
+
+    def serve_later(self, handler: Callable[..., BaseHTTPRequestHandler]) -> None:
+        """It retries binding the port until it succeeds or the server is stopped"""
+        while not self.__stopped.wait(BALANCER_DEFAULT_METRICS_BIND_RETRY_WAITING):
+            try:
+                self.serve(handler)
+            except OSError:
+                continue
+            return
+
+    def update_targets(self, targets: Iterable[Target]) -> None:
+        """It makes the server to report the reloaded targets"""
+        self.targets = list(targets)
+
+    def render(self) -> str:
+        """It renders the metrics in the Prometheus text format"""
+        metrics = self.metrics
+        lines: List[str] = []
+
+        def family(name: str, kind: str, description: str) -> None:
+            lines.append(f"# HELP {name} {description}")
+            lines.append(f"# TYPE {name} {kind}")
+
+        targets = [target for target in self.targets if target.name in metrics.slots]
+        values = {target.name: metrics.read(target.name) for target in targets}
+        counters = (
+            ("accepted", Metrics.ACCEPTED, "Connections given to the target"),
+            ("failed", Metrics.FAILED, "Connections to the target that failed"),
+            ("retried", Metrics.RETRIES, "Connections given to the target as a retry"),
+        )
+        for (name, counter, description) in counters:
+            family(f"balancer_connections_{name}_total", "counter", description)
+            for target in targets:
+                lines.append(
+                    f'balancer_connections_{name}_total{{target="{target.name}"}} '
+                    f"{values[target.name][counter]:.0f}"
+                )
+
+        family("balancer_connections_active", "gauge", "Connections being relayed")
+        for target in targets:
+            lines.append(
+                f'balancer_connections_active{{target="{target.name}"}} {target.active_connections}'
+            )
+        limited = [target for target in targets if target.max_conns > 0]
+        if limited:
+            family(
+                "balancer_connections_limit",
+                "gauge",
+                "Connections the target is able to be given at once",
+            )
+            for target in limited:
+                lines.append(
+                    f'balancer_connections_limit{{target="{target.name}"}} {target.max_conns}'
+                )
+        family("balancer_target_healthy", "gauge", "Whether the target is healthy")
+        for target in targets:
+            lines.append(
+                f'balancer_target_healthy{{target="{target.name}"}} {int(target.healthy)}'
+            )
+        family(
+            "balancer_target_ejected",
+            "gauge",
+            "Whether the target is ejected as an outlier",
+        )
+        for target in targets:
+            lines.append(
+                f'balancer_target_ejected{{target="{target.name}"}} {int(target.ejected)}'
+            )
+        family(
+            "balancer_target_ejections_total",
+            "counter",
+            "Times the target was ejected as an outlier",
+        )
+        for target in targets:
+            lines.append(
+                f'balancer_target_ejections_total{{target="{target.name}"}} '
+                f"{values[target.name][Metrics.EJECTIONS]:.0f}"
+            )
+
+        for (direction, counter) in (
+            ("in", Metrics.BYTES_IN),
+            ("out", Metrics.BYTES_OUT),
+        ):
+            family(
+                f"balancer_bytes_{direction}_total",
+                "counter",
+                f"Bytes relayed {'from clients to' if direction == 'in' else 'to clients from'} the target",
+            )
+            for target in targets:
+                lines.append(
+                    f'balancer_bytes_{direction}_total{{target="{target.name}"}} '
+                    f"{values[target.name][counter]:.0f}"
+                )
+
+        histograms = (
+            ("connect", metrics.connect_histogram, "Time to connect to the target"),
+            ("session", metrics.session_histogram, "Time a connection is relayed"),
+        )
+        for (name, histogram, description) in histograms:
+            family(f"balancer_{name}_duration_seconds", "histogram", description)
+            for target in targets:
+                target_values = values[target.name]
+                labels = f'target="{target.name}"'
+                cumulative = 0.0
+                for (i, bound) in enumerate((*histogram.buckets, float("inf"))):
+                    cumulative += target_values[histogram.offset + i]
+                    le = "+Inf" if bound == float("inf") else repr(bound)
+                    lines.append(
+                        f'balancer_{name}_duration_seconds_bucket{{{labels},le="{le}"}} {cumulative:.0f}'
+                    )
+                lines.append(
+                    f"balancer_{name}_duration_seconds_sum{{{labels}}} {target_values[histogram.sum_position]}"
+                )
+                lines.append(
+                    f"balancer_{name}_duration_seconds_count{{{labels}}} {cumulative:.0f}"
+                )
+
+        if self.admission is not None:
+            self.render_admission(self.admission, family, lines)
+        if self.rate_limiter is not None:
+            rejections = self.rate_limiter.read()
+            family(
+                "balancer_rate_limited_total",
+                "counter",
+                "Connections rejected as they were over the rate limit",
+            )
+            for (scope, counter) in (
+                ("client", RateLimiter.LIMITED_CLIENT),
+                ("total", RateLimiter.LIMITED_TOTAL),
+            ):
+                lines.append(
+                    f'balancer_rate_limited_total{{scope="{scope}"}} {rejections[counter]}'
+                )
+            family(
+                "balancer_rate_limit_evictions_total",
+                "counter",
+                "Buckets of clients evicted from the rate limit table",
+            )
+            lines.append(
+                f"balancer_rate_limit_evictions_total {rejections[RateLimiter.EVICTED]}"
+            )
+        if self.tls is not None:
+            handshakes = self.tls.read()
+            family(
+                "balancer_tls_handshakes_total",
+                "counter",
+                "TLS handshakes with clients by their result",
+            )
+            for (result, counter) in (
+                ("full", TlsPolicy.FULL),
+                ("resumed", TlsPolicy.RESUMED),
+                ("failed", TlsPolicy.FAILED),
+            ):
+                lines.append(
+                    f'balancer_tls_handshakes_total{{result="{result}"}} {handshakes[counter]}'
+                )
+        if self.udp is not None:
+            self.render_udp(self.udp, family, lines)
+
+        queue_length = read_accept_queue_length(self.listen_port)
+        if queue_length is not None:
+            family(
+                "balancer_accept_queue_length",
+                "gauge",
+                "Connections waiting to be accepted",
+            )
+            lines.append(f"balancer_accept_queue_length {queue_length}")
+        return "\n".join(lines) + "\n"
+
+    @staticmethod
+    def render_admission(
+        admission: AdmissionQueue,
+        family: Callable[[str, str, str], None],
+        lines: List[str],
+    ) -> None:
+        """It renders depth of the admission queue, rejected clients and the wait time of the admitted ones"""
+        state = admission.read()
+        family(
+            "balancer_admission_queue_depth",
+            "gauge",
+            "Clients waiting for a saturated target to have room",
+        )
+        lines.append(
+            f"balancer_admission_queue_depth {state[AdmissionQueue.DEPTH]:.0f}"
+        )
+        family(
+            "balancer_admission_rejected_total",
+            "counter",
+            "Clients rejected as the targets were saturated",
+        )
+        for (reason, field) in (
+            ("queue_full", AdmissionQueue.REJECTED),
+            ("timeout", AdmissionQueue.TIMED_OUT),
+        ):
+            lines.append(
+                f'balancer_admission_rejected_total{{reason="{reason}"}} {state[field]:.0f}'
+            )
+        family(
+            "balancer_admission_wait_duration_seconds",
+            "histogram",
+            "Time clients waited in the admission queue before they were admitted",
+        )
+        cumulative = 0.0
+        for (i, bound) in enumerate((*admission.wait_buckets, float("inf"))):
+            cumulative += state[AdmissionQueue.WAIT_BUCKETS + i]
+            le = "+Inf" if bound == float("inf") else repr(bound)
+            lines.append(
+                f'balancer_admission_wait_duration_seconds_bucket{{le="{le}"}} {cumulative:.0f}'
+            )
+        lines.append(
+            f"balancer_admission_wait_duration_seconds_sum {state[AdmissionQueue.WAIT_SUM]}"
+        )
+        lines.append(f"balancer_admission_wait_duration_seconds_count {cumulative:.0f}")
+
+    def stop(self) -> None:
+        """It stops serving the metrics"""
+        with self.__lock:
+            self.__stopped.set()
+            (server, self.__server) = (self.__server, None)  # type: ignore
+        if server is not None:
+            server.shutdown()
+            server.server_close()
+
+    @staticmethod
+    def render_udp(
+        udp: UdpPolicy,
+        family: Callable[[str, str, str], None],
+        lines: List[str],
+    ) -> None:
+        """It renders closed flows and dropped datagrams of the UDP mode"""
+        counters = udp.read()
+        family(
+            "balancer_udp_flows_closed_total",
+            "counter",
+            "UDP flows closed by the balancer by the reason",
+        )
+        for (reason, counter) in (
+            ("idle", UdpPolicy.EXPIRED),
+            ("evicted", UdpPolicy.EVICTED),
+            ("failed", UdpPolicy.FAILED),
+        ):
+            lines.append(
+                f'balancer_udp_flows_closed_total{{reason="{reason}"}} {counters[counter]}'
+            )
+        family(
+            "balancer_udp_datagrams_dropped_total",
+            "counter",
+            "Datagrams dropped by the balancer by the reason",
+        )
+        for (reason, counter) in (
+            ("saturated", UdpPolicy.DROPPED_SATURATED),
+            ("overflow", UdpPolicy.DROPPED_OVERFLOW),
+        ):
+            lines.append(
+                f'balancer_udp_datagrams_dropped_total{{reason="{reason}"}} {counters[counter]}'
+            )
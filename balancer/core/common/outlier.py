@@ -0,0 +1,128 @@
+import math
+from typing import Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_OUTLIER_BASE_EJECTION_TIME,
+    BALANCER_DEFAULT_OUTLIER_CONSECUTIVE_FAILURES,
+    BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_PERCENT,
+    BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_TIME,
+    BALANCER_DEFAULT_OUTLIER_SHORT_SESSION,
+    BALANCER_DEFAULT_OUTLIER_SLOW_START,
+)
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.target import Target
+from balancer.core.logger import logger
+
+
+class OutlierDetector:
+    """
+    Class that ejects targets which keep failing the connections given to them, although they may pass health checks
+    (e.g. they reset connections or close them right away). Relays report each connection: failed connects,
+    resets by the target and sessions the target closed without responding are failures, other sessions are successes.
+    A target is ejected after a number of failures in a row, for a time that doubles with each ejection in a row,
+    and it ramps back up to its full share of connections once it returns. Failures and ejections are kept
+    in the shared target counters, so the detector is common for all the balancer processes
+    """
+
+    def __init__(
+        self,
+        consecutive_failures: int = BALANCER_DEFAULT_OUTLIER_CONSECUTIVE_FAILURES,
+        short_session: float = BALANCER_DEFAULT_OUTLIER_SHORT_SESSION,
+        base_ejection_time: float = BALANCER_DEFAULT_OUTLIER_BASE_EJECTION_TIME,
+        max_ejection_time: float = BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_TIME,
+        max_ejection_percent: float = BALANCER_DEFAULT_OUTLIER_MAX_EJECTION_PERCENT,
+        slow_start: float = BALANCER_DEFAULT_OUTLIER_SLOW_START,
+        metrics: Optional[Metrics] = None,
+    ) -> None:
+        """
+        :param consecutive_failures: Failures in a row that eject a target
+        :param short_session: Seconds a session the target closed without responding is taken as a failure within,
+            0 means such sessions are not failures
+        :param base_ejection_time: Seconds of the first ejection, each ejection in a row doubles it
+        :param max_ejection_time: Seconds an ejection takes at most
+        :param max_ejection_percent: Percent of the targets that are able to be ejected at once,
+            one target is ejectable anyway
+        :param slow_start: Seconds a returned target takes to get its full share of connections, 0 disables it
+        :param metrics: Metrics the ejections are counted by, if enabled
+        """
+        if consecutive_failures < 1:
+            raise ValueError(
+                f"Argument 'consecutive_failures' should be positive, got: {consecutive_failures}"
+            )
+        if short_session < 0 or slow_start < 0:
+            raise ValueError(
+                f"Durations should be non-negative, got: short_session={short_session}, slow_start={slow_start}"
+            )
+        if base_ejection_time <= 0 or max_ejection_time < base_ejection_time:
+            raise ValueError(
+                f"Ejection time should be positive and not exceed its maximum, got: "
+                f"base_ejection_time={base_ejection_time}, max_ejection_time={max_ejection_time}"
+            )
+        if not 0 <= max_ejection_percent <= 100:
+            raise ValueError(
+                f"Argument 'max_ejection_percent' should be between 0 and 100, got: {max_ejection_percent}"
+            )
+
+        self.consecutive_failures = consecutive_failures
+        self.short_session = short_session
+        self.base_ejection_time = base_ejection_time
+        self.max_ejection_time = max_ejection_time
+        self.max_ejection_percent = max_ejection_percent
+        self.slow_start = slow_start
+        self.metrics = metrics
+
+    def record_failure(self, target: Target, reason: str) -> None:
+        """It counts a failed connection to the target and ejects the target once it fails enough times in a row"""
+        failures = target.record_failure()
+        if failures < self.consecutive_failures:
+            return
+        counters = target.counters
+        size = counters.size if counters is not None else 1
+        max_ejected = max(math.floor(size * self.max_ejection_percent / 100), 1)
+        duration = target.eject(
+            self.base_ejection_time,
+            self.max_ejection_time,
+            max_ejected,
+            self.slow_start,
+        )
+        if duration == 0:
+            if not target.ejected:
+                logger.warning(
+                    f"Target {target} failed {failures} times in a row, but it isn't ejected "
+                    f"as {max_ejected} targets are ejected already"
+                )
+            return
+        if self.metrics is not None:
+            self.metrics.add(target, Metrics.EJECTIONS)
+        logger.warning(
+            f"Target {target} is ejected for {duration:g}s after {failures} failures in a row, "
+            f"the last one is: {reason}"
+        )
+
+    def record_success(self, target: Target) -> None:
+        """It counts a connection to the target that was relayed successfully"""
+        target.record_success()
+
+    def record_session(
+        self,
+        target: Target,
+        duration: float,
+        received: int,
+        closed_by_target: bool,
+        reset_by_target: bool,
+    ) -> None:
+        """
+        It counts a completed session with the target as a failure or a success
+        :param duration: Seconds the session lasted
+        :param received: Bytes received from the target
+        :param closed_by_target: Whether the target closed the connection first
+        :param reset_by_target: Whether the connection to the target was reset
+        """
+        if reset_by_target:
+            self.record_failure(target, "connection is reset")
+        elif closed_by_target and received == 0 and duration < self.short_session:
+            self.record_failure(
+                target, f"connection is closed without response in {duration:.3f}s"
+            )
+        else:
+            target.record_success()
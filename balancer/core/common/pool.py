@@ -0,0 +1,243 @@
+import os
+import select
+import socket
+import threading
+import time
+from collections import deque
+from typing import Deque, Dict, Iterable, Optional, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_POOL_CONNECT_TIMEOUT,
+    BALANCER_DEFAULT_POOL_FILL_INTERVAL,
+    BALANCER_DEFAULT_POOL_MAX_AGE,
+    BALANCER_DEFAULT_POOL_MAX_IDLE,
+    BALANCER_DEFAULT_POOL_MIN_IDLE,
+)
+from balancer.core.common.target import Target
+from balancer.core.logger import logger
+
+
+class TargetConnectionPool:
+    """
+    Pool of idle sockets that are connected to a target in advance,
+    so the connect latency is taken off the client's critical path
+    """
+
+    def __init__(
+        self,
+        target: Target,
+        min_idle: int = BALANCER_DEFAULT_POOL_MIN_IDLE,
+        max_idle: int = BALANCER_DEFAULT_POOL_MAX_IDLE,
+        max_age: float = BALANCER_DEFAULT_POOL_MAX_AGE,
+    ) -> None:
+        if min_idle < 0 or max_idle < min_idle:
+            raise ValueError(
+                f"Pool limits should satisfy 0 <= min_idle <= max_idle, got: min_idle={min_idle}, max_idle={max_idle}"
+            )
+
+        self.target = target
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.__idle: Deque[Tuple[float, socket.socket]] = deque()  # Oldest on the left
+        # Socket that is being connected by the fill thread, until it's pooled
+        self.__connecting: Optional[socket.socket] = None
+        self.__lock = threading.Lock()
+
+    def __len__(self) -> int:
+        return len(self.__idle)
+
+    def is_usable(self, connected_at: float, sock: socket.socket) -> bool:
+        """
+        Checks if the pooled socket is still able to be used: it's not too old and not closed (or half-closed)
+        by the target. An idle connection must have nothing to read, so any readable state means it's stale
+        """
+        if time.monotonic() - connected_at > self.max_age:
+            return False
+        try:
+            (read, _, err) = select.select([sock], [], [sock], 0)
+        except (OSError, ValueError):
+            return False
+        return not read and not err
+
+    def acquire(self) -> Optional[socket.socket]:
+        """
+        It takes the most recently connected socket from the pool. Stale sockets met on the way are discarded
+        :return: Connected socket or None if the pool has no usable sockets
+        """
+        while True:
+            with self.__lock:
+                if not self.__idle:
+                    return None
+                (connected_at, sock) = self.__idle.pop()
+            if self.is_usable(connected_at, sock):
+                return sock
+            logger.debug("Discard stale pooled connection to %s", self.target)
+            sock.close()
+
+    def release(self, sock: socket.socket) -> None:
+        """It puts a connected socket back to the pool or closes it if the pool already holds enough sockets"""
+        with self.__lock:
+            if len(self.__idle) < self.max_idle:
+                self.__idle.append((time.monotonic(), sock))
+                return
+        sock.close()
+
+    def fill(self) -> None:
+        """
+        It discards stale sockets and then connects new ones until the pool holds at least ``min_idle`` sockets
+        """
+        with self.__lock:
+            pooled = list(self.__idle)
+        # Usable sockets are kept in the pool meanwhile, so they're able to be acquired
+        stale = [entry for entry in pooled if not self.is_usable(*entry)]
+        for entry in stale:
+            with self.__lock:
+                try:
+                    self.__idle.remove(entry)
+                except ValueError:
+                    continue  # It's acquired meanwhile
+            entry[1].close()
+
+        while len(self.__idle) < self.min_idle:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            self.__connecting = sock
+            try:
+                sock.settimeout(BALANCER_DEFAULT_POOL_CONNECT_TIMEOUT)
+                sock.connect((self.target.address, self.target.port))
+            except OSError as exc:
+                sock.close()
+                logger.debug("Couldn't pre-connect to the %s: %s", self.target, exc)
+                return
+            finally:
+                self.__connecting = None
+            sock.settimeout(None)
+            self.release(sock)
+
+    def close(self) -> None:
+        """It closes all the pooled sockets"""
+        with self.__lock:
+            pooled = list(self.__idle)
+            self.__idle.clear()
+        for (_, sock) in pooled:
+            sock.close()
+
+    def close_inherited(self) -> None:
+        """
+        It closes the sockets a forked process inherited from the pool, so a connection closed by the balancer
+        isn't kept open by its workers. It's called in the child right after the fork, while the child has
+        a single thread, so the lock that may be held by another thread of the parent isn't taken
+        """
+        self.__lock = threading.Lock()
+        sockets = [sock for (_, sock) in self.__idle]
+        if self.__connecting is not None:
+            sockets.append(self.__connecting)
+        self.__idle.clear()
+        self.__connecting = None
+        for sock in sockets:
+            sock.close()
+
+
+class ConnectionPools:
+    """
+    Class that keeps a :class:`TargetConnectionPool` per target and refills them in a background thread.
+    Pools are created on start, so each balancer process owns its own sockets
+    """
+
+    def __init__(
+        self,
+        min_idle: int = BALANCER_DEFAULT_POOL_MIN_IDLE,
+        max_idle: int = BALANCER_DEFAULT_POOL_MAX_IDLE,
+        max_age: float = BALANCER_DEFAULT_POOL_MAX_AGE,
+    ) -> None:
+        self.min_idle = min_idle
+        self.max_idle = max_idle
+        self.max_age = max_age
+        self.pools: Dict[Target, TargetConnectionPool] = {}
+        self.keep_going: bool = False
+        # Set when some pool needs to be refilled right now
+        self.__wakeup = threading.Event()
+        self.__fill_thread: threading.Thread = None  # type: ignore
+
+    def start(self, targets: Iterable[Target]) -> None:
+        """
+        It creates pools for the targets and starts the thread that keeps them filled. Processes forked
+        from now on (i.e. workers) close the pooled sockets they inherit, the socket given to a worker
+        is taken from its pool before the fork
+        """
+        os.register_at_fork(after_in_child=self.close_inherited)
+        for target in targets:
+            self.pools[target] = TargetConnectionPool(
+                target, self.min_idle, self.max_idle, self.max_age
+            )
+        self.keep_going = True
+        self.__fill_thread = threading.Thread(target=self.keep_filled, daemon=True)
+        self.__fill_thread.start()
+        logger.info(
+            f"Connection pools are started: min_idle={self.min_idle} max_idle={self.max_idle} max_age={self.max_age}s"
+        )
+
+    def update_targets(self, targets: Iterable[Target]) -> None:
+        """
+        It keeps the pools of the targets that are not changed by a reload, creates pools for the added ones
+        and closes the pools of the removed ones
+        """
+        current = {pool.target.key: pool for pool in self.pools.values()}
+        pools: Dict[Target, TargetConnectionPool] = {}
+        for target in targets:
+            pool = current.pop(target.key, None)
+            if pool is None:
+                pool = TargetConnectionPool(
+                    target, self.min_idle, self.max_idle, self.max_age
+                )
+            pools[target] = pool
+        self.pools = pools
+        for pool in current.values():
+            pool.close()
+        self.__wakeup.set()
+
+    def keep_filled(self) -> None:
+        """It refills the pools periodically or as soon as a pooled socket is taken"""
+        while self.keep_going is True:
+            for pool in list(self.pools.values()):
+                pool.fill()
+            self.__wakeup.wait(BALANCER_DEFAULT_POOL_FILL_INTERVAL)
+            self.__wakeup.clear()
+
+    def acquire(self, target: Target) -> Optional[socket.socket]:
+        """
+        It takes a pooled socket connected to the target
+        :return: Connected socket or None, so the caller should connect by itself
+        """
+        pool = self.pools.get(target)
+        if pool is None:
+            return None
+        sock = pool.acquire()
+        if len(pool) < pool.min_idle:
+            self.__wakeup.set()
+        return sock
+
+    def release(self, target: Target, sock: socket.socket) -> None:
+        """
+        It puts a socket connected to the target back to its pool, e.g. a keep-alive connection
+        the HTTP request is completed on. The socket is closed if the target isn't pooled anymore
+        """
+        pool = self.pools.get(target)
+        if pool is None:
+            sock.close()
+            return
+        pool.release(sock)
+
+    def close_inherited(self) -> None:
+        """It closes the pooled sockets inherited by a forked process, the process doesn't use the pools"""
+        self.keep_going = False
+        for pool in list(self.pools.values()):
+            pool.close_inherited()
+        self.pools = {}
+
+    def stop(self) -> None:
+        """It stops refilling and closes all the pooled sockets"""
+        self.keep_going = False
+        self.__wakeup.set()
+        for pool in self.pools.values():
+            pool.close()
@@ -0,0 +1,174 @@
+import hashlib
+import multiprocessing
+import time
+from typing import Any, List
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_RATE_LIMIT_CLIENT_BURST,
+    BALANCER_DEFAULT_RATE_LIMIT_LOCKS,
+    BALANCER_DEFAULT_RATE_LIMIT_TABLE_SIZE,
+    BALANCER_DEFAULT_RATE_LIMIT_TOTAL_BURST,
+    BALANCER_DEFAULT_RATE_LIMIT_WAYS,
+)
+
+
+class RateLimiter:
+    """
+    Limits rate of new connections per client address and in total by token buckets: a bucket holds up to 'burst'
+    tokens, it's refilled at 'rate' tokens per second and each connection takes a token. It's checked right after
+    a connection is accepted, so connections over the limit are reset before a target is chosen or a worker is created.
+
+    Buckets of the clients are kept in a table of a fixed size, so memory is bounded whatever amount of addresses
+    is seen. The table is set-associative: an address maps to a set of a few slots, and an address that isn't there
+    takes the least recently seen slot of the set, so the clients that keep connecting keep their buckets.
+    A client whose bucket is evicted starts over with a full one. The table is kept in shared memory created before
+    balancer processes are forked, so the limits are common for all of them. Each lock guards a part of the sets,
+    so processes rarely wait for each other
+    """
+
+    # Counters of the shared state
+    LIMITED_CLIENT = 0  # Connections rejected by the limit of their client
+    LIMITED_TOTAL = 1  # Connections rejected by the total limit
+    EVICTED = 2  # Buckets evicted to give their slots to other clients
+
+    def __init__(
+        self,
+        client_rate: float = 0,
+        client_burst: int = BALANCER_DEFAULT_RATE_LIMIT_CLIENT_BURST,
+        total_rate: float = 0,
+        total_burst: int = BALANCER_DEFAULT_RATE_LIMIT_TOTAL_BURST,
+        table_size: int = BALANCER_DEFAULT_RATE_LIMIT_TABLE_SIZE,
+        ways: int = BALANCER_DEFAULT_RATE_LIMIT_WAYS,
+    ) -> None:
+        """
+        :param client_rate: Connections per second a client is able to open, 0 means no limit
+        :param client_burst: Connections a client is able to open at once
+        :param total_rate: Connections per second all the clients are able to open, 0 means no limit
+        :param total_burst: Connections all the clients are able to open at once
+        :param table_size: Clients whose buckets are kept at once
+        :param ways: Slots of the table an address is able to take
+        """
+        if client_rate < 0 or total_rate < 0:
+            raise ValueError(
+                f"Rates should be non-negative, got: client={client_rate}, total={total_rate}"
+            )
+        if client_burst < 1 or total_burst < 1:
+            raise ValueError(
+                f"Bursts should be positive, got: client={client_burst}, total={total_burst}"
+            )
+        if table_size < 1 or ways < 1:
+            raise ValueError(
+                f"Table should have slots, got: table_size={table_size}, ways={ways}"
+            )
+
+        self.client_rate = client_rate
+        self.client_burst = client_burst
+        self.total_rate = total_rate
+        self.total_burst = total_burst
+        self.ways = min(ways, table_size)
+        self.sets = table_size // self.ways
+        slots = self.sets * self.ways
+        self.__keys = multiprocessing.RawArray("Q", slots)  # 0 means a free slot
+        self.__tokens = multiprocessing.RawArray("d", slots)
+        # Monotonic time of the last refill, that is of the last connection of the client
+        self.__stamps = multiprocessing.RawArray("d", slots)
+        self.__locks = [
+            multiprocessing.Lock() for _ in range(BALANCER_DEFAULT_RATE_LIMIT_LOCKS)
+        ]
+        # Tokens and the last refill time of the total bucket
+        self.__total = multiprocessing.RawArray("d", [total_burst, time.monotonic()])
+        self.__total_lock = multiprocessing.Lock()
+        self.__counters = multiprocessing.RawArray("q", 3)
+        self.__counters_lock = multiprocessing.Lock()
+
+    @staticmethod
+    def key_of(address: str) -> int:
+        """It maps the client address to a non-zero key of the table"""
+        digest = hashlib.blake2b(address.encode(), digest_size=8).digest()
+        return int.from_bytes(digest, "big") or 1
+
+    def allow(self, client_host: Any) -> bool:
+        """
+        It takes a token from the bucket of the client and from the total one. The client is checked first,
+        so a client over its limit doesn't use up the total bucket, and its token is given back if the total
+        bucket is empty, so well-behaved clients aren't throttled for the overload of others
+        :param client_host: Address of the client as it's accepted, a (host, port) pair
+        :return: Whether the connection is able to be given to a target
+        """
+        now = time.monotonic()
+        if self.client_rate > 0 and not self.__take_client(client_host[0], now):
+            self.__count(self.LIMITED_CLIENT)
+            return False
+        if self.total_rate > 0 and not self.__take_total(now):
+            if self.client_rate > 0:
+                self.__refund_client(client_host[0])
+            self.__count(self.LIMITED_TOTAL)
+            return False
+        return True
+
+    def __take_client(self, address: str, now: float) -> bool:
+        """It takes a token from the bucket of the address, the bucket is given a slot if it has none"""
+        key = self.key_of(address)
+        index = key % self.sets
+        start = index * self.ways
+        end = start + self.ways
+        keys = self.__keys
+        stamps = self.__stamps
+        with self.__locks[index % len(self.__locks)]:
+            victim = start
+            for slot in range(start, end):
+                if keys[slot] == key:
+                    break
+                # Free slots are never seen, so they're taken first
+                if stamps[slot] < stamps[victim]:
+                    victim = slot
+            else:
+                slot = victim
+                evicted = keys[slot] != 0
+                keys[slot] = key
+                self.__tokens[slot] = self.client_burst
+                stamps[slot] = now
+                if evicted:
+                    self.__count(self.EVICTED)
+            tokens = min(
+                self.client_burst,
+                self.__tokens[slot] + (now - stamps[slot]) * self.client_rate,
+            )
+            stamps[slot] = now
+            allowed = tokens >= 1
+            self.__tokens[slot] = tokens - 1 if allowed else tokens
+        return allowed
+
+    def __refund_client(self, address: str) -> None:
+        """It gives the token back to the bucket of the address, unless the bucket is evicted meanwhile"""
+        key = self.key_of(address)
+        index = key % self.sets
+        start = index * self.ways
+        keys = self.__keys
+        with self.__locks[index % len(self.__locks)]:
+            for slot in range(start, start + self.ways):
+                if keys[slot] == key:
+                    self.__tokens[slot] = min(
+                        self.client_burst, self.__tokens[slot] + 1
+                    )
+                    return
+
+    def __take_total(self, now: float) -> bool:
+        """It takes a token from the total bucket"""
+        total = self.__total
+        with self.__total_lock:
+            tokens = min(
+                self.total_burst, total[0] + (now - total[1]) * self.total_rate
+            )
+            total[1] = now
+            allowed = tokens >= 1
+            total[0] = tokens - 1 if allowed else tokens
+        return allowed
+
+    def __count(self, counter: int) -> None:
+        with self.__counters_lock:
+            self.__counters[counter] += 1
+
+    def read(self) -> List[int]:
+        """It returns the counters, positions are the names of them"""
+        return list(self.__counters)
@@ -0,0 +1,214 @@
+import os
+import socket
+import sys
+from abc import ABCMeta, abstractmethod
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+    BALANCER_DEFAULT_BUFFER_SIZE,
+)
+from balancer.core.enums import BalancerRelayModeEnum
+from balancer.core.logger import logger
+
+
+def is_splice_supported() -> bool:
+    """Checks if the kernel-side ``os.splice`` relay path is able to be used on the current platform"""
+    return sys.platform.startswith("linux") and hasattr(os, "splice")
+
+
+class AbstractRelayBuffer(metaclass=ABCMeta):
+    """
+    Buffer that holds data relayed in one direction, i.e. received from one socket and not yet sent to another
+    """
+
+    path: BalancerRelayModeEnum  # Relay path the buffer implements
+    capacity: int  # Amount of bytes the buffer is able to hold, that is the high watermark
+    # Once the buffer is full, its source isn't read until it drains to this amount of bytes
+    low_watermark: int = 0
+    __paused: bool = False
+
+    @property
+    @abstractmethod
+    def size(self) -> int:
+        """Amount of bytes that are received but not sent yet"""
+        raise NotImplementedError("Method should be overridden")
+
+    @property
+    @abstractmethod
+    def is_full(self) -> bool:
+        """Whether the buffer is unable to receive more data until some of it is sent"""
+        raise NotImplementedError("Method should be overridden")
+
+    @property
+    def is_empty(self) -> bool:
+        return self.size == 0
+
+    @property
+    def is_paused(self) -> bool:
+        """
+        Whether the source shouldn't be read: the buffer got full and hasn't drained to the low watermark yet.
+        The gap between the watermarks makes the source to be read by large chunks instead of a few bytes
+        each time the destination takes some
+        """
+        if self.is_full:
+            self.__paused = True
+        elif self.size <= self.low_watermark:
+            self.__paused = False
+        return self.__paused
+
+    @abstractmethod
+    def recv_from(self, sock: socket.socket) -> int:
+        """
+        Receives as much data from the socket as the buffer is able to hold.
+        Raises ``BlockingIOError`` if nothing is able to be received right now
+        :return: Amount of received bytes, 0 means that the socket is closed by the peer
+        """
+        raise NotImplementedError("Method should be overridden")
+
+    @abstractmethod
+    def send_to(self, sock: socket.socket) -> int:
+        """
+        Sends buffered data to the socket. The data that wasn't accepted by the socket stays in the buffer
+        :return: Amount of sent bytes
+        """
+        raise NotImplementedError("Method should be overridden")
+
+    def close(self) -> None:
+        """Releases resources held by the buffer"""
+
+
+class RingRelayBuffer(AbstractRelayBuffer):
+    """
+    User-space buffer over a preallocated ``bytearray``. Data is received with ``recv_into`` straight into
+    the free region of the ring and sent from a ``memoryview`` of the filled region, so relaying doesn't
+    allocate or copy intermediate ``bytes`` objects
+    """
+
+    path = BalancerRelayModeEnum.BUFFER
+
+    def __init__(self, capacity: int = BALANCER_DEFAULT_BUFFER_SIZE) -> None:
+        self.capacity = capacity
+        self.__view = memoryview(bytearray(capacity))
+        self.__start = 0  # Position of the first byte that is not sent yet
+        self.__size = 0
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def is_full(self) -> bool:
+        return self.__size == self.capacity
+
+    def recv_from(self, sock: socket.socket) -> int:
+        start, end = self.__start, self.__start + self.__size
+        if end < self.capacity:
+            # Free region lays from the end of data up to the end of the ring
+            region = self.__view[end:]
+        else:
+            # Data wraps around, so free region lays between the ring start and the data start
+            end -= self.capacity
+            region = self.__view[end:start]
+        received = sock.recv_into(region)
+        self.__size += received
+        return received
+
+    def send_to(self, sock: socket.socket) -> int:
+        start, end = self.__start, min(self.__start + self.__size, self.capacity)
+        sent = sock.send(self.__view[start:end])
+        self.__size -= sent
+        if self.__size == 0:
+            self.__start = 0  # Rewind, so the next receive gets the whole ring as a contiguous region
+        else:
+            self.__start = (self.__start + sent) % self.capacity
+        return sent
+
+    def close(self) -> None:
+        self.__view.release()
+
+
+class SpliceRelayBuffer(AbstractRelayBuffer):
+    """
+    Kernel-side buffer over a pipe. Data is moved from one socket into the pipe and from the pipe into
+    another socket with ``os.splice``, so it never gets copied to the user-space
+    """
+
+    path = BalancerRelayModeEnum.SPLICE
+
+    def __init__(self, capacity: int = BALANCER_DEFAULT_BUFFER_SIZE) -> None:
+        import fcntl  # Unix only, splice is used on Linux only anyway
+
+        self.__read_fd, self.__write_fd = os.pipe()
+        try:
+            fcntl.fcntl(self.__write_fd, fcntl.F_SETPIPE_SZ, capacity)
+        except OSError:
+            pass  # Exceeds the system limit, so the default pipe size is used
+        self.capacity: int = fcntl.fcntl(self.__write_fd, fcntl.F_GETPIPE_SZ)
+        self.__size = 0
+        # The pipe capacity is counted in pages, so it may be full before 'capacity' bytes are spliced into it
+        self.__blocked = False
+
+    @property
+    def size(self) -> int:
+        return self.__size
+
+    @property
+    def is_full(self) -> bool:
+        return self.__blocked or self.__size >= self.capacity
+
+    def recv_from(self, sock: socket.socket) -> int:
+        try:
+            received = os.splice(  # type: ignore
+                sock.fileno(),
+                self.__write_fd,
+                self.capacity - self.__size,
+                flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK,  # type: ignore
+            )
+        except BlockingIOError:
+            # Either the socket has no data or the pipe is full
+            self.__blocked = self.__size > 0
+            raise
+        self.__size += received
+        return received
+
+    def send_to(self, sock: socket.socket) -> int:
+        sent = os.splice(  # type: ignore
+            self.__read_fd,
+            sock.fileno(),
+            self.__size,
+            flags=os.SPLICE_F_MOVE | os.SPLICE_F_NONBLOCK,  # type: ignore
+        )
+        self.__size -= sent
+        self.__blocked = False
+        return sent
+
+    def close(self) -> None:
+        os.close(self.__read_fd)
+        os.close(self.__write_fd)
+
+
+def build_relay_buffer(
+    mode: BalancerRelayModeEnum,
+    capacity: int = BALANCER_DEFAULT_BUFFER_SIZE,
+    low_watermark: int = BALANCER_DEFAULT_BUFFER_LOW_WATERMARK,
+) -> AbstractRelayBuffer:
+    """
+    It builds a buffer for the relay path that matches the mode. If the kernel-side path is requested,
+    but it's unsupported, the user-space one is used.
+
+    :param mode: Relay mode to build a buffer for
+    :param capacity: Amount of bytes the buffer is able to hold, that is the high watermark
+    :param low_watermark: Amount of bytes a full buffer drains to before its source is read again
+    """
+    if mode is BalancerRelayModeEnum.SPLICE and not is_splice_supported():
+        logger.warning(
+            f"Relay mode '{mode.value}' isn't supported by the platform, "
+            f"'{BalancerRelayModeEnum.BUFFER.value}' is used"
+        )
+    buffer: AbstractRelayBuffer
+    if mode is not BalancerRelayModeEnum.BUFFER and is_splice_supported():
+        buffer = SpliceRelayBuffer(capacity)
+    else:
+        buffer = RingRelayBuffer(capacity)
+    buffer.low_watermark = min(low_watermark, buffer.capacity - 1)
+    return buffer
@@ -0,0 +1,94 @@
+import os
+import signal
+import threading
+import time
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+from balancer.conf.constants import BALANCER_DEFAULT_RELOAD_WATCH_INTERVAL
+from balancer.conf.settings import Settings
+from balancer.core.common.resolver import TargetResolver
+from balancer.core.common.target import Target
+from balancer.core.enums import BalancerAlgorithmEnum
+from balancer.core.logger import logger
+from balancer.utils import create_targets
+
+
+class SettingsReloader:
+    """
+    Class that reads the targets and the balance algorithm from the settings file again, for a running balancer
+    to swap them in on SIGHUP. Other settings are applied on restart only. Optionally it watches the file
+    and sends SIGHUP to the process by itself once the file is changed
+    """
+
+    def __init__(
+        self,
+        path_to: Path,
+        watch_interval: float = BALANCER_DEFAULT_RELOAD_WATCH_INTERVAL,
+        resolver: Optional[TargetResolver] = None,
+    ) -> None:
+        """
+        :param path_to: Path to the settings file
+        :param watch_interval: Seconds between checks of the file for changes, 0 disables watching
+        :param resolver: Resolver that expands the reloaded targets and resolves their host names, if it's given
+        """
+        if watch_interval < 0:
+            raise ValueError(
+                f"Argument 'watch_interval' should be non-negative, got: {watch_interval}"
+            )
+
+        self.path_to = path_to
+        self.watch_interval = watch_interval
+        self.resolver = resolver
+        self.keep_going: bool = False
+        self.__watch_thread: threading.Thread = None  # type: ignore
+
+    def load(self) -> Tuple[List[Target], BalancerAlgorithmEnum]:
+        """
+        It reads and validates the settings file
+        :return: New targets (not bound to counters yet) and the balance algorithm
+        :raises: Any error of reading or validating, the running configuration should be kept then
+        """
+        settings = Settings(path_to=self.path_to)
+        targets = create_targets(settings.balancer.targets)
+        if not targets:
+            raise ValueError(f"No targets are set in '{self.path_to}'")
+        if self.resolver is not None:
+            targets = self.resolver.expand_targets(targets)
+            self.resolver.resolve(targets)
+        return (targets, BalancerAlgorithmEnum(settings.balancer.balance_algorithm))
+
+    def watch(self) -> None:
+        """It starts the thread that sends SIGHUP to the current process once the file is changed"""
+        if self.watch_interval == 0:
+            return
+        self.keep_going = True
+        self.__watch_thread = threading.Thread(
+            target=self.keep_watching, args=(os.getpid(),), daemon=True
+        )
+        self.__watch_thread.start()
+        logger.info(
+            f"Settings file '{self.path_to}' is watched for changes each {self.watch_interval}s"
+        )
+
+    def keep_watching(self, pid: int) -> None:
+        """It compares modification time of the file each interval"""
+        modified_at = self.__modified_at()
+        while self.keep_going is True:
+            time.sleep(self.watch_interval)
+            current = self.__modified_at()
+            if current != modified_at:
+                modified_at = current
+                logger.info(f"Settings file '{self.path_to}' is changed, reloading")
+                os.kill(pid, signal.SIGHUP)
+
+    def __modified_at(self) -> float:
+        try:
+            return os.stat(self.path_to).st_mtime
+        except OSError:
+            # The file is being replaced, it's checked again on the next interval
+            return 0
+
+    def stop(self) -> None:
+        """It stops watching"""
+        self.keep_going = False
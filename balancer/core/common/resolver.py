@@ -0,0 +1,180 @@
+import ipaddress
+import os
+import signal
+import socket
+import threading
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from balancer.conf.constants import BALANCER_DEFAULT_DNS_TTL
+from balancer.core.common.target import Target
+from balancer.core.logger import logger
+
+
+class TargetResolver:
+    """
+    Class that resolves host names of the targets and keeps the addresses in the targets, so connections don't wait
+    for the resolver. The names are resolved again in a background thread each TTL, a name the resolver fails on
+    keeps its last known addresses. Addresses are kept by the targets of each process, so every process that
+    connects to the targets (e.g. each balancer) runs its own thread. Optionally a name of several addresses
+    is expanded into a target per address, so they're balanced. A change of its addresses reloads the targets
+    """
+
+    def __init__(self, ttl: float = BALANCER_DEFAULT_DNS_TTL, expand: bool = False):
+        """
+        :param ttl: Seconds the addresses are kept before the names are resolved again, 0 disables re-resolution
+        :param expand: Whether a name of several addresses is expanded into a target per address
+        """
+        if ttl < 0:
+            raise ValueError(f"Argument 'ttl' should be non-negative, got: {ttl}")
+
+        self.ttl = ttl
+        self.expand = expand
+        self.targets: List[Target] = []
+        # Addresses of the expanded names as of the last expansion, a change of them reloads the targets
+        self.expanded: Dict[str, Tuple[str, ...]] = {}
+        # Process that reloads the targets on SIGHUP, if the expanded names are watched
+        self.watch_pid: Optional[int] = None
+        self.keep_going: bool = False
+        # Set to stop the waiting for the next resolution
+        self.__wakeup = threading.Event()
+        self.__resolve_thread: threading.Thread = None  # type: ignore
+
+    @staticmethod
+    def lookup(host: str) -> Tuple[str, ...]:
+        """
+        It resolves the name to its IPv4 addresses, as the targets are connected over IPv4
+        :return: Distinct addresses in the order of the resolver
+        :raises OSError: If the name isn't resolved
+        """
+        infos = socket.getaddrinfo(host, None, socket.AF_INET, socket.SOCK_STREAM)
+        return tuple(dict.fromkeys(info[4][0] for info in infos))
+
+    @staticmethod
+    def is_address(host: str) -> bool:
+        """Checks if the host is an address already, so there is nothing to resolve"""
+        try:
+            ipaddress.ip_address(host)
+        except ValueError:
+            return False
+        return True
+
+    def expand_targets(self, targets: List[Target]) -> List[Target]:
+        """
+        It expands each target whose name has several addresses into a target per address, named after the address.
+        A name that isn't resolved is kept as a single target. Nothing is changed unless expanding is enabled
+        :param targets: Targets that are not bound to counters yet
+        :return: The expanded targets
+        """
+        if self.expand is False:
+            return targets
+        expanded: List[Target] = []
+        self.expanded = {}
+        for target in targets:
+            if self.is_address(target.host):
+                expanded.append(target)
+                continue
+            try:
+                addresses = self.lookup(target.host)
+            except OSError as exc:
+                logger.error(f"Target {target} isn't expanded: {exc!r}")
+                expanded.append(target)
+                continue
+            self.expanded[target.host] = addresses
+            if len(addresses) == 1:
+                expanded.append(target)
+                continue
+            for address in addresses:
+                expanded.append(
+                    Target(
+                        name=f"{target.name}@{address}",
+                        host=address,
+                        port=target.port,
+                        weight=target.weight,
+                        max_conns=target.max_conns,
+                    )
+                )
+            logger.info(
+                f"Target {target} is expanded into {len(addresses)} targets: {', '.join(addresses)}"
+            )
+        return expanded
+
+    def resolve(self, targets: Iterable[Target]) -> None:
+        """
+        It resolves the names of the targets and gives each target the first address of its name.
+        A name the resolver fails on keeps its last known address
+        """
+        resolved: Dict[str, Optional[str]] = {}
+        for target in targets:
+            if self.is_address(target.host):
+                continue
+            if target.host not in resolved:
+                try:
+                    resolved[target.host] = self.lookup(target.host)[0]
+                except (OSError, IndexError) as exc:
+                    resolved[target.host] = None
+                    logger.warning(
+                        f"Host '{target.host}' isn't resolved, the last known address "
+                        f"'{target.address}' is kept: {exc!r}"
+                    )
+            address = resolved[target.host]
+            if address is not None and address != target.address:
+                if target.address != target.host:
+                    logger.info(
+                        f"Target {target} is resolved to another address: {address}"
+                    )
+                target.set_address(address)
+
+    def watch(self) -> None:
+        """It makes the current process to reload the targets once addresses of an expanded name change"""
+        if self.expand is True:
+            self.watch_pid = os.getpid()
+
+    def start(self, targets: Iterable[Target]) -> None:
+        """It starts the thread that resolves the names of the targets each TTL"""
+        self.targets = list(targets)
+        if self.ttl == 0:
+            return
+        self.keep_going = True
+        self.__wakeup.clear()
+        self.__resolve_thread = threading.Thread(
+            target=self.keep_resolving, name="resolver", daemon=True
+        )
+        self.__resolve_thread.start()
+        logger.info(f"Host names of the targets are resolved each {self.ttl}s")
+
+    def update_targets(self, targets: Iterable[Target]) -> None:
+        """It makes the thread to resolve the names of the reloaded targets"""
+        self.targets = list(targets)
+
+    def keep_resolving(self) -> None:
+        """It resolves the names each TTL, until it's stopped"""
+        while not self.__wakeup.wait(self.ttl):
+            # The targets are able to be swapped by a reload meanwhile
+            self.resolve(self.targets)
+            # Balancers forked by a supervisor inherit the watching, while it's the supervisor that reloads
+            if self.watch_pid == os.getpid() and self.expanded_changed():
+                os.kill(self.watch_pid, signal.SIGHUP)
+
+    def expanded_changed(self) -> bool:
+        """
+        Checks if addresses of an expanded name are changed since the last expansion. A name the resolver
+        fails on is considered unchanged
+        """
+        for host, addresses in list(self.expanded.items()):
+            try:
+                current = self.lookup(host)
+            except OSError:
+                continue
+            if set(current) != set(addresses):
+                logger.info(
+                    f"Addresses of host '{host}' are changed to {', '.join(current)}, reloading the targets"
+                )
+                # The reload expands the name again, it's not reported once more meanwhile
+                self.expanded[host] = current
+                return True
+        return False
+
+    def stop(self) -> None:
+        """It stops resolving"""
+        self.keep_going = False
+        self.__wakeup.set()
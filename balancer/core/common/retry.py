@@ -0,0 +1,150 @@
+import multiprocessing
+import time
+from typing import Iterable, Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_CONNECT_TIMEOUT,
+    BALANCER_DEFAULT_MAX_ATTEMPTS,
+    BALANCER_DEFAULT_RETRY_BUDGET,
+    BALANCER_DEFAULT_RETRY_BUDGET_MIN_RETRIES,
+    BALANCER_DEFAULT_RETRY_BUDGET_WINDOW,
+)
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+
+
+class RetryBudget:
+    """
+    Limits retries to a percentage of recent requests, so a failing target doesn't multiply the load on others
+    with retry storms. A few retries per second are allowed anyway, so rare failures are retried under a low load.
+    Requests and retries are counted for the current and the previous time windows, the previous one is weighted
+    by the part of it that still falls into the sliding window. Counters are kept in shared memory created before
+    balancer processes are forked, so the budget is common for all of them
+    """
+
+    # Fields of the shared state
+    __STARTED_AT = 0
+    __REQUESTS = 1
+    __RETRIES = 2
+    __PREVIOUS_REQUESTS = 3
+    __PREVIOUS_RETRIES = 4
+
+    def __init__(
+        self,
+        percent: float = BALANCER_DEFAULT_RETRY_BUDGET,
+        min_retries: float = BALANCER_DEFAULT_RETRY_BUDGET_MIN_RETRIES,
+        window: float = BALANCER_DEFAULT_RETRY_BUDGET_WINDOW,
+    ) -> None:
+        """
+        :param percent: Percentage of recent requests that are able to be retried
+        :param min_retries: Retries per second that are allowed regardless of the percentage
+        :param window: Seconds the recent requests are counted for
+        """
+        if percent < 0 or min_retries < 0 or window <= 0:
+            raise ValueError(
+                f"Retry budget should be non-negative, got: percent={percent}, min_retries={min_retries}, "
+                f"window={window}"
+            )
+
+        self.ratio = percent / 100
+        self.min_retries = min_retries
+        self.window = window
+        self.__state = multiprocessing.RawArray("d", [time.monotonic(), 0, 0, 0, 0])
+        self.__lock = multiprocessing.Lock()
+
+    def __roll(self, now: float) -> float:
+        """
+        It starts a new window if the current one is over
+        :return: Part of the previous window that falls into the sliding window
+        """
+        state = self.__state
+        elapsed = now - state[self.__STARTED_AT]
+        if elapsed >= self.window:
+            # Nothing is counted for the last window
+            passed = elapsed >= 2 * self.window
+            state[self.__PREVIOUS_REQUESTS] = 0 if passed else state[self.__REQUESTS]
+            state[self.__PREVIOUS_RETRIES] = 0 if passed else state[self.__RETRIES]
+            state[self.__REQUESTS] = state[self.__RETRIES] = 0
+            state[self.__STARTED_AT] = now
+            elapsed = 0
+        return 1 - elapsed / self.window
+
+    def record_request(self) -> None:
+        """It must be called once per client request"""
+        with self.__lock:
+            self.__roll(time.monotonic())
+            self.__state[self.__REQUESTS] += 1
+
+    def try_retry(self) -> bool:
+        """
+        It takes a retry from the budget
+        :return: Whether the retry is allowed
+        """
+        with self.__lock:
+            state = self.__state
+            previous_part = self.__roll(time.monotonic())
+            requests = (
+                state[self.__REQUESTS] + state[self.__PREVIOUS_REQUESTS] * previous_part
+            )
+            retries = (
+                state[self.__RETRIES] + state[self.__PREVIOUS_RETRIES] * previous_part
+            )
+            if retries + 1 > max(self.ratio * requests, self.min_retries * self.window):
+                return False
+            state[self.__RETRIES] += 1
+            return True
+
+
+class FailoverPolicy:
+    """
+    Rules of retrying a client connection on other targets when connection to the chosen one fails
+    """
+
+    def __init__(
+        self,
+        connect_timeout: float = BALANCER_DEFAULT_CONNECT_TIMEOUT,
+        max_attempts: int = BALANCER_DEFAULT_MAX_ATTEMPTS,
+        budget: Optional[RetryBudget] = None,
+    ) -> None:
+        """
+        :param connect_timeout: Seconds a connection to a target is able to take
+        :param max_attempts: Targets a client connection is able to be tried on, including the first one
+        :param budget: Budget the retries are taken from, it's shared by all the balancers using the policy
+        """
+        if max_attempts < 1:
+            raise ValueError(
+                f"Argument 'max_attempts' should be positive number, got: {max_attempts}"
+            )
+
+        self.connect_timeout = connect_timeout
+        self.max_attempts = max_attempts
+        self.budget = budget or RetryBudget()
+
+    def next_target(
+        self, targets: TargetAlgorithmizedList, tried: Iterable[Target]
+    ) -> Optional[Target]:
+        """
+        It chooses a target to retry a client connection on, by the algorithm of the targets, and counts
+        the connection on it. Saturated targets are not chosen. Algorithms that keep giving the tried target
+        (e.g. least connections, as the failed target has the least connections) are followed by a scan
+        of the untried targets: available ones first and the rest of them if none is available, like the algorithms do
+        :return: Target that wasn't tried yet or None if the connection mustn't be retried
+        """
+        tried = list(tried)
+        if len(tried) >= min(self.max_attempts, len(targets)):
+            return None
+        for _ in range(len(targets)):
+            target = targets.get_next()
+            if target not in tried and target.try_increment_connections():
+                break
+        else:
+            untried = [target for target in targets if target not in tried]
+            available = [target for target in untried if target.available]
+            for target in available or untried:
+                if target.try_increment_connections():
+                    break
+            else:
+                return None
+        if self.budget.try_retry() is False:
+            target.decrement_connections()
+            return None
+        return target
@@ -1,7 +1,10 @@
-from typing import Any, List, Optional
+import random
+from typing import Any, Iterable, List, Optional, Tuple
 
-from balancer.core.common.algorithms import AbstractBalanceAlgorithm
+from balancer.core.common.algorithms import AbstractBalanceAlgorithm, hash_key
+from balancer.core.common.counters import ConnectionCounters
 from balancer.core.exceptions import WrongBalanceAlgorithmError
+from balancer.core.logger import logger
 
 
 class Target:
@@ -9,7 +12,9 @@ class Target:
     It's a class that represents a target between the set of which the load is distributed
     """
 
-    def __init__(self, name: str, host: str, port: int) -> None:
+    def __init__(
+        self, name: str, host: str, port: int, weight: int = 1, max_conns: int = 0
+    ) -> None:
         if host is None:
             raise ValueError(f"Argument 'host' shouldn't be {None}")
         if port is None:
@@ -19,10 +24,31 @@ class Target:
             raise TypeError(
                 f"Invalid type of 'port' argument, got: {type(port)}. Expected: {int}"
             )
+        if type(weight) is not int:
+            raise TypeError(
+                f"Invalid type of 'weight' argument, got: {type(weight)}. Expected: {int}"
+            )
+        if weight < 1:
+            raise ValueError(f"Argument 'weight' should be positive, got: {weight}")
+        if type(max_conns) is not int:
+            raise TypeError(
+                f"Invalid type of 'max_conns' argument, got: {type(max_conns)}. Expected: {int}"
+            )
+        if max_conns < 0:
+            raise ValueError(
+                f"Argument 'max_conns' should be non-negative, got: {max_conns}"
+            )
 
         self.__name = name
         self.__host = host
+        # Address the host is resolved to, connections are made to it. It's the host until it's resolved
+        self.__address = host
         self.__port = port
+        self.__weight = weight
+        self.__max_conns = max_conns  # Concurrent connections limit, 0 means no limit
+        # Shared active connections counters
+        self.__counters: Optional[ConnectionCounters] = None
+        self.__counter_index: int = -1
 
     @property
     def name(self) -> str:
@@ -32,12 +58,142 @@ class Target:
     def host(self) -> str:
         return self.__host
 
+    @property
+    def address(self) -> str:
+        return self.__address
+
     @property
     def port(self) -> int:
         return self.__port
 
+    @property
+    def weight(self) -> int:
+        return self.__weight
+
+    @property
+    def max_conns(self) -> int:
+        return self.__max_conns
+
+    @property
+    def key(self) -> Tuple[str, str, int]:
+        """Identity of the target across reloads: targets with the same name and address are the same backend"""
+        return (self.__name, self.__host, self.__port)
+
+    @property
+    def counters(self) -> Optional[ConnectionCounters]:
+        return self.__counters
+
+    @property
+    def active_connections(self) -> int:
+        if self.__counters is None:
+            return 0
+        return self.__counters.count(self.__counter_index)
+
+    @property
+    def healthy(self) -> bool:
+        if self.__counters is None:
+            return True
+        return self.__counters.is_healthy(self.__counter_index)
+
+    @property
+    def ejected(self) -> bool:
+        """Whether the target is ejected as an outlier for a while"""
+        if self.__counters is None:
+            return False
+        return self.__counters.is_ejected(self.__counter_index)
+
+    @property
+    def available(self) -> bool:
+        """Whether the target is healthy and not ejected, i.e. it's given new connections"""
+        if self.__counters is None:
+            return True
+        return self.__counters.is_available(self.__counter_index)
+
+    @property
+    def slow_start_share(self) -> float:
+        """Share of new connections the target gets, it's less than 1 while the target ramps up after an ejection"""
+        if self.__counters is None:
+            return 1.0
+        return self.__counters.slow_start_share(self.__counter_index)
+
+    def set_address(self, address: str) -> None:
+        """It makes the connections to the target to be made to the address the host is resolved to"""
+        self.__address = address
+
+    def set_healthy(self, healthy: bool) -> None:
+        """It marks the target as healthy or not, so the balancers stop or start giving connections to it"""
+        if self.__counters is not None:
+            self.__counters.set_healthy(self.__counter_index, healthy)
+
+    def bind_counters(self, counters: ConnectionCounters, index: int) -> None:
+        """It makes the target to count its connections by the shared counters at the index"""
+        self.__counters = counters
+        self.__counter_index = index
+
+    def inherit_state(self, previous: "Target") -> None:
+        """It takes over health, latency and ejection of the same target from before a reload"""
+        if self.__counters is not None and previous.__counters is not None:
+            self.__counters.inherit(
+                self.__counter_index, previous.__counters, previous.__counter_index
+            )
+
+    def is_bound_to(self, counters: ConnectionCounters, index: int) -> bool:
+        """Checks if the target counts its connections by the shared counters at the index"""
+        return self.__counters is counters and self.__counter_index == index
+
+    def increment_connections(self) -> None:
+        """It must be called when a connection is given to the target"""
+        if self.__counters is not None:
+            self.__counters.add(self.__counter_index, 1)
+
+    def try_increment_connections(self) -> bool:
+        """
+        It must be called when a connection is given to the target, unless the target is saturated
+        :return: Whether the connection is counted, i.e. the target has room for it
+        """
+        if self.__counters is None:
+            return True
+        return self.__counters.try_add(self.__counter_index, self.__max_conns)
+
+    def decrement_connections(self) -> None:
+        """It must be called when a connection to the target is closed"""
+        if self.__counters is not None:
+            self.__counters.add(self.__counter_index, -1)
+
+    def observe_latency(self, latency: float) -> None:
+        """It must be called with connect or response latency (in seconds) measured on a connection to the target"""
+        if self.__counters is not None:
+            self.__counters.observe_latency(self.__counter_index, latency)
+
+    def record_failure(self) -> int:
+        """
+        It must be called when a connection to the target fails, e.g. it isn't connected or it's reset
+        :return: Failures of the target in a row
+        """
+        if self.__counters is None:
+            return 0
+        return self.__counters.record_failure(self.__counter_index)
+
+    def record_success(self) -> None:
+        """It must be called when a connection to the target is relayed successfully"""
+        if self.__counters is not None:
+            self.__counters.record_success(self.__counter_index)
+
+    def eject(
+        self, base_time: float, max_time: float, max_ejected: int, slow_start: float
+    ) -> float:
+        """
+        It ejects the target for a while, so it isn't given new connections
+        :return: Seconds the target is ejected for, 0 if it isn't ejected
+        """
+        if self.__counters is None:
+            return 0
+        return self.__counters.eject(
+            self.__counter_index, base_time, max_time, max_ejected, slow_start
+        )
+
     def __str__(self):
-        return f"<{__class__.__name__} name={self.__name} host={self.__host} port={self.__port})>"
+        return f"<{__class__.__name__} name={self.__name} host={self.__host} port={self.__port} weight={self.__weight} max_conns={self.__max_conns})>"
 
 
 class TargetAlgorithmizedList(list):
@@ -49,13 +205,24 @@ class TargetAlgorithmizedList(list):
     __slots__ = (
         "targets",
         "__algorithm",
+        "__counters",
+        "__version",
+        "__available",
+        "__fallback_position",
     )
 
     def __init__(self, targets: Optional[List[Target]] = None) -> None:
+        self.__version = 0  # Incremented on each change of the targets
         if targets is not None:
             for t in targets:
                 self.append(t)
         self.__algorithm: AbstractBalanceAlgorithm
+        self.__counters: Optional[ConnectionCounters] = None
+        # Available targets and the versions of the targets and of their availability the list is made for
+        self.__available: Tuple[int, int, List[Target]] = (-1, -1, [])
+        self.__fallback_position = (
+            0  # Position of the last available target given instead of a skipped one
+        )
 
         super(TargetAlgorithmizedList, self).__init__()
 
@@ -69,12 +236,152 @@ class TargetAlgorithmizedList(list):
         self.__algorithm = algorithm
         self.__algorithm.set_sequence(self)
 
+    @property
+    def counters(self) -> ConnectionCounters:
+        """Shared active connections counters of the targets. They're bound to the targets on the first access"""
+        if self.__counters is None or self.__counters.size != len(self):
+            return self.bind_counters()
+        return self.__counters
+
+    def bind_counters(self) -> ConnectionCounters:
+        """
+        It binds shared active connections counters to the targets. If the targets are already bound to the same
+        counters (e.g. by another balancer built of the same targets), they're reused, so the counters are shared
+        by all the balancers. Counters are weighted if the attached algorithm balances by weights
+        """
+        weights = [target.weight if self.__algorithm.weighted else 1 for target in self]
+        counters = self[0].counters if self else None
+        if counters is not None and counters.weights == weights:
+            if all(target.is_bound_to(counters, i) for i, target in enumerate(self)):
+                self.__counters = counters
+                self.__available = (-1, -1, [])
+                return counters
+
+        counters = ConnectionCounters(weights)
+        for i, target in enumerate(self):
+            target.bind_counters(counters, i)
+        self.__counters = counters
+        self.__available = (-1, -1, [])
+        return counters
+
+    def inherit_state(self, previous: Iterable[Target]) -> None:
+        """It makes the targets that were among the previous ones to take over their health, latency and ejection"""
+        previous_targets = {target.key: target for target in previous}
+        for target in self:
+            previous_target = previous_targets.get(target.key)
+            if previous_target is not None and previous_target is not target:
+                target.inherit_state(previous_target)
+
+    def reloaded(
+        self, targets: List[Target], algorithm: AbstractBalanceAlgorithm
+    ) -> "TargetAlgorithmizedList":
+        """
+        It builds a list of the reloaded targets to be swapped in instead of this one. The list is bound to new counters,
+        targets that are not changed take over their health and latency, and the algorithm takes over the state
+        of the current one. This list isn't changed, so relays in progress keep using it
+        :param targets: New targets, they shouldn't be bound to counters yet
+        :param algorithm: New algorithm instance, it may be of another kind than the current one
+        """
+        if not targets:
+            raise ValueError("Targets shouldn't be empty")
+
+        reloaded = TargetAlgorithmizedList()
+        for target in targets:
+            reloaded.append(target)
+        reloaded.attach_algorithm(algorithm)
+        reloaded.bind_counters()
+        reloaded.inherit_state(self)
+        algorithm.inherit(self.__algorithm)
+
+        current_keys = {target.key: target for target in self}
+        reloaded_keys = {target.key: target for target in reloaded}
+        for key, target in reloaded_keys.items():
+            if key not in current_keys:
+                logger.info(f"Add target: {target} for load distribution")
+            elif current_keys[key].weight != target.weight:
+                logger.info(f"Change weight of the target: {target}")
+            elif current_keys[key].max_conns != target.max_conns:
+                logger.info(f"Change connections limit of the target: {target}")
+        for key, target in current_keys.items():
+            if key not in reloaded_keys:
+                logger.info(
+                    f"Remove target: {target}, its connections in progress are kept until completed"
+                )
+        return reloaded
+
+    @property
+    def version(self) -> int:
+        """Number of changes of the targets, so algorithms are able to notice them cheaply"""
+        return self.__version
+
     def append(self, item: Target):
         self.__check_type(item)
         super(TargetAlgorithmizedList, self).append(item)
+        self.__version += 1
+
+    def get_next(self, key: Optional[str] = None):
+        """
+        It gives the next target by the attached algorithm skipping unhealthy and ejected ones. A target that ramps up
+        after an ejection is skipped in favour of another one by chance, so it gets a growing share of connections.
+        A skipped target is replaced by one of the available targets in O(1): they take turns, or the key picks one
+        of them, so a key keeps going to the same target. If no target is available, the one given by the algorithm
+        is given anyway (fail open), as health checks may be wrong
+        """
+        if self.__counters is not None:
+            for index in self.__counters.release_ejected():
+                logger.info(f"Target {self[index]} is returned from ejection")
+        target = self.__algorithm.get_next_item(key)
+        if self.__admits(target):
+            return target
+        available = self.available_targets()
+        if not available:
+            return target
+        if key is not None:
+            return available[hash_key(key) % len(available)]
+        self.__fallback_position = (self.__fallback_position + 1) % len(available)
+        return available[self.__fallback_position]
+
+    def available_targets(self) -> List[Target]:
+        """
+        It returns the targets that are healthy and not ejected. The list is made again only once the targets
+        or their availability are changed, not on each selection
+        """
+        counters = self.__counters
+        availability = -1 if counters is None else counters.availability_version
+        (version, made_for, available) = self.__available
+        if version == self.__version and made_for == availability:
+            return available
+        available = [target for target in self if target.available]
+        self.__available = (self.__version, availability, available)
+        return available
+
+    @staticmethod
+    def __admits(target: Target) -> bool:
+        """Checks if the target is able to be given a new connection, taking its slow start share by chance"""
+        if not target.available:
+            return False
+        share = target.slow_start_share
+        return share >= 1 or random.random() < share
 
-    def get_next(self):
-        return self.__algorithm.get_next_item()
+    def acquire_next(self, key: Optional[str] = None) -> Optional[Target]:
+        """
+        It gives the next target like :meth:`get_next` does, counting the connection on it. Saturated targets
+        (having as many connections as their limit) are skipped in favour of the ones that follow
+        :return: The target or None if all the eligible targets are saturated
+        """
+        target = self.get_next(key)
+        if target.try_increment_connections():
+            return target
+        # Unavailable targets are eligible only if there are no available ones, as in get_next
+        fail_open = not target.available
+        start = self.index(target)
+        for offset in range(1, len(self)):
+            candidate = self[(start + offset) % len(self)]
+            if not candidate.available and not fail_open:
+                continue
+            if candidate.try_increment_connections():
+                return candidate
+        return None
 
     def __check_type(self, v: Any):
         """Checks if an item is suitable for this class"""
@@ -86,3 +393,4 @@ class TargetAlgorithmizedList(list):
     def __setitem__(self, key, value):
         self.__check_type(value)
         super(TargetAlgorithmizedList, self).__setitem__(key, value)
+        self.__version += 1
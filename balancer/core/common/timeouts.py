@@ -0,0 +1,324 @@
+import asyncio
+import math
+import socket
+import time
+from typing import Callable, Dict, List, Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_IDLE_READ_TIMEOUT,
+    BALANCER_DEFAULT_IDLE_WRITE_TIMEOUT,
+    BALANCER_DEFAULT_KEEPALIVE_COUNT,
+    BALANCER_DEFAULT_KEEPALIVE_IDLE,
+    BALANCER_DEFAULT_KEEPALIVE_INTERVAL,
+    BALANCER_DEFAULT_SESSION_TIMEOUT,
+    BALANCER_DEFAULT_TIMER_LEVELS,
+    BALANCER_DEFAULT_TIMER_RESOLUTION,
+    BALANCER_DEFAULT_TIMER_SLOTS,
+)
+from balancer.core.logger import logger
+
+
+class TimeoutPolicy:
+    """
+    Timeouts of relayed connections and TCP keepalive of both their legs. Idle timeouts are checked against
+    the time of the last activity, so relaying only notes the time and timers are not rescheduled per chunk:
+    a timer that finds the connection active is set again for the rest of the timeout
+    """
+
+    def __init__(
+        self,
+        idle_read: float = BALANCER_DEFAULT_IDLE_READ_TIMEOUT,
+        idle_write: float = BALANCER_DEFAULT_IDLE_WRITE_TIMEOUT,
+        session: float = BALANCER_DEFAULT_SESSION_TIMEOUT,
+        keepalive_idle: int = BALANCER_DEFAULT_KEEPALIVE_IDLE,
+        keepalive_interval: int = BALANCER_DEFAULT_KEEPALIVE_INTERVAL,
+        keepalive_count: int = BALANCER_DEFAULT_KEEPALIVE_COUNT,
+    ) -> None:
+        """
+        :param idle_read: Seconds a relay waits for data from either side, 0 disables it
+        :param idle_write: Seconds relayed data waits for its side to take it, 0 disables it
+        :param session: Seconds a relayed session lasts at most, 0 means it's unlimited
+        :param keepalive_idle: Seconds a connection is idle before keepalive probes are sent, 0 disables keepalive
+        :param keepalive_interval: Seconds between keepalive probes
+        :param keepalive_count: Unanswered keepalive probes that drop the connection
+        """
+        if idle_read < 0 or idle_write < 0 or session < 0:
+            raise ValueError(
+                f"Timeouts should be non-negative, got: idle_read={idle_read}, idle_write={idle_write}, "
+                f"session={session}"
+            )
+        if keepalive_idle < 0 or keepalive_interval < 1 or keepalive_count < 1:
+            raise ValueError(
+                f"Keepalive should be non-negative and probe at least once, got: keepalive_idle={keepalive_idle}, "
+                f"keepalive_interval={keepalive_interval}, keepalive_count={keepalive_count}"
+            )
+
+        self.idle_read = idle_read
+        self.idle_write = idle_write
+        self.session = session
+        self.keepalive_idle = keepalive_idle
+        self.keepalive_interval = keepalive_interval
+        self.keepalive_count = keepalive_count
+
+    @property
+    def enabled(self) -> bool:
+        """Whether any relay timeout is enabled"""
+        return self.idle_read > 0 or self.idle_write > 0 or self.session > 0
+
+    def deadline(
+        self,
+        started_at: float,
+        received_at: float,
+        sending_since: Optional[float],
+    ) -> Optional[float]:
+        """
+        It returns the time the relay expires at, if it stays as it is
+        :param started_at: Time the relay is started at
+        :param received_at: Time data was received from either side for the last time
+        :param sending_since: Time relayed data started waiting for its side to take it, none if nothing waits
+        :return: The time or None if no one timeout applies
+        """
+        deadlines = []
+        if self.idle_read > 0:
+            deadlines.append(received_at + self.idle_read)
+        if self.idle_write > 0 and sending_since is not None:
+            deadlines.append(sending_since + self.idle_write)
+        if self.session > 0:
+            deadlines.append(started_at + self.session)
+        return min(deadlines) if deadlines else None
+
+    def expired(
+        self,
+        now: float,
+        started_at: float,
+        received_at: float,
+        sending_since: Optional[float],
+    ) -> Optional[str]:
+        """
+        Checks if the relay is expired, arguments are the same as the ones of :meth:`deadline`
+        :return: Reason of the expiry or None if the relay isn't expired
+        """
+        if self.session > 0 and now - started_at >= self.session:
+            return f"session lasted for longer than {self.session:g}s"
+        if self.idle_read > 0 and now - received_at >= self.idle_read:
+            return f"no data was received for {self.idle_read:g}s"
+        if self.idle_write > 0 and sending_since is not None:
+            if now - sending_since >= self.idle_write:
+                return f"relayed data wasn't taken for {self.idle_write:g}s"
+        return None
+
+    def keep_alive(self, sock: socket.socket) -> None:
+        """It enables TCP keepalive on the socket, so a peer that's gone without closing the connection is detected"""
+        if self.keepalive_idle == 0:
+            return
+        options = (
+            (getattr(socket, "TCP_KEEPIDLE", None), self.keepalive_idle),
+            (getattr(socket, "TCP_KEEPINTVL", None), self.keepalive_interval),
+            (getattr(socket, "TCP_KEEPCNT", None), self.keepalive_count),
+        )
+        try:
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_KEEPALIVE, 1)
+            for option, value in options:
+                if option is not None:  # Tuning isn't supported by every platform
+                    sock.setsockopt(socket.IPPROTO_TCP, option, value)
+        except OSError as exc:
+            logger.debug("Keepalive isn't enabled: %r", exc)
+
+
+class Timer:
+    """Callback scheduled on a :class:`TimerWheel`, it's cancelled in O(1)"""
+
+    __slots__ = ("tick", "callback", "slot", "wheel")
+
+    def __init__(
+        self, tick: int, callback: Callable[[], None], wheel: "TimerWheel"
+    ) -> None:
+        self.tick = tick  # Tick the timer is due at
+        self.callback = callback
+        self.slot: Optional[Dict["Timer", None]] = None  # Slot the timer waits in
+        self.wheel = wheel
+
+    @property
+    def active(self) -> bool:
+        return self.slot is not None
+
+    def cancel(self) -> None:
+        """It cancels the timer, if it's not fired or cancelled yet"""
+        if self.slot is not None:
+            del self.slot[self]
+            self.slot = None
+            self.wheel.discard()
+
+
+class TimerWheel:
+    """
+    Hierarchical timing wheel: timers are put into slots of a tick each, slots of the next level span a whole
+    rotation of the previous one. Timers are scheduled and cancelled in O(1), a tick fires a single slot and a slot
+    of the next level is cascaded down once a rotation is over. A wheel driven by an event loop wakes it up only for
+    slots that have timers and for cascades, so the amount of timers doesn't add wakeups. It's shared by all the
+    connections of the event loop
+    """
+
+    def __init__(
+        self,
+        resolution: float = BALANCER_DEFAULT_TIMER_RESOLUTION,
+        slots: int = BALANCER_DEFAULT_TIMER_SLOTS,
+        levels: int = BALANCER_DEFAULT_TIMER_LEVELS,
+        loop: Optional[asyncio.AbstractEventLoop] = None,
+    ) -> None:
+        """
+        :param resolution: Seconds a tick takes, timers fire within a tick after they're due
+        :param slots: Slots of each level
+        :param levels: Levels of the wheel
+        :param loop: Event loop that drives the wheel, its clock is used. Otherwise :meth:`advance` should be called
+        """
+        if resolution <= 0 or slots < 2 or levels < 1:
+            raise ValueError(
+                f"Timer wheel should have positive resolution, several slots and a level at least, "
+                f"got: resolution={resolution}, slots={slots}, levels={levels}"
+            )
+
+        self.resolution = resolution
+        self.slots = slots
+        self.levels = levels
+        self.loop = loop
+        self.clock: Callable[[], float] = (
+            loop.time if loop is not None else time.monotonic
+        )
+        # Slots of each level, timers are the keys of the dictionaries, so they're removed in O(1)
+        self.__wheels: List[List[Dict[Timer, None]]] = [
+            [{} for _ in range(slots)] for _ in range(levels)
+        ]
+        # Ticks a slot of each level spans
+        self.__spans = [slots**level for level in range(levels + 1)]
+        self.__origin = self.clock()
+        self.__tick = 0  # The last processed tick
+        self.__count = 0  # Scheduled timers
+        self.__handle: Optional[asyncio.TimerHandle] = None  # Wakeup of the loop
+        self.__armed_tick: Optional[int] = None  # Tick the loop is woken up at
+
+    def __len__(self) -> int:
+        return self.__count
+
+    def schedule(self, delay: float, callback: Callable[[], None]) -> Timer:
+        """
+        It schedules the callback to be called once the delay passes
+        :return: Timer that cancels the callback
+        """
+        due = math.ceil((self.clock() + delay - self.__origin) / self.resolution)
+        timer = Timer(max(due, self.__tick + 1), callback, self)
+        level = self.__place(timer)
+        self.__count += 1
+        if self.loop is not None:
+            # Timers of upper levels are cascaded down by the end of the current rotation at the latest
+            rotation_end = (self.__tick // self.slots + 1) * self.slots
+            self.__arm(timer.tick if level == 0 else rotation_end)
+        return timer
+
+    def discard(self) -> None:
+        """It counts a cancelled timer out"""
+        self.__count -= 1
+
+    def __place(self, timer: Timer) -> int:
+        """
+        It puts the timer into the slot of its tick, at the lowest level that spans it
+        :return: The level
+        """
+        delta = timer.tick - self.__tick
+        level = 0
+        while level < self.levels - 1 and delta >= self.__spans[level + 1]:
+            level += 1
+        # Timers beyond the span of the wheel wait in its farthest slot and they're placed again from there
+        tick = min(timer.tick, self.__tick + self.__spans[self.levels] - 1)
+        slot = self.__wheels[level][(tick // self.__spans[level]) % self.slots]
+        slot[timer] = None
+        timer.slot = slot
+        return level
+
+    def advance(self, now: Optional[float] = None) -> None:
+        """It fires the timers that are due by now, cascading timers of the upper levels on the way"""
+        now = self.clock() if now is None else now
+        # The loop runs a wakeup a moment before its time, within the resolution of its clock
+        target = math.floor((now - self.__origin) / self.resolution + 1e-6)
+        if self.__count == 0:
+            self.__tick = max(
+                self.__tick, target
+            )  # Nothing to fire, so the ticks are skipped
+            return
+        while self.__tick < target and self.__count > 0:
+            self.__tick += 1
+            tick = self.__tick
+            for level in range(self.levels - 1, 0, -1):
+                if tick % self.__spans[level] == 0:
+                    self.__cascade(level, (tick // self.__spans[level]) % self.slots)
+            slot = self.__wheels[0][tick % self.slots]
+            if slot:
+                self.__fire(slot)
+        self.__tick = max(self.__tick, target)
+
+    def __cascade(self, level: int, index: int) -> None:
+        """It places the timers of the slot again, so they get to the lower levels"""
+        slot = self.__wheels[level][index]
+        if not slot:
+            return
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            self.__place(timer)
+
+    def __fire(self, slot: Dict[Timer, None]) -> None:
+        """It calls the callbacks of the timers in the slot, timers beyond the span of the wheel are placed again"""
+        timers = list(slot)
+        slot.clear()
+        for timer in timers:
+            if timer.tick > self.__tick:
+                self.__place(timer)
+                continue
+            timer.slot = None
+            self.__count -= 1
+            try:
+                timer.callback()
+            except Exception as exc:
+                logger.exception(exc)
+
+    def next_tick(self) -> Optional[int]:
+        """
+        It returns the tick the wheel should be advanced at: the first slot with timers in the current rotation
+        of the lowest level or the end of the rotation, when upper levels are cascaded down
+        :return: The tick or None if there are no timers
+        """
+        if self.__count == 0:
+            return None
+        wheel = self.__wheels[0]
+        rotation_end = (self.__tick // self.slots + 1) * self.slots
+        for tick in range(self.__tick + 1, rotation_end):
+            if wheel[tick % self.slots]:
+                return tick
+        return rotation_end
+
+    def __arm(self, tick: int) -> None:
+        """It makes the event loop to advance the wheel at the tick, unless it's woken up earlier already"""
+        if self.__armed_tick is not None and self.__armed_tick <= tick:
+            return
+        if self.__handle is not None:
+            self.__handle.cancel()
+        self.__armed_tick = tick
+        self.__handle = self.loop.call_at(  # type: ignore
+            self.__origin + tick * self.resolution, self.__run
+        )
+
+    def __run(self) -> None:
+        """It advances the wheel on the event loop and sets the next wakeup"""
+        self.__handle = None
+        self.__armed_tick = None
+        self.advance()
+        tick = self.next_tick()
+        if tick is not None:
+            self.__arm(tick)
+
+    def close(self) -> None:
+        """It stops waking the event loop up, timers are left unfired"""
+        if self.__handle is not None:
+            self.__handle.cancel()
+            self.__handle = None
+            self.__armed_tick = None
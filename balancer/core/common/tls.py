@@ -0,0 +1,308 @@
+import asyncio
+import multiprocessing
+import socket
+import ssl
+import time
+from typing import Any, List, Optional, Sequence
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_TLS_HANDSHAKE_TIMEOUT,
+    BALANCER_DEFAULT_TLS_READ_SIZE,
+    BALANCER_DEFAULT_TLS_WRITE_SIZE,
+)
+from balancer.core.logger import logger
+
+
+class TlsSocket:
+    """
+    Server side of a TLS connection over an accepted socket. It looks like a non-blocking socket to the relays:
+    plain data is received and sent by ``recv_into`` and ``send``, and ``BlockingIOError`` is raised while
+    the underlying socket isn't ready, so both engines relay it the same way as a plain socket and wait for
+    the underlying socket as usual. Records are encrypted and decrypted in memory by an ``SSLObject``
+    """
+
+    def __init__(self, sock: socket.socket, context: ssl.SSLContext) -> None:
+        self.sock = sock
+        self.__incoming = ssl.MemoryBIO()
+        self.__outgoing = ssl.MemoryBIO()
+        self.__tls = context.wrap_bio(
+            self.__incoming, self.__outgoing, server_side=True
+        )
+        self.__backlog = bytearray()  # Encrypted bytes the socket hasn't taken yet
+        # Plain bytes that are encrypted, but not reported as sent until their records are taken by the socket
+        self.__unreported = 0
+        # Set when the received records end in the middle of one, so nothing is decrypted until the socket is read
+        self.__starving = False
+
+    def fileno(self) -> int:
+        return self.sock.fileno()
+
+    def setblocking(self, flag: bool) -> None:
+        self.sock.setblocking(flag)
+
+    def gettimeout(self) -> Optional[float]:
+        return self.sock.gettimeout()
+
+    @property
+    def resumed(self) -> bool:
+        """Whether the handshake resumed a previous session of the client"""
+        return self.__tls.session_reused
+
+    @property
+    def alpn_protocol(self) -> Optional[str]:
+        return self.__tls.selected_alpn_protocol()
+
+    @property
+    def version(self) -> Optional[str]:
+        return self.__tls.version()
+
+    @property
+    def pending(self) -> bool:
+        """
+        Checks if there are received records that are not read yet. The socket isn't readable for them anymore,
+        so a selector should take it as readable by itself
+        """
+        return not self.__starving and (
+            self.__incoming.pending > 0 or self.__tls.pending() > 0
+        )
+
+    def recv_into(self, buffer: Any, nbytes: int = 0) -> int:
+        """
+        It decrypts the received records into the buffer, the socket is read only when they're exhausted
+        :return: Amount of plain bytes, 0 means that the peer closed the connection
+        """
+        size = nbytes or len(buffer)
+        while True:
+            try:
+                received: int = self.__tls.read(size, buffer)  # type: ignore
+            except ssl.SSLWantReadError:
+                pass
+            except ssl.SSLZeroReturnError:
+                return 0  # Peer sent close_notify
+            else:
+                if self.__outgoing.pending:
+                    # Post-handshake messages, e.g. a reply to a key update
+                    self.__flush_quietly()
+                return received
+            try:
+                data = self.sock.recv(BALANCER_DEFAULT_TLS_READ_SIZE)
+            except BlockingIOError:
+                self.__starving = True
+                raise
+            self.__starving = False
+            if not data:
+                return 0  # Peer closed the connection without close_notify
+            self.__incoming.write(data)
+
+    def send(self, data: Any) -> int:
+        """
+        It encrypts a part of the data and sends the records. If the socket doesn't take all of them,
+        ``BlockingIOError`` is raised and the same data should be given again, so the part is reported once
+        all its records are sent
+        :return: Amount of plain bytes sent
+        """
+        if self.__unreported == 0:
+            self.__unreported = self.__tls.write(data[:BALANCER_DEFAULT_TLS_WRITE_SIZE])
+        self.__flush()
+        (sent, self.__unreported) = (self.__unreported, 0)
+        return sent
+
+    def __flush(self) -> None:
+        """It sends the encrypted records, ``BlockingIOError`` is raised if the socket doesn't take all of them"""
+        self.__backlog += self.__outgoing.read()
+        while self.__backlog:
+            sent = self.sock.send(self.__backlog)
+            del self.__backlog[:sent]
+
+    def __flush_quietly(self) -> None:
+        """It sends the encrypted records as far as the socket takes them, the rest is sent with the next data"""
+        try:
+            self.__flush()
+        except OSError:
+            pass
+
+    def __handshake_step(self) -> bool:
+        """
+        It advances the handshake with the received records, the records to be sent are put into the backlog
+        :return: Whether the handshake is completed
+        """
+        try:
+            self.__tls.do_handshake()
+            completed = True
+        except ssl.SSLWantReadError:
+            completed = False
+        self.__backlog += self.__outgoing.read()
+        return completed
+
+    def handshake(self, timeout: float) -> None:
+        """
+        It completes the handshake over the blocking socket
+        :raises OSError: If the handshake fails, the peer closes the connection or the timeout expires
+        """
+        deadline = time.monotonic() + timeout
+        while True:
+            completed = self.__handshake_step()
+            while self.__backlog:
+                self.sock.settimeout(max(deadline - time.monotonic(), 0.001))
+                sent = self.sock.send(self.__backlog)
+                del self.__backlog[:sent]
+            if completed:
+                return
+            self.sock.settimeout(max(deadline - time.monotonic(), 0.001))
+            data = self.sock.recv(BALANCER_DEFAULT_TLS_READ_SIZE)
+            if not data:
+                raise ConnectionError("Connection is closed during the handshake")
+            self.__incoming.write(data)
+
+    async def handshake_async(self) -> None:
+        """
+        It completes the handshake over the non-blocking socket on the running event loop
+        :raises OSError: If the handshake fails or the peer closes the connection
+        """
+        loop = asyncio.get_running_loop()
+        while True:
+            completed = self.__handshake_step()
+            if self.__backlog:
+                await loop.sock_sendall(self.sock, bytes(self.__backlog))
+                self.__backlog.clear()
+            if completed:
+                return
+            data = await loop.sock_recv(self.sock, BALANCER_DEFAULT_TLS_READ_SIZE)
+            if not data:
+                raise ConnectionError("Connection is closed during the handshake")
+            self.__incoming.write(data)
+
+    def shutdown(self, how: int) -> None:
+        """It sends close_notify as far as the socket takes it, and shuts the socket down"""
+        try:
+            self.__tls.unwrap()
+        except ssl.SSLError:
+            pass  # The peer's close_notify isn't waited for
+        self.__flush_quietly()
+        try:
+            self.sock.shutdown(how)
+        except OSError:
+            pass  # Peer that closed the connection first resets it on close_notify, it's gone anyway
+
+    def close(self) -> None:
+        self.sock.close()
+
+
+class TlsPolicy:
+    """
+    TLS terminated on the listener. The context is created before balancer processes are forked, so all of them
+    share the keys of session tickets and a client resumes its session on any of them. Handshakes run in the worker
+    of the connection (its own process or coroutine), so a slow or failing client doesn't hold the accept loop.
+    Counters of the handshakes are kept in shared memory, so they're common for all the processes
+    """
+
+    # Counters of the shared state
+    FULL = 0  # Completed handshakes that negotiated a new session
+    RESUMED = 1  # Completed handshakes that resumed a session
+    FAILED = 2  # Handshakes that failed or timed out
+
+    def __init__(
+        self,
+        cert_file: str,
+        key_file: Optional[str] = None,
+        ciphers: str = "",
+        alpn: Sequence[str] = (),
+        session_tickets: bool = True,
+        handshake_timeout: float = BALANCER_DEFAULT_TLS_HANDSHAKE_TIMEOUT,
+    ) -> None:
+        """
+        :param cert_file: Path to the PEM certificate chain
+        :param key_file: Path to the PEM private key, none if it's in the certificate file
+        :param ciphers: OpenSSL cipher list of TLS 1.2, empty means the OpenSSL defaults. TLS 1.3 suites aren't affected
+        :param alpn: Protocols offered to clients by ALPN, in the order of preference
+        :param session_tickets: Whether sessions are resumed by tickets. Otherwise they're kept in the server-side
+            cache of each process, which is able to resume them only in the process that made them
+        :param handshake_timeout: Seconds a handshake is able to take
+        :raises OSError: If the certificate or the key is unable to be read
+        :raises ssl.SSLError: If the certificate, the key or the ciphers are invalid
+        """
+        if handshake_timeout <= 0:
+            raise ValueError(
+                f"Argument 'handshake_timeout' should be positive, got: {handshake_timeout}"
+            )
+
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_SERVER)
+        context.load_cert_chain(cert_file, key_file or None)
+        # Renegotiation started by clients is a known way to spend the CPU of the server
+        context.options |= ssl.OP_NO_RENEGOTIATION
+        if ciphers:
+            context.set_ciphers(ciphers)
+        if alpn:
+            context.set_alpn_protocols(list(alpn))
+        if session_tickets is False:
+            context.options |= ssl.OP_NO_TICKET
+        self.context = context
+        self.alpn = tuple(alpn)
+        self.session_tickets = session_tickets
+        self.handshake_timeout = handshake_timeout
+        self.__counters = multiprocessing.RawArray("q", 3)
+        self.__lock = multiprocessing.Lock()
+
+    def accept(
+        self, client_socket: socket.socket, client_host: Any
+    ) -> Optional[TlsSocket]:
+        """
+        It completes the handshake with the client over the blocking socket
+        :return: Socket that relays plain data or None if the handshake failed, the client socket is closed then
+        """
+        tls_socket = TlsSocket(client_socket, self.context)
+        started_at = time.monotonic()
+        try:
+            tls_socket.handshake(self.handshake_timeout)
+        except OSError as exc:
+            self.__fail(client_socket, client_host, exc)
+            return None
+        client_socket.settimeout(None)
+        self.__complete(tls_socket, client_host, time.monotonic() - started_at)
+        return tls_socket
+
+    async def accept_async(
+        self, client_socket: socket.socket, client_host: Any
+    ) -> Optional[TlsSocket]:
+        """
+        It completes the handshake with the client over the non-blocking socket on the running event loop
+        :return: Socket that relays plain data or None if the handshake failed, the client socket is closed then
+        """
+        tls_socket = TlsSocket(client_socket, self.context)
+        started_at = time.monotonic()
+        try:
+            await asyncio.wait_for(tls_socket.handshake_async(), self.handshake_timeout)
+        except (OSError, asyncio.TimeoutError) as exc:
+            self.__fail(client_socket, client_host, exc)
+            return None
+        except asyncio.CancelledError:
+            client_socket.close()
+            raise
+        self.__complete(tls_socket, client_host, time.monotonic() - started_at)
+        return tls_socket
+
+    def __complete(self, tls_socket: TlsSocket, client_host: Any, took: float) -> None:
+        self.__count(self.RESUMED if tls_socket.resumed else self.FULL)
+        logger.info(
+            "TLS handshake with client '%s' is completed in %.3fs: %s%s, ALPN '%s'",
+            client_host,
+            took,
+            tls_socket.version,
+            " (resumed)" if tls_socket.resumed else "",
+            tls_socket.alpn_protocol or "",
+        )
+
+    def __fail(
+        self, client_socket: socket.socket, client_host: Any, exc: Exception
+    ) -> None:
+        self.__count(self.FAILED)
+        logger.info("TLS handshake with client '%s' failed: %r", client_host, exc)
+        client_socket.close()
+
+    def __count(self, counter: int) -> None:
+        with self.__lock:
+            self.__counters[counter] += 1
+
+    def read(self) -> List[int]:
+        """It returns the counters, positions are the names of them"""
+        return list(self.__counters)
@@ -0,0 +1,95 @@
+import multiprocessing
+import socket
+from typing import Any, List, Sequence
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_UDP_IDLE_TIMEOUT,
+    BALANCER_DEFAULT_UDP_MAX_FLOWS,
+)
+from balancer.core.common.target import Target
+
+
+class UdpPolicy:
+    """
+    Rules of the flows of the UDP mode. A flow is the datagrams of a client address, they're given to the target
+    chosen for the first one, and replies of the target go back to the address. Counters of closed flows and dropped
+    datagrams are kept in shared memory created before balancer processes are forked, so they're common for all
+    of them, while each process keeps its own flows
+    """
+
+    # Counters of the shared state
+    EXPIRED = 0  # Flows closed as they were idle for longer than the timeout
+    EVICTED = 1  # Flows closed to make room for new ones, as the table was full
+    FAILED = 2  # Flows closed as their target refused datagrams
+    DROPPED_SATURATED = 3  # Datagrams dropped as no one target had room for a new flow
+    DROPPED_OVERFLOW = 4  # Datagrams dropped as a socket buffer was full
+
+    def __init__(
+        self,
+        idle_timeout: float = BALANCER_DEFAULT_UDP_IDLE_TIMEOUT,
+        max_flows: int = BALANCER_DEFAULT_UDP_MAX_FLOWS,
+        source_addresses: Sequence[str] = (),
+    ) -> None:
+        """
+        :param idle_timeout: Seconds a flow is kept without datagrams in either direction
+        :param max_flows: Flows a balancer process keeps at once, the least recently active ones are evicted beyond that
+        :param source_addresses: Local addresses flow sockets are bound to in turn. Each flow takes an ephemeral port
+            of its address, so more addresses allow more flows than a single range of ports does
+        """
+        if idle_timeout <= 0:
+            raise ValueError(
+                f"Argument 'idle_timeout' should be positive, got: {idle_timeout}"
+            )
+        if max_flows < 1:
+            raise ValueError(
+                f"Argument 'max_flows' should be positive, got: {max_flows}"
+            )
+
+        self.idle_timeout = idle_timeout
+        self.max_flows = max_flows
+        self.source_addresses = tuple(source_addresses)
+        self.__counters = multiprocessing.RawArray("q", 5)
+        self.__lock = multiprocessing.Lock()
+
+    def count(self, counter: int, value: int = 1) -> None:
+        with self.__lock:
+            self.__counters[counter] += value
+
+    def read(self) -> List[int]:
+        """It returns the counters, positions are the names of them"""
+        return list(self.__counters)
+
+
+class UdpFlow:
+    """
+    Datagrams of a client address relayed to a target. The socket of the flow is connected to the target,
+    so the kernel gives it the replies of the target only and the replies are sent back to the client address
+    """
+
+    __slots__ = (
+        "client_host",
+        "target",
+        "socket",
+        "started_at",
+        "last_seen",
+        "sent",
+        "received",
+    )
+
+    def __init__(
+        self,
+        client_host: Any,
+        target: Target,
+        target_socket: socket.socket,
+        started_at: float,
+    ) -> None:
+        self.client_host = client_host
+        self.target = target
+        self.socket = target_socket
+        self.started_at = started_at
+        self.last_seen = started_at  # Time of the last datagram in either direction
+        self.sent = 0  # Bytes relayed from the client to the target
+        self.received = 0  # Bytes relayed from the target to the client
+
+    def __str__(self):
+        return f"<{__class__.__name__} from={f'%s:%d' % self.client_host} to={self.target.host}:{self.target.port}>"
@@ -4,12 +4,23 @@ import signal
 import socket
 import sys
 import time
+from typing import Optional
 
 from balancer.conf.constants import (
-    BALANCE_DEFAULT_GRACEFUL_SHUTDOWN_TIME,
     BALANCER_DEFAULT_BUFFER_SIZE,
+    BALANCER_DEFAULT_EWMA_FAILURE_PENALTY,
 )
-from balancer.core.logger import logger
+from balancer.core.common.backpressure import BufferPolicy
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.relay import AbstractRelayBuffer
+from balancer.core.common.retry import FailoverPolicy
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.common.timeouts import TimeoutPolicy
+from balancer.core.common.tls import TlsPolicy, TlsSocket
+from balancer.core.enums import BalancerRelayModeEnum
+from balancer.core.exceptions import RelayTimeoutError
+from balancer.core.logger import log_access, logger
 
 
 class Worker(multiprocessing.Process):
@@ -20,29 +31,107 @@ class Worker(multiprocessing.Process):
 
     def __init__(
         self,
-        host: str,
-        port: int,
+        target: Target,
         client_socket: socket.socket,
         client_host: str,
         buffer_size: int = BALANCER_DEFAULT_BUFFER_SIZE,
+        relay_mode: BalancerRelayModeEnum = BalancerRelayModeEnum.AUTO,
+        worker_socket: Optional[socket.socket] = None,
+        targets: Optional[TargetAlgorithmizedList] = None,
+        failover: Optional[FailoverPolicy] = None,
+        metrics: Optional[Metrics] = None,
+        buffers: Optional[BufferPolicy] = None,
+        tls: Optional[TlsPolicy] = None,
+        outliers: Optional[OutlierDetector] = None,
+        timeouts: Optional[TimeoutPolicy] = None,
     ) -> None:
         super(Worker, self).__init__()
-        self.client_socket = client_socket
+        self.client_socket: socket.socket = client_socket
         self.client_host = client_host
 
-        self.host = host
-        self.port = port
+        self.target = target
+        self.host = target.host
+        self.port = target.port
+        # Whether the connection is given back to the target counters
+        self.target_released: bool = False
 
-        self.worker_socket = None
-        self.buffer_size = buffer_size
-        self.failure_connection = multiprocessing.Value("i", 0)
+        self.worker_socket: socket.socket = worker_socket  # type: ignore  # Pooled socket, if any
+        self.relay_mode = relay_mode
+        # Sizes and watermarks of the buffers in each direction
+        self.buffers = buffers or BufferPolicy(buffer_size, buffer_size)
+        # Targets to retry the connection on, if connection to the target fails
+        self.targets = targets
+        self.failover = failover or FailoverPolicy()
+        self.metrics = metrics
+        # TLS is terminated on the client connection, if it's given
+        self.tls = tls
+        # Time the relay is started at, until the session is counted by the metrics
+        self.connected_at: Optional[float] = None
+        # Bytes relayed from the client to the target and back
+        self.relayed = [0, 0]
+        # Ejects the target if its connections keep failing, if enabled
+        self.outliers = outliers
+        # Whether the target closed the connection first, none while neither side closed it
+        self.closed_by_target: Optional[bool] = None
+        self.reset_by_target: bool = (
+            False  # Whether the connection to the target was reset
+        )
+        # Idle and session timeouts of the relay, and keepalive of its sockets
+        self.timeouts = timeouts or TimeoutPolicy()
+        self.timed_out: bool = False  # Whether the relay is closed by a timeout
+
+    def switch_target(self, target: Target) -> None:
+        """It makes the worker to process the connection on another target"""
+        self.target = target
+        self.host = target.host
+        self.port = target.port
+        self.target_released = False
+
+    def record_session(self) -> None:
+        """It counts the relayed session by the metrics and the access log. It's safe to be called several times"""
+        if self.connected_at is None:
+            return
+        duration = time.monotonic() - self.connected_at
+        self.connected_at = None
+        if self.metrics is not None:
+            self.metrics.observe_session(self.target, duration, *self.relayed)
+        if self.outliers is not None:
+            self.outliers.record_session(
+                self.target,
+                duration,
+                self.relayed[1],
+                self.closed_by_target is True,
+                self.reset_by_target,
+            )
+        log_access(
+            self.client_host,
+            self.target.name,
+            self.host,
+            self.port,
+            "timeout" if self.timed_out else "ok",
+            duration,
+            *self.relayed,
+        )
+
+    def release_target(self):
+        """
+        It gives the connection back to the target active connections counters. It's safe to be called several times
+        """
+        if self.target_released is False:
+            self.target_released = True
+            self.target.decrement_connections()
 
     def close_connections(self):
         """
         It closes the client and worker sockets, and then sets the default signal handler for SIGTERM
         """
+        self.record_session()
+        self.release_target()
         logger.info(
-            f"Closing connections from '{self.client_socket.getsockname()}' to '{self.worker_socket.getsockname()}' ..."
+            "Closing connections from '%s' to '%s:%d' ...",
+            self.client_host,
+            self.host,
+            self.port,
         )
         try:
             self.worker_socket.shutdown(socket.SHUT_RDWR)
@@ -70,76 +159,247 @@ class Worker(multiprocessing.Process):
         self.close_connections()
         sys.exit(0)
 
+    def connect(self) -> bool:
+        """
+        It connects to the target. If connection fails, the connection is retried right away on the next target
+        chosen by the failover policy, until it succeeds or the policy gives up
+        :return: Whether the worker is connected
+        """
+        self.failover.budget.record_request()
+        if self.worker_socket is not None:
+            logger.info("Connected to %s:%d (pooled connection)", self.host, self.port)
+            return True
+
+        tried = []
+        while True:
+            tried.append(self.target)
+            connect_started_at = time.monotonic()
+            try:
+                self.worker_socket = socket.create_connection(
+                    (self.target.address, self.port),
+                    timeout=self.failover.connect_timeout,
+                )
+                self.worker_socket.settimeout(None)
+                connect_time = time.monotonic() - connect_started_at
+                self.target.observe_latency(connect_time)
+                self.metrics and self.metrics.observe(
+                    self.target, self.metrics.connect_histogram, connect_time
+                )
+                logger.info("Connected to %s:%d", self.host, self.port)
+                return True
+            except OSError as exc:
+                logger.error(
+                    "Couldn't connect to the worker %s:%d: %s",
+                    self.host,
+                    self.port,
+                    exc,
+                )
+                self.target.observe_latency(BALANCER_DEFAULT_EWMA_FAILURE_PENALTY)
+                self.metrics and self.metrics.add(self.target, Metrics.FAILED)
+                self.outliers and self.outliers.record_failure(
+                    self.target, f"connection failed: {exc!r}"
+                )
+                self.release_target()
+
+            target = None
+            if self.targets is not None:
+                target = self.failover.next_target(self.targets, tried)
+            if target is None:
+                logger.error(
+                    "No one target is able to process client '%s' request",
+                    self.client_host,
+                )
+                log_access(
+                    self.client_host, self.target.name, self.host, self.port, "failed"
+                )
+                return False
+            logger.info(
+                "Retry client '%s' request from worker %s:%d to another worker: %s:%d",
+                self.client_host,
+                self.host,
+                self.port,
+                target.host,
+                target.port,
+            )
+            self.metrics and self.metrics.add(target, Metrics.RETRIES)
+            self.switch_target(target)
+
     def run(self):
         """
-        It reads data from the client socket and sends it to the worker socket, and vice versa
+        It connects to the worker and relays data between it and the client through the path chosen by the relay mode
         :return: The data that is being returned is the data that is being sent to the client.
         """
-        self.worker_socket = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
-
-        try:
-            self.worker_socket.connect((self.host, self.port))
-            logger.info(f"Connected to {self.host}:{self.port}")
-        except Exception:
-            logger.exception(f"Couldn't connect to the worker {self.host}:{self.port}")
-            self.failure_connection.value = 1
-            time.sleep(
-                BALANCE_DEFAULT_GRACEFUL_SHUTDOWN_TIME
-            )  # Give a few seconds for up before it will be removed by the joining thread
+        self.timeouts.keep_alive(self.client_socket)
+        if self.tls is not None:
+            # Handshake runs before the target is connected, so failing clients don't take target connections
+            tls_socket = self.tls.accept(self.client_socket, self.client_host)
+            if tls_socket is None:
+                self.release_target()
+                return
+            self.client_socket = tls_socket  # type: ignore
+        if self.connect() is False:
+            self.client_socket.close()
             return
+        self.timeouts.keep_alive(self.worker_socket)
 
         signal.signal(signal.SIGTERM, self.close_connections_and_shutdown)
 
+        # Client to worker and worker to client directions
+        upstream = self.buffers.build(self.relay_mode, BufferPolicy.UPSTREAM)
+        downstream = self.buffers.build(self.relay_mode, BufferPolicy.DOWNSTREAM)
+        logger.info(
+            "Relay '%s' to %s:%d through '%s' path",
+            self.client_host,
+            self.host,
+            self.port,
+            upstream.path.value,
+        )
+        self.connected_at = time.monotonic()
         try:
-            data_snd = b""  # Send to client data
-            data_rcv = b""  # Data received from client
-            while True:
-                waiting_for_write = []
-                if data_snd:
-                    waiting_for_write.append(self.client_socket)
-                if data_rcv:
-                    waiting_for_write.append(self.worker_socket)
-                try:
-                    (read, write, err) = select.select(
-                        [self.client_socket, self.worker_socket],
-                        waiting_for_write,
-                        [self.client_socket, self.worker_socket],
-                        0.3,
-                    )
-                except KeyboardInterrupt:
-                    break
-                if err:
-                    break
-                if self.client_socket in read:
-                    next_data = self.client_socket.recv(self.buffer_size)
-                    if not next_data:
-                        break
-                    data_rcv += next_data
-
-                if self.worker_socket in read:
-                    next_data = self.worker_socket.recv(self.buffer_size)
-                    if not next_data:
-                        break
-                    data_snd += next_data
-
-                if self.worker_socket in write:
-                    while data_rcv:
-                        self.worker_socket.send(data_rcv[: self.buffer_size])
-                        data_rcv = data_rcv[self.buffer_size:]  # fmt: skip
-
-                if self.client_socket in write:
-                    while data_snd:
-                        self.client_socket.send(data_snd[: self.buffer_size])
-                        data_snd = data_snd[self.buffer_size:]  # fmt: skip
-            logger.debug(f"Data to send: {data_snd}")
-            logger.debug(f"Data to receive: {data_rcv}")
+            self.relay(upstream, downstream)
+            logger.debug("Data to send: %d bytes", downstream.size)
+            logger.debug("Data to receive: %d bytes", upstream.size)
+        except ConnectionError as exc:
+            logger.info(
+                "Connection of '%s' to %s:%d is broken by the %s: %r",
+                self.client_host,
+                self.host,
+                self.port,
+                "target" if self.reset_by_target else "client",
+                exc,
+            )
+        except RelayTimeoutError as exc:
+            self.timed_out = True
+            logger.info(
+                "Connection of '%s' to %s:%d is closed as %s",
+                self.client_host,
+                self.host,
+                self.port,
+                exc,
+            )
         except Exception as exc:
             logger.critical(
-                "Got unexpected behaviour on: %s:%d. Closing connections and shutting down."
-                % (self.host, self.port)
+                "Got unexpected behaviour on: %s:%d. Closing connections and shutting down.",
+                self.host,
+                self.port,
             )
             logger.exception(exc)
+        finally:
+            for buffer in (upstream, downstream):
+                # Data that is not delivered is given back to the memory budget
+                self.buffers.account(buffer.size, -buffer.size)
+                buffer.close()
         self.close_connections_and_shutdown()
 
+    def relay(self, upstream: AbstractRelayBuffer, downstream: AbstractRelayBuffer):
+        """
+        It moves data from the client socket to the worker socket through the upstream buffer, and vice versa through
+        the downstream one, until one of the sides closes the connection and all data received from it is delivered.
+        A side is not read once its buffer is full until it drains to the low watermark, so the buffers never grow
+        beyond their capacity, or while the buffer takes more than its share of the used up memory budget.
+        Time to the first byte of the response is observed as the target latency. Waiting for the sockets lasts until
+        the nearest timeout of the relay, so an idle relay doesn't wake up
+        :raises RelayTimeoutError: If the relay is idle or lasts for longer than its timeouts allow
+        """
+        self.client_socket.setblocking(False)
+        self.worker_socket.setblocking(False)
+        channels = (
+            (self.client_socket, upstream, self.worker_socket),
+            (self.worker_socket, downstream, self.client_socket),
+        )
+        closed = False  # Turns to True when one of the sides closes the connection
+        # Time the first request data was sent at, until the first response data is received
+        request_sent_at: Optional[float] = None
+        response_received = False
+        timeouts = self.timeouts
+        started_at = received_at = time.monotonic()
+        # Time buffered data started waiting for its side to take it, until the side takes some of it
+        sending_since: Optional[float] = None
+        while True:
+            waiting_for_read = []
+            waiting_for_write = []
+            for source, buffer, destination in channels:
+                if closed is False and self.buffers.may_receive(buffer):
+                    waiting_for_read.append(source)
+                if not buffer.is_empty:
+                    waiting_for_write.append(destination)
+            if closed is True and not waiting_for_write:
+                break
+            if not waiting_for_write:
+                sending_since = None
+            elif sending_since is None:
+                sending_since = time.monotonic()
+            # Decrypted TLS records are not seen by the selector, so their socket is taken as readable by itself
+            pending = [
+                source
+                for source in waiting_for_read
+                if isinstance(source, TlsSocket) and source.pending
+            ]
+            timeout: Optional[float] = 0
+            if not pending:
+                deadline = timeouts.deadline(started_at, received_at, sending_since)
+                if deadline is not None:
+                    timeout = max(deadline - time.monotonic(), 0)
+                else:
+                    timeout = None  # Signals interrupt the waiting anyway
+            try:
+                (read, write, err) = select.select(
+                    waiting_for_read,
+                    waiting_for_write,
+                    [self.client_socket, self.worker_socket],
+                    timeout,
+                )
+            except KeyboardInterrupt:
+                break
+            if err:
+                break
+            if not read and not write and not pending:
+                reason = timeouts.expired(
+                    time.monotonic(), started_at, received_at, sending_since
+                )
+                if reason is not None:
+                    raise RelayTimeoutError(reason)
+                continue
+            read.extend(source for source in pending if source not in read)
+            for direction, (source, buffer, destination) in enumerate(channels):
+                if source in read:
+                    try:
+                        received = buffer.recv_from(source)
+                        if received == 0:
+                            if closed is False:
+                                self.closed_by_target = source is self.worker_socket
+                            closed = True
+                        else:
+                            received_at = time.monotonic()
+                        self.relayed[direction] += received
+                        self.buffers.account(buffer.size - received, received)
+                    except BlockingIOError:
+                        pass
+                    except ConnectionError:
+                        self.reset_by_target = source is self.worker_socket
+                        raise
+                if destination in write:
+                    try:
+                        sent = buffer.send_to(destination)
+                        self.buffers.account(buffer.size + sent, -sent)
+                        sending_since = (
+                            None  # The side takes data, so it's waited for anew
+                        )
+                    except BlockingIOError:
+                        pass
+                    except ConnectionError:
+                        self.reset_by_target = destination is self.worker_socket
+                        raise
+            if response_received is False:
+                if request_sent_at is None:
+                    if not downstream.is_empty:
+                        # The target speaks first, so there is nothing to measure
+                        response_received = True
+                    elif self.worker_socket in write:
+                        request_sent_at = time.monotonic()
+                elif not downstream.is_empty:
+                    response_received = True
+                    self.target.observe_latency(time.monotonic() - request_sent_at)
+
     def __str__(self):
-        return f"<{__class__.__name__} on={self.host}:{self.port}, from={f'%s:%d' % self.client_socket.getsockname()}>"
+        return f"<{__class__.__name__} on={self.host}:{self.port}, from={f'%s:%d' % self.client_host}>"
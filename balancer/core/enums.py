@@ -23,7 +23,65 @@ class BalancerAlgorithmEnum(BaseBalancerEnum):
 
     RANDOM = "random"
     ROUND_ROBIN = "round-robin"
+    WEIGHTED_ROUND_ROBIN = "weighted-round-robin"
+    CONSISTENT_HASH = "consistent-hash"
+    MAGLEV = "maglev"
+    LEAST_CONNECTIONS = "least-connections"
+    WEIGHTED_LEAST_CONNECTIONS = "weighted-least-connections"
+    PEAK_EWMA = "peak-ewma"
 
     @classmethod
     def is_valid_algorithm(cls, value) -> bool:
         return cls.has_value(value)
+
+
+@enum.unique
+class BalancerEngineEnum(BaseBalancerEnum):
+    """Enum class that describes existing engines that relay client connections"""
+
+    PROCESS = "process"  # Process per connection
+    ASYNCIO = "asyncio"  # Coroutine per connection on a single event loop
+
+    @classmethod
+    def is_valid_engine(cls, value) -> bool:
+        return cls.has_value(value)
+
+
+@enum.unique
+class BalancerRelayModeEnum(BaseBalancerEnum):
+    """Enum class that describes existing paths of relaying data between client and target"""
+
+    AUTO = "auto"  # Kernel-side path where it's supported, user-space otherwise
+    BUFFER = "buffer"  # User-space preallocated ring buffers
+    SPLICE = "splice"  # Kernel-side pipes with os.splice, Linux only
+
+    @classmethod
+    def is_valid_relay_mode(cls, value) -> bool:
+        return cls.has_value(value)
+
+
+@enum.unique
+class BalancerLoggingModeEnum(BaseBalancerEnum):
+    """Enum class that describes existing ways of writing log records"""
+
+    SYNC = "sync"  # Each process writes records to the files by itself
+    QUEUE = (
+        "queue"  # Records are queued to a single background writer that batches writes
+    )
+
+    @classmethod
+    def is_valid_logging_mode(cls, value) -> bool:
+        return cls.has_value(value)
+
+
+@enum.unique
+class BalancerProtocolEnum(BaseBalancerEnum):
+    """Enum class that describes existing protocols the client connections are balanced by"""
+
+    TCP = "tcp"  # Connections are relayed as they are, each one to a single target
+    HTTP = "http"  # HTTP/1.1 requests are balanced one by one over keep-alive connections to the targets
+    UDP = "udp"  # Datagrams are balanced by flows, a flow is the datagrams of a client address
+
+    @classmethod
+    def is_valid_protocol(cls, value) -> bool:
+        return cls.has_value(value)
@@ -1,2 +1,21 @@
 class WrongBalanceAlgorithmError(Exception):
     """Raised when provided invalid algorithm (e.g. don't exist an implementation)"""
+
+
+class HttpProtocolError(Exception):
+    """Raised when an HTTP message is malformed or isn't able to be relayed (e.g. its head is too large)"""
+
+    def __init__(self, message: str, status: int = 400) -> None:
+        super(HttpProtocolError, self).__init__(message)
+        self.status = status  # Status of the response the client is given
+
+
+class HttpClientError(HttpProtocolError):
+    """
+    Raised when the client side of a relayed HTTP request fails (e.g. its body is malformed or the client is gone),
+    so it isn't taken as a failure of the target
+    """
+
+
+class RelayTimeoutError(TimeoutError):
+    """Raised when a relayed connection exceeds one of its timeouts (e.g. it's idle for too long)"""
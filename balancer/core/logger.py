@@ -1,7 +1,30 @@
+import atexit
+import fcntl
+import json
 import logging.config
+import multiprocessing
+import os
+import random
+import select
+import struct
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Deque, Dict, Iterator, List, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_LOG_FLUSH_INTERVAL,
+    BALANCER_DEFAULT_LOG_MAX_LINE_SIZE,
+    BALANCER_DEFAULT_LOG_PIPE_SIZE,
+)
+from balancer.core.enums import BalancerLoggingModeEnum
 
 LOGGER_NAME = __name__
 
+ACCESS_LOGGER_NAME = f"{LOGGER_NAME}.access"
+
 logger_settings = {
     "version": 1,
     "disable_existing_loggers": False,
@@ -24,3 +47,353 @@ logger_settings = {
 # Setting up the logger to log to the console.
 logging.config.dictConfig(logger_settings)
 logger = logging.getLogger(LOGGER_NAME)
+# Sessions of clients, one structured record per session. It's enabled by the settings
+access_logger = logging.getLogger(ACCESS_LOGGER_NAME)
+access_logger.propagate = False
+access_logger.disabled = True
+
+
+@contextmanager
+def handlers_locked() -> Iterator[None]:
+    """
+    It holds locks of the logger handlers, so no thread is in the middle of writing a record meanwhile.
+    Processes must be forked under it: a child doesn't get threads of the parent, so a stream lock taken
+    by one of them at the fork would never be released in the child
+    """
+    handlers = list(logger.handlers)
+    for handler in handlers:
+        handler.acquire()
+    try:
+        yield
+    finally:
+        for handler in reversed(handlers):
+            handler.release()
+
+
+class LogWriter:
+    """
+    Background writer of the log lines that all the balancer processes send to it through a pipe created
+    before the processes are forked. Records are formatted once where they're logged and only the lines
+    go through the pipe. The writer wakes up at most once per 'flush_interval' and writes the lines that came
+    meanwhile with a single write per file, so relays are neither waiting for the files nor interrupted
+    by a wakeup of the writer per record
+    """
+
+    MAIN_CHANNEL = 0
+    ACCESS_CHANNEL = 1
+    # Marker, channel, level and length of the line that follows
+    FRAME_HEADER = struct.Struct("!BBBI")
+    # Byte that starts a frame, it's never a part of UTF-8 text, so the next frame is found after garbage
+    FRAME_MARKER = 0xFF
+
+    def __init__(
+        self, flush_interval: float = BALANCER_DEFAULT_LOG_FLUSH_INTERVAL
+    ) -> None:
+        if flush_interval <= 0:
+            raise ValueError(
+                f"Argument 'flush_interval' should be positive, got: {flush_interval}"
+            )
+
+        self.flush_interval = flush_interval
+        (self.read_fd, self.write_fd) = os.pipe()
+        # Lines of a whole interval should fit into the pipe, so senders don't wait for the writer
+        try:
+            fcntl.fcntl(
+                self.write_fd,
+                fcntl.F_SETPIPE_SZ,
+                BALANCER_DEFAULT_LOG_PIPE_SIZE,
+            )
+        except (AttributeError, OSError):
+            pass  # Linux only, the default size is used otherwise
+        os.set_blocking(self.read_fd, False)
+        # Frames longer than PIPE_BUF are not written to a pipe atomically, so writes of the processes are locked.
+        # It's reentrant, as signal handlers log as well and they're able to interrupt a write of the same thread,
+        # their frames are deferred then
+        self.lock = multiprocessing.RLock()
+        # Whether this process is in the middle of writing a frame, it's changed under the lock only
+        self.writing: bool = False
+        # Frames of signal handlers that interrupted a write, they're written once the interrupted frame is
+        self.deferred: Deque[memoryview] = deque()
+        # Channel, minimal level and stream
+        self.streams: List[Tuple[int, int, IO[str]]] = []
+        self.pending = bytearray()  # Read data that doesn't make a whole frame yet
+        self.keep_going: bool = False
+        self.__thread: threading.Thread = None  # type: ignore
+
+    def add_stream(
+        self, stream: IO[str], level: int = logging.DEBUG, channel: int = MAIN_CHANNEL
+    ) -> None:
+        """It makes lines of the channel of the level and above to be written to the stream"""
+        self.streams.append((channel, level, stream))
+
+    def handler(self, channel: int, formatter: logging.Formatter) -> "LogPipeHandler":
+        """It builds a handler that sends records formatted by the formatter to the channel"""
+        handler = LogPipeHandler(self, channel)
+        handler.setFormatter(formatter)
+        return handler
+
+    def send(self, channel: int, levelno: int, line: str) -> None:
+        """
+        It sends the line to the writer. It's called by any process, the writer process included.
+        Lines longer than the maximal size are cut
+        """
+        data = line.encode("utf-8", "backslashreplace")[
+            :BALANCER_DEFAULT_LOG_MAX_LINE_SIZE
+        ]
+        frame = memoryview(self.pack_frame(channel, levelno, data))
+        with self.lock:
+            if self.writing is True:
+                # A signal handler interrupted a write of this thread, its frame mustn't land inside that one
+                self.deferred.append(frame)
+                return
+            self.writing = True
+            try:
+                self.deferred.append(frame)
+                while self.deferred:
+                    frame = self.deferred[0]
+                    while frame:
+                        written = os.write(self.write_fd, frame)
+                        frame = frame[written:]
+                        self.deferred[0] = frame
+                    self.deferred.popleft()
+            except BaseException:
+                # The rest of a cut frame isn't sent, the writer skips the part that was
+                self.deferred.clear()
+                raise
+            finally:
+                self.writing = False
+
+    def start(self) -> None:
+        """It starts the thread that writes the lines"""
+        self.keep_going = True
+        self.__thread = threading.Thread(
+            target=self.keep_writing, name="log-writer", daemon=True
+        )
+        self.__thread.start()
+
+    def keep_writing(self) -> None:
+        """It waits for lines, lets them pile up for the flush interval and writes them"""
+        while self.keep_going is True:
+            (readable, _, _) = select.select(
+                [self.read_fd], [], [], self.flush_interval
+            )
+            if readable:
+                time.sleep(self.flush_interval)
+                self.write_pending()
+
+    def write_pending(self) -> None:
+        """It reads all the lines sent so far and writes them to the streams"""
+        while True:
+            try:
+                chunk = os.read(self.read_fd, BALANCER_DEFAULT_LOG_PIPE_SIZE)
+            except BlockingIOError:
+                break
+            if not chunk:
+                break
+            self.pending += chunk
+
+        batches: Dict[int, List[str]] = {}  # Lines by index of the stream
+        offset = 0
+        while len(self.pending) - offset >= self.FRAME_HEADER.size:
+            (marker, channel, levelno, length) = self.FRAME_HEADER.unpack_from(
+                self.pending, offset
+            )
+            start = offset + self.FRAME_HEADER.size
+            end = start + length
+            # A frame that takes the marker of the next one in was cut
+            cut = self.pending.find(self.FRAME_MARKER, start, end) != -1
+            if cut or not self.is_frame_header(marker, channel, levelno, length):
+                # Frames are out of sync (e.g. a write failed midway), bytes are skipped up to the next frame
+                offset = self.pending.find(self.FRAME_MARKER, offset + 1)
+                if offset == -1:
+                    offset = len(self.pending)
+                continue
+            if end > len(self.pending):
+                break
+            line = self.pending[start:end].decode("utf-8", "replace")
+            offset = end
+            for (index, (stream_channel, level, _)) in enumerate(self.streams):
+                if stream_channel == channel and levelno >= level:
+                    batches.setdefault(index, []).append(line)
+        del self.pending[:offset]
+
+        for (index, lines) in batches.items():
+            stream = self.streams[index][2]
+            try:
+                stream.write("\n".join(lines) + "\n")
+                stream.flush()
+            except OSError:
+                pass  # E.g. the disk is full, lines are dropped rather than relays are stopped
+
+    @classmethod
+    def pack_frame(cls, channel: int, levelno: int, data: bytes) -> bytes:
+        """It builds the frame of the encoded line"""
+        return (
+            cls.FRAME_HEADER.pack(cls.FRAME_MARKER, channel, levelno, len(data)) + data
+        )
+
+    @classmethod
+    def is_frame_header(
+        cls, marker: int, channel: int, levelno: int, length: int
+    ) -> bool:
+        """It checks if the values are able to be a header of a frame, rather than garbage"""
+        if marker != cls.FRAME_MARKER:
+            return False
+        if channel not in (cls.MAIN_CHANNEL, cls.ACCESS_CHANNEL):
+            return False
+        return (
+            levelno <= logging.CRITICAL and length <= BALANCER_DEFAULT_LOG_MAX_LINE_SIZE
+        )
+
+    def stop(self) -> None:
+        """It stops the thread and writes the lines sent before"""
+        self.keep_going = False
+        if self.__thread is not None:
+            self.__thread.join()
+        self.write_pending()
+
+
+class LogPipeHandler(logging.Handler):
+    """Handler that sends formatted records to the :class:`LogWriter` instead of writing them"""
+
+    def __init__(self, writer: LogWriter, channel: int) -> None:
+        super(LogPipeHandler, self).__init__()
+        self.writer = writer
+        self.channel = channel
+
+    def emit(self, record: logging.LogRecord) -> None:
+        try:
+            self.writer.send(self.channel, record.levelno, self.format(record))
+        except Exception:
+            self.handleError(record)
+
+
+class AccessSampler(logging.Filter):
+    """It passes the given share of access records, so the access log is affordable under load"""
+
+    def __init__(self, rate: float) -> None:
+        if not 0 <= rate <= 1:
+            raise ValueError(f"Argument 'rate' should be in [0, 1], got: {rate}")
+
+        super(AccessSampler, self).__init__()
+        self.rate = rate
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        return self.rate == 1 or random.random() < self.rate
+
+
+class AccessFormatter(logging.Formatter):
+    """It formats access records as JSON lines, so they're able to be parsed by log collectors"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        return json.dumps(
+            {
+                "time": round(record.created, 3),
+                "process": record.processName,
+                **getattr(record, "access", {}),
+            }
+        )
+
+
+def log_access(
+    client_host: Any,
+    target_name: str,
+    host: str,
+    port: int,
+    status: str,
+    duration: float = 0,
+    sent: int = 0,
+    received: int = 0,
+) -> None:
+    """
+    It logs a session of the client to the access log. Nothing is built if the access log is disabled
+    :param client_host: Address of the client as it's accepted, a (host, port) pair
+    :param status: 'ok' if the session is relayed, 'timeout' if it's closed by a timeout, 'failed' if no one target
+        is able to be connected
+    :param duration: Seconds the session is relayed for
+    :param sent: Bytes relayed from the client to the target
+    :param received: Bytes relayed from the target to the client
+    """
+    if not access_logger.isEnabledFor(logging.INFO):
+        return
+    access_logger.info(
+        "access",
+        extra={
+            "access": {
+                "client": "%s:%d" % client_host,
+                "target": target_name,
+                "upstream": "%s:%d" % (host, port),
+                "status": status,
+                "duration": round(duration, 6),
+                "sent": sent,
+                "received": received,
+            }
+        },
+    )
+
+
+def setup_logging(
+    logs_dir: Path,
+    name: str,
+    level: str = "DEBUG",
+    mode: BalancerLoggingModeEnum = BalancerLoggingModeEnum.SYNC,
+    flush_interval: float = BALANCER_DEFAULT_LOG_FLUSH_INTERVAL,
+    access_log: bool = False,
+    access_sample_rate: float = 1,
+) -> None:
+    """
+    It sets up the debug, info, error and access log files in the directory. In the sync mode each process writes
+    records to the files by itself. In the queue mode records are sent to the :class:`LogWriter` started here,
+    so it must be called before the balancer processes are forked
+    :param name: Prefix of the log files names
+    :param level: Minimal level of the records to be logged
+    """
+    logger.setLevel(level)
+    formatter = logger.handlers[0].formatter
+    levels = (
+        ("debug", logging.DEBUG),
+        ("info", logging.INFO),
+        ("err", logging.ERROR),
+    )
+    access_path_to = logs_dir.joinpath(f"{name}.access.log")
+    if access_log is True:
+        access_logger.disabled = False
+        access_logger.setLevel(logging.INFO)
+        access_logger.addFilter(AccessSampler(access_sample_rate))
+
+    if mode is BalancerLoggingModeEnum.SYNC:
+        for (suffix, handler_level) in levels:
+            handler = logging.FileHandler(logs_dir.joinpath(f"{name}.{suffix}.log"))
+            handler.setLevel(handler_level)
+            handler.setFormatter(formatter)
+            logger.addHandler(handler)
+        if access_log is True:
+            access_handler = logging.FileHandler(access_path_to)
+            access_handler.setFormatter(AccessFormatter())
+            access_logger.addHandler(access_handler)
+        return
+
+    writer = LogWriter(flush_interval=flush_interval)
+    for console_handler in list(logger.handlers):
+        # Console is written by the writer as well
+        if isinstance(console_handler, logging.StreamHandler):
+            writer.add_stream(console_handler.stream, console_handler.level)
+        logger.removeHandler(console_handler)
+    for (suffix, handler_level) in levels:
+        writer.add_stream(
+            open(logs_dir.joinpath(f"{name}.{suffix}.log"), "a", encoding="utf-8"),
+            handler_level,
+        )
+    if access_log is True:
+        writer.add_stream(
+            open(access_path_to, "a", encoding="utf-8"),
+            logging.INFO,
+            LogWriter.ACCESS_CHANNEL,
+        )
+    logger.addHandler(writer.handler(LogWriter.MAIN_CHANNEL, formatter))  # type: ignore
+    access_logger.addHandler(
+        writer.handler(LogWriter.ACCESS_CHANNEL, AccessFormatter())
+    )
+    writer.start()
+    # Lines sent by the main process right before it exits are written as well
+    atexit.register(writer.stop)
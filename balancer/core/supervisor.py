@@ -0,0 +1,262 @@
+import multiprocessing.connection
+import os
+import signal
+import socket
+import sys
+import time
+from functools import partial
+from typing import Callable, Dict, List, Optional, Tuple
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_DRAIN_TIMEOUT,
+    BALANCER_DEFAULT_PROCESSES,
+    BALANCER_DEFAULT_RESTART_WAITING,
+)
+from balancer.core.balancer import Balancer
+from balancer.core.common.algorithms import BalanceAlgorithmFactory
+from balancer.core.common.health import HealthChecker
+from balancer.core.common.metrics import Metrics, MetricsServer
+from balancer.core.common.reload import SettingsReloader
+from balancer.core.common.resolver import TargetResolver
+from balancer.core.common.target import TargetAlgorithmizedList
+from balancer.core.logger import handlers_locked, logger
+
+
+class BalancerSupervisor:
+    """
+    Class that pre-forks a pool of long-lived balancer processes listening on the same port.
+    Each balancer process runs its own accept and relay loops, so the connection rate scales with the CPU cores.
+    Balancers bind the port with SO_REUSEPORT where it's supported, otherwise they share a socket
+    bound by the supervisor. Crashed balancers are restarted, SIGTERM is forwarded to all of them.
+    On SIGHUP a generation of balancers with the reloaded targets is started and the previous one is drained,
+    so shared counters of the new targets are created before the balancers are forked. On SIGQUIT all the balancers
+    are drained and the supervisor exits (e.g. once an upgraded one took the listening socket over)
+    """
+
+    def __init__(
+        self,
+        factory: Callable[..., Balancer],
+        processes: int = BALANCER_DEFAULT_PROCESSES,
+        health_checker: Optional[HealthChecker] = None,
+        metrics_server: Optional[MetricsServer] = None,
+        metrics: Optional[Metrics] = None,
+        reloader: Optional[SettingsReloader] = None,
+        listen_socket: Optional[socket.socket] = None,
+        drain_timeout: float = BALANCER_DEFAULT_DRAIN_TIMEOUT,
+        resolver: Optional[TargetResolver] = None,
+    ) -> None:
+        """
+        :param factory: Callable that builds a balancer, it should accept `reuse_port`, `listen_socket`, `targets`
+            and `algorithm` arguments
+        :param processes: Amount of balancer processes to pre-fork
+        :param health_checker: Checker that probes the targets once for all the balancers, if enabled
+        :param metrics_server: Server of the metrics counted by all the balancers, if enabled
+        :param metrics: Metrics counted by all the balancers, slots of reloaded targets are given before forking
+        :param reloader: Reader of the targets for SIGHUP
+        :param listen_socket: Listening socket the balancers share instead of binding the port with SO_REUSEPORT
+            (e.g. one that is handed over on upgrades). Connections queued on a closed SO_REUSEPORT socket are reset,
+            while a shared one keeps them for the other holders
+        :param drain_timeout: Seconds the balancers are given to drain on SIGQUIT
+        :param resolver: Resolver of host names of the targets for the health checks, the balancers run their own
+        """
+        if type(processes) is not int:
+            raise TypeError(
+                f"Invalid type of 'processes' argument, got: {type(processes)}. Expected: {int}"
+            )
+        if processes < 1:
+            raise ValueError(
+                f"Argument 'processes' should be positive number, got: {processes}"
+            )
+
+        self.factory = factory
+        self.processes = processes
+        self.health_checker = health_checker
+        self.metrics_server = metrics_server
+        # Shared socket, if it's given or SO_REUSEPORT isn't supported
+        self.listen_socket: Optional[socket.socket] = listen_socket
+        self.drain_timeout = drain_timeout
+        self.metrics = metrics
+        self.reloader = reloader
+        self.resolver = resolver
+        self.balancers: Dict[int, Balancer] = {}  # Running balancers by their sentinels
+        # Balancers of the previous generations completing their relays, by their sentinels
+        self.draining_balancers: Dict[int, Balancer] = {}
+        self.targets: TargetAlgorithmizedList = None  # type: ignore  # Targets of the current generation
+        # Pipe that interrupts waiting for the balancers, so the waiting is restarted for a new generation
+        self.wakeup: Tuple[int, int] = (-1, -1)
+        self.keep_going: bool = True
+        self.draining: bool = (
+            False  # Set on SIGQUIT, balancers are waited for to drain before exiting
+        )
+
+    def spawn(self) -> Balancer:
+        """
+        It builds a balancer that shares the listening port with the others and starts it
+        :return: The started balancer
+        """
+        if self.listen_socket is None:
+            balancer = self.factory(reuse_port=True)
+        else:
+            balancer = self.factory(listen_socket=self.listen_socket)
+        with handlers_locked():
+            balancer.start()
+        self.balancers[balancer.sentinel] = balancer
+        logger.info(f"Balancer '{balancer}' is started with pid: {balancer.pid}")
+        return balancer
+
+    def reload(self, *args):
+        """
+        It reads the targets and the algorithm from the settings again, starts a generation of balancers with them
+        and makes the previous generation to drain, i.e. to stop accepting and complete the relays in progress.
+        If the settings are invalid, the running balancers are kept
+        """
+        try:
+            (targets, algorithm) = self.reloader.load()  # type: ignore
+            reloaded = self.targets.reloaded(
+                targets, BalanceAlgorithmFactory.build(algorithm)
+            )
+        except Exception as exc:
+            logger.error(f"Reload failed, the running targets are kept: {exc!r}")
+            return
+
+        self.metrics and self.metrics.register(reloaded)
+        # Balancers are built of the targets bound to the counters already, so the counters are shared by all of them
+        self.factory = partial(
+            self.factory, targets=list(reloaded), algorithm=algorithm
+        )
+        previous = self.balancers
+        self.balancers = {}
+        for _ in range(self.processes):
+            self.spawn()
+        self.targets = reloaded
+        self.resolver and self.resolver.update_targets(reloaded)
+        self.health_checker and self.health_checker.update_targets(reloaded)
+        self.metrics_server and self.metrics_server.update_targets(reloaded)
+
+        for sentinel, balancer in previous.items():
+            self.draining_balancers[sentinel] = balancer
+            try:
+                os.kill(balancer.pid, signal.SIGQUIT)  # type: ignore
+            except OSError as exc:
+                logger.exception(exc)
+        os.write(self.wakeup[1], b"\0")
+        logger.info(
+            f"Balancers are reloaded with {len(reloaded)} targets, {len(previous)} previous ones are draining"
+        )
+
+    def drain_balancers(self, *args):
+        """
+        It makes all the balancers to drain, i.e. to stop accepting and complete the relays in progress.
+        The supervisor exits once they're drained, drained balancers are not restarted
+        """
+        logger.info(
+            f"Balancers are draining, they're given {self.drain_timeout}s to complete"
+        )
+        self.keep_going = False
+        self.draining = True
+        self.resolver and self.resolver.stop()
+        self.health_checker and self.health_checker.stop()
+        self.metrics_server and self.metrics_server.stop()
+        self.reloader and self.reloader.stop()
+        for sentinel, balancer in self.balancers.items():
+            self.draining_balancers[sentinel] = balancer
+            try:
+                os.kill(balancer.pid, signal.SIGQUIT)  # type: ignore
+            except OSError as exc:
+                logger.exception(exc)
+        self.balancers = {}
+        os.write(self.wakeup[1], b"\0")
+
+    def wait_drained(self) -> None:
+        """It waits for the draining balancers to complete, remaining ones are terminated after the drain timeout"""
+        # Balancers terminate their relays after the drain timeout by themselves, so they're given a moment beyond it
+        deadline = time.monotonic() + self.drain_timeout + 3
+        for sentinel, balancer in list(self.draining_balancers.items()):
+            balancer.join(max(deadline - time.monotonic(), 0))
+            if balancer.is_alive() is False:
+                self.draining_balancers.pop(sentinel)
+                logger.info(f"Balancer '{balancer}' is drained")
+
+    def close_balancers(self, *args):
+        """
+        It forwards the termination to all the balancers and waits for them to complete
+        """
+        self.keep_going = False
+        self.resolver and self.resolver.stop()
+        self.health_checker and self.health_checker.stop()
+        self.metrics_server and self.metrics_server.stop()
+        self.reloader and self.reloader.stop()
+        balancers: List[Balancer] = [
+            *self.balancers.values(),
+            *self.draining_balancers.values(),
+        ]
+        for balancer in balancers:
+            try:
+                balancer.terminate()
+            except Exception as exc:
+                logger.exception(exc)
+
+        for balancer in balancers:
+            balancer.join(3)
+            if balancer.is_alive() is True:  # One last chance was given, so we kill
+                logger.warning(f"Balancer '{balancer}' is killed")
+                balancer.kill()
+
+        if self.listen_socket is not None:
+            self.listen_socket.close()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.exit(0)
+
+    def run(self):
+        """
+        It starts the balancers and then waits for any of them to exit. Crashed balancers are restarted
+        until the supervisor is terminated
+        :return: NoReturn
+        """
+        if self.listen_socket is None and not hasattr(socket, "SO_REUSEPORT"):
+            logger.warning(
+                "SO_REUSEPORT isn't supported by the platform, balancers will share an inherited socket"
+            )
+            self.listen_socket = self.factory().bind()
+
+        self.wakeup = os.pipe()
+        signal.signal(signal.SIGTERM, self.close_balancers)
+        signal.signal(signal.SIGQUIT, self.drain_balancers)
+        for _ in range(self.processes):
+            balancer = self.spawn()
+        # Targets are bound to the shared counters by the balancers, so health flags are seen by all of them
+        self.targets = balancer.targets
+        self.resolver and self.resolver.start(self.targets)
+        self.health_checker and self.health_checker.start(self.targets)
+        self.metrics_server and self.metrics_server.start(self.targets, balancer.port)
+        signal.signal(signal.SIGHUP, self.reload if self.reloader else signal.SIG_IGN)
+
+        while self.keep_going is True:
+            ready = multiprocessing.connection.wait(
+                [self.wakeup[0], *self.balancers, *self.draining_balancers]
+            )
+            for sentinel in ready:
+                if sentinel == self.wakeup[0]:
+                    os.read(self.wakeup[0], 1)
+                    continue
+                if sentinel in self.draining_balancers:
+                    balancer = self.draining_balancers.pop(sentinel)  # type: ignore
+                    balancer.join()
+                    logger.info(f"Balancer '{balancer}' is drained")
+                    continue
+                if sentinel not in self.balancers:
+                    continue  # Collected by the previous round
+                balancer = self.balancers.pop(sentinel)  # type: ignore
+                balancer.join()
+                if self.keep_going is False:
+                    break
+                logger.error(
+                    f"Balancer '{balancer}' exited unexpectedly with code: {balancer.exitcode}. "
+                    f"Restarting in {BALANCER_DEFAULT_RESTART_WAITING}s..."
+                )
+                time.sleep(BALANCER_DEFAULT_RESTART_WAITING)
+                self.spawn()
+
+        if self.draining is True:
+            self.wait_drained()
+        self.close_balancers()
@@ -0,0 +1,371 @@
+import asyncio
+import errno
+import itertools
+import resource
+import signal
+import socket
+import sys
+import time
+from collections import OrderedDict
+from typing import Any, Iterator, Optional
+
+from balancer.conf.constants import (
+    BALANCER_DEFAULT_EWMA_FAILURE_PENALTY,
+    BALANCER_DEFAULT_UDP_BATCH_SIZE,
+    BALANCER_DEFAULT_UDP_DATAGRAM_SIZE,
+    BALANCER_DEFAULT_UDP_RESERVED_DESCRIPTORS,
+    BALANCER_DEFAULT_UDP_SOCKET_BUFFER,
+    BALANCER_DEFAULT_UDP_SWEEP_INTERVAL,
+)
+from balancer.core.balancer import Balancer
+from balancer.core.common.metrics import Metrics
+from balancer.core.common.target import Target
+from balancer.core.common.udp import UdpFlow, UdpPolicy
+from balancer.core.logger import log_access, logger
+
+# Errors of opening a flow that mean the balancer has no free ephemeral ports or descriptors
+LOCAL_EXHAUSTION_ERRORS = frozenset(
+    (errno.EAGAIN, errno.EADDRNOTAVAIL, errno.EADDRINUSE, errno.EMFILE, errno.ENFILE)
+)
+
+
+class UdpBalancer(Balancer):
+    """
+    Class that balances datagrams (e.g. DNS or syslog) between provided targets. Datagrams of a client address are
+    a flow: the first one is given to the target chosen by the algorithm and the rest follow it, while replies of
+    the target are sent back to the address. Flows are kept in a table ordered by their last activity, so idle flows
+    are expired and the least recently active one is evicted when the table is full in O(1).
+    Sockets are served by callbacks of a single asyncio event loop, each callback handles a batch of datagrams
+    """
+
+    socket_type = socket.SOCK_DGRAM
+
+    def __init__(self, *args, **kwargs) -> None:
+        super(UdpBalancer, self).__init__(*args, **kwargs)
+        self.udp: UdpPolicy = self.udp or UdpPolicy()
+        self.max_flows = self.udp.max_flows
+        # Flows by client addresses, from the least recently active one to the most recently active one
+        self.flows: "OrderedDict[Any, UdpFlow]" = OrderedDict()
+        # Datagrams are handled one by one, so a single buffer is enough for all of them
+        self.datagram = bytearray(BALANCER_DEFAULT_UDP_DATAGRAM_SIZE)
+        self.datagram_view = memoryview(self.datagram)
+        # Addresses that flow sockets are bound to in turn, none means the kernel chooses one
+        self.source_addresses: Optional[Iterator[str]] = None
+        if self.udp.source_addresses:
+            self.source_addresses = itertools.cycle(self.udp.source_addresses)
+        # Done when the balancer is set to terminate
+        self.stopped: Optional[asyncio.Future] = None
+        self.draining: bool = False  # Flows are given time to complete on stop
+
+    def bind(self) -> socket.socket:
+        """It binds the UDP socket, with large kernel buffers so bursts of datagrams are not dropped"""
+        listen_socket = super(UdpBalancer, self).bind()
+        for option in (socket.SO_RCVBUF, socket.SO_SNDBUF):
+            try:
+                listen_socket.setsockopt(
+                    socket.SOL_SOCKET, option, BALANCER_DEFAULT_UDP_SOCKET_BUFFER
+                )
+            except OSError as exc:
+                logger.warning(f"Buffer of the UDP socket isn't enlarged: {exc!r}")
+        return listen_socket
+
+    def close_workers(self, *args):
+        """It stops the balancer, remaining flows are closed right after that"""
+        self.keep_going = False
+        self.resolver and self.resolver.stop()
+        self.health_checker and self.health_checker.stop()
+        self.metrics_server and self.metrics_server.stop()
+        if self.stopped is not None and not self.stopped.done():
+            self.stopped.set_result(None)
+
+    def drain_workers(self, *args):
+        """
+        It stops opening new flows. Remaining flows are relayed until they expire or the drain timeout passes,
+        then they're closed
+        """
+        logger.info(
+            f"Balancer '{self}' is draining, flows are given {self.drain_timeout}s to complete"
+        )
+        self.draining = True
+        self.close_workers()
+
+    def receive_from_clients(self, listen_socket: socket.socket) -> None:
+        """It relays a batch of datagrams of the clients to the targets of their flows, opening new flows"""
+        now = time.monotonic()
+        flows = self.flows
+        view = self.datagram_view
+        for _ in range(BALANCER_DEFAULT_UDP_BATCH_SIZE):
+            try:
+                (size, client_host) = listen_socket.recvfrom_into(self.datagram)
+            except (BlockingIOError, InterruptedError):
+                return
+            except OSError as exc:
+                logger.debug("Datagram isn't received: %r", exc)
+                continue
+            flow = flows.get(client_host)
+            if flow is None:
+                flow = self.open_flow(client_host, now)
+                if flow is None:
+                    continue
+            else:
+                flows.move_to_end(client_host)
+            flow.last_seen = now
+            try:
+                flow.socket.send(view[:size])
+            except (BlockingIOError, InterruptedError):
+                self.udp.count(UdpPolicy.DROPPED_OVERFLOW)
+                continue
+            except OSError as exc:
+                self.fail_flow(flow, exc)
+                continue
+            flow.sent += size
+
+    def receive_from_target(self, flow: UdpFlow) -> None:
+        """It sends a batch of datagrams of the flow target back to the client"""
+        view = self.datagram_view
+        for _ in range(BALANCER_DEFAULT_UDP_BATCH_SIZE):
+            try:
+                size = flow.socket.recv_into(self.datagram)
+            except (BlockingIOError, InterruptedError):
+                break
+            except OSError as exc:
+                # E.g. the port of the target is unreachable, that's reported to the connected socket
+                self.fail_flow(flow, exc)
+                return
+            flow.received += size
+            try:
+                self.listen_socket.sendto(view[:size], flow.client_host)
+            except OSError:
+                self.udp.count(UdpPolicy.DROPPED_OVERFLOW)
+        flow.last_seen = time.monotonic()
+        self.flows.move_to_end(flow.client_host)
+        if self.outliers is not None:
+            self.outliers.record_success(flow.target)
+
+    def open_flow(self, client_host: Any, now: float) -> Optional[UdpFlow]:
+        """
+        It gives the client address to a target and connects a socket of the flow to it.
+        If the table is full, the least recently active flow is evicted to make room
+        :return: The flow or None if the client is over the rate limit or the flow isn't able to be opened
+        """
+        if self.keep_going is False:
+            return None  # Draining balancer relays the flows it has only
+        if self.rate_limiter is not None and not self.rate_limiter.allow(client_host):
+            return None
+        target = self._next_target(client_host[0])
+        if target is None:
+            self.udp.count(UdpPolicy.DROPPED_SATURATED)
+            logger.debug(
+                "All the targets are saturated, datagram of client '%s' is dropped",
+                client_host,
+            )
+            return None
+        if self.metrics is not None:
+            self.metrics.add(target, Metrics.ACCEPTED)
+        try:
+            target_socket = self.connect_flow(target)
+        except OSError as exc:
+            target.decrement_connections()
+            if exc.errno in LOCAL_EXHAUSTION_ERRORS:
+                # It's the balancer that is out of ports or descriptors, the target isn't to blame
+                self.udp.count(UdpPolicy.DROPPED_SATURATED)
+                logger.warning(
+                    "Couldn't open a flow of client '%s', local resources are exhausted: %r",
+                    client_host,
+                    exc,
+                )
+                return None
+            logger.error(
+                "Couldn't open a flow to the worker %s:%d: %r",
+                target.host,
+                target.port,
+                exc,
+            )
+            target.observe_latency(BALANCER_DEFAULT_EWMA_FAILURE_PENALTY)
+            if self.metrics is not None:
+                self.metrics.add(target, Metrics.FAILED)
+            if self.outliers is not None:
+                self.outliers.record_failure(target, f"flow failed: {exc!r}")
+            return None
+
+        if len(self.flows) >= self.max_flows:
+            self.evict_flow()
+        flow = UdpFlow(client_host, target, target_socket, now)
+        self.flows[client_host] = flow
+        asyncio.get_running_loop().add_reader(
+            target_socket.fileno(), self.receive_from_target, flow
+        )
+        logger.debug("Flow '%s' is opened", flow)
+        return flow
+
+    def connect_flow(self, target: Target) -> socket.socket:
+        """
+        It connects a new socket to the target. Sockets are bound to the source addresses in turn, each of them has
+        its own range of ephemeral ports. If ports or descriptors are exhausted, the least recently active flow
+        is evicted to free them and the socket is connected once again
+        :raises OSError: If the socket isn't able to be connected
+        """
+        # Host of the target is resolved by the resolver, so a new flow doesn't wait for it
+        address = (target.address, target.port)
+        retried = False
+        while True:
+            target_socket = None
+            try:
+                target_socket = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+                target_socket.setblocking(False)
+                if self.source_addresses is not None:
+                    target_socket.bind((next(self.source_addresses), 0))
+                target_socket.connect(address)
+                return target_socket
+            except OSError as exc:
+                if target_socket is not None:
+                    target_socket.close()
+                exhausted = exc.errno in LOCAL_EXHAUSTION_ERRORS
+                if retried or not exhausted or not self.flows:
+                    raise
+            retried = True
+            self.evict_flow()
+
+    def evict_flow(self) -> None:
+        """It closes the least recently active flow to make room for a new one"""
+        (_, evicted) = self.flows.popitem(last=False)
+        self.udp.count(UdpPolicy.EVICTED)
+        self.close_flow(evicted, pop=False)
+
+    def fail_flow(self, flow: UdpFlow, exc: OSError) -> None:
+        """It closes the flow whose target refused datagrams, the next datagram of the client opens a new one"""
+        logger.info(
+            "Target %s:%d of client '%s' refused datagrams: %r",
+            flow.target.host,
+            flow.target.port,
+            flow.client_host,
+            exc,
+        )
+        flow.target.observe_latency(BALANCER_DEFAULT_EWMA_FAILURE_PENALTY)
+        if self.metrics is not None:
+            self.metrics.add(flow.target, Metrics.FAILED)
+        if self.outliers is not None:
+            self.outliers.record_failure(flow.target, f"datagrams refused: {exc!r}")
+        self.udp.count(UdpPolicy.FAILED)
+        self.close_flow(flow)
+
+    def close_flow(self, flow: UdpFlow, pop: bool = True) -> None:
+        """
+        It closes the socket of the flow and gives the flow back to the target counters
+        :param pop: Whether the flow is still in the table
+        """
+        if pop is True:
+            self.flows.pop(flow.client_host, None)
+        asyncio.get_running_loop().remove_reader(flow.socket.fileno())
+        flow.socket.close()
+        flow.target.decrement_connections()
+        duration = flow.last_seen - flow.started_at
+        if self.metrics is not None:
+            self.metrics.observe_session(
+                flow.target, duration, flow.sent, flow.received
+            )
+        log_access(
+            flow.client_host,
+            flow.target.name,
+            flow.target.host,
+            flow.target.port,
+            "ok",
+            duration,
+            flow.sent,
+            flow.received,
+        )
+        logger.debug("Flow '%s' is closed", flow)
+
+    def expire_flows(self) -> None:
+        """It closes the flows that are idle for longer than the timeout, they're the first ones in the table"""
+        deadline = time.monotonic() - self.udp.idle_timeout
+        flows = self.flows
+        expired = 0
+        while flows:
+            flow = next(iter(flows.values()))
+            if flow.last_seen > deadline:
+                break
+            self.close_flow(flow)
+            expired += 1
+        if expired:
+            self.udp.count(UdpPolicy.EXPIRED, expired)
+
+    async def sweep_flows(self) -> None:
+        """It expires idle flows periodically"""
+        interval = min(self.udp.idle_timeout / 2, BALANCER_DEFAULT_UDP_SWEEP_INTERVAL)
+        while True:
+            await asyncio.sleep(interval)
+            self.expire_flows()
+
+    def reserve_descriptors(self) -> None:
+        """
+        Each flow takes a socket, so the limit of open descriptors is raised as far as the hard limit allows.
+        If it's still too low, the table is bounded by it, so flows are evicted instead of failing to be opened
+        """
+        (soft, hard) = resource.getrlimit(resource.RLIMIT_NOFILE)
+        wanted = self.max_flows + BALANCER_DEFAULT_UDP_RESERVED_DESCRIPTORS
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            soft = wanted if hard == resource.RLIM_INFINITY else min(wanted, hard)
+            try:
+                resource.setrlimit(resource.RLIMIT_NOFILE, (soft, hard))
+            except (ValueError, OSError) as exc:
+                logger.warning(f"Limit of open descriptors isn't raised: {exc!r}")
+                (soft, _) = resource.getrlimit(resource.RLIMIT_NOFILE)
+        if soft != resource.RLIM_INFINITY and soft < wanted:
+            self.max_flows = max(soft - BALANCER_DEFAULT_UDP_RESERVED_DESCRIPTORS, 1)
+            logger.warning(
+                f"Limit of open descriptors is {soft}, flows are limited to {self.max_flows}"
+            )
+
+    async def serve(self, listen_socket: socket.socket):
+        """
+        It relays datagrams until termination. A draining balancer relays the flows it has until they expire
+        or the drain timeout passes. Remaining flows are closed then
+        """
+        loop = asyncio.get_running_loop()
+        loop.add_signal_handler(signal.SIGTERM, self.close_workers)
+        loop.add_signal_handler(signal.SIGQUIT, self.drain_workers)
+        if self.reloader is not None:
+            loop.add_signal_handler(signal.SIGHUP, self.reload_targets)
+        else:
+            # Balancers run by a supervisor are reloaded by replacing them
+            signal.signal(signal.SIGHUP, signal.SIG_IGN)
+        listen_socket.setblocking(False)
+
+        self.stopped = loop.create_future()
+        if self.keep_going is False:
+            self.stopped.set_result(None)  # Terminated before the loop was started
+        loop.add_reader(
+            listen_socket.fileno(), self.receive_from_clients, listen_socket
+        )
+        sweeper = loop.create_task(self.sweep_flows())
+        try:
+            await self.stopped
+            if self.draining is True and self.inherited_listen_socket is True:
+                # Datagrams of the shared socket are left to the balancer that replaces this one
+                loop.remove_reader(listen_socket.fileno())
+            if self.draining is True:
+                deadline = loop.time() + self.drain_timeout
+                while self.flows and loop.time() < deadline:
+                    await asyncio.sleep(BALANCER_DEFAULT_UDP_SWEEP_INTERVAL)
+        finally:
+            sweeper.cancel()
+            loop.remove_reader(listen_socket.fileno())
+            for flow in list(self.flows.values()):
+                self.close_flow(flow)
+            self.close_listen_socket()
+
+    def run(self):
+        """
+        It binds the UDP socket to the host and port, and then relays datagrams on the event loop.
+        There is no process or coroutine per flow, flows are served by callbacks of their sockets
+        :return: NoReturn
+        """
+        listen_socket = self.bind()
+        self.reserve_descriptors()
+        self.resolver and self.resolver.start(self.targets)
+        self.health_checker and self.health_checker.start(self.targets)
+        self.metrics_server and self.metrics_server.start(self.targets, self.port)
+        asyncio.run(self.serve(listen_socket))
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        sys.exit(0)
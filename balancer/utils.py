@@ -1,3 +1,5 @@
+import socket
+import struct
 from typing import Dict, List, Union
 
 from balancer.core.common.target import Target
@@ -13,11 +15,25 @@ def create_targets(dict_target: Dict[str, Dict[str, Union[str, int]]]) -> List[T
     """
     targets = []
     for target_name, target_props in dict_target.items():
-        targets.append(Target(name=target_name, host=target_props["host"], port=target_props["port"]))  # type: ignore
+        targets.append(Target(name=target_name, host=target_props["host"], port=target_props["port"], weight=target_props.get("weight", 1), max_conns=target_props.get("max_conns", 0)))  # type: ignore
 
     return targets
 
 
+def close_with_reset(client_socket: socket.socket) -> None:
+    """
+    It closes the connection with a reset instead of the graceful shutdown, so a rejected client fails fast
+    and the socket doesn't linger in TIME_WAIT
+    """
+    try:
+        client_socket.setsockopt(
+            socket.SOL_SOCKET, socket.SO_LINGER, struct.pack("ii", 1, 0)
+        )
+    except OSError:
+        pass  # The client is already gone
+    client_socket.close()
+
+
 def get_pretty_dict_properties(dict_: Dict[str, str], depth: int = 1) -> str:
     """
     It takes a dictionary and returns a string with the keys and values of the dictionary in a pretty format
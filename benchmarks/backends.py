@@ -0,0 +1,131 @@
+import asyncio
+import multiprocessing
+import socket
+import struct
+from typing import List, Tuple
+
+from benchmarks.enums import BackendKindEnum
+
+BACKEND_HOST = "127.0.0.1"
+BACKEND_CHUNK_SIZE = 65536
+# Header of a sink upload: length of the payload that follows
+SINK_HEADER = struct.Struct("!Q")
+SINK_ACK = b"ok"
+
+
+async def handle_echo(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float
+) -> None:
+    """It sends all received data back, each chunk is delayed if the backend is slow"""
+    try:
+        while True:
+            data = await reader.read(BACKEND_CHUNK_SIZE)
+            if not data:
+                break
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(data)
+            await writer.drain()
+    except ConnectionError:
+        pass
+    finally:
+        writer.close()
+
+
+async def handle_sink(
+    reader: asyncio.StreamReader, writer: asyncio.StreamWriter, delay: float
+) -> None:
+    """It discards uploads and acknowledges each one, the acknowledgement is delayed if the backend is slow"""
+    try:
+        while True:
+            header = await reader.readexactly(SINK_HEADER.size)
+            (left,) = SINK_HEADER.unpack(header)
+            while left > 0:
+                data = await reader.read(min(left, BACKEND_CHUNK_SIZE))
+                if not data:
+                    return
+                left -= len(data)
+            if delay:
+                await asyncio.sleep(delay)
+            writer.write(SINK_ACK)
+            await writer.drain()
+    except (asyncio.IncompleteReadError, ConnectionError):
+        pass
+    finally:
+        writer.close()
+
+
+HANDLERS = {
+    BackendKindEnum.ECHO: handle_echo,
+    BackendKindEnum.SINK: handle_sink,
+}
+
+
+async def serve(backends: List[Tuple[BackendKindEnum, int, float]], ready) -> None:
+    """It serves all the backends on one event loop until the process is terminated"""
+    servers = []
+    for (kind, port, delay) in backends:
+
+        async def handle(reader, writer, handler=HANDLERS[kind], delay=delay):
+            await handler(reader, writer, delay)
+
+        servers.append(
+            await asyncio.start_server(handle, BACKEND_HOST, port, backlog=4096)
+        )
+    ready.set()
+    await asyncio.gather(*(server.serve_forever() for server in servers))
+
+
+def run_backends(backends: List[Tuple[BackendKindEnum, int, float]], ready) -> None:
+    asyncio.run(serve(backends, ready))
+
+
+class Backends:
+    """
+    Local stand-in backends for the balancer to be benchmarked against. The last ``slow`` of them delay
+    responses, so algorithms that avoid busy targets are able to be told apart. Backends run in their own process,
+    so they don't take CPU time of the balancer and the load generator
+    """
+
+    def __init__(
+        self, kind: BackendKindEnum, amount: int, slow: int = 0, delay: float = 0
+    ) -> None:
+        if amount < 1 or not 0 <= slow <= amount:
+            raise ValueError(
+                f"Backends amount should be positive and not less than slow ones, got: amount={amount}, slow={slow}"
+            )
+
+        self.kind = kind
+        self.ports = [free_port() for _ in range(amount)]
+        self.delays = [0.0] * (amount - slow) + [delay] * slow
+        self.__process: multiprocessing.Process = None  # type: ignore
+
+    def __enter__(self) -> "Backends":
+        ready = multiprocessing.Event()
+        self.__process = multiprocessing.Process(
+            target=run_backends,
+            args=(
+                [
+                    (self.kind, port, delay)
+                    for port, delay in zip(self.ports, self.delays)
+                ],
+                ready,
+            ),
+            daemon=True,
+        )
+        self.__process.start()
+        if ready.wait(10) is False:
+            self.__exit__()
+            raise RuntimeError("Backends are not started in time")
+        return self
+
+    def __exit__(self, *args) -> None:
+        self.__process.terminate()
+        self.__process.join()
+
+
+def free_port() -> int:
+    """It returns a port that isn't used at the moment"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind((BACKEND_HOST, 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,36 @@
+import enum
+
+from balancer.core.enums import BaseBalancerEnum
+
+
+@enum.unique
+class BackendKindEnum(BaseBalancerEnum):
+    """Enum class that describes existing stand-in backends"""
+
+    ECHO = "echo"  # Sends received data back
+    SINK = "sink"  # Discards a framed upload and acknowledges it
+
+
+@enum.unique
+class ScenarioEnum(BaseBalancerEnum):
+    """Enum class that describes existing load scenarios"""
+
+    SHORT = "short"  # Connection per small request
+    STREAM = "stream"  # Long-lived connections exchanging messages
+    LARGE = "large"  # Connection per large upload
+    TLS_FULL = (
+        "tls-full"  # TLS connection per small request, each one with a full handshake
+    )
+    TLS_RESUMED = "tls-resumed"  # TLS connection per small request, each one resumes the previous session
+
+    @property
+    def backend_kind(self) -> BackendKindEnum:
+        """Kind of backends the scenario talks to"""
+        return (
+            BackendKindEnum.SINK if self is ScenarioEnum.LARGE else BackendKindEnum.ECHO
+        )
+
+    @property
+    def is_tls(self) -> bool:
+        """Whether the balancer terminates TLS in the scenario"""
+        return self in (ScenarioEnum.TLS_FULL, ScenarioEnum.TLS_RESUMED)
@@ -0,0 +1,257 @@
+import asyncio
+import multiprocessing
+import os
+import socket
+import ssl
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional, Union
+
+from benchmarks.backends import BACKEND_HOST, SINK_ACK, SINK_HEADER
+from benchmarks.enums import ScenarioEnum
+
+# Seconds a request is able to take, it's counted as an error then
+REQUEST_TIMEOUT = 10
+# Bytes sent per request, by scenario
+DEFAULT_PAYLOAD_SIZES = {
+    ScenarioEnum.SHORT: 64,
+    ScenarioEnum.STREAM: 1024,
+    ScenarioEnum.LARGE: 1024 * 1024,
+    ScenarioEnum.TLS_FULL: 64,
+    ScenarioEnum.TLS_RESUMED: 64,
+}
+
+
+class LoadStats:
+    """Counts of a load generator run, they are merged when the load is generated by several processes"""
+
+    def __init__(self) -> None:
+        self.requests = 0
+        self.connections = 0
+        self.errors = 0
+        self.bytes = 0  # Both directions
+        self.latencies: List[float] = []  # Seconds per request
+
+    def merge(self, other: "LoadStats") -> None:
+        self.requests += other.requests
+        self.connections += other.connections
+        self.errors += other.errors
+        self.bytes += other.bytes
+        self.latencies.extend(other.latencies)
+
+    def report(self, elapsed: float) -> Dict[str, Union[int, float]]:
+        """It returns rates and latency percentiles of the run that took ``elapsed`` seconds"""
+        latencies = sorted(self.latencies)
+
+        def percentile(quantile: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+        return {
+            "requests": self.requests,
+            "connections": self.connections,
+            "errors": self.errors,
+            "requests_per_second": round(self.requests / elapsed, 1),
+            "connections_per_second": round(self.connections / elapsed, 1),
+            "throughput_mib_per_second": round(self.bytes / elapsed / 2**20, 2),
+            "latency_p50_ms": round(percentile(0.5) * 1000, 3),
+            "latency_p99_ms": round(percentile(0.99) * 1000, 3),
+            "latency_p999_ms": round(percentile(0.999) * 1000, 3),
+        }
+
+
+class LoadGenerator:
+    """
+    Concurrent clients that talk to the balancer in the scenario for a fixed time. Clients of a process share
+    an event loop, several processes are used if one of them isn't enough to saturate the balancer
+    """
+
+    def __init__(
+        self,
+        scenario: ScenarioEnum,
+        port: int,
+        concurrency: int,
+        duration: float,
+        payload_size: int = 0,
+        processes: int = 1,
+    ) -> None:
+        if concurrency < processes:
+            raise ValueError(
+                f"Concurrency should be not less than processes, got: concurrency={concurrency}, processes={processes}"
+            )
+
+        self.scenario = scenario
+        self.port = port
+        self.concurrency = concurrency
+        self.duration = duration
+        self.payload_size = payload_size or DEFAULT_PAYLOAD_SIZES[scenario]
+        self.processes = processes
+
+    def run(self) -> Dict[str, Union[int, float]]:
+        """It generates the load and returns its report"""
+        (share, rest) = divmod(self.concurrency, self.processes)
+        # Clients per process, the rest ones are given to the first processes
+        shares = [share + (1 if i < rest else 0) for i in range(self.processes)]
+        started_at = time.monotonic()
+        if self.processes == 1:
+            results = [self.generate(shares[0])]
+        else:
+            with multiprocessing.Pool(self.processes) as pool:
+                results = pool.map(self.generate, shares)
+        elapsed = time.monotonic() - started_at
+
+        stats = LoadStats()
+        for result in results:
+            stats.merge(result)
+        return stats.report(elapsed)
+
+    def generate(self, clients: int) -> LoadStats:
+        """It runs the clients on an event loop of the current process"""
+        return asyncio.run(self.__generate(clients))
+
+    async def __generate(self, clients: int) -> LoadStats:
+        stats = LoadStats()
+        deadline = time.monotonic() + self.duration
+        if self.scenario.is_tls:
+            # The stdlib resumes TLS sessions on blocking sockets only, so each client gets a thread
+            with ThreadPoolExecutor(clients) as executor:
+                await asyncio.gather(
+                    *(
+                        self.__tls_client(stats, deadline, executor)
+                        for _ in range(clients)
+                    )
+                )
+            return stats
+        client = {
+            ScenarioEnum.SHORT: self.__short_client,
+            ScenarioEnum.STREAM: self.__stream_client,
+            ScenarioEnum.LARGE: self.__large_client,
+        }[self.scenario]
+        await asyncio.gather(*(client(stats, deadline) for _ in range(clients)))
+        return stats
+
+    async def __exchange(self, payload: bytes, response_size: int) -> None:
+        """It sends the payload over a new connection and waits for the response of the size"""
+        (reader, writer) = await asyncio.open_connection(BACKEND_HOST, self.port)
+        try:
+            writer.write(payload)
+            await writer.drain()
+            await reader.readexactly(response_size)
+        finally:
+            writer.close()
+
+    async def __short_client(self, stats: LoadStats, deadline: float) -> None:
+        """It opens a connection per request, sends the payload and waits for its echo"""
+        payload = os.urandom(self.payload_size)
+        while time.monotonic() < deadline:
+            started_at = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self.__exchange(payload, len(payload)), REQUEST_TIMEOUT
+                )
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                stats.errors += 1
+                continue
+            stats.latencies.append(time.monotonic() - started_at)
+            stats.requests += 1
+            stats.connections += 1
+            stats.bytes += 2 * len(payload)
+
+    async def __stream_client(self, stats: LoadStats, deadline: float) -> None:
+        """It keeps a connection open and exchanges payloads over it, reconnecting if it's lost"""
+        payload = os.urandom(self.payload_size)
+        while time.monotonic() < deadline:
+            try:
+                (reader, writer) = await asyncio.wait_for(
+                    asyncio.open_connection(BACKEND_HOST, self.port), REQUEST_TIMEOUT
+                )
+            except (OSError, asyncio.TimeoutError):
+                stats.errors += 1
+                continue
+            stats.connections += 1
+            try:
+                while time.monotonic() < deadline:
+                    started_at = time.monotonic()
+                    writer.write(payload)
+                    await asyncio.wait_for(
+                        reader.readexactly(len(payload)), REQUEST_TIMEOUT
+                    )
+                    stats.latencies.append(time.monotonic() - started_at)
+                    stats.requests += 1
+                    stats.bytes += 2 * len(payload)
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                stats.errors += 1
+            finally:
+                writer.close()
+
+    async def __large_client(self, stats: LoadStats, deadline: float) -> None:
+        """It opens a connection per upload of the payload and waits for the acknowledgement"""
+        payload = SINK_HEADER.pack(self.payload_size) + os.urandom(self.payload_size)
+        while time.monotonic() < deadline:
+            started_at = time.monotonic()
+            try:
+                await asyncio.wait_for(
+                    self.__exchange(payload, len(SINK_ACK)), REQUEST_TIMEOUT
+                )
+            except (OSError, asyncio.IncompleteReadError, asyncio.TimeoutError):
+                stats.errors += 1
+                continue
+            stats.latencies.append(time.monotonic() - started_at)
+            stats.requests += 1
+            stats.connections += 1
+            stats.bytes += len(payload)
+
+    def __tls_exchange(
+        self, context: ssl.SSLContext, payload: bytes, session: Optional[ssl.SSLSession]
+    ) -> ssl.SSLSession:
+        """
+        It sends the payload over a new TLS connection and waits for its echo
+        :param session: Session to resume, none means a full handshake
+        :return: Session of the connection
+        """
+        with socket.create_connection(
+            (BACKEND_HOST, self.port), timeout=REQUEST_TIMEOUT
+        ) as raw_socket:
+            with context.wrap_socket(raw_socket, session=session) as tls_socket:
+                tls_socket.sendall(payload)
+                received = 0
+                while received < len(payload):
+                    chunk = tls_socket.recv(len(payload) - received)
+                    if not chunk:
+                        raise ConnectionError("Connection is closed before the echo")
+                    received += len(chunk)
+                # Tickets of TLS 1.3 come after the handshake, so the session is taken once the echo is read
+                return tls_socket.session  # type: ignore
+
+    async def __tls_client(
+        self, stats: LoadStats, deadline: float, executor: ThreadPoolExecutor
+    ) -> None:
+        """It opens a TLS connection per request, resuming the previous session in the resumed scenario"""
+        loop = asyncio.get_running_loop()
+        context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+        context.check_hostname = False
+        context.verify_mode = (
+            ssl.CERT_NONE
+        )  # Benchmarks run with a self-signed certificate
+        payload = os.urandom(self.payload_size)
+        resume = self.scenario is ScenarioEnum.TLS_RESUMED
+        session: Optional[ssl.SSLSession] = None
+        while time.monotonic() < deadline:
+            started_at = time.monotonic()
+            try:
+                session = await loop.run_in_executor(
+                    executor,
+                    self.__tls_exchange,
+                    context,
+                    payload,
+                    session if resume else None,
+                )
+            except OSError:
+                stats.errors += 1
+                session = None
+                continue
+            stats.latencies.append(time.monotonic() - started_at)
+            stats.requests += 1
+            stats.connections += 1
+            stats.bytes += 2 * len(payload)
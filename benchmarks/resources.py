@@ -0,0 +1,88 @@
+import os
+import threading
+from typing import Dict, List, Tuple
+
+# Seconds between samples of memory usage
+SAMPLE_INTERVAL = 0.1
+
+
+def read_stat(pid: int) -> Tuple[int, float, int]:
+    """
+    It reads ``/proc/<pid>/stat`` of the process, so it's Linux only
+    :return: Parent pid, CPU seconds of the process and its reaped children, RSS in bytes
+    """
+    with open(f"/proc/{pid}/stat") as stat:
+        # The command is able to contain spaces and parentheses, so fields are counted from its end
+        fields = stat.read().rsplit(")", 1)[1].split()
+    ticks = os.sysconf("SC_CLK_TCK")
+    # Fields are counted from the state, that is the third one: ppid, ..., utime, stime, cutime, cstime, ..., rss
+    (ppid, utime, stime, cutime, cstime) = (
+        int(fields[1]),
+        int(fields[11]),
+        int(fields[12]),
+        int(fields[13]),
+        int(fields[14]),
+    )
+    rss = int(fields[21]) * os.sysconf("SC_PAGE_SIZE")
+    return (ppid, (utime + stime + cutime + cstime) / ticks, rss)
+
+
+def read_tree(root: int) -> Tuple[float, int]:
+    """
+    It sums up CPU time and RSS over the process and all its descendants. CPU time of the processes that are
+    already completed is counted by their parents, once they are reaped
+    :return: CPU seconds and RSS in bytes
+    """
+    stats: Dict[int, Tuple[int, float, int]] = {}
+    for entry in os.listdir("/proc"):
+        if not entry.isdigit():
+            continue
+        try:
+            stats[int(entry)] = read_stat(int(entry))
+        except (OSError, IndexError, ValueError):
+            continue  # The process is completed while it's read
+
+    children: Dict[int, List[int]] = {}
+    for pid, (ppid, _, _) in stats.items():
+        children.setdefault(ppid, []).append(pid)
+
+    (cpu, rss) = (0.0, 0)
+    pending = [root] if root in stats else []
+    while pending:
+        pid = pending.pop()
+        cpu += stats[pid][1]
+        rss += stats[pid][2]
+        pending.extend(children.get(pid, []))
+    return (cpu, rss)
+
+
+class ResourceSampler:
+    """
+    It measures CPU time taken by the process tree between ``start`` and ``stop`` and samples its RSS
+    in a background thread meanwhile, the peak one is reported
+    """
+
+    def __init__(self, pid: int) -> None:
+        self.pid = pid
+        self.cpu_seconds = 0.0
+        self.peak_rss = 0
+        self.__started_cpu = 0.0
+        self.__stopped = threading.Event()
+        self.__sample_thread: threading.Thread = None  # type: ignore
+
+    def start(self) -> None:
+        (self.__started_cpu, self.peak_rss) = read_tree(self.pid)
+        self.__stopped.clear()
+        self.__sample_thread = threading.Thread(target=self.__sample, daemon=True)
+        self.__sample_thread.start()
+
+    def __sample(self) -> None:
+        while not self.__stopped.wait(SAMPLE_INTERVAL):
+            self.peak_rss = max(self.peak_rss, read_tree(self.pid)[1])
+
+    def stop(self) -> None:
+        self.__stopped.set()
+        self.__sample_thread.join()
+        (cpu, rss) = read_tree(self.pid)
+        self.cpu_seconds = cpu - self.__started_cpu
+        self.peak_rss = max(self.peak_rss, rss)
@@ -0,0 +1,252 @@
+import json
+import platform
+import signal
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple, Union
+
+import typer
+
+from balancer.core.enums import BalancerAlgorithmEnum, BalancerEngineEnum
+from benchmarks.backends import BACKEND_HOST, Backends, free_port
+from benchmarks.enums import ScenarioEnum
+from benchmarks.load import LoadGenerator
+from benchmarks.resources import ResourceSampler
+
+ROOT_DIR = Path(__file__).resolve().parent.parent
+# Seconds the balancer is able to take to start listening
+BALANCER_START_TIMEOUT = 10
+
+
+def write_settings(
+    path: Path,
+    algorithm: BalancerAlgorithmEnum,
+    backends: Backends,
+    tls: Optional[Tuple[Path, Path]] = None,
+) -> None:
+    """
+    It writes a settings file that balances over the backends with the algorithm
+    :param tls: Certificate and key files TLS is terminated with, none if it isn't
+    """
+    lines = ["balancer:", "  targets:"]
+    for i, port in enumerate(backends.ports):
+        lines.append(f"    backend_{i}: {{host: {BACKEND_HOST}, port: {port}}}")
+    lines.append(f"  balance_algorithm: '{algorithm.value}'")
+    if tls is not None:
+        lines.append("  tls:")
+        lines.append(f"    cert_file: '{tls[0].resolve()}'")
+        lines.append(f"    key_file: '{tls[1].resolve()}'")
+    path.write_text("\n".join(lines) + "\n")
+
+
+def wait_for_port(port: int, process: subprocess.Popen) -> None:
+    """It waits until the balancer listens on the port"""
+    deadline = time.monotonic() + BALANCER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(
+                f"Balancer exited with code {process.returncode} before listening"
+            )
+        try:
+            with socket.create_connection((BACKEND_HOST, port), timeout=1):
+                return
+        except OSError:
+            time.sleep(0.1)
+    raise RuntimeError(f"Balancer doesn't listen on {port} in time")
+
+
+def bench(
+    scenario: ScenarioEnum,
+    engine: BalancerEngineEnum,
+    algorithm: BalancerAlgorithmEnum,
+    backends: Backends,
+    workdir: Path,
+    options: Dict[str, Union[int, float]],
+    tls: Optional[Tuple[Path, Path]] = None,
+) -> Dict[str, Union[str, int, float]]:
+    """It starts the balancer, puts the load on it and reports the results"""
+    config = workdir.joinpath(f"{engine.value}.{algorithm.value}.yaml")
+    write_settings(config, algorithm, backends, tls if scenario.is_tls else None)
+    port = free_port()
+    command = [
+        sys.executable,
+        str(ROOT_DIR.joinpath("balancer.py")),
+        "--config",
+        str(config),
+        "--logs",
+        str(workdir.joinpath("logs")),
+        "--port",
+        str(port),
+        "--engine",
+        engine.value,
+        "--processes",
+        str(options["balancer_processes"]),
+        "--max-connections",
+        str(options["max_connections"]),
+    ]
+    process = subprocess.Popen(
+        command, cwd=ROOT_DIR, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL
+    )
+    try:
+        wait_for_port(port, process)
+
+        def generator(duration: float) -> LoadGenerator:
+            return LoadGenerator(
+                scenario,
+                port,
+                concurrency=int(options["concurrency"]),
+                duration=duration,
+                payload_size=int(options["payload_size"]),
+                processes=int(options["load_processes"]),
+            )
+
+        if options["warmup"] > 0:
+            generator(options["warmup"]).run()
+
+        sampler = ResourceSampler(process.pid)
+        sampler.start()
+        started_at = time.monotonic()
+        report = generator(options["duration"]).run()
+        elapsed = time.monotonic() - started_at
+        sampler.stop()
+    finally:
+        process.send_signal(signal.SIGTERM)
+        try:
+            process.wait(BALANCER_START_TIMEOUT)
+        except subprocess.TimeoutExpired:
+            process.kill()
+            process.wait()
+
+    return {
+        "scenario": scenario.value,
+        "engine": engine.value,
+        "algorithm": algorithm.value,
+        **report,
+        "cpu_percent": round(sampler.cpu_seconds / elapsed * 100, 1),
+        "peak_rss_mib": round(sampler.peak_rss / 2**20, 1),
+    }
+
+
+def run(
+    output: Path = typer.Option(
+        Path("benchmarks/results.json"),
+        help="Path to the JSON file results are written to",
+    ),
+    scenarios: Optional[List[str]] = typer.Option(
+        None,
+        "--scenario",
+        help=f"Scenario to run, all by default. Able to: {', '.join(ScenarioEnum.values())}",
+    ),
+    engines: Optional[List[str]] = typer.Option(
+        None,
+        "--engine",
+        help=f"Engine to benchmark, all by default. Able to: {', '.join(BalancerEngineEnum.values())}",
+    ),
+    algorithms: Optional[List[str]] = typer.Option(
+        None,
+        "--algorithm",
+        help=f"Algorithm to benchmark, all by default. Able to: {', '.join(BalancerAlgorithmEnum.values())}",
+    ),
+    backends: int = typer.Option(3, help="Amount of backends"),
+    slow_backends: int = typer.Option(
+        0, help="Amount of the backends that delay responses"
+    ),
+    slow_delay: float = typer.Option(
+        0.005, help="Seconds the slow backends delay responses for"
+    ),
+    concurrency: int = typer.Option(64, help="Amount of concurrent clients"),
+    duration: float = typer.Option(5, help="Seconds the load is measured for"),
+    warmup: float = typer.Option(1, help="Seconds the load is put before measuring"),
+    payload_size: int = typer.Option(
+        0, help="Bytes sent per request, the scenario default if it's 0"
+    ),
+    load_processes: int = typer.Option(
+        1, help="Amount of processes the load is generated by"
+    ),
+    balancer_processes: int = typer.Option(
+        1, help="Amount of pre-forked balancer processes"
+    ),
+    max_connections: int = typer.Option(
+        1024, help="Maximum amount of connections the balancer relays at once"
+    ),
+    tls_cert: Optional[Path] = typer.Option(
+        None, help="Certificate file of the TLS scenarios, they're skipped without it"
+    ),
+    tls_key: Optional[Path] = typer.Option(
+        None, help="Key file of the TLS scenarios, none if it's in the certificate file"
+    ),
+):
+    """It benchmarks each combination of the scenarios, engines and algorithms, one after another"""
+    options: Dict[str, Union[int, float]] = {
+        "backends": backends,
+        "slow_backends": slow_backends,
+        "slow_delay": slow_delay,
+        "concurrency": concurrency,
+        "duration": duration,
+        "warmup": warmup,
+        "payload_size": payload_size,
+        "load_processes": load_processes,
+        "balancer_processes": balancer_processes,
+        "max_connections": max_connections,
+    }
+    tls = None
+    if tls_cert is not None:
+        tls = (tls_cert, tls_key or tls_cert)
+    elif any(ScenarioEnum(scenario).is_tls for scenario in scenarios or []):
+        raise typer.BadParameter("TLS scenarios require '--tls-cert'")
+    started_at = datetime.now(timezone.utc)
+    results = []
+    with tempfile.TemporaryDirectory(prefix="balancer-bench-") as workdir:
+        for scenario in map(ScenarioEnum, scenarios or ScenarioEnum.values()):
+            if scenario.is_tls and tls is None:
+                typer.echo(
+                    f"Scenario '{scenario.value}' is skipped, '--tls-cert' isn't given"
+                )
+                continue
+            with Backends(
+                scenario.backend_kind, backends, slow=slow_backends, delay=slow_delay
+            ) as scenario_backends:
+                for engine in map(
+                    BalancerEngineEnum, engines or BalancerEngineEnum.values()
+                ):
+                    for algorithm in map(
+                        BalancerAlgorithmEnum,
+                        algorithms or BalancerAlgorithmEnum.values(),
+                    ):
+                        result = bench(
+                            scenario,
+                            engine,
+                            algorithm,
+                            scenario_backends,
+                            Path(workdir),
+                            options,
+                            tls,
+                        )
+                        typer.echo(
+                            f"{result['scenario']:<11} {result['engine']:<8} {result['algorithm']:<27} "
+                            f"{result['connections_per_second']:>9} conn/s "
+                            f"{result['throughput_mib_per_second']:>9} MiB/s "
+                            f"p50={result['latency_p50_ms']}ms p99={result['latency_p99_ms']}ms "
+                            f"p999={result['latency_p999_ms']}ms cpu={result['cpu_percent']}% "
+                            f"rss={result['peak_rss_mib']}MiB errors={result['errors']}"
+                        )
+                        results.append(result)
+
+    summary = {
+        "started_at": started_at.isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "options": options,
+        "results": results,
+    }
+    output.write_text(json.dumps(summary, indent=2) + "\n")
+    typer.echo(f"Results are written to {output}")
+
+
+if __name__ == "__main__":
+    typer.run(run)
@@ -0,0 +1,99 @@
+import socket
+import threading
+from typing import Iterator, List, Optional, Tuple
+
+import pytest
+
+from balancer.core.common.algorithms import BalanceAlgorithmFactory
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.enums import BalancerAlgorithmEnum
+
+
+def build_targets(
+    amount: int,
+    algorithm: BalancerAlgorithmEnum = BalancerAlgorithmEnum.ROUND_ROBIN,
+    port: int = 4000,
+    weights: Optional[List[int]] = None,
+    max_conns: int = 0,
+) -> TargetAlgorithmizedList:
+    """It builds a list of targets bound to shared counters, as a balancer does"""
+    targets = TargetAlgorithmizedList()
+    for i in range(amount):
+        weight = weights[i] if weights else 1
+        targets.append(
+            Target(f"t{i}", "127.0.0.1", port + i, weight=weight, max_conns=max_conns)
+        )
+    targets.attach_algorithm(BalanceAlgorithmFactory.build(algorithm))
+    targets.bind_counters()
+    return targets
+
+
+@pytest.fixture
+def echo_server() -> Iterator[Tuple[str, int]]:
+    """A TCP server on a free local port that sends back everything it receives"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+    keep_going = True
+
+    def echo(connection: socket.socket) -> None:
+        with connection:
+            while True:
+                try:
+                    data = connection.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+                connection.sendall(data)
+
+    def serve() -> None:
+        while keep_going:
+            try:
+                (connection, _) = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=echo, args=(connection,), daemon=True).start()
+
+    thread = threading.Thread(target=serve, daemon=True)
+    thread.start()
+    yield server.getsockname()
+    keep_going = False
+    server.close()
+
+
+@pytest.fixture
+def silent_server() -> Iterator[Tuple[str, int]]:
+    """An HTTP target that reads whatever it's sent and never responds"""
+    server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    server.bind(("127.0.0.1", 0))
+    server.listen(16)
+
+    def read(connection: socket.socket) -> None:
+        with connection:
+            while True:
+                try:
+                    data = connection.recv(65536)
+                except OSError:
+                    return
+                if not data:
+                    return
+
+    def serve() -> None:
+        while True:
+            try:
+                (connection, _) = server.accept()
+            except OSError:
+                return
+            threading.Thread(target=read, args=(connection,), daemon=True).start()
+
+    threading.Thread(target=serve, daemon=True).start()
+    yield server.getsockname()
+    server.close()
+
+
+def free_port() -> int:
+    """It returns a local port nobody listens on"""
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
@@ -0,0 +1,94 @@
+import socket
+import time
+from typing import Any, List, Optional, Tuple
+
+import pytest
+
+from balancer.core.common.admission import AdmissionQueue
+from balancer.core.common.target import Target
+
+from .conftest import build_targets
+
+
+@pytest.fixture
+def clients():
+    """Factory of accepted client sockets, the peers are kept to see how the clients are closed"""
+    pairs: List[Tuple[socket.socket, socket.socket]] = []
+
+    def connect() -> Tuple[socket.socket, socket.socket]:
+        pairs.append(socket.socketpair())
+        return pairs[-1]
+
+    yield connect
+    for pair in pairs:
+        for sock in pair:
+            sock.close()
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        AdmissionQueue(size=-1)
+    with pytest.raises(ValueError):
+        AdmissionQueue(timeout=0)
+
+
+def test_clients_over_the_size_are_rejected(clients) -> None:
+    queue = AdmissionQueue(size=1)
+    (first, _) = clients()
+    (second, second_peer) = clients()
+    assert queue.enqueue(first, ("10.0.0.1", 1))
+    assert not queue.enqueue(second, ("10.0.0.2", 2))
+    assert queue.depth == 1
+    assert queue.read()[AdmissionQueue.REJECTED] == 1
+    assert second.fileno() == -1
+    assert second_peer.recv(1) == b""
+
+
+def test_clients_are_admitted_in_order_once_there_is_room(clients) -> None:
+    queue = AdmissionQueue(size=3, wait_buckets=(0.1, 1))
+    targets = build_targets(1, max_conns=1)
+    assert targets.acquire_next() is targets[0]
+    sockets = [clients()[0] for _ in range(2)]
+    for (i, sock) in enumerate(sockets):
+        queue.enqueue(sock, (f"10.0.0.{i}", i))
+    admitted: List[Any] = []
+
+    def acquire(key: str) -> Optional[Target]:
+        return targets.acquire_next(key)
+
+    def admit(target: Target, client_socket: socket.socket, client_host: Any) -> None:
+        admitted.append(client_host)
+
+    queue.dispatch(acquire, admit)
+    assert admitted == [] and queue.depth == 2 and queue.has_waiting.is_set()
+
+    targets[0].decrement_connections()
+    queue.dispatch(acquire, admit)
+    assert admitted == [("10.0.0.0", 0)] and queue.depth == 1
+
+    targets[0].decrement_connections()
+    queue.dispatch(acquire, admit)
+    assert admitted == [("10.0.0.0", 0), ("10.0.0.1", 1)]
+    assert queue.is_empty and not queue.has_waiting.is_set()
+    state = queue.read()
+    assert state[AdmissionQueue.WAIT_BUCKETS] == 2
+
+
+def test_clients_waiting_too_long_are_rejected(clients) -> None:
+    queue = AdmissionQueue(size=1, timeout=0.01)
+    (client, peer) = clients()
+    queue.enqueue(client, ("10.0.0.1", 1))
+    time.sleep(0.02)
+    queue.dispatch(lambda key: None, lambda *args: None)
+    assert queue.depth == 0
+    assert queue.read()[AdmissionQueue.TIMED_OUT] == 1
+    assert client.fileno() == -1
+
+
+def test_clear_rejects_all_the_waiting(clients) -> None:
+    queue = AdmissionQueue(size=2)
+    for i in range(2):
+        queue.enqueue(clients()[0], (f"10.0.0.{i}", i))
+    queue.clear()
+    assert queue.depth == 0 and queue.is_empty
+    assert queue.read()[AdmissionQueue.REJECTED] == 2
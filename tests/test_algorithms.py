@@ -0,0 +1,127 @@
+from collections import Counter
+
+import pytest
+
+from balancer.core.common.algorithms import (
+    BalanceAlgorithmFactory,
+    RoundRobinBalanceAlgorithm,
+    SmoothWeightedRoundRobinBalanceAlgorithm,
+)
+from balancer.core.common.target import Target, TargetAlgorithmizedList
+from balancer.core.enums import BalancerAlgorithmEnum
+from balancer.core.exceptions import WrongBalanceAlgorithmError
+
+from .conftest import build_targets
+
+
+def names(targets: TargetAlgorithmizedList, amount: int) -> str:
+    """It gives targets the amount of times and returns their names joined"""
+    return "".join(targets.get_next().name[1:] for _ in range(amount))
+
+
+def test_factory_rejects_unknown_algorithms() -> None:
+    with pytest.raises(WrongBalanceAlgorithmError):
+        BalanceAlgorithmFactory.build("round_robin")
+
+
+def test_round_robin_takes_turns() -> None:
+    targets = build_targets(3)
+    assert names(targets, 7) == "0120120"
+
+
+def test_smooth_weighted_round_robin_interleaves() -> None:
+    targets = build_targets(
+        3, BalancerAlgorithmEnum.WEIGHTED_ROUND_ROBIN, weights=[5, 1, 1]
+    )
+    # The same order nginx gives, the heavy target isn't given 5 times in a row
+    assert names(targets, 7) == "0010200"
+
+
+def test_smooth_weighted_round_robin_reduces_weights() -> None:
+    algorithm = SmoothWeightedRoundRobinBalanceAlgorithm()
+    algorithm.set_sequence(
+        [
+            Target("a", "127.0.0.1", 4000, weight=40),
+            Target("b", "127.0.0.1", 4001, weight=20),
+        ]
+    )
+    algorithm.ensure_built()
+    assert algorithm.schedule == [0, 1, 0]
+
+
+def test_smooth_weighted_round_robin_follows_weights() -> None:
+    targets = build_targets(
+        3, BalancerAlgorithmEnum.WEIGHTED_ROUND_ROBIN, weights=[3, 2, 1]
+    )
+    given = Counter(names(targets, 60))
+    assert given == {"0": 30, "1": 20, "2": 10}
+
+
+def test_smooth_weighted_round_robin_is_rebuilt_on_change() -> None:
+    targets = build_targets(2, BalancerAlgorithmEnum.WEIGHTED_ROUND_ROBIN)
+    assert sorted(names(targets, 2)) == ["0", "1"]
+    targets.append(Target("t2", "127.0.0.1", 4002, weight=2))
+    targets.bind_counters()
+    given = Counter(names(targets, 8))
+    assert given == {"0": 2, "1": 2, "2": 4}
+
+
+def test_round_robin_goes_on_after_reload() -> None:
+    previous = RoundRobinBalanceAlgorithm()
+    previous.set_sequence(build_targets(3))
+    previous.get_next_item()
+    algorithm = RoundRobinBalanceAlgorithm()
+    algorithm.set_sequence(build_targets(3))
+    algorithm.inherit(previous)
+    assert algorithm.get_next_item().name == "t1"
+
+
+@pytest.mark.parametrize(
+    "algorithm",
+    [BalancerAlgorithmEnum.CONSISTENT_HASH, BalancerAlgorithmEnum.MAGLEV],
+)
+def test_hashing_keeps_keys_on_their_targets(algorithm: BalancerAlgorithmEnum) -> None:
+    targets = build_targets(4, algorithm)
+    keys = [f"10.0.0.{i}" for i in range(200)]
+    mapping = {key: targets.get_next(key).name for key in keys}
+    assert all(targets.get_next(key).name == mapping[key] for key in keys)
+    assert len(set(mapping.values())) == 4
+
+
+@pytest.mark.parametrize(
+    "algorithm",
+    [BalancerAlgorithmEnum.CONSISTENT_HASH, BalancerAlgorithmEnum.MAGLEV],
+)
+def test_hashing_remaps_only_keys_of_removed_target(
+    algorithm: BalancerAlgorithmEnum,
+) -> None:
+    targets = build_targets(5, algorithm)
+    keys = [f"10.0.{i // 256}.{i % 256}" for i in range(1000)]
+    before = {key: targets.get_next(key).name for key in keys}
+
+    reduced = build_targets(5, algorithm)
+    del reduced[2]
+    reduced.bind_counters()
+    after = {key: reduced.get_next(key).name for key in keys}
+
+    assert all(after[key] != "t2" for key in keys)
+    # Keys of the kept targets stay, Maglev allows a little disruption
+    moved = [key for key in keys if before[key] != "t2" and before[key] != after[key]]
+    assert len(moved) <= len(keys) * 0.05
+
+
+def test_maglev_spreads_keys_by_weights() -> None:
+    targets = build_targets(2, BalancerAlgorithmEnum.MAGLEV, weights=[1, 3])
+    given = Counter(targets.get_next(f"key-{i}").name for i in range(4000))
+    assert 0.2 < given["t0"] / 4000 < 0.3
+
+
+def test_hashing_survives_reordering() -> None:
+    targets = build_targets(3, BalancerAlgorithmEnum.CONSISTENT_HASH)
+    before = {f"k{i}": targets.get_next(f"k{i}").name for i in range(100)}
+    targets.reverse()
+    targets.bind_counters()
+    targets.attach_algorithm(
+        BalanceAlgorithmFactory.build(BalancerAlgorithmEnum.CONSISTENT_HASH)
+    )
+    assert {key: targets.get_next(key).name for key in before} == before
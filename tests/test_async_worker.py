@@ -0,0 +1,84 @@
+import asyncio
+import socket
+
+from balancer.core.common.async_worker import AsyncWorker
+from balancer.core.common.backpressure import BufferPolicy, MemoryBudget
+from balancer.core.common.target import Target
+from tests.conftest import build_targets, free_port
+
+
+async def relay_through(worker: AsyncWorker, peer: socket.socket, payload: bytes):
+    """It runs the worker and sends the payload through it, the peer is the client side of the connection"""
+    loop = asyncio.get_running_loop()
+    task = loop.create_task(worker.run())
+    await loop.sock_sendall(peer, payload)
+    received = b""
+    while len(received) < len(payload):
+        chunk = await asyncio.wait_for(loop.sock_recv(peer, 65536), 5)
+        if not chunk:
+            break
+        received += chunk
+    peer.close()
+    await asyncio.wait_for(task, 5)
+    return received
+
+
+def test_relays_both_directions(echo_server):
+    targets = build_targets(1, port=echo_server[1])
+    target = targets.acquire_next()
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    worker = AsyncWorker(target, client, ("127.0.0.1", 1), targets=targets)
+    payload = bytes(range(256)) * 1000
+
+    received = asyncio.run(relay_through(worker, peer, payload))
+
+    assert received == payload
+    assert worker.relayed == [len(payload), len(payload)]
+    assert target.active_connections == 0
+
+
+def test_relays_cut_chunks_while_the_budget_is_used_up(echo_server):
+    targets = build_targets(1, port=echo_server[1])
+    target = targets.acquire_next()
+    budget = MemoryBudget(64)
+    # Other connections hold the whole budget, the relay isn't paused by them
+    budget.account(0, 32)
+    budget.account(0, 32)
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    worker = AsyncWorker(
+        target,
+        client,
+        ("127.0.0.1", 1),
+        targets=targets,
+        buffers=BufferPolicy(budget=budget),
+    )
+    payload = bytes(range(256)) * 40
+
+    received = asyncio.run(relay_through(worker, peer, payload))
+
+    assert received == payload
+    assert budget.used == 64
+
+
+def test_fails_over_to_the_next_target(echo_server):
+    targets = build_targets(2)
+    dead = Target("dead", "127.0.0.1", free_port())
+    alive = Target("alive", "127.0.0.1", echo_server[1])
+    targets[0] = dead
+    targets[1] = alive
+    targets.bind_counters()
+    dead.increment_connections()
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    worker = AsyncWorker(dead, client, ("127.0.0.1", 1), targets=targets)
+
+    received = asyncio.run(relay_through(worker, peer, b"ping"))
+
+    assert received == b"ping"
+    assert worker.target is alive
+    assert dead.active_connections == 0 and alive.active_connections == 0
@@ -0,0 +1,98 @@
+import socket
+
+import pytest
+
+from balancer.core.common.backpressure import BufferPolicy, MemoryBudget
+from balancer.core.common.relay import RingRelayBuffer
+from balancer.core.enums import BalancerRelayModeEnum
+
+
+def test_budget_counts_bytes_and_holders() -> None:
+    budget = MemoryBudget(100)
+    budget.account(0, 30)
+    budget.account(0, 20)
+    assert budget.used == 50 and not budget.is_used_up
+    budget.account(30, -30)
+    assert budget.used == 20
+    # The buffer holding nothing is no longer a holder, so the other one gets the whole budget
+    budget.account(20, 80)
+    assert budget.is_used_up
+    assert budget.is_exceeded_by(100)
+
+
+def test_budget_pauses_the_largest_buffers_only() -> None:
+    budget = MemoryBudget(100)
+    for size in (70, 20, 10):
+        budget.account(0, size)
+    # Fair share of 3 holders is a third of the budget
+    assert budget.is_exceeded_by(70)
+    assert not budget.is_exceeded_by(20)
+    budget.account(70, -10)
+    assert not budget.is_exceeded_by(60)
+
+
+def test_fair_share_splits_the_limit_between_holders() -> None:
+    budget = MemoryBudget(100)
+    assert budget.fair_share == 100
+    for size in (70, 20, 10):
+        budget.account(0, size)
+    assert budget.fair_share == 33
+
+
+def test_rejects_wrong_limits() -> None:
+    with pytest.raises(ValueError):
+        MemoryBudget(0)
+    with pytest.raises(ValueError):
+        BufferPolicy(upstream_size=0)
+    with pytest.raises(ValueError):
+        BufferPolicy(downstream_low_watermark=-1)
+
+
+def test_source_is_paused_between_the_watermarks() -> None:
+    policy = BufferPolicy(upstream_size=8, upstream_low_watermark=2)
+    buffer = policy.build(BalancerRelayModeEnum.BUFFER, BufferPolicy.UPSTREAM)
+    assert isinstance(buffer, RingRelayBuffer) and buffer.capacity == 8
+    (source, source_peer) = socket.socketpair()
+    (destination, destination_peer) = socket.socketpair()
+    try:
+        source_peer.sendall(b"x" * 8)
+        buffer.recv_from(source)
+        assert not policy.may_receive(buffer)
+
+        # Draining above the low watermark keeps the source paused
+        buffer.send_to(LimitedSocket(destination, 5))  # type: ignore
+        assert buffer.size == 3 and not policy.may_receive(buffer)
+        buffer.send_to(LimitedSocket(destination, 1))  # type: ignore
+        assert buffer.size == 2 and policy.may_receive(buffer)
+    finally:
+        for sock in (source, source_peer, destination, destination_peer):
+            sock.close()
+
+
+def test_policy_asks_the_budget() -> None:
+    budget = MemoryBudget(10)
+    policy = BufferPolicy(budget=budget)
+    (source, source_peer) = socket.socketpair()
+    try:
+        source_peer.sendall(b"x" * 10)
+        large = RingRelayBuffer(64)
+        policy.account(0, large.recv_from(source))
+    finally:
+        source.close()
+        source_peer.close()
+    assert budget.used == 10
+    assert not policy.may_receive(large)
+    # An empty buffer keeps receiving, the budget is a soft limit
+    assert policy.may_receive(RingRelayBuffer(64))
+    assert BufferPolicy().may_receive(large)
+
+
+class LimitedSocket:
+    """Destination that takes at most the given amount of bytes per send"""
+
+    def __init__(self, sock: socket.socket, per_send: int) -> None:
+        self.sock = sock
+        self.per_send = per_send
+
+    def send(self, data) -> int:
+        return self.sock.send(data[: self.per_send])
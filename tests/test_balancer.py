@@ -0,0 +1,38 @@
+import multiprocessing
+import os
+import selectors
+import threading
+import time
+
+from balancer.core.balancer import Balancer
+from balancer.core.common.target import Target
+
+from .conftest import free_port
+
+
+def test_completed_workers_are_reaped() -> None:
+    balancer = Balancer([Target("t", "127.0.0.1", free_port())], port=free_port())
+    balancer.workers_selector = selectors.DefaultSelector()
+    balancer.cleanup_wakeup = os.pipe()
+    thread = threading.Thread(target=balancer.cleanup, daemon=True)
+    thread.start()
+    context = multiprocessing.get_context("fork")
+    try:
+        workers = [
+            context.Process(target=time.sleep, args=(0.2 + 0.05 * i,)) for i in range(5)
+        ]
+        for worker in workers:
+            balancer.track_worker(worker)  # type: ignore
+        assert len(balancer.processing_workers) == 5
+
+        deadline = time.monotonic() + 5
+        while balancer.processing_workers and time.monotonic() < deadline:
+            balancer.workers_completed.wait(0.1)
+        assert not balancer.processing_workers
+        # Only the wakeup pipe is waited for, sentinels of the reaped workers are released
+        assert list(balancer.workers_selector.get_map()) == [balancer.cleanup_wakeup[0]]
+    finally:
+        balancer.keep_going = False
+        os.write(balancer.cleanup_wakeup[1], b"\0")
+        thread.join(3)
+    assert not thread.is_alive()
@@ -0,0 +1,54 @@
+import os
+
+import pytest
+
+from benchmarks.backends import Backends
+from benchmarks.enums import BackendKindEnum, ScenarioEnum
+from benchmarks.load import LoadGenerator, LoadStats
+from benchmarks.resources import read_stat
+
+
+def test_report_gives_rates_and_percentiles() -> None:
+    stats = LoadStats()
+    stats.requests = stats.connections = 1000
+    stats.bytes = 2**20
+    stats.latencies = [i / 1000 for i in range(1000)]
+    report = stats.report(2)
+    assert report["requests_per_second"] == 500
+    assert report["throughput_mib_per_second"] == 0.5
+    assert report["latency_p50_ms"] == 500
+    assert report["latency_p99_ms"] == 990
+    assert report["latency_p999_ms"] == 999
+
+    assert LoadStats().report(1)["latency_p99_ms"] == 0
+
+
+def test_rejects_fewer_clients_than_processes() -> None:
+    with pytest.raises(ValueError):
+        LoadGenerator(ScenarioEnum.SHORT, 4000, concurrency=1, duration=1, processes=2)
+
+
+@pytest.mark.parametrize(
+    "scenario", [ScenarioEnum.SHORT, ScenarioEnum.STREAM, ScenarioEnum.LARGE]
+)
+def test_load_is_generated_against_backends(scenario: ScenarioEnum) -> None:
+    with Backends(scenario.backend_kind, 1) as backends:
+        report = LoadGenerator(
+            scenario, backends.ports[0], concurrency=2, duration=0.3
+        ).run()
+    assert report["requests"] > 0
+    assert report["errors"] == 0
+
+
+def test_backends_take_slow_ones_last() -> None:
+    backends = Backends(BackendKindEnum.ECHO, 3, slow=1, delay=0.1)
+    assert backends.delays == [0, 0, 0.1]
+    with pytest.raises(ValueError):
+        Backends(BackendKindEnum.ECHO, 1, slow=2)
+
+
+@pytest.mark.skipif(not os.path.exists("/proc/self/stat"), reason="No procfs")
+def test_stat_of_the_current_process() -> None:
+    (ppid, cpu, rss) = read_stat(os.getpid())
+    assert ppid == os.getppid()
+    assert cpu > 0 and rss > 0
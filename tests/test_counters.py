@@ -0,0 +1,104 @@
+import pytest
+
+from balancer.core.common.counters import ConnectionCounters
+from balancer.core.enums import BalancerAlgorithmEnum
+
+from .conftest import build_targets
+
+
+def test_least_loaded_follows_the_counts() -> None:
+    counters = ConnectionCounters([1, 1, 1])
+    counters.add(0, 2)
+    counters.add(1, 1)
+    counters.add(2, 3)
+    assert counters.least_loaded() == 1
+
+    counters.add(1, 2)
+    assert counters.least_loaded() == 0
+
+
+def test_least_loaded_is_weighted() -> None:
+    counters = ConnectionCounters([1, 4])
+    counters.add(0, 1)
+    counters.add(1, 3)
+    # 3 / 4 is less than 1 / 1
+    assert counters.least_loaded() == 1
+
+
+def test_equally_loaded_take_turns() -> None:
+    counters = ConnectionCounters([1, 1, 1])
+    given = []
+    for _ in range(6):
+        index = counters.least_loaded()
+        given.append(index)
+        counters.add(index, 1)
+        counters.add(index, -1)
+    assert sorted(given) == [0, 0, 1, 1, 2, 2]
+
+
+def test_try_add_keeps_the_limit() -> None:
+    counters = ConnectionCounters([1])
+    assert counters.try_add(0, 2) and counters.try_add(0, 2)
+    assert not counters.try_add(0, 2)
+    assert counters.count(0) == 2
+    assert counters.try_add(0, 0)
+
+
+def test_unhealthy_are_given_only_if_all_are() -> None:
+    counters = ConnectionCounters([1, 1])
+    counters.add(1, 5)
+    counters.set_healthy(0, False)
+    assert counters.least_loaded() == 1
+
+    counters.set_healthy(1, False)
+    assert counters.least_loaded() == 0
+
+
+def test_least_connections_algorithm_gives_the_least_loaded() -> None:
+    targets = build_targets(3, BalancerAlgorithmEnum.LEAST_CONNECTIONS)
+    targets[0].increment_connections()
+    targets[2].increment_connections()
+    assert targets.get_next() is targets[1]
+
+
+def test_weighted_least_connections_spreads_by_weights() -> None:
+    targets = build_targets(
+        2, BalancerAlgorithmEnum.WEIGHTED_LEAST_CONNECTIONS, weights=[1, 3]
+    )
+    for _ in range(8):
+        targets.acquire_next()
+    assert [target.active_connections for target in targets] == [2, 6]
+
+
+def test_latency_peak_is_taken_at_once() -> None:
+    counters = ConnectionCounters([1])
+    counters.observe_latency(0, 0.01)
+    counters.observe_latency(0, 0.5)
+    assert counters.load_score(0) == pytest.approx(0.5, rel=0.01)
+
+    # A lower latency lowers the estimate smoothly, not at once
+    counters.observe_latency(0, 0.01)
+    assert 0.01 < counters.load_score(0) <= 0.5
+
+
+def test_load_score_counts_connections() -> None:
+    counters = ConnectionCounters([1])
+    counters.observe_latency(0, 0.1)
+    counters.add(0, 3)
+    assert counters.load_score(0) == pytest.approx(0.4, rel=0.01)
+
+
+def test_peak_ewma_gives_the_lower_score() -> None:
+    targets = build_targets(2, BalancerAlgorithmEnum.PEAK_EWMA)
+    targets[0].observe_latency(0.5)
+    targets[1].observe_latency(0.01)
+    assert all(targets.get_next() is targets[1] for _ in range(20))
+
+    for _ in range(100):
+        targets[1].increment_connections()
+    assert targets.get_next() is targets[0]
+
+
+def test_peak_ewma_gives_the_single_target() -> None:
+    targets = build_targets(1, BalancerAlgorithmEnum.PEAK_EWMA)
+    assert targets.get_next() is targets[0]
@@ -0,0 +1,124 @@
+import os
+import signal
+import socket
+import time
+from pathlib import Path
+from typing import Iterator, List
+
+import pytest
+
+from balancer.core.common.handoff import READY, ListenSocketHandoff
+
+
+@pytest.fixture
+def listen_socket() -> Iterator[socket.socket]:
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.bind(("127.0.0.1", 0))
+    sock.listen(16)
+    yield sock
+    sock.close()
+
+
+@pytest.fixture
+def drained() -> Iterator[List[int]]:
+    """Signals the running balancer gets to drain, the test process isn't quit by them"""
+    received: List[int] = []
+    previous = signal.signal(
+        signal.SIGQUIT, lambda signum, frame: received.append(signum)
+    )
+    yield received
+    signal.signal(signal.SIGQUIT, previous)
+
+
+def wait_for(condition, timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        ListenSocketHandoff("")
+    with pytest.raises(ValueError):
+        ListenSocketHandoff("handoff.sock", timeout=0)
+
+
+def test_nothing_is_received_without_a_running_balancer(tmp_path: Path) -> None:
+    handoff = ListenSocketHandoff(str(tmp_path / "handoff.sock"), timeout=1)
+    assert handoff.receive(4000, socket.SOCK_STREAM) is None
+    handoff.complete()  # Nobody is told to drain
+
+
+def test_listening_socket_is_handed_over(
+    tmp_path: Path, listen_socket: socket.socket, drained: List[int]
+) -> None:
+    path = str(tmp_path / "handoff.sock")
+    running = ListenSocketHandoff(path, timeout=1)
+    running.serve(listen_socket)
+    upgraded = ListenSocketHandoff(path, timeout=1)
+    try:
+        port = listen_socket.getsockname()[1]
+        taken = upgraded.receive(port, socket.SOCK_STREAM)
+        assert taken is not None
+        assert os.path.sameopenfile(taken.fileno(), listen_socket.fileno())
+
+        # Both of them accept from the same socket until the upgraded one is ready
+        assert not drained and running.keep_going
+        upgraded.complete()
+        assert wait_for(lambda: drained == [signal.SIGQUIT])
+        assert not running.keep_going
+
+        # The upgraded balancer takes the path over, the previous one leaves it alone
+        upgraded.serve(taken)
+        running.stop()
+        assert os.path.exists(path)
+        upgraded.stop()
+        assert not os.path.exists(path)
+        taken.close()
+    finally:
+        running.stop()
+        upgraded.stop()
+
+
+def test_serving_goes_on_if_the_upgraded_balancer_fails(
+    tmp_path: Path, listen_socket: socket.socket, drained: List[int]
+) -> None:
+    path = str(tmp_path / "handoff.sock")
+    running = ListenSocketHandoff(path, timeout=1)
+    running.serve(listen_socket)
+    try:
+        # The upgraded balancer exits before it's ready
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+            connection.connect(path)
+            (message, fds, _, _) = socket.recv_fds(connection, len(READY), 1)
+            assert message == READY and len(fds) == 1
+            os.close(fds[0])
+
+        upgraded = ListenSocketHandoff(path, timeout=1)
+        taken = upgraded.receive(listen_socket.getsockname()[1], socket.SOCK_STREAM)
+        assert taken is not None
+        taken.close()
+        assert not drained and running.keep_going
+    finally:
+        running.stop()
+
+
+def test_socket_of_another_port_isnt_taken(
+    tmp_path: Path, listen_socket: socket.socket, drained: List[int]
+) -> None:
+    path = str(tmp_path / "handoff.sock")
+    running = ListenSocketHandoff(path, timeout=1)
+    running.serve(listen_socket)
+    try:
+        other = ListenSocketHandoff(path, timeout=1)
+        port = listen_socket.getsockname()[1]
+        assert other.receive(port + 1, socket.SOCK_STREAM) is None
+        assert other.receive(port, socket.SOCK_DGRAM) is None
+        # The path is left to the balancer of the other port
+        inode = os.stat(path).st_ino
+        other.serve(listen_socket)
+        assert not other.keep_going and os.stat(path).st_ino == inode
+        assert not drained and running.keep_going
+    finally:
+        running.stop()
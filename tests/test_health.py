@@ -0,0 +1,99 @@
+import asyncio
+from collections import Counter
+from typing import Tuple
+
+import pytest
+
+from balancer.core.common.health import HealthChecker
+from balancer.core.common.target import Target
+from balancer.core.enums import BalancerAlgorithmEnum
+
+from .conftest import build_targets, free_port
+
+
+def test_rejects_wrong_thresholds() -> None:
+    with pytest.raises(ValueError):
+        HealthChecker(rise=0)
+
+
+def test_probe_connects_and_expects(echo_server: Tuple[str, int]) -> None:
+    target = Target("t", *echo_server)
+    assert asyncio.run(HealthChecker(send=b"ping", expect=b"ping").probe(target))
+    assert not asyncio.run(HealthChecker(send=b"ping", expect=b"pong").probe(target))
+    dead = Target("dead", "127.0.0.1", free_port())
+    assert not asyncio.run(HealthChecker(timeout=1).probe(dead))
+
+
+def test_state_changes_after_thresholds() -> None:
+    targets = build_targets(1)
+    target = targets[0]
+    checker = HealthChecker(rise=2, fall=3)
+    for _ in range(2):
+        checker.account(target, False)
+    # A success breaks the row
+    checker.account(target, True)
+    for _ in range(2):
+        checker.account(target, False)
+    assert target.healthy
+    checker.account(target, False)
+    assert not target.healthy
+
+    checker.account(target, True)
+    assert not target.healthy
+    checker.account(target, True)
+    assert target.healthy
+
+
+def test_unhealthy_targets_are_skipped() -> None:
+    targets = build_targets(4)
+    targets[1].set_healthy(False)
+    targets[2].set_healthy(False)
+    given = Counter(targets.get_next().name for _ in range(40))
+    assert set(given) == {"t0", "t3"}
+    assert given["t0"] == given["t3"]
+
+
+@pytest.mark.parametrize(
+    "algorithm",
+    [
+        BalancerAlgorithmEnum.RANDOM,
+        BalancerAlgorithmEnum.CONSISTENT_HASH,
+        BalancerAlgorithmEnum.MAGLEV,
+        BalancerAlgorithmEnum.LEAST_CONNECTIONS,
+        BalancerAlgorithmEnum.PEAK_EWMA,
+    ],
+)
+def test_unhealthy_targets_are_skipped_by_any_algorithm(
+    algorithm: BalancerAlgorithmEnum,
+) -> None:
+    targets = build_targets(8, algorithm)
+    for target in targets[:7]:
+        target.set_healthy(False)
+    assert all(targets.get_next(f"k{i}") is targets[7] for i in range(20))
+
+
+def test_keys_of_unhealthy_target_stick_to_another_one() -> None:
+    targets = build_targets(4, BalancerAlgorithmEnum.CONSISTENT_HASH)
+    key = next(f"k{i}" for i in range(100) if targets.get_next(f"k{i}") is targets[0])
+    targets[0].set_healthy(False)
+    replacement = targets.get_next(key)
+    assert replacement is not targets[0]
+    assert all(targets.get_next(key) is replacement for _ in range(10))
+
+
+def test_available_targets_are_kept_until_availability_changes() -> None:
+    targets = build_targets(3)
+    available = targets.available_targets()
+    assert targets.available_targets() is available
+
+    targets[0].set_healthy(False)
+    assert targets.available_targets() == [targets[1], targets[2]]
+    targets[0].set_healthy(True)
+    assert targets.available_targets() == list(targets)
+
+
+def test_all_unhealthy_fail_open() -> None:
+    targets = build_targets(2)
+    for target in targets:
+        target.set_healthy(False)
+    assert targets.get_next() in targets
@@ -0,0 +1,136 @@
+import asyncio
+import socket
+
+import pytest
+
+from balancer.core.common.http import ChunkedBody, HttpHead, error_response
+from balancer.core.common.http_worker import HttpWorker
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.exceptions import HttpProtocolError
+
+from .conftest import build_targets
+
+
+def test_request_head_is_parsed() -> None:
+    head = HttpHead(
+        b"POST /path HTTP/1.1\r\nHost: x\r\nContent-Length: 5\r\n"
+        b"Connection: keep-alive, X-Private\r\nX-Private: 1\r\n\r\n",
+        True,
+    )
+    assert (head.method, head.version) == (b"POST", b"HTTP/1.1")
+    assert head.content_length == 5 and head.has_body and head.keep_alive
+    # Hop-by-hop headers and the ones listed in Connection are not relayed
+    assert head.rebuild(b"close") == (
+        b"POST /path HTTP/1.1\r\nHost: x\r\nContent-Length: 5\r\nConnection: close\r\n\r\n"
+    )
+
+
+def test_response_head_is_parsed() -> None:
+    request = HttpHead(b"HEAD / HTTP/1.0\r\n\r\n", True)
+    assert not request.keep_alive
+    response = HttpHead(b"HTTP/1.1 200 OK\r\nContent-Length: 3\r\n\r\n", False)
+    assert response.status == 200 and not response.response_has_body(request)
+    assert not HttpHead(b"HTTP/1.1 204 No Content\r\n\r\n", False).response_has_body(
+        HttpHead(b"GET / HTTP/1.1\r\n\r\n", True)
+    )
+
+
+def test_transfer_encoding_overrides_content_length() -> None:
+    head = HttpHead(
+        b"POST / HTTP/1.1\r\nContent-Length: 5\r\nTransfer-Encoding: chunked\r\n\r\n",
+        True,
+    )
+    assert head.chunked and head.content_length is None and not head.keep_alive
+
+
+@pytest.mark.parametrize(
+    ("data", "status"),
+    [
+        (b"GET /\r\n\r\n", 400),
+        (b"HTTP/1.1 20 OK\r\n\r\n", 400),
+        (b"GET / HTTP/2.0\r\n\r\n", 505),
+        (b"GET / HTTP/1.1\r\nHost : x\r\n\r\n", 400),
+        (b"GET / HTTP/1.1\r\nContent-Length: -1\r\n\r\n", 400),
+        (b"GET / HTTP/1.1\r\nContent-Length: 1\r\nContent-Length: 2\r\n\r\n", 400),
+        (b"POST / HTTP/1.1\r\nTransfer-Encoding: gzip\r\n\r\n", 400),
+    ],
+)
+def test_malformed_heads_are_rejected(data: bytes, status: int) -> None:
+    with pytest.raises(HttpProtocolError) as info:
+        HttpHead(data, not data.startswith(b"HTTP/"))
+    assert info.value.status == status  # type: ignore
+
+
+def test_chunked_body_end_is_found() -> None:
+    body = b"5;name=value\r\nhello\r\nA\r\n0123456789\r\n0\r\nTrailer: 1\r\n\r\n"
+    parser = ChunkedBody()
+    data = bytearray(body + b"GET / HTTP/1.1\r\n\r\n")
+    assert parser.feed(data) == len(body) and parser.done
+
+
+def test_chunked_body_is_parsed_in_parts() -> None:
+    parser = ChunkedBody()
+    data = bytearray(b"1")
+    # An incomplete size line is fed again with the bytes that follow
+    assert parser.feed(data) == 0
+    data += b"0\r\n" + b"x" * 4
+    assert parser.feed(data) == 8 and parser.expects_data
+    parser.skip(12)
+    assert parser.feed(bytearray(b"\r\n0\r\n\r\n")) == 7 and parser.done
+
+
+@pytest.mark.parametrize(
+    "size", [b"0x10", b"1_0", b"+5", b" 5", b"5 ", b"-1", b"", b"1" * 17]
+)
+def test_chunk_sizes_are_hex_digits_only(size: bytes) -> None:
+    with pytest.raises(HttpProtocolError):
+        ChunkedBody().feed(bytearray(size + b"\r\n"))
+
+
+def test_chunk_data_longer_than_its_size_is_rejected() -> None:
+    with pytest.raises(HttpProtocolError):
+        ChunkedBody().feed(bytearray(b"1\r\nxx\r\n"))
+
+
+def test_error_response_closes_the_connection() -> None:
+    response = HttpHead(error_response(503), False)
+    assert response.status == 503 and not response.keep_alive
+    assert response.content_length == 0
+
+
+async def serve_request(worker: HttpWorker, peer: socket.socket, data: bytes) -> bytes:
+    """It runs the worker for the request the client sends, and gives back what the client receives"""
+    loop = asyncio.get_running_loop()
+    task = loop.create_task(worker.run())
+    await loop.sock_sendall(peer, data)
+    received = b""
+    while True:
+        chunk = await asyncio.wait_for(loop.sock_recv(peer, 65536), 5)
+        if not chunk:
+            break
+        received += chunk
+    await asyncio.wait_for(task, 5)
+    return received
+
+
+def test_malformed_request_body_isnt_a_target_failure(silent_server) -> None:
+    targets = build_targets(1, port=silent_server[1])
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    outliers = OutlierDetector(consecutive_failures=1)
+    worker = HttpWorker(client, "127.0.0.1", lambda: targets, outliers=outliers)
+
+    response = asyncio.run(
+        serve_request(
+            worker,
+            peer,
+            b"POST / HTTP/1.1\r\nTransfer-Encoding: chunked\r\n\r\n0x5\r\nhello\r\n",
+        )
+    )
+    peer.close()
+
+    # The target is still waiting for the body when the client's one turns out to be malformed
+    assert HttpHead(response, False).status == 400
+    assert not targets[0].ejected
+    assert targets[0].active_connections == 0
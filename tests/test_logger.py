@@ -0,0 +1,156 @@
+import io
+import json
+import logging
+import multiprocessing
+import signal
+import threading
+import time
+
+import pytest
+
+from balancer.core.logger import (
+    AccessFormatter,
+    AccessSampler,
+    LogWriter,
+    access_logger,
+    log_access,
+)
+
+
+def send_lines(writer: LogWriter, amount: int) -> None:
+    """It sends lines to the writer from another process, as a worker does"""
+    for i in range(amount):
+        writer.send(LogWriter.MAIN_CHANNEL, logging.INFO, f"child {i}")
+
+
+def test_writer_batches_lines_of_all_processes() -> None:
+    writer = LogWriter(flush_interval=0.01)
+    (main, errors, access) = (io.StringIO(), io.StringIO(), io.StringIO())
+    writer.add_stream(main)
+    writer.add_stream(errors, logging.ERROR)
+    writer.add_stream(access, channel=LogWriter.ACCESS_CHANNEL)
+
+    process = multiprocessing.get_context("fork").Process(
+        target=send_lines, args=(writer, 100)
+    )
+    process.start()
+    process.join()
+    writer.send(LogWriter.MAIN_CHANNEL, logging.ERROR, "failure")
+    writer.send(LogWriter.ACCESS_CHANNEL, logging.INFO, "session")
+    writer.stop()
+
+    lines = main.getvalue().splitlines()
+    assert lines == [f"child {i}" for i in range(100)] + ["failure"]
+    assert errors.getvalue() == "failure\n"
+    assert access.getvalue() == "session\n"
+
+
+def test_writer_keeps_incomplete_frames() -> None:
+    writer = LogWriter()
+    stream = io.StringIO()
+    writer.add_stream(stream)
+    frame = writer.pack_frame(LogWriter.MAIN_CHANNEL, logging.INFO, b"hello")
+    writer.pending += frame[:-2]
+    writer.write_pending()
+    assert stream.getvalue() == ""
+    writer.pending += b"lo"
+    writer.write_pending()
+    assert stream.getvalue() == "hello\n"
+
+
+def test_writer_skips_garbage_up_to_a_frame() -> None:
+    writer = LogWriter()
+    stream = io.StringIO()
+    writer.add_stream(stream)
+    # Frames of an unknown channel and of an absurd length, a cut header and a cut line
+    writer.pending += b"garbage" + writer.pack_frame(7, logging.INFO, b"hello")
+    writer.pending += writer.FRAME_HEADER.pack(0xFF, 0, 0, 2**31)
+    writer.pending += writer.pack_frame(LogWriter.MAIN_CHANNEL, 0, b"cut")[:3]
+    writer.pending += writer.pack_frame(LogWriter.MAIN_CHANNEL, 0, b"cut line")[:-4]
+    writer.pending += writer.pack_frame(LogWriter.MAIN_CHANNEL, 20, b"kept")
+    writer.write_pending()
+    assert stream.getvalue() == "kept\n"
+    assert not writer.pending
+
+
+def test_signal_handler_doesnt_break_a_frame() -> None:
+    writer = LogWriter()
+    stream = io.StringIO()
+    writer.add_stream(stream)
+    long_line = "x" * (
+        3 << 20
+    )  # More than the pipe takes, so the write waits for the reader
+    done = threading.Event()
+
+    def read() -> None:
+        time.sleep(0.2)
+        while not done.is_set():
+            writer.write_pending()
+            time.sleep(0.01)
+
+    previous = signal.signal(
+        signal.SIGALRM,
+        lambda signum, frame: writer.send(
+            LogWriter.MAIN_CHANNEL, logging.INFO, "alarm"
+        ),
+    )
+    reader = threading.Thread(target=read)
+    reader.start()
+    try:
+        signal.setitimer(signal.ITIMER_REAL, 0.05)
+        writer.send(LogWriter.MAIN_CHANNEL, logging.INFO, long_line)
+    finally:
+        signal.setitimer(signal.ITIMER_REAL, 0)
+        signal.signal(signal.SIGALRM, previous)
+        done.set()
+        reader.join()
+    writer.write_pending()
+
+    assert stream.getvalue().splitlines() == [long_line, "alarm"]
+    assert not writer.pending and not writer.deferred
+
+
+def test_handler_sends_formatted_records() -> None:
+    writer = LogWriter()
+    stream = io.StringIO()
+    writer.add_stream(stream)
+    test_logger = logging.getLogger("tests.logger")
+    test_logger.propagate = False
+    handler = writer.handler(LogWriter.MAIN_CHANNEL, logging.Formatter("%(message)s!"))
+    test_logger.addHandler(handler)
+    try:
+        test_logger.warning("sent %d", 1)
+    finally:
+        test_logger.removeHandler(handler)
+    writer.write_pending()
+    assert stream.getvalue() == "sent 1!\n"
+
+
+def test_sampler_passes_the_share() -> None:
+    with pytest.raises(ValueError):
+        AccessSampler(1.5)
+    record = logging.makeLogRecord({})
+    assert all(AccessSampler(1).filter(record) for _ in range(100))
+    assert not any(AccessSampler(0).filter(record) for _ in range(100))
+
+
+def test_access_records_are_json_lines() -> None:
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    handler.setFormatter(AccessFormatter())
+    access_logger.addHandler(handler)
+    try:
+        log_access(("10.0.0.1", 5000), "t0", "127.0.0.1", 4000, "ok")
+        assert stream.getvalue() == ""  # Disabled by default
+
+        access_logger.disabled = False
+        access_logger.setLevel(logging.INFO)
+        log_access(("10.0.0.1", 5000), "t0", "127.0.0.1", 4000, "ok", 0.5, 10, 20)
+    finally:
+        access_logger.disabled = True
+        access_logger.removeHandler(handler)
+
+    record = json.loads(stream.getvalue())
+    assert record["client"] == "10.0.0.1:5000"
+    assert record["upstream"] == "127.0.0.1:4000"
+    assert (record["status"], record["sent"], record["received"]) == ("ok", 10, 20)
@@ -0,0 +1,84 @@
+import multiprocessing
+import os
+import socket
+import urllib.request
+
+import pytest
+
+from balancer.core.common.metrics import Metrics, MetricsServer
+from balancer.core.common.target import Target
+
+from .conftest import build_targets, free_port
+
+
+def count_in_child(metrics: Metrics, target: Target) -> None:
+    """It counts into the metrics from another process, as a worker does"""
+    metrics.add(target, Metrics.ACCEPTED)
+    metrics.observe_session(target, 0.2, 100, 300)
+
+
+def test_values_are_summed_over_processes() -> None:
+    targets = build_targets(2)
+    metrics = Metrics(targets, shards=4)
+    metrics.add(targets[0], Metrics.ACCEPTED)
+    context = multiprocessing.get_context("fork")
+    processes = [
+        context.Process(target=count_in_child, args=(metrics, targets[0]))
+        for _ in range(3)
+    ]
+    for process in processes:
+        process.start()
+    for process in processes:
+        process.join()
+
+    values = metrics.read("t0")
+    assert values[Metrics.ACCEPTED] == 4
+    assert values[Metrics.BYTES_IN] == 300 and values[Metrics.BYTES_OUT] == 900
+    assert values[metrics.session_histogram.sum_position] == pytest.approx(0.6)
+    assert metrics.read("t1") == [0.0] * metrics.stride
+
+
+def test_histogram_counts_into_buckets() -> None:
+    targets = build_targets(1)
+    metrics = Metrics(targets, connect_buckets=(0.01, 0.1))
+    for latency in (0.005, 0.05, 0.5, 0.01):
+        metrics.observe(targets[0], metrics.connect_histogram, latency)
+    histogram = metrics.connect_histogram
+    values = metrics.read("t0")
+    assert [values[histogram.offset + i] for i in range(3)] == [2, 1, 1]
+
+
+def test_spare_slots_are_given_to_added_targets() -> None:
+    targets = build_targets(1)
+    metrics = Metrics(targets, spare_slots=1)
+    metrics.register([Target("added", "127.0.0.1", 4001)])
+    metrics.register([Target("extra", "127.0.0.1", 4002)])
+    assert metrics.names == ["t0", "added"]
+    # Targets that are not known are not counted
+    metrics.add(Target("extra", "127.0.0.1", 4002), Metrics.ACCEPTED)
+
+
+def test_server_renders_prometheus_text() -> None:
+    targets = build_targets(1)
+    metrics = Metrics(targets)
+    metrics.add(targets[0], Metrics.ACCEPTED, 3)
+    metrics.observe(targets[0], metrics.connect_histogram, 0.001)
+    server = MetricsServer(metrics, "127.0.0.1", free_port())
+    listener = socket.socket()
+    listener.bind(("127.0.0.1", 0))
+    listener.listen(1)
+    server.start(targets, listener.getsockname()[1])
+    try:
+        with urllib.request.urlopen(
+            f"http://127.0.0.1:{server.port}/metrics"
+        ) as response:
+            text = response.read().decode()
+    finally:
+        server.stop()
+        listener.close()
+
+    assert 'balancer_connections_accepted_total{target="t0"} 3' in text
+    assert 'balancer_connect_duration_seconds_count{target="t0"} 1' in text
+    assert "# TYPE balancer_session_duration_seconds histogram" in text
+    if os.path.exists("/proc/net/tcp"):
+        assert "balancer_accept_queue_length 0" in text
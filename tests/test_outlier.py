@@ -0,0 +1,170 @@
+import asyncio
+import socket
+import threading
+import time
+from typing import Callable, Iterator
+
+import pytest
+
+from balancer.core.common.http_worker import HttpWorker
+from balancer.core.common.outlier import OutlierDetector
+
+from .conftest import build_targets
+
+
+@pytest.fixture
+def http_server() -> Iterator[Callable[[Callable[[socket.socket], None]], int]]:
+    """Factory of HTTP targets on free local ports, each connection is handled by the given function"""
+    servers = []
+
+    def start(handle: Callable[[socket.socket], None]) -> int:
+        server = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+        server.bind(("127.0.0.1", 0))
+        server.listen(16)
+        servers.append(server)
+
+        def serve() -> None:
+            while True:
+                try:
+                    (connection, _) = server.accept()
+                except OSError:
+                    return
+                threading.Thread(target=handle, args=(connection,), daemon=True).start()
+
+        threading.Thread(target=serve, daemon=True).start()
+        return server.getsockname()[1]
+
+    yield start
+    for server in servers:
+        server.close()
+
+
+def read_head(connection: socket.socket) -> None:
+    data = b""
+    while b"\r\n\r\n" not in data:
+        chunk = connection.recv(65536)
+        if not chunk:
+            return
+        data += chunk
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        OutlierDetector(consecutive_failures=0)
+    with pytest.raises(ValueError):
+        OutlierDetector(base_ejection_time=10, max_ejection_time=5)
+    with pytest.raises(ValueError):
+        OutlierDetector(max_ejection_percent=101)
+    with pytest.raises(ValueError):
+        OutlierDetector(short_session=-1)
+
+
+def test_target_is_ejected_after_failures_in_a_row() -> None:
+    targets = build_targets(2)
+    detector = OutlierDetector(consecutive_failures=3, max_ejection_percent=50)
+    detector.record_failure(targets[0], "reset")
+    detector.record_failure(targets[0], "reset")
+    # A success breaks the row
+    detector.record_success(targets[0])
+    detector.record_failure(targets[0], "reset")
+    detector.record_failure(targets[0], "reset")
+    assert not targets[0].ejected
+    detector.record_failure(targets[0], "reset")
+    assert targets[0].ejected and not targets[0].available
+    assert all(targets.get_next() is targets[1] for _ in range(4))
+
+
+def test_ejected_targets_are_limited() -> None:
+    targets = build_targets(4)
+    detector = OutlierDetector(consecutive_failures=1, max_ejection_percent=50)
+    for target in targets:
+        detector.record_failure(target, "reset")
+    assert [target.ejected for target in targets] == [True, True, False, False]
+
+
+def test_ejection_is_over_in_time() -> None:
+    targets = build_targets(2)
+    detector = OutlierDetector(
+        consecutive_failures=1, base_ejection_time=0.05, slow_start=0
+    )
+    detector.record_failure(targets[0], "reset")
+    assert targets[0].ejected
+    time.sleep(0.06)
+    targets.get_next()  # Ejections that are over are released on selection
+    assert not targets[0].ejected
+
+
+def test_sessions_are_classified() -> None:
+    targets = build_targets(1)
+    detector = OutlierDetector(consecutive_failures=2, short_session=1)
+    # Closed by the target without a response, quickly
+    detector.record_session(targets[0], 0.1, 0, True, False)
+    # A long session isn't a failure, though nothing was received
+    detector.record_session(targets[0], 2, 0, True, False)
+    detector.record_session(targets[0], 0.1, 0, True, False)
+    assert not targets[0].ejected
+    detector.record_session(targets[0], 5, 100, False, True)
+    assert targets[0].ejected
+
+
+async def serve_request(worker: HttpWorker, peer: socket.socket, data: bytes) -> None:
+    loop = asyncio.get_running_loop()
+    task = loop.create_task(worker.run())
+    await loop.sock_sendall(peer, data)
+    while await asyncio.wait_for(loop.sock_recv(peer, 65536), 5):
+        pass
+    await asyncio.wait_for(task, 5)
+
+
+def test_target_closing_in_the_middle_of_a_response_is_a_failure(http_server) -> None:
+    def respond(connection: socket.socket) -> None:
+        with connection:
+            read_head(connection)
+            connection.sendall(b"HTTP/1.1 200 OK\r\nContent-Length: 100\r\n\r\npart")
+
+    targets = build_targets(1, port=http_server(respond))
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    outliers = OutlierDetector(consecutive_failures=1)
+    worker = HttpWorker(client, "127.0.0.1", lambda: targets, outliers=outliers)
+
+    asyncio.run(serve_request(worker, peer, b"GET / HTTP/1.1\r\n\r\n"))
+    peer.close()
+
+    assert targets[0].ejected
+
+
+def test_client_gone_in_the_middle_of_a_response_isnt_a_failure(http_server) -> None:
+    body = b"x" * 2**24
+
+    def respond(connection: socket.socket) -> None:
+        with connection:
+            read_head(connection)
+            try:
+                connection.sendall(
+                    b"HTTP/1.1 200 OK\r\nContent-Length: %d\r\n\r\n" % len(body) + body
+                )
+            except OSError:
+                pass
+
+    targets = build_targets(1, port=http_server(respond))
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    outliers = OutlierDetector(consecutive_failures=1)
+    worker = HttpWorker(client, "127.0.0.1", lambda: targets, outliers=outliers)
+
+    async def leave() -> None:
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(worker.run())
+        await loop.sock_sendall(peer, b"GET / HTTP/1.1\r\n\r\n")
+        # The client leaves once the response is started
+        await asyncio.wait_for(loop.sock_recv(peer, 1), 5)
+        peer.close()
+        await asyncio.wait_for(task, 5)
+
+    asyncio.run(leave())
+
+    assert not targets[0].ejected
+    assert targets[0].active_connections == 0
@@ -0,0 +1,98 @@
+import multiprocessing
+import os
+import socket
+import time
+from typing import List, Tuple, cast
+
+import pytest
+
+from balancer.core.common.pool import ConnectionPools, TargetConnectionPool
+from balancer.core.common.target import Target
+
+
+def test_rejects_wrong_limits() -> None:
+    with pytest.raises(ValueError):
+        TargetConnectionPool(Target("t", "127.0.0.1", 4000), min_idle=2, max_idle=1)
+
+
+def test_fills_and_hands_out_connected_sockets(echo_server: Tuple[str, int]) -> None:
+    pool = TargetConnectionPool(Target("t", *echo_server), min_idle=2, max_idle=4)
+    pool.fill()
+    assert len(pool) == 2
+
+    sock = pool.acquire()
+    assert sock is not None and len(pool) == 1
+    sock.sendall(b"ping")
+    assert sock.recv(4) == b"ping"
+    sock.close()
+    pool.close()
+
+
+def test_discards_stale_sockets(echo_server: Tuple[str, int]) -> None:
+    pool = TargetConnectionPool(
+        Target("t", *echo_server), min_idle=1, max_idle=1, max_age=0.01
+    )
+    pool.fill()
+    time.sleep(0.02)
+    assert pool.acquire() is None
+    assert len(pool) == 0
+
+
+def test_release_keeps_at_most_max_idle(echo_server: Tuple[str, int]) -> None:
+    pool = TargetConnectionPool(Target("t", *echo_server), min_idle=0, max_idle=1)
+    socks = [socket.create_connection(echo_server) for _ in range(2)]
+    for sock in socks:
+        pool.release(sock)
+    assert len(pool) == 1
+    assert socks[0].fileno() != -1 and socks[1].fileno() == -1
+    pool.close()
+
+
+def report_open_sockets(
+    connection: "multiprocessing.connection.Connection", sockets: List[Tuple[int, int]]
+) -> None:
+    """It reports which of the sockets (by descriptor and inode) are still open in the forked process"""
+    opened = []
+    for (fd, inode) in sockets:
+        try:
+            # The descriptor may be reused by the child for another file
+            if os.fstat(fd).st_ino == inode:
+                opened.append(fd)
+        except OSError:
+            continue
+    connection.send(opened)
+
+
+@pytest.mark.skipif(
+    "fork" not in multiprocessing.get_all_start_methods(), reason="No fork"
+)
+def test_forked_process_keeps_only_its_own_socket(echo_server: Tuple[str, int]) -> None:
+    target = Target("t", *echo_server)
+    pools = ConnectionPools(min_idle=3, max_idle=5)
+    pools.start([target])
+    try:
+        deadline = time.monotonic() + 5
+        while len(pools.pools[target]) < 3 and time.monotonic() < deadline:
+            time.sleep(0.01)
+        socks = [pools.acquire(target) for _ in range(3)]
+        assert all(sock is not None for sock in socks)
+        (own, *pooled) = cast(List[socket.socket], socks)
+        for sock in pooled:
+            pools.release(target, sock)
+        sockets = [
+            (sock.fileno(), os.fstat(sock.fileno()).st_ino) for sock in (own, *pooled)
+        ]
+
+        context = multiprocessing.get_context("fork")
+        (reader, writer) = context.Pipe(duplex=False)
+        process = context.Process(target=report_open_sockets, args=(writer, sockets))
+        process.start()
+        opened = reader.recv()
+        process.join()
+
+        assert opened == [own.fileno()]
+        # The balancer keeps its pooled sockets
+        assert all(sock.fileno() != -1 for sock in pooled)
+        own.close()
+    finally:
+        pools.stop()
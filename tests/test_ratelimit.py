@@ -0,0 +1,69 @@
+import time
+
+import pytest
+
+from balancer.core.common.ratelimit import RateLimiter
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        RateLimiter(client_rate=-1)
+    with pytest.raises(ValueError):
+        RateLimiter(total_burst=0)
+    with pytest.raises(ValueError):
+        RateLimiter(table_size=0)
+
+
+def test_no_limits_allow_everything() -> None:
+    limiter = RateLimiter()
+    assert all(limiter.allow(("10.0.0.1", port)) for port in range(1000))
+
+
+def test_client_is_limited_by_its_burst_and_rate() -> None:
+    limiter = RateLimiter(client_rate=100, client_burst=2)
+    assert limiter.allow(("10.0.0.1", 1)) and limiter.allow(("10.0.0.1", 2))
+    assert not limiter.allow(("10.0.0.1", 3))
+    # Other clients have buckets of their own
+    assert limiter.allow(("10.0.0.2", 1))
+    time.sleep(0.02)
+    assert limiter.allow(("10.0.0.1", 4))
+    assert limiter.read()[RateLimiter.LIMITED_CLIENT] == 1
+
+
+def test_total_is_limited_for_all_the_clients() -> None:
+    limiter = RateLimiter(total_rate=0.001, total_burst=2)
+    assert limiter.allow(("10.0.0.1", 1)) and limiter.allow(("10.0.0.2", 1))
+    assert not limiter.allow(("10.0.0.3", 1))
+    assert limiter.read()[RateLimiter.LIMITED_TOTAL] == 1
+
+
+def test_total_rejection_keeps_the_client_budget() -> None:
+    limiter = RateLimiter(
+        client_rate=0.001, client_burst=2, total_rate=0.001, total_burst=1
+    )
+    assert limiter.allow(("10.0.0.1", 1))
+    # Rejected by the total limit, the client's token is given back
+    for port in range(2, 10):
+        assert not limiter.allow(("10.0.0.2", port))
+    assert limiter.read()[RateLimiter.LIMITED_CLIENT] == 0
+
+    limiter = RateLimiter(
+        client_rate=0.001, client_burst=1, total_rate=1000, total_burst=1
+    )
+    assert limiter.allow(("10.0.0.1", 1))
+    time.sleep(0.01)
+    assert not limiter.allow(("10.0.0.1", 2))
+    assert limiter.read()[RateLimiter.LIMITED_CLIENT] == 1
+
+
+def test_least_recently_seen_client_is_evicted() -> None:
+    limiter = RateLimiter(client_rate=0.001, client_burst=1, table_size=2, ways=2)
+    assert limiter.allow(("10.0.0.1", 1))
+    time.sleep(0.001)
+    assert limiter.allow(("10.0.0.2", 1))
+    time.sleep(0.001)
+    assert limiter.allow(("10.0.0.3", 1))
+    assert limiter.read()[RateLimiter.EVICTED] == 1
+    # The first client starts over with a full bucket, the second one is still limited
+    assert not limiter.allow(("10.0.0.2", 2))
+    assert limiter.allow(("10.0.0.1", 2))
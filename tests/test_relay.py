@@ -0,0 +1,104 @@
+import socket
+
+import pytest
+
+from balancer.core.common.relay import (
+    RingRelayBuffer,
+    SpliceRelayBuffer,
+    build_relay_buffer,
+    is_splice_supported,
+)
+from balancer.core.enums import BalancerRelayModeEnum
+
+
+@pytest.fixture
+def pipes():
+    """Two connected socket pairs: data is written to the source and relayed to the destination"""
+    (source, source_peer) = socket.socketpair()
+    (destination, destination_peer) = socket.socketpair()
+    for sock in (source, destination_peer):
+        sock.setblocking(False)
+    yield (source_peer, source, destination, destination_peer)
+    for sock in (source, source_peer, destination, destination_peer):
+        sock.close()
+
+
+class SlowSocket:
+    """Destination that takes a few bytes per send, so the data of the ring wraps around its end"""
+
+    def __init__(self, per_send: int) -> None:
+        self.per_send = per_send
+        self.taken = b""
+
+    def send(self, data) -> int:
+        chunk = bytes(data[: self.per_send])
+        self.taken += chunk
+        return len(chunk)
+
+
+def test_ring_buffer_keeps_order_across_the_wrap(pipes):
+    (writer, source, _, _) = pipes
+    buffer = RingRelayBuffer(10)
+    destination = SlowSocket(6)
+
+    writer.sendall(b"abcdefgh")
+    assert buffer.recv_from(source) == 8
+    assert buffer.send_to(destination) == 6  # type: ignore
+    writer.sendall(b"0123456789")
+    # Free region lays at the end of the ring first, then at its start
+    assert buffer.recv_from(source) == 2
+    assert buffer.recv_from(source) == 6
+    assert buffer.is_full
+    while not buffer.is_empty:
+        buffer.send_to(destination)  # type: ignore
+
+    assert destination.taken == b"abcdefgh01234567"
+
+
+def test_ring_buffer_receives_into_the_free_region_only(pipes):
+    (writer, source, destination, reader) = pipes
+    buffer = RingRelayBuffer(4)
+
+    writer.sendall(b"abcdef")
+
+    assert buffer.recv_from(source) == 4
+    assert buffer.is_full
+    assert buffer.send_to(destination) == 4
+    assert buffer.recv_from(source) == 2
+    assert reader.recv(100) == b"abcd"
+
+
+def test_ring_buffer_reports_closed_source(pipes):
+    (writer, source, _, _) = pipes
+    writer.close()
+
+    assert RingRelayBuffer(4).recv_from(source) == 0
+
+
+@pytest.mark.skipif(not is_splice_supported(), reason="os.splice isn't supported")
+def test_splice_buffer_moves_data_between_sockets(pipes):
+    (writer, source, destination, reader) = pipes
+    buffer = SpliceRelayBuffer(65536)
+    payload = b"x" * 5000
+
+    writer.sendall(payload)
+    assert buffer.recv_from(source) == len(payload)
+    assert buffer.send_to(destination) == len(payload)
+    buffer.close()
+
+    assert reader.recv(65536) == payload
+
+
+@pytest.mark.skipif(not is_splice_supported(), reason="os.splice isn't supported")
+def test_auto_mode_takes_the_kernel_side_path():
+    buffer = build_relay_buffer(BalancerRelayModeEnum.AUTO)
+    buffer.close()
+
+    assert buffer.path is BalancerRelayModeEnum.SPLICE
+
+
+def test_buffer_mode_takes_the_user_space_path():
+    buffer = build_relay_buffer(BalancerRelayModeEnum.BUFFER, capacity=16)
+
+    assert isinstance(buffer, RingRelayBuffer)
+    assert buffer.capacity == 16
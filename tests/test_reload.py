@@ -0,0 +1,109 @@
+from pathlib import Path
+from typing import List
+
+import pytest
+
+from balancer.core.common.algorithms import (
+    BalanceAlgorithmFactory,
+    ConsistentHashBalanceAlgorithm,
+)
+from balancer.core.common.reload import SettingsReloader
+from balancer.core.common.target import Target
+from balancer.core.enums import BalancerAlgorithmEnum
+
+from .conftest import build_targets
+
+SETTINGS = """
+balancer:
+  targets:
+    first:
+      host: 127.0.0.1
+      port: 4001
+    second:
+      host: 127.0.0.1
+      port: 4002
+      weight: 3
+  balance_algorithm: '{algorithm}'
+"""
+
+
+def reload_targets(numbers: str) -> List[Target]:
+    """It builds targets like a reloaded settings file gives them, by the numbers of their names"""
+    return [Target(f"t{i}", "127.0.0.1", 4000 + int(i)) for i in numbers]
+
+
+def test_reloaded_targets_are_bound_to_new_counters() -> None:
+    targets = build_targets(3)
+    targets[0].increment_connections()
+    algorithm = BalancerAlgorithmEnum.ROUND_ROBIN
+    reloaded = targets.reloaded(
+        reload_targets("012"), BalanceAlgorithmFactory.build(algorithm)
+    )
+    assert reloaded.counters is not targets.counters
+    # Connections in progress are released in the previous counters
+    assert reloaded[0].active_connections == 0
+    assert targets[0].active_connections == 1
+
+
+def test_unchanged_targets_keep_their_health() -> None:
+    targets = build_targets(3)
+    targets[1].set_healthy(False)
+    algorithm = BalancerAlgorithmEnum.ROUND_ROBIN
+    reloaded = targets.reloaded(
+        reload_targets("123"), BalanceAlgorithmFactory.build(algorithm)
+    )
+    assert [target.healthy for target in reloaded] == [False, True, True]
+
+
+def test_round_robin_goes_on_with_the_same_target() -> None:
+    targets = build_targets(3)
+    targets.get_next()
+    algorithm = BalancerAlgorithmEnum.ROUND_ROBIN
+    reloaded = targets.reloaded(
+        reload_targets("0123"), BalanceAlgorithmFactory.build(algorithm)
+    )
+    assert reloaded.get_next().name == "t1"
+
+
+def test_hash_ring_is_taken_over_if_unchanged() -> None:
+    targets = build_targets(3, BalancerAlgorithmEnum.CONSISTENT_HASH)
+    previous = ConsistentHashBalanceAlgorithm()
+    targets.attach_algorithm(previous)
+    targets.get_next("key")
+
+    algorithm = ConsistentHashBalanceAlgorithm()
+    reloaded = targets.reloaded(reload_targets("012"), algorithm)
+    assert algorithm.ring_hashes is previous.ring_hashes
+    assert reloaded.get_next("key").name == targets.get_next("key").name
+
+    # Changed targets get a ring of their own
+    algorithm = ConsistentHashBalanceAlgorithm()
+    targets.reloaded(reload_targets("013"), algorithm)
+    assert algorithm.ring_hashes is not previous.ring_hashes
+
+
+def test_reload_requires_targets() -> None:
+    with pytest.raises(ValueError):
+        build_targets(1).reloaded(
+            [], BalanceAlgorithmFactory.build(BalancerAlgorithmEnum.RANDOM)
+        )
+
+
+def test_reloader_reads_targets_and_algorithm(tmp_path: Path) -> None:
+    path = tmp_path / "settings.yaml"
+    path.write_text(SETTINGS.format(algorithm="maglev"))
+    (targets, algorithm) = SettingsReloader(path, watch_interval=0).load()
+    assert [(target.name, target.port, target.weight) for target in targets] == [
+        ("first", 4001, 1),
+        ("second", 4002, 3),
+    ]
+    assert algorithm is BalancerAlgorithmEnum.MAGLEV
+
+
+def test_reloader_rejects_wrong_settings(tmp_path: Path) -> None:
+    path = tmp_path / "settings.yaml"
+    path.write_text(SETTINGS.format(algorithm="fastest"))
+    with pytest.raises(Exception):
+        SettingsReloader(path).load()
+    with pytest.raises(ValueError):
+        SettingsReloader(path, watch_interval=-1)
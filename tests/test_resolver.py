@@ -0,0 +1,153 @@
+import signal
+import socket
+import time
+from typing import Callable, List, Tuple
+
+import pytest
+
+from balancer.core.common.resolver import TargetResolver
+from balancer.core.common.target import Target
+
+
+class FakeDns(dict):
+    """Addresses of the names the resolver looks up, the names are kept in the order they are looked up"""
+
+    def __init__(self) -> None:
+        super(FakeDns, self).__init__()
+        self.lookups: List[str] = []
+
+    def lookup(self, host: str) -> Tuple[str, ...]:
+        self.lookups.append(host)
+        if host not in self:
+            raise socket.gaierror(socket.EAI_NONAME, "Name or service not known")
+        return self[host]
+
+
+@pytest.fixture
+def dns(monkeypatch: pytest.MonkeyPatch) -> FakeDns:
+    records = FakeDns()
+    monkeypatch.setattr(TargetResolver, "lookup", staticmethod(records.lookup))
+    return records
+
+
+def wait_for(condition: Callable[[], bool], timeout: float = 5) -> bool:
+    deadline = time.monotonic() + timeout
+    while not condition() and time.monotonic() < deadline:
+        time.sleep(0.01)
+    return condition()
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        TargetResolver(ttl=-1)
+
+
+def test_names_are_resolved_once_per_resolution(dns: FakeDns) -> None:
+    dns["backend"] = ("10.0.0.1", "10.0.0.2")
+    targets = [
+        Target("first", "backend", 4000),
+        Target("second", "backend", 4001),
+        Target("plain", "10.0.0.9", 4002),
+    ]
+    TargetResolver().resolve(targets)
+    assert [target.address for target in targets] == [
+        "10.0.0.1",
+        "10.0.0.1",
+        "10.0.0.9",
+    ]
+    # Addresses are not looked up
+    assert dns.lookups == ["backend"]
+
+
+def test_last_known_address_is_kept_on_failure(dns: FakeDns) -> None:
+    dns["backend"] = ("10.0.0.1",)
+    target = Target("first", "backend", 4000)
+    resolver = TargetResolver()
+    resolver.resolve([target])
+    del dns["backend"]
+    resolver.resolve([target])
+    assert target.address == "10.0.0.1"
+    dns["backend"] = ("10.0.0.2",)
+    resolver.resolve([target])
+    assert target.address == "10.0.0.2"
+
+
+def test_names_of_several_addresses_are_expanded(dns: FakeDns) -> None:
+    dns["many"] = ("10.0.0.1", "10.0.0.2")
+    dns["single"] = ("10.0.0.3",)
+    targets = [
+        Target("many", "many", 4000, weight=2, max_conns=10),
+        Target("single", "single", 4001),
+        Target("unknown", "unknown", 4002),
+        Target("plain", "10.0.0.9", 4003),
+    ]
+    assert TargetResolver().expand_targets(targets) is targets
+
+    resolver = TargetResolver(expand=True)
+    expanded = resolver.expand_targets(targets)
+    assert [(target.name, target.host) for target in expanded] == [
+        ("many@10.0.0.1", "10.0.0.1"),
+        ("many@10.0.0.2", "10.0.0.2"),
+        ("single", "single"),
+        ("unknown", "unknown"),
+        ("plain", "10.0.0.9"),
+    ]
+    assert all(
+        (target.port, target.weight, target.max_conns) == (4000, 2, 10)
+        for target in expanded[:2]
+    )
+    assert resolver.expanded == {"many": dns["many"], "single": dns["single"]}
+
+
+def test_changed_expansion_is_reported_once(dns: FakeDns) -> None:
+    dns["many"] = ("10.0.0.1", "10.0.0.2")
+    resolver = TargetResolver(expand=True)
+    resolver.expand_targets([Target("many", "many", 4000)])
+    # Order of the addresses doesn't matter
+    dns["many"] = ("10.0.0.2", "10.0.0.1")
+    assert not resolver.expanded_changed()
+    dns["many"] = ("10.0.0.2", "10.0.0.3")
+    assert resolver.expanded_changed()
+    assert not resolver.expanded_changed()
+    del dns["many"]
+    assert not resolver.expanded_changed()
+
+
+def test_names_are_resolved_again_each_ttl(dns: FakeDns) -> None:
+    dns["backend"] = ("10.0.0.1",)
+    target = Target("first", "backend", 4000)
+    resolver = TargetResolver(ttl=0.01)
+    resolver.resolve([target])
+    resolver.start([target])
+    try:
+        dns["backend"] = ("10.0.0.2",)
+        assert wait_for(lambda: target.address == "10.0.0.2")
+
+        # Reloaded targets are resolved instead of the previous ones
+        reloaded = Target("first", "backend", 4000)
+        resolver.update_targets([reloaded])
+        assert wait_for(lambda: reloaded.address == "10.0.0.2")
+    finally:
+        resolver.stop()
+
+
+def test_changed_expansion_reloads_the_targets(dns: FakeDns) -> None:
+    dns["many"] = ("10.0.0.1", "10.0.0.2")
+    reloads: List[int] = []
+    previous = signal.signal(signal.SIGHUP, lambda signum, frame: reloads.append(1))
+    resolver = TargetResolver(ttl=0.01, expand=True)
+    try:
+        targets = resolver.expand_targets([Target("many", "many", 4000)])
+        resolver.watch()
+        resolver.start(targets)
+        dns["many"] = ("10.0.0.1", "10.0.0.3")
+        assert wait_for(lambda: reloads == [1])
+    finally:
+        resolver.stop()
+        signal.signal(signal.SIGHUP, previous)
+
+
+def test_zero_ttl_doesnt_resolve_again(dns: FakeDns) -> None:
+    resolver = TargetResolver(ttl=0)
+    resolver.start([Target("first", "backend", 4000)])
+    assert not resolver.keep_going
@@ -0,0 +1,72 @@
+import time
+
+import pytest
+
+from balancer.core.common.retry import FailoverPolicy, RetryBudget
+from balancer.core.enums import BalancerAlgorithmEnum
+
+from .conftest import build_targets
+
+
+def test_budget_allows_min_retries_without_requests() -> None:
+    budget = RetryBudget(percent=0, min_retries=2, window=1)
+    assert budget.try_retry() and budget.try_retry()
+    assert not budget.try_retry()
+
+
+def test_budget_follows_the_percentage() -> None:
+    budget = RetryBudget(percent=20, min_retries=0, window=10)
+    for _ in range(10):
+        budget.record_request()
+    assert budget.try_retry() and budget.try_retry()
+    assert not budget.try_retry()
+
+
+def test_budget_is_refilled_by_the_next_window() -> None:
+    budget = RetryBudget(percent=0, min_retries=10, window=0.1)
+    while budget.try_retry():
+        pass
+    time.sleep(0.25)
+    assert budget.try_retry()
+
+
+def test_budget_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        RetryBudget(window=0)
+    with pytest.raises(ValueError):
+        FailoverPolicy(max_attempts=0)
+
+
+@pytest.mark.parametrize("algorithm", list(BalancerAlgorithmEnum))
+def test_fails_over_to_an_untried_target(algorithm: BalancerAlgorithmEnum) -> None:
+    targets = build_targets(3, algorithm)
+    # The failed target is the least loaded one, so the least connections algorithms keep giving it
+    for target in targets[1:]:
+        for _ in range(5):
+            target.increment_connections()
+    policy = FailoverPolicy(max_attempts=3, budget=RetryBudget(min_retries=100))
+
+    target = policy.next_target(targets, [targets[0]])
+    assert target is not None and target is not targets[0]
+    assert target.active_connections == 6
+
+    other = policy.next_target(targets, [targets[0], target])
+    assert other is not None and other not in (targets[0], target)
+
+
+def test_fails_over_to_unavailable_targets_as_a_last_resort() -> None:
+    targets = build_targets(3, BalancerAlgorithmEnum.LEAST_CONNECTIONS)
+    targets[1].set_healthy(False)
+    policy = FailoverPolicy(max_attempts=3, budget=RetryBudget(min_retries=100))
+    assert policy.next_target(targets, [targets[0]]) is targets[2]
+    assert policy.next_target(targets, [targets[0], targets[2]]) is targets[1]
+
+
+def test_no_failover_beyond_max_attempts_or_budget() -> None:
+    targets = build_targets(3)
+    policy = FailoverPolicy(max_attempts=2, budget=RetryBudget(min_retries=100))
+    assert policy.next_target(targets, targets[:2]) is None
+
+    policy = FailoverPolicy(budget=RetryBudget(percent=0, min_retries=0))
+    assert policy.next_target(targets, [targets[0]]) is None
+    assert all(target.active_connections == 0 for target in targets)
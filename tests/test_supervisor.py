@@ -0,0 +1,53 @@
+import socket
+
+import pytest
+
+from balancer.core.supervisor import BalancerSupervisor
+
+
+class FakeBalancer:
+    """Stands in for a balancer process, it records how it was built"""
+
+    started = 0
+
+    def __init__(self, **kwargs) -> None:
+        self.kwargs = kwargs
+        FakeBalancer.started += 1
+        self.sentinel = 1000 + FakeBalancer.started
+        self.pid = 0
+
+    def start(self) -> None:
+        pass
+
+
+@pytest.mark.parametrize("processes", [0, -1])
+def test_rejects_non_positive_processes(processes):
+    with pytest.raises(ValueError):
+        BalancerSupervisor(FakeBalancer, processes=processes)
+
+
+def test_rejects_non_integer_processes():
+    with pytest.raises(TypeError):
+        BalancerSupervisor(FakeBalancer, processes="2")  # type: ignore
+
+
+def test_balancers_bind_the_port_with_reuse_port():
+    supervisor = BalancerSupervisor(FakeBalancer, processes=2)
+
+    balancer = supervisor.spawn()
+
+    assert balancer.kwargs == {"reuse_port": True}
+    assert supervisor.balancers[balancer.sentinel] is balancer
+
+
+def test_balancers_share_the_given_socket():
+    with socket.socket() as listen_socket:
+        supervisor = BalancerSupervisor(
+            FakeBalancer, processes=2, listen_socket=listen_socket
+        )
+
+        first = supervisor.spawn()
+        second = supervisor.spawn()
+
+    assert first.kwargs == second.kwargs == {"listen_socket": listen_socket}
+    assert len(supervisor.balancers) == 2
@@ -0,0 +1,168 @@
+import asyncio
+import functools
+import socket
+import time
+from typing import List
+
+import pytest
+
+from balancer.core.common.http import HttpHead
+from balancer.core.common.http_worker import HttpWorker
+from balancer.core.common.outlier import OutlierDetector
+from balancer.core.common.timeouts import TimeoutPolicy, TimerWheel
+
+from .conftest import build_targets
+
+
+def test_policy_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        TimeoutPolicy(idle_read=-1)
+    with pytest.raises(ValueError):
+        TimeoutPolicy(keepalive_count=0)
+    assert not TimeoutPolicy(idle_read=0, idle_write=0, session=0).enabled
+
+
+def test_policy_gives_the_nearest_deadline() -> None:
+    policy = TimeoutPolicy(idle_read=10, idle_write=5, session=100)
+    assert policy.deadline(0, 50, None) == 60
+    assert policy.deadline(0, 50, 52) == 57
+    assert policy.deadline(0, 95, None) == 100
+    assert TimeoutPolicy(0, 0, 0).deadline(0, 0, 0) is None
+
+
+def test_policy_tells_the_reason_of_expiry() -> None:
+    policy = TimeoutPolicy(idle_read=10, idle_write=5, session=100)
+    assert policy.expired(59, 0, 50, None) is None
+    assert "no data" in policy.expired(60, 0, 50, None)  # type: ignore
+    assert "wasn't taken" in policy.expired(58, 0, 55, 53)  # type: ignore
+    assert "session" in policy.expired(100, 0, 99, None)  # type: ignore
+
+
+def test_wheel_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        TimerWheel(resolution=0)
+    with pytest.raises(ValueError):
+        TimerWheel(slots=1)
+    with pytest.raises(ValueError):
+        TimerWheel(levels=0)
+
+
+def test_wheel_fires_timers_in_order_across_levels() -> None:
+    wheel = TimerWheel(resolution=1, slots=4, levels=3)
+    start = wheel.clock()
+    fired: List[int] = []
+    # Delays beyond the span of the wheel (64 ticks) wait in its farthest slot
+    for delay in (1, 3, 5, 17, 40, 100):
+        wheel.schedule(delay, functools.partial(fired.append, delay))
+    assert len(wheel) == 6
+    for tick in range(1, 102):
+        wheel.advance(start + tick)
+        # A timer fires within a tick after it's due
+        assert all(delay <= tick for delay in fired)
+        assert all(delay in fired for delay in (1, 3, 5, 17, 40, 100) if delay < tick)
+    assert fired == [1, 3, 5, 17, 40, 100] and len(wheel) == 0
+
+
+def test_cancelled_timers_dont_fire() -> None:
+    wheel = TimerWheel(resolution=1, slots=4, levels=2)
+    start = wheel.clock()
+    fired: List[str] = []
+    kept = wheel.schedule(2, lambda: fired.append("kept"))
+    cancelled = wheel.schedule(2, lambda: fired.append("cancelled"))
+    cancelled.cancel()
+    cancelled.cancel()  # It's safe to be cancelled once again
+    assert len(wheel) == 1 and not cancelled.active and kept.active
+    wheel.advance(start + 3)
+    assert fired == ["kept"] and not kept.active
+    assert wheel.next_tick() is None
+
+
+def test_failing_callback_doesnt_stop_the_wheel() -> None:
+    wheel = TimerWheel(resolution=1, slots=4, levels=1)
+    fired: List[int] = []
+    wheel.schedule(1, lambda: 1 / 0)  # type: ignore
+    wheel.schedule(1, lambda: fired.append(1))
+    wheel.advance(wheel.clock() + 2)
+    assert fired == [1]
+
+
+def test_wheel_driven_by_the_event_loop() -> None:
+    async def run() -> List[float]:
+        loop = asyncio.get_running_loop()
+        wheel = TimerWheel(resolution=0.01, slots=8, levels=2, loop=loop)
+        started_at = loop.time()
+        fired: List[float] = []
+        done = loop.create_future()
+        for delay in (0.02, 0.15):
+            wheel.schedule(delay, lambda: fired.append(loop.time() - started_at))
+        wheel.schedule(0.2, lambda: done.set_result(None))
+        await asyncio.wait_for(done, 5)
+        wheel.close()
+        return fired
+
+    fired = asyncio.run(run())
+    assert len(fired) == 2
+    assert 0.02 <= fired[0] < 0.1 and 0.15 <= fired[1] < 0.3
+
+
+def test_stalled_target_is_timed_out(silent_server) -> None:
+    targets = build_targets(1, port=silent_server[1])
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    outliers = OutlierDetector(consecutive_failures=1)
+    worker = HttpWorker(
+        client,
+        "127.0.0.1",
+        lambda: targets,
+        outliers=outliers,
+        timeouts=TimeoutPolicy(idle_read=0.1),
+    )
+
+    async def request() -> bytes:
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(worker.run())
+        await loop.sock_sendall(peer, b"GET / HTTP/1.1\r\n\r\n")
+        response = await asyncio.wait_for(loop.sock_recv(peer, 65536), 5)
+        await asyncio.wait_for(task, 5)
+        return response
+
+    started_at = time.monotonic()
+    response = asyncio.run(request())
+    peer.close()
+
+    assert HttpHead(response, False).status == 504
+    assert time.monotonic() - started_at < 2
+    assert targets[0].ejected and targets[0].active_connections == 0
+
+
+def test_stalled_client_body_is_timed_out(silent_server) -> None:
+    targets = build_targets(1, port=silent_server[1])
+    (client, peer) = socket.socketpair()
+    client.setblocking(False)
+    peer.setblocking(False)
+    outliers = OutlierDetector(consecutive_failures=1)
+    worker = HttpWorker(
+        client,
+        "127.0.0.1",
+        lambda: targets,
+        outliers=outliers,
+        timeouts=TimeoutPolicy(idle_read=0.1),
+    )
+
+    async def request() -> bytes:
+        loop = asyncio.get_running_loop()
+        task = loop.create_task(worker.run())
+        # The body is promised, but never sent
+        await loop.sock_sendall(
+            peer, b"POST / HTTP/1.1\r\nContent-Length: 10\r\n\r\nabc"
+        )
+        response = await asyncio.wait_for(loop.sock_recv(peer, 65536), 5)
+        await asyncio.wait_for(task, 5)
+        return response
+
+    response = asyncio.run(request())
+    peer.close()
+
+    assert HttpHead(response, False).status == 408
+    assert not targets[0].ejected
@@ -0,0 +1,138 @@
+import asyncio
+import shutil
+import socket
+import ssl
+import subprocess
+import threading
+from typing import Any, List, Optional, Tuple
+
+import pytest
+
+from balancer.core.common.tls import TlsPolicy
+
+
+@pytest.fixture(scope="module")
+def certificate(tmp_path_factory: pytest.TempPathFactory) -> Tuple[str, str]:
+    """Self-signed certificate and its key in separate PEM files"""
+    if shutil.which("openssl") is None:
+        pytest.skip("No openssl to generate a certificate")
+    directory = tmp_path_factory.mktemp("tls")
+    (cert, key) = (str(directory / "cert.pem"), str(directory / "key.pem"))
+    subprocess.run(
+        [
+            "openssl",
+            "req",
+            "-x509",
+            "-newkey",
+            "rsa:2048",
+            "-nodes",
+            "-days",
+            "1",
+            "-subj",
+            "/CN=localhost",
+            "-keyout",
+            key,
+            "-out",
+            cert,
+        ],
+        check=True,
+        capture_output=True,
+    )
+    return (cert, key)
+
+
+def client_context() -> ssl.SSLContext:
+    context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
+    context.check_hostname = False
+    context.verify_mode = ssl.CERT_NONE
+    return context
+
+
+def talk(
+    peer: socket.socket, context: ssl.SSLContext, result: List[Any], session: Any = None
+) -> None:
+    """It handshakes as a client, sends a ping and waits for the pong, the session is put into the result"""
+    try:
+        with context.wrap_socket(peer, session=session) as client:
+            client.sendall(b"ping")
+            result.append(client.recv(4))
+            result.append(client.session)
+    except OSError as exc:
+        result.append(exc)
+
+
+def serve(
+    policy: TlsPolicy, context: ssl.SSLContext, session: Any = None
+) -> Optional[ssl.SSLSession]:
+    """
+    It accepts a TLS connection of a client running in a thread and answers its ping
+    :return: Session of the client, None if the handshake failed
+    """
+    (server, peer) = socket.socketpair()
+    result: List[Any] = []
+    thread = threading.Thread(target=talk, args=(peer, context, result, session))
+    thread.start()
+    tls_socket = policy.accept(server, ("127.0.0.1", 1))
+    if tls_socket is not None:
+        buffer = bytearray(4)
+        assert tls_socket.recv_into(buffer) == 4 and buffer == b"ping"
+        assert tls_socket.send(b"pong") == 4
+    thread.join(5)
+    if tls_socket is not None:
+        assert result[0] == b"pong"
+        tls_socket.shutdown(socket.SHUT_RDWR)
+        tls_socket.close()
+        return result[1]
+    peer.close()
+    return None
+
+
+def test_rejects_wrong_arguments(certificate: Tuple[str, str]) -> None:
+    with pytest.raises(ValueError):
+        TlsPolicy(*certificate, handshake_timeout=0)
+    with pytest.raises(OSError):
+        TlsPolicy("missing.pem")
+
+
+def test_plain_data_is_relayed(certificate: Tuple[str, str]) -> None:
+    policy = TlsPolicy(*certificate)
+    assert serve(policy, client_context()) is not None
+    assert policy.read() == [1, 0, 0]
+
+
+def test_sessions_are_resumed_by_tickets(certificate: Tuple[str, str]) -> None:
+    policy = TlsPolicy(*certificate)
+    context = client_context()
+    session = serve(policy, context)
+    serve(policy, context, session)
+    assert policy.read()[TlsPolicy.RESUMED] == 1
+
+
+def test_sessions_are_resumed_by_the_cache_without_tickets(
+    certificate: Tuple[str, str],
+) -> None:
+    policy = TlsPolicy(*certificate, session_tickets=False)
+    context = client_context()
+    session = serve(policy, context)
+    serve(policy, context, session)
+    assert policy.read()[TlsPolicy.RESUMED] == 1
+
+
+def test_failed_handshake_closes_the_client(certificate: Tuple[str, str]) -> None:
+    policy = TlsPolicy(*certificate)
+    (server, peer) = socket.socketpair()
+    with peer:
+        peer.sendall(b"GET / HTTP/1.1\r\n\r\n")
+        assert policy.accept(server, ("127.0.0.1", 1)) is None
+    assert server.fileno() == -1
+    assert policy.read()[TlsPolicy.FAILED] == 1
+
+
+def test_stalled_handshake_times_out(certificate: Tuple[str, str]) -> None:
+    policy = TlsPolicy(*certificate, handshake_timeout=0.05)
+    (server, peer) = socket.socketpair()
+    server.setblocking(False)
+    with peer:
+        tls_socket = asyncio.run(policy.accept_async(server, ("127.0.0.1", 1)))
+    assert tls_socket is None and server.fileno() == -1
+    assert policy.read()[TlsPolicy.FAILED] == 1
@@ -0,0 +1,154 @@
+import asyncio
+import select
+import socket
+import time
+from typing import Callable, Iterator, List
+
+import pytest
+
+from balancer.core.common.target import Target
+from balancer.core.common.udp import UdpPolicy
+from balancer.core.udp_balancer import UdpBalancer
+
+from .conftest import free_port
+
+
+@pytest.fixture
+def udp_sockets() -> Iterator[Callable[[], socket.socket]]:
+    """Factory of local UDP sockets, closed once the test is completed"""
+    sockets: List[socket.socket] = []
+
+    def bind() -> socket.socket:
+        sockets.append(socket.socket(socket.AF_INET, socket.SOCK_DGRAM))
+        sockets[-1].bind(("127.0.0.1", 0))
+        return sockets[-1]
+
+    yield bind
+    for sock in sockets:
+        sock.close()
+
+
+def build_balancer(
+    target_ports: List[int], listen_socket: socket.socket, **kwargs
+) -> UdpBalancer:
+    """It builds a balancer over the bound socket, flows are relayed by calling its callbacks"""
+    listen_socket.setblocking(False)
+    targets = [
+        Target(f"t{i}", "127.0.0.1", port) for (i, port) in enumerate(target_ports)
+    ]
+    return UdpBalancer(targets, udp=UdpPolicy(**kwargs), listen_socket=listen_socket)
+
+
+def wait_readable(sock: socket.socket) -> None:
+    assert select.select([sock], [], [], 5)[0], "Datagram isn't received in time"
+
+
+def send_from(
+    balancer: UdpBalancer, client: socket.socket, datagram: bytes = b"ping"
+) -> None:
+    """It sends the datagram of the client to the balancer and lets the balancer relay it"""
+    client.sendto(datagram, balancer.listen_socket.getsockname())
+    wait_readable(balancer.listen_socket)
+    balancer.receive_from_clients(balancer.listen_socket)
+
+
+def test_rejects_wrong_arguments() -> None:
+    with pytest.raises(ValueError):
+        UdpPolicy(idle_timeout=0)
+    with pytest.raises(ValueError):
+        UdpPolicy(max_flows=0)
+
+
+def test_flow_relays_both_directions(udp_sockets) -> None:
+    target = udp_sockets()
+    balancer = build_balancer([target.getsockname()[1]], udp_sockets())
+    client = udp_sockets()
+
+    async def relay() -> None:
+        send_from(balancer, client)
+        send_from(balancer, client, b"pong")
+        assert list(balancer.flows) == [client.getsockname()]
+        (first, flow_address) = target.recvfrom(64)
+        (second, _) = target.recvfrom(64)
+        assert (first, second) == (b"ping", b"pong")
+
+        flow = balancer.flows[client.getsockname()]
+        target.sendto(b"reply", flow_address)
+        wait_readable(flow.socket)
+        balancer.receive_from_target(flow)
+        assert client.recv(64) == b"reply"
+        assert (flow.sent, flow.received) == (8, 5)
+        assert balancer.targets[0].active_connections == 1
+
+        balancer.close_flow(flow)
+        assert not balancer.flows
+        assert balancer.targets[0].active_connections == 0
+
+    asyncio.run(relay())
+
+
+def test_least_recently_active_flow_is_evicted(udp_sockets) -> None:
+    target = udp_sockets()
+    balancer = build_balancer([target.getsockname()[1]], udp_sockets(), max_flows=2)
+    clients = [udp_sockets() for _ in range(3)]
+
+    async def relay() -> None:
+        send_from(balancer, clients[0])
+        send_from(balancer, clients[1])
+        # The first flow is active again, so the second one is the least recently active
+        send_from(balancer, clients[0])
+        send_from(balancer, clients[2])
+        assert list(balancer.flows) == [
+            clients[0].getsockname(),
+            clients[2].getsockname(),
+        ]
+        assert balancer.udp.read()[UdpPolicy.EVICTED] == 1
+        assert balancer.targets[0].active_connections == 2
+
+    asyncio.run(relay())
+
+
+def test_idle_flows_are_expired(udp_sockets) -> None:
+    target = udp_sockets()
+    balancer = build_balancer([target.getsockname()[1]], udp_sockets(), idle_timeout=60)
+    clients = [udp_sockets() for _ in range(2)]
+
+    async def relay() -> None:
+        for client in clients:
+            send_from(balancer, client)
+        balancer.flows[clients[0].getsockname()].last_seen = time.monotonic() - 61
+        balancer.flows.move_to_end(clients[1].getsockname())
+        balancer.expire_flows()
+        assert list(balancer.flows) == [clients[1].getsockname()]
+        assert balancer.udp.read()[UdpPolicy.EXPIRED] == 1
+
+    asyncio.run(relay())
+
+
+def test_refused_flow_is_closed(udp_sockets) -> None:
+    balancer = build_balancer([free_port()], udp_sockets())
+    client = udp_sockets()
+
+    async def relay() -> None:
+        send_from(balancer, client)
+        flow = balancer.flows[client.getsockname()]
+        # Port unreachable is reported to the connected socket of the flow
+        wait_readable(flow.socket)
+        balancer.receive_from_target(flow)
+        assert not balancer.flows
+        assert balancer.udp.read()[UdpPolicy.FAILED] == 1
+        assert balancer.targets[0].active_connections == 0
+
+    asyncio.run(relay())
+
+
+def test_draining_balancer_opens_no_flows(udp_sockets) -> None:
+    target = udp_sockets()
+    balancer = build_balancer([target.getsockname()[1]], udp_sockets())
+    balancer.keep_going = False
+
+    async def relay() -> None:
+        send_from(balancer, udp_sockets())
+        assert not balancer.flows
+
+    asyncio.run(relay())